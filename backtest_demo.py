@@ -13,7 +13,7 @@ from pandas import Timestamp
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
-from core.fetcher.downloader import load_data
+from core.storage.reader import load_data
 from config.etf_list import ETF_LIST
 from config.stock_list import STOCK_LIST
 
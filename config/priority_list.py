@@ -0,0 +1,10 @@
+"""
+下载优先级配置
+档位越小越先下载（0最高），未列出的代码为档位2。
+设置了截止时间（DOWNLOAD_DEADLINE）时，高优先级的代码不会因为窗口不够而被推迟
+"""
+
+PRIORITY_LIST = {
+    '510300.SH': 0,  # 沪深300ETF
+    '000300.SH': 0,  # 沪深300
+}
@@ -1 +1,5 @@
 # QmtDataTool 核心模块
+import logging
+
+# 库代码不配置日志输出，由调用方决定（见 core.logging_config）
+logging.getLogger(__name__).addHandler(logging.NullHandler())
@@ -0,0 +1,462 @@
+"""
+数据对账模块
+把本地数据与另一份参考数据（其他数据商导出的CSV/Parquet）按 (代码, 日期) 逐日比对，
+找出QMT数据中悄悄出错的地方：缺失的交易日、超出容差的价格和成交量，生成差异报告，
+并可以只重新下载有差异的时间段
+
+参考数据可以是：
+- 一个目录，每个代码一个文件 {code}.parquet / {code}.csv
+- 一个文件（CSV/Parquet），包含代码列，所有代码在同一张表中
+
+列名和代码格式按常见写法自动识别（见 COLUMN_ALIASES / normalize_code）。
+比对在日线粒度进行，分钟线先按交易日汇总；只比较两份数据都覆盖的日期范围。
+注意参考数据的复权方式需要与本地数据一致（默认前复权），否则价格会整体不一致。
+"""
+
+import os
+import re
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from core.storage.resampler import resample_bars
+
+logger = logging.getLogger(__name__)
+
+REPORT_FILE = 'reconcile_report.csv'
+
+# 参考数据中可能出现的列名（小写比较），依次匹配第一个存在的列
+COLUMN_ALIASES = {
+    'code': ['code', 'ts_code', 'symbol', 'ticker', 'sec_code', '代码', '证券代码'],
+    'date': ['date', 'trade_date', 'datetime', 'time', 'trading_date', '日期', '交易日期'],
+    'open': ['open', '开盘', '开盘价'],
+    'high': ['high', '最高', '最高价'],
+    'low': ['low', '最低', '最低价'],
+    'close': ['close', '收盘', '收盘价'],
+    'volume': ['volume', 'vol', '成交量'],
+    'amount': ['amount', 'turnover', 'money', '成交额'],
+}
+
+COMPARE_FIELDS = ['open', 'high', 'low', 'close', 'volume', 'amount']
+
+# 差异类型
+MISMATCH = 'mismatch'                    # 字段超出容差
+MISSING_LOCAL = 'missing_local'          # 参考数据有、本地没有的交易日
+MISSING_REFERENCE = 'missing_reference'  # 本地有、参考数据没有的交易日
+NO_LOCAL = 'no_local'                    # 没有本地数据文件
+NO_REFERENCE = 'no_reference'            # 没有该代码的参考数据
+ERROR = 'error'                          # 读取或比对失败（原因见日志）
+
+# 需要重新下载的差异类型（参考数据缺失通常是参考数据本身的问题）
+REFETCH_KINDS = (MISMATCH, MISSING_LOCAL)
+
+# 相隔不超过这么多自然日的差异日期合并为一个重新下载的时间段
+MERGE_GAP_DAYS = 10
+
+REPORT_COLUMNS = ['code', 'date', 'kind', 'field', 'local', 'reference', 'diff']
+
+_EXCHANGE_SUFFIX = {'XSHG': 'SH', 'XSHE': 'SZ', 'SS': 'SH', 'SH': 'SH', 'SZ': 'SZ', 'BJ': 'BJ'}
+_CODE_PATTERN = re.compile(r'^(?:(SH|SZ|BJ)\.?)?(\d{6})(?:\.(\w+))?$')
+
+
+@dataclass
+class Tolerance:
+    """单个字段的容差：|本地 - 参考| <= atol + rtol * |参考| 视为一致"""
+    atol: float = 0.0
+    rtol: float = 0.0
+
+    def exceeds(self, local: np.ndarray, reference: np.ndarray) -> np.ndarray:
+        """逐元素判断是否超出容差（只有一边缺失也算超出，两边都缺失不算）"""
+        with np.errstate(invalid='ignore'):
+            over = np.abs(local - reference) > self.atol + self.rtol * np.abs(reference)
+        return over | (np.isnan(local) != np.isnan(reference))
+
+
+# 默认容差：价格允许半分钱的舍入误差和0.1%的复权误差；成交量/成交额允许0.5%（各家对盘后成交的统计口径不同）
+DEFAULT_TOLERANCES = {
+    'open': Tolerance(atol=0.005, rtol=0.001),
+    'high': Tolerance(atol=0.005, rtol=0.001),
+    'low': Tolerance(atol=0.005, rtol=0.001),
+    'close': Tolerance(atol=0.005, rtol=0.001),
+    'volume': Tolerance(rtol=0.005),
+    'amount': Tolerance(rtol=0.005),
+}
+
+
+def parse_tolerances(value: str | None) -> dict[str, Tolerance]:
+    """解析容差配置，未指定的字段使用默认容差
+
+    Args:
+        value: 逗号分隔的 字段=容差，数字为绝对容差，百分数为相对容差，
+               如 'close=0.01,volume=1%'；也可以同时指定 'close=0.01+0.1%'
+
+    Returns:
+        {字段: Tolerance}
+    """
+    tolerances = dict(DEFAULT_TOLERANCES)
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        field, _, spec = item.partition('=')
+        atol = rtol = 0.0
+        for part in spec.split('+'):
+            part = part.strip()
+            if part.endswith('%'):
+                rtol = float(part[:-1]) / 100
+            elif part:
+                atol = float(part)
+        tolerances[field.strip()] = Tolerance(atol=atol, rtol=rtol)
+    return tolerances
+
+
+def parse_scales(value: str | None) -> dict[str, float]:
+    """解析参考数据的单位换算，如 'volume=100,amount=1000'（成交量单位为手、成交额单位为千元）"""
+    scales = {}
+    for item in (value or '').split(','):
+        if item.strip():
+            field, _, factor = item.partition('=')
+            scales[field.strip()] = float(factor)
+    return scales
+
+
+def normalize_code(code: Any) -> str:
+    """各家的代码写法统一为QMT格式
+
+    '600000.SH' / 'SH600000' / 'sh.600000' / '600000.XSHG' -> '600000.SH'，无法识别时原样返回
+    """
+    text = str(code).strip().upper()
+    match = _CODE_PATTERN.match(text)
+    if not match:
+        return text
+    prefix, digits, suffix = match.groups()
+    exchange = _EXCHANGE_SUFFIX.get(suffix or prefix or '')
+    return f"{digits}.{exchange}" if exchange else text
+
+
+def _read_table(path: str) -> pd.DataFrame:
+    if path.lower().endswith('.csv'):
+        return pd.read_csv(path, encoding='utf-8-sig')
+    return pd.read_parquet(path)
+
+
+def standardize_reference(df: pd.DataFrame, scales: dict[str, float] | None = None) -> pd.DataFrame:
+    """按 COLUMN_ALIASES 识别列名，统一为以日期为索引的 COMPARE_FIELDS（保留code列）
+
+    Args:
+        df: 参考数据（日期可以是索引或列）
+        scales: 单位换算，参考数据的值乘以该系数后与本地比较
+
+    Returns:
+        标准化后的DataFrame，按日期升序
+    """
+    if not isinstance(df.index, pd.RangeIndex):
+        df = df.reset_index()
+    lower = {str(c).strip().lower(): c for c in df.columns}
+    columns = {}
+    for name, aliases in COLUMN_ALIASES.items():
+        source = next((lower[a] for a in aliases if a in lower), None)
+        if source is not None:
+            columns[name] = df[source]
+    if 'date' not in columns:
+        raise ValueError(f"参考数据中找不到日期列: {list(df.columns)}")
+
+    out = pd.DataFrame(columns)
+    # 20240102 这类整数日期按字符串解析
+    dates = out.pop('date')
+    out.index = pd.DatetimeIndex(pd.to_datetime(dates.astype(str) if dates.dtype.kind in 'iu' else dates),
+                                 name='date')
+    if 'code' in out.columns:
+        out['code'] = out['code'].map(normalize_code)
+    for field, factor in (scales or {}).items():
+        if field in out.columns:
+            out[field] = out[field].astype('float64') * factor
+    return out.sort_index(kind='stable')
+
+
+def to_daily(df: pd.DataFrame) -> pd.DataFrame:
+    """日内数据按交易日汇总（开盘取第一根、收盘取最后一根），索引统一为日期（0点）"""
+    if len(df) == 0:
+        return df
+    index = pd.DatetimeIndex(df.index)
+    if not index.normalize().is_unique:
+        df = resample_bars(df[[c for c in COMPARE_FIELDS if c in df.columns]], '1d')
+    df = df.copy()
+    df.index = pd.DatetimeIndex(df.index).normalize().rename('date')
+    return df
+
+
+def compare_frames(code: str, local: pd.DataFrame, reference: pd.DataFrame,
+                   tolerances: dict[str, Tolerance] | None = None) -> pd.DataFrame:
+    """比对一个代码的本地数据和参考数据
+
+    两边按日期外连接，只比较两份数据都覆盖的日期范围；参考数据中成交量为0的日期
+    （停牌日，QMT不返回K线）不算本地缺失。
+
+    Args:
+        code: 股票/ETF代码
+        local: 本地数据（日线或分钟线）
+        reference: standardize_reference 后的参考数据
+        tolerances: 各字段容差，默认 DEFAULT_TOLERANCES
+
+    Returns:
+        差异明细，列为 REPORT_COLUMNS
+    """
+    tolerances = tolerances or DEFAULT_TOLERANCES
+    local = to_daily(local)
+    reference = to_daily(reference.drop(columns=['code'], errors='ignore'))
+    if len(local) == 0 or len(reference) == 0:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+
+    lo = max(local.index[0], reference.index[0])
+    hi = min(local.index[-1], reference.index[-1])
+    local = local.loc[lo:hi]
+    reference = reference.loc[lo:hi]
+    fields = [f for f in COMPARE_FIELDS if f in local.columns and f in reference.columns]
+
+    joined = local[fields].astype('float64').join(reference[fields].astype('float64'),
+                                                  how='outer', lsuffix='_local', rsuffix='_ref')
+    in_local = joined.index.isin(local.index)
+    in_ref = joined.index.isin(reference.index)
+
+    parts = []
+    missing_local = in_ref & ~in_local
+    if 'volume' in fields:
+        missing_local &= joined['volume_ref'].to_numpy() != 0
+    for mask, kind in ((missing_local, MISSING_LOCAL), (in_local & ~in_ref, MISSING_REFERENCE)):
+        if mask.any():
+            parts.append(pd.DataFrame({'date': joined.index[mask], 'kind': kind}))
+
+    both = joined[in_local & in_ref]
+    for field in fields:
+        local_values = both[f'{field}_local'].to_numpy()
+        ref_values = both[f'{field}_ref'].to_numpy()
+        over = tolerances.get(field, Tolerance()).exceeds(local_values, ref_values)
+        if not over.any():
+            continue
+        with np.errstate(divide='ignore', invalid='ignore'):
+            diff = (local_values[over] - ref_values[over]) / np.abs(ref_values[over])
+        parts.append(pd.DataFrame({
+            'date': both.index[over], 'kind': MISMATCH, 'field': field,
+            'local': local_values[over], 'reference': ref_values[over], 'diff': diff,
+        }))
+
+    if not parts:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    report = pd.concat(parts, ignore_index=True)
+    report.insert(0, 'code', code)
+    return report.reindex(columns=REPORT_COLUMNS).sort_values(['date', 'kind'], kind='stable')
+
+
+def _reconcile_one(task: tuple[str, str, Any, dict[str, Tolerance], dict[str, float],
+                               str | None, str | None]) -> pd.DataFrame:
+    """对账一个代码（在工作进程中执行，参考数据是文件路径或已拆分的DataFrame）"""
+    code, local_path, reference, tolerances, scales, start, end = task
+    if reference is None:
+        return pd.DataFrame([{'code': code, 'kind': NO_REFERENCE}], columns=REPORT_COLUMNS)
+    if not os.path.exists(local_path):
+        return pd.DataFrame([{'code': code, 'kind': NO_LOCAL}], columns=REPORT_COLUMNS)
+    try:
+        local = pd.read_parquet(local_path).sort_index()
+        if isinstance(reference, str):
+            reference = standardize_reference(_read_table(reference), scales)
+        local = local.loc[start:end]
+        reference = reference.loc[start:end]
+        return compare_frames(code, local, reference, tolerances)
+    except Exception as e:
+        logger.error("❌ %s 对账失败: %s", code, e)
+        return pd.DataFrame([{'code': code, 'kind': ERROR}], columns=REPORT_COLUMNS)
+
+
+class Reconciler:
+    """本地数据与参考数据对账
+
+    示例::
+
+        reconciler = Reconciler('output', 'vendor_dump/', workers=8)
+        report = reconciler.run(code_list)
+        reconciler.save_report(report)
+        reconciler.print_summary(report)
+        reconciler.refetch(downloader, report)      # 只重新下载有差异的时间段
+    """
+
+    def __init__(self, output_dir: str, reference: str,
+                 tolerances: dict[str, Tolerance] | None = None,
+                 scales: dict[str, float] | None = None, workers: int = 1):
+        """初始化
+
+        Args:
+            output_dir: 本地数据目录
+            reference: 参考数据目录（每个代码一个文件）或单个文件（含代码列）
+            tolerances: 各字段容差，默认 DEFAULT_TOLERANCES
+            scales: 参考数据的单位换算，如 {'volume': 100}（参考数据成交量单位为手）
+            workers: 对账进程数，1表示在当前进程中执行
+        """
+        self.output_dir = output_dir
+        self.reference = reference
+        self.tolerances = tolerances or DEFAULT_TOLERANCES
+        self.scales = scales or {}
+        self.workers = max(1, workers)
+        self._reference_table: pd.DataFrame | None = None
+
+    def _reference_files(self) -> dict[str, str]:
+        """参考数据目录中的文件 {代码: 路径}，同一代码有多个文件时优先parquet"""
+        files: dict[str, str] = {}
+        for name in sorted(os.listdir(self.reference), key=lambda n: not n.endswith('.parquet')):
+            stem, ext = os.path.splitext(name)
+            if ext.lower() in ('.parquet', '.csv'):
+                files.setdefault(normalize_code(stem), os.path.join(self.reference, name))
+        return files
+
+    def _reference_frames(self) -> dict[str, pd.DataFrame]:
+        """单文件参考数据按代码拆分"""
+        if self._reference_table is None:
+            table = standardize_reference(_read_table(self.reference), self.scales)
+            if 'code' not in table.columns:
+                raise ValueError(f"参考数据文件 {self.reference} 中没有代码列")
+            self._reference_table = table
+        return {code: group for code, group in self._reference_table.groupby('code', sort=False)}
+
+    def run(self, code_list: list[str], start: str | None = None,
+            end: str | None = None) -> pd.DataFrame:
+        """对账多个代码
+
+        Args:
+            code_list: 代码列表
+            start: 只比较该日期（YYYYMMDD）之后的数据，默认不限
+            end: 只比较该日期之前的数据，默认不限
+
+        Returns:
+            差异明细（列为 REPORT_COLUMNS），没有差异时为空表
+        """
+        if os.path.isdir(self.reference):
+            references: dict[str, Any] = self._reference_files()
+        else:
+            references = self._reference_frames()
+        start_ts = pd.Timestamp(start) if start else None
+        end_ts = pd.Timestamp(end) + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1) if end else None
+
+        tasks = [(code, os.path.join(self.output_dir, f"{code}.parquet"), references.get(code),
+                  self.tolerances, self.scales, start_ts, end_ts) for code in code_list]
+        logger.info("🔍 对账 %d 个代码（参考数据: %s，%d 个进程）", len(tasks), self.reference, self.workers)
+
+        if self.workers == 1 or len(tasks) <= 1:
+            reports = [_reconcile_one(task) for task in tqdm(tasks, desc="对账", unit="code")]
+        else:
+            ctx = multiprocessing.get_context('spawn')
+            # 每个任务只读一两个文件，按块分发减少进程间通信
+            chunksize = max(1, len(tasks) // (self.workers * 8))
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx) as pool:
+                reports = list(tqdm(pool.map(_reconcile_one, tasks, chunksize=chunksize),
+                                    total=len(tasks), desc="对账", unit="code"))
+
+        reports = [r for r in reports if len(r)]
+        if not reports:
+            return pd.DataFrame(columns=REPORT_COLUMNS)
+        return pd.concat(reports, ignore_index=True)
+
+    def save_report(self, report: pd.DataFrame, path: str | None = None) -> str:
+        """保存差异明细（CSV）和按代码汇总的统计（同名 .json）
+
+        Args:
+            report: run 的结果
+            path: 报告路径，默认 {output_dir}/reconcile_report.csv
+
+        Returns:
+            报告路径
+        """
+        path = path or os.path.join(self.output_dir, REPORT_FILE)
+        report.to_csv(path, index=False, encoding='utf-8-sig', date_format='%Y-%m-%d')
+        summary = {
+            'reference': self.reference,
+            'tolerances': {f: {'atol': t.atol, 'rtol': t.rtol} for f, t in self.tolerances.items()},
+            'scales': self.scales,
+            'kinds': {str(k): int(v) for k, v in report['kind'].value_counts().items()},
+            'codes': {str(code): {str(k): int(v) for k, v in group['kind'].value_counts().items()}
+                      for code, group in report.groupby('code')},
+            'segments': {code: [list(s) for s in segments]
+                         for code, segments in self.affected_segments(report).items()},
+        }
+        with open(os.path.splitext(path)[0] + '.json', 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        logger.info("📄 对账报告已保存到: %s", path)
+        return path
+
+    @staticmethod
+    def affected_segments(report: pd.DataFrame,
+                          gap_days: int = MERGE_GAP_DAYS) -> dict[str, list[tuple[str, str]]]:
+        """需要重新下载的时间段
+
+        缺失和超出容差的日期，相隔不超过 gap_days 个自然日的合并为一段。
+
+        Returns:
+            {代码: [(起始日期, 结束日期), ...]}，日期为 YYYYMMDD
+        """
+        rows = report[report['kind'].isin(REFETCH_KINDS)]
+        segments: dict[str, list[tuple[str, str]]] = {}
+        for code, group in rows.groupby('code', sort=True):
+            dates = pd.DatetimeIndex(sorted(set(pd.to_datetime(group['date']))))
+            breaks = np.flatnonzero(np.diff(dates.values) > np.timedelta64(timedelta(days=gap_days)))
+            starts = np.r_[0, breaks + 1]
+            ends = np.r_[breaks, len(dates) - 1]
+            segments[code] = [(dates[s].strftime('%Y%m%d'), dates[e].strftime('%Y%m%d'))
+                              for s, e in zip(starts, ends)]
+        return segments
+
+    def refetch(self, downloader: Any, report: pd.DataFrame, **kwargs) -> dict[str, bool]:
+        """只重新下载有差异的时间段，替换本地对应日期的数据
+
+        Args:
+            downloader: QmtDataDownloader
+            report: run 的结果
+            **kwargs: 传给 downloader.repair_segments 的参数（period、dividend_type 等）
+
+        Returns:
+            {代码: 是否成功}
+        """
+        segments = self.affected_segments(report)
+        logger.info("🔁 重新下载 %d 个代码的 %d 个时间段", len(segments),
+                    sum(len(s) for s in segments.values()))
+        return {code: downloader.repair_segments(code, code_segments, **kwargs)
+                for code, code_segments in segments.items()}
+
+    @staticmethod
+    def merge(report: pd.DataFrame, recheck: pd.DataFrame, codes: list[str]) -> pd.DataFrame:
+        """用重新对账的结果替换报告中这些代码的行"""
+        kept = report[~report['code'].isin(codes)]
+        parts = [part for part in (kept, recheck) if len(part)]
+        if not parts:
+            return pd.DataFrame(columns=REPORT_COLUMNS)
+        return pd.concat(parts, ignore_index=True)
+
+    @staticmethod
+    def print_summary(report: pd.DataFrame, limit: int = 20) -> None:
+        """打印对账摘要：各类差异数量和差异最多的代码"""
+        print("\n" + "=" * 60)
+        print("对账摘要")
+        print("=" * 60)
+        if len(report) == 0:
+            print("✅ 未发现差异")
+            print("=" * 60)
+            return
+
+        for kind, count in report['kind'].value_counts().items():
+            print(f"{kind:20} {count:8}")
+        print("")
+        counts = report.groupby('code').size().sort_values(ascending=False)
+        for code, count in counts.head(limit).items():
+            rows = report[report['code'] == code]
+            kinds = ', '.join(f"{k} {v}" for k, v in rows['kind'].value_counts().items())
+            fields = rows['field'].dropna().unique()
+            detail = f" | 字段: {', '.join(map(str, fields))}" if len(fields) else ''
+            print(f"{code:15} | {count:6} 处 | {kinds}{detail}")
+        if len(counts) > limit:
+            print(f"... 另有 {len(counts) - limit} 个代码有差异")
+        print("=" * 60)
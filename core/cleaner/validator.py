@@ -8,6 +8,8 @@ import pandas as pd
 from typing import Any
 import logging
 
+from core.storage.summary import SUMMARY_FILE
+
 logger = logging.getLogger(__name__)
 
 
@@ -57,20 +59,31 @@ class DataValidator:
                 'error': str(e)
             }
     
-    def generate_manifest(self, code_list: list[str] | None = None) -> dict[str, dict[str, Any]]:
+    def generate_manifest(self, code_list: list[str] | None = None,
+                          query: Any = None, summary: Any = None) -> dict[str, dict[str, Any]]:
         """生成数据清单报告
         
         Args:
             code_list: 要检查的代码列表，None则检查output目录下所有文件
+            query: 可选的 core.storage.query.DataQuery，指定后从查询库汇总，
+                   不再逐个读取parquet文件
+            summary: 可选的 core.storage.summary.SummaryTable，指定后从摘要表生成，
+                     只重新读取有变化的文件
             
         Returns:
             清单字典
         """
+        if query is not None:
+            query.refresh()
+            return query.manifest(code_list)
+        if summary is not None:
+            return summary.manifest(code_list)
+        
         if code_list is None:
             # 扫描output目录
             code_list = []
             for file in os.listdir(self.output_dir):
-                if file.endswith('.parquet'):
+                if file.endswith('.parquet') and file != SUMMARY_FILE:
                     code = file.replace('.parquet', '')
                     code_list.append(code)
         
@@ -94,7 +107,7 @@ class DataValidator:
         with open(file_path, 'w', encoding='utf-8') as f:
             json.dump(manifest, f, ensure_ascii=False, indent=2)
         
-        logger.info(f"📄 清单已保存到: {file_path}")
+        logger.info("📄 清单已保存到: %s", file_path)
     
     def print_manifest_summary(self, manifest: dict[str, dict[str, Any]]):
         """打印清单摘要
@@ -0,0 +1,730 @@
+"""
+命令行入口
+安装后使用 qmtdatatool 命令（见 pyproject.toml 的 [project.scripts]），也可以 python -m core.cli
+
+    qmtdatatool download --universe full --start 20200101 --formats parquet,csv
+    qmtdatatool download --codes 600000.SH,000001.SZ --dry-run
+    qmtdatatool update --deadline 06:30
+    qmtdatatool validate
+    qmtdatatool reconcile --reference vendor_dump --workers 8 --refetch
+    qmtdatatool export --codes 600000.SH --formats csv,excel
+    qmtdatatool bench --replay-dir output --workers 1,2 --years-per-segment 3,10
+    qmtdatatool tickbench --codes 10 --days 5 --bucket-minutes 5,30,240
+
+未在命令行指定的参数从环境变量（.env）读取，与 download.py 的默认行为一致
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from functools import partial
+from typing import Any, Callable
+
+from dotenv import load_dotenv
+
+from core.logging_config import setup_logging
+from core.memory import MemoryGuard, parse_size
+from core.metrics import RunMetrics
+
+# 下载命令的默认值（与原 download.py 中的写法一致）
+DEFAULT_START = '20200101'
+DEFAULT_FORMATS = 'parquet,csv'
+UNIVERSE_KINDS = ['etf', 'stock', 'index']
+# MiniQMT默认端口（只有一个实例但要开多个进程时使用）
+DEFAULT_ENDPOINT = '58610'
+
+
+def _env_flag(name: str, default: str = '0') -> bool:
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+
+def _split(value: str | None) -> list[str]:
+    return [v.strip() for v in (value or '').split(',') if v.strip()]
+
+
+def _add_selection_args(parser: argparse.ArgumentParser) -> None:
+    """选择代码和输出目录的参数"""
+    parser.add_argument('--output-dir', help='数据目录，默认 OUTPUT_DIR 或项目内的 output')
+    parser.add_argument('--codes', help='逗号分隔的代码，指定后忽略 --universe')
+    parser.add_argument('--universe', choices=['config', 'full'],
+                        default=os.getenv('UNIVERSE', 'config').lower(),
+                        help='标的池：config 配置文件中的列表 / full 全市场（默认 UNIVERSE）')
+    parser.add_argument('--kinds', default=','.join(UNIVERSE_KINDS),
+                        help='标的类型，逗号分隔（etf,stock,index）')
+
+
+def _add_download_args(parser: argparse.ArgumentParser, multi: bool = False) -> None:
+    """下载参数（multi=True 时每段年数可以是逗号分隔的多个值，供 bench 使用）"""
+    parser.add_argument('--start', default=DEFAULT_START, help='起始日期 YYYYMMDD')
+    parser.add_argument('--end', help='结束日期 YYYYMMDD，默认今天')
+    parser.add_argument('--period', default='1d', help='周期，如 1d / 1m / 5m')
+    parser.add_argument('--dividend-type', default='front',
+                        choices=['none', 'front', 'back', 'front_ratio', 'back_ratio'], help='复权方式')
+    parser.add_argument('--formats', default=DEFAULT_FORMATS, help='输出格式，逗号分隔（parquet,csv,excel）')
+    years = os.getenv('YEARS_PER_SEGMENT', '3')
+    parser.add_argument('--years-per-segment', type=str if multi else int,
+                        default=years if multi else int(years),
+                        help='每段下载年数（默认 YEARS_PER_SEGMENT）' + ('，逗号分隔多个值' if multi else ''))
+    parser.add_argument('--retry-times', type=int, default=int(os.getenv('RETRY_TIMES', '3')),
+                        help='每段最多尝试次数（默认 RETRY_TIMES）')
+    parser.add_argument('--pause', type=float, default=0.5, help='每个代码之间的暂停秒数')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """构建命令行解析器"""
+    # 各子命令共用的参数
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--quiet', action='store_true', default=_env_flag('QUIET_MODE'),
+                        help='安静模式，只显示总进度条（默认 QUIET_MODE）')
+    common.add_argument('--log-file', default=os.getenv('LOG_FILE'), help='滚动日志文件（默认 LOG_FILE）')
+
+    parser = argparse.ArgumentParser(prog='qmtdatatool', description='QMT历史行情下载与管理工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    for name, help_text in (('download', '下载数据（默认全量）'), ('update', '增量更新（download --incremental）')):
+        sub = subparsers.add_parser(name, help=help_text, parents=[common])
+        _add_selection_args(sub)
+        _add_download_args(sub)
+        if name == 'download':
+            mode = sub.add_mutually_exclusive_group()
+            mode.add_argument('--incremental', dest='incremental', action='store_true',
+                              default=_env_flag('INCREMENTAL_UPDATE'),
+                              help='增量更新（默认 INCREMENTAL_UPDATE）')
+            mode.add_argument('--full', dest='incremental', action='store_false', help='全量下载')
+        sub.add_argument('--workers', type=int, default=1,
+                         help='工作进程数；只有一个MiniQMT时所有进程共用同一个端口')
+        sub.add_argument('--endpoints', default=os.getenv('QMT_ENDPOINTS', ''),
+                         help='逗号分隔的MiniQMT地址（默认 QMT_ENDPOINTS），两个以上时按地址分片')
+        sub.add_argument('--deadline', default=os.getenv('DOWNLOAD_DEADLINE', ''),
+                         help='截止时间 HH:MM 或分钟数，来不及下载的代码推迟（默认 DOWNLOAD_DEADLINE）')
+        sub.add_argument('--prioritize', action='store_true', default=_env_flag('PRIORITY_SCHEDULING'),
+                         help='按陈旧程度和优先级调度（默认 PRIORITY_SCHEDULING）')
+        sub.add_argument('--resample', default=os.getenv('RESAMPLE_PERIODS', ''),
+                         help='下载后本地合成的周期，如 1w,1mon（默认 RESAMPLE_PERIODS）')
+        sub.add_argument('--snapshot-keep', type=int, default=int(os.getenv('SNAPSHOT_KEEP', '0')),
+                         help='发布快照并保留最近N个，0表示不发布（默认 SNAPSHOT_KEEP）')
+        sub.add_argument('--memory-limit', default=os.getenv('MEMORY_LIMIT', ''),
+                         help='内存上限，如 12G；接近上限时改为流式写入并降低并发（默认 MEMORY_LIMIT）')
+        sub.add_argument('--trace-memory', action='store_true', default=_env_flag('MEMORY_TRACE'),
+                         help='用tracemalloc记录各阶段内存峰值，会让下载慢一些（默认 MEMORY_TRACE）')
+        sub.add_argument('--dry-run', action='store_true',
+                         help='只生成下载计划（时间段、预计行数和磁盘占用），不连接QMT')
+        sub.add_argument('--save-plan', help='与 --dry-run 一起使用，把计划保存为JSON')
+        sub.add_argument('--plan', help='按 --save-plan 保存的计划执行，忽略代码选择和日期参数')
+        sub.set_defaults(func=cmd_download, incremental=(name == 'update' or _env_flag('INCREMENTAL_UPDATE')))
+
+    sub = subparsers.add_parser('validate', help='检查数据文件并生成 manifest.json', parents=[common])
+    _add_selection_args(sub)
+    sub.add_argument('--all-files', action='store_true', help='检查数据目录下的全部文件，忽略 --codes/--universe')
+    sub.set_defaults(func=cmd_validate)
+
+    sub = subparsers.add_parser('reconcile', help='与参考数据逐日对账，生成差异报告，可重新下载有差异的时间段',
+                                parents=[common])
+    _add_selection_args(sub)
+    sub.add_argument('--reference', default=os.getenv('RECONCILE_REFERENCE', ''),
+                     help='参考数据目录（每个代码一个CSV/Parquet）或单个文件（含代码列）（默认 RECONCILE_REFERENCE）')
+    sub.add_argument('--start', help='只比较该日期之后的数据 YYYYMMDD')
+    sub.add_argument('--end', help='只比较该日期之前的数据 YYYYMMDD')
+    sub.add_argument('--tolerance', default=os.getenv('RECONCILE_TOLERANCE', ''),
+                     help="字段容差，数字为绝对值、百分数为相对值，如 close=0.01,volume=1%%（默认 RECONCILE_TOLERANCE）")
+    sub.add_argument('--ref-scale', default=os.getenv('RECONCILE_REF_SCALE', ''),
+                     help='参考数据的单位换算，如 volume=100（成交量单位为手）（默认 RECONCILE_REF_SCALE）')
+    sub.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='对账进程数，默认CPU核数')
+    sub.add_argument('--report', help='差异报告路径，默认 {output_dir}/reconcile_report.csv')
+    sub.add_argument('--refetch', action='store_true', help='从QMT重新下载有差异的时间段，完成后重新对账')
+    sub.add_argument('--period', default='1d', help='重新下载的周期，需要与已保存的数据一致')
+    sub.add_argument('--dividend-type', default='front',
+                     choices=['none', 'front', 'back', 'front_ratio', 'back_ratio'], help='重新下载的复权方式')
+    sub.add_argument('--formats', default=DEFAULT_FORMATS, help='重新下载后保存的格式，逗号分隔')
+    sub.add_argument('--retry-times', type=int, default=int(os.getenv('RETRY_TIMES', '3')),
+                     help='每段最多尝试次数（默认 RETRY_TIMES）')
+    sub.set_defaults(func=cmd_reconcile)
+
+    sub = subparsers.add_parser('export', help='把已保存的parquet导出为CSV/Excel', parents=[common])
+    _add_selection_args(sub)
+    sub.add_argument('--formats', default='csv', help='导出格式，逗号分隔（csv,excel）')
+    sub.add_argument('--dest', help='导出目录，默认与数据目录相同')
+    sub.add_argument('--snapshot', help="从快照导出（快照ID或 'latest'）")
+    sub.set_defaults(func=cmd_export)
+
+    sub = subparsers.add_parser('bench', help='压测下载吞吐，比较不同进程数和分段大小', parents=[common])
+    _add_selection_args(sub)
+    _add_download_args(sub, multi=True)
+    sub.set_defaults(formats='parquet', pause=0.0)
+    sub.add_argument('--replay-dir', help='从该目录回放数据（不连接QMT，只测清洗和存储）')
+    sub.add_argument('--workers', default='1', help='逗号分隔的进程数，如 1,2,4')
+    sub.add_argument('--endpoints', default=os.getenv('QMT_ENDPOINTS', ''), help='逗号分隔的MiniQMT地址')
+    sub.add_argument('--repeat', type=int, default=1, help='每个组合重复次数')
+    sub.add_argument('--limit', type=int, help='只取前N个代码')
+    sub.add_argument('--report', help='把结果写入JSON文件')
+    sub.set_defaults(func=cmd_bench)
+
+    sub = subparsers.add_parser('tickbench', help='压测分笔存储的写入吞吐和时间窗口读取延迟（模拟数据）',
+                                parents=[common])
+    sub.add_argument('--output-dir', help='测试目录，默认使用临时目录并在结束后删除')
+    sub.add_argument('--codes', type=int, default=10, help='模拟代码数')
+    sub.add_argument('--days', type=int, default=5, help='模拟交易日数')
+    sub.add_argument('--ticks-per-day', type=int, default=4800, help='每个代码每天的分笔数')
+    sub.add_argument('--bucket-minutes', default='30',
+                     help='逗号分隔的row group分钟数，如 5,30,240')
+    sub.add_argument('--windows', default='5,30,240', help='逗号分隔的读取窗口分钟数')
+    sub.add_argument('--repeat', type=int, default=50, help='每个窗口的读取次数')
+    sub.add_argument('--report', help='把结果写入JSON文件')
+    sub.set_defaults(func=cmd_tick_bench)
+
+    return parser
+
+
+def _resilience_options() -> tuple[float | None, dict[str, Any], dict[str, Any]]:
+    """从环境变量读取单次调用超时、熔断器和重试策略参数"""
+    call_timeout = float(os.getenv('CALL_TIMEOUT', '120')) or None
+    max_trips = int(os.getenv('BREAKER_MAX_TRIPS', '5'))
+    breaker_options = {
+        'threshold': int(os.getenv('BREAKER_THRESHOLD', '5')),
+        'cooldown': float(os.getenv('BREAKER_COOLDOWN', '30')),
+        'max_trips': max_trips if max_trips > 0 else None,
+    }
+    retry_budget = int(os.getenv('RETRY_BUDGET', '0'))
+    retry_options = {
+        'base_delay': float(os.getenv('RETRY_BASE_DELAY', '1')),
+        'budget': retry_budget if retry_budget > 0 else None,
+    }
+    return call_timeout, breaker_options, retry_options
+
+
+def _build_downloader(args: argparse.Namespace, metrics: RunMetrics, source: Any = None,
+                      output_dir: str | None = None) -> Any:
+    """创建下载器和标的池"""
+    from core.fetcher.downloader import QmtDataDownloader
+    from core.fetcher.universe import Universe
+    from core.fetcher.resilience import CircuitBreaker, RetryPolicy
+
+    call_timeout, breaker_options, retry_options = _resilience_options()
+    downloader = QmtDataDownloader(
+        output_dir or args.output_dir, metrics=metrics, quiet=args.quiet, source=source,
+        call_timeout=call_timeout, breaker=CircuitBreaker(**breaker_options),
+        retry_policy=RetryPolicy(**retry_options), pause=getattr(args, 'pause', 0.5)
+    )
+    # 标的池：缓存上市/退市日期，下载窗口裁剪到上市期间
+    downloader.universe = Universe(
+        os.path.join(downloader.output_dir, 'universe.csv'),
+        source=downloader.source,
+        max_age_days=float(os.getenv('UNIVERSE_MAX_AGE_DAYS', '1'))
+    )
+    return downloader
+
+
+def _resolve_output_dir(args: argparse.Namespace) -> str:
+    """数据目录：--output-dir，否则与 QmtDataDownloader 相同（OUTPUT_DIR 或项目内的 output）"""
+    from core.storage.reader import default_output_dir
+    return args.output_dir or default_output_dir()
+
+
+def _config_lists() -> dict[str, list[str]]:
+    from config.etf_list import ETF_LIST
+    from config.stock_list import STOCK_LIST
+    from config.index_list import INDEX_LIST
+    return {'etf': ETF_LIST, 'stock': STOCK_LIST, 'index': INDEX_LIST}
+
+
+def _resolve_codes(args: argparse.Namespace, universe: Any, offline: bool = False) -> list[str]:
+    """按 --codes / --universe / --kinds 确定代码列表
+
+    Args:
+        args: 命令行参数
+        universe: 标的池，None表示不使用
+        offline: 不连接数据源（dry-run、validate、export），全市场时只读取缓存
+    """
+    if args.codes:
+        return _split(args.codes)
+
+    kinds = _split(args.kinds)
+    if args.universe == 'full':
+        if universe is None:
+            raise SystemExit("--universe full 需要标的池")
+        if not offline:
+            universe.load()
+        return universe.codes(kinds)
+
+    codes = []
+    for kind, kind_codes in _config_lists().items():
+        if kind not in kinds:
+            continue
+        if universe is not None and not offline:
+            universe.ensure(kind_codes, kind)
+        codes.extend(kind_codes)
+    return codes
+
+
+def _endpoint_list(args: argparse.Namespace, workers: int) -> list[str]:
+    """工作进程使用的MiniQMT地址：多个地址时每个地址一个进程，否则同一地址重复 workers 次"""
+    endpoints = _split(args.endpoints)
+    if len(endpoints) > 1:
+        return endpoints
+    if workers > 1:
+        return (endpoints or [DEFAULT_ENDPOINT]) * workers
+    return []
+
+
+def cmd_download(args: argparse.Namespace) -> int:
+    """download / update 子命令"""
+    from core.fetcher.sharding import ShardedDownloader
+    from core.fetcher.scheduler import DownloadScheduler, parse_deadline
+    from core.fetcher.planner import DownloadPlan, DownloadPlanner, execute_plan
+    from core.fetcher.trading_calendar import CALENDAR_FILE, TradingCalendar
+
+    print("=" * 60)
+    print("QmtDataTool - 数据下载工具")
+    print("=" * 60)
+
+    metrics = RunMetrics()
+    if args.dry_run:
+        # 不连接QMT：数据源只在真正下载时才导入xtquant
+        from core.fetcher.source import ReplaySource
+        # 回放源和规划器使用同一个数据目录
+        output_dir = _resolve_output_dir(args)
+        downloader = _build_downloader(args, metrics, output_dir=output_dir, source=ReplaySource(
+            output_dir, period=args.period, dividend_type=args.dividend_type))
+        all_codes = _resolve_codes(args, downloader.universe, offline=True)
+        plan = DownloadPlanner(downloader).plan(
+            all_codes, args.start, args.end, args.period, args.dividend_type,
+            args.years_per_segment, _split(args.formats), args.incremental
+        )
+        print("")
+        plan.print_summary()
+        if args.save_plan:
+            plan.save(args.save_plan)
+            print(f"\n📄 计划已保存，执行: qmtdatatool download --plan {args.save_plan}")
+        return 0
+
+    # 多个MiniQMT实例或多个进程时分片下载；工作进程只做全量下载，不支持增量更新和调度
+    endpoints = [] if args.plan else _endpoint_list(args, args.workers)
+    if len(endpoints) > 1:
+        unsupported = [flag for flag, enabled in (('--incremental/update', args.incremental),
+                                                  ('--prioritize', args.prioritize),
+                                                  ('--deadline', bool(args.deadline))) if enabled]
+        if unsupported:
+            raise SystemExit(f"分片下载（--workers/--endpoints）不支持 {', '.join(unsupported)}，"
+                             f"请去掉这些选项（含 .env 中的 INCREMENTAL_UPDATE 等）或使用单进程下载")
+
+    downloader = _build_downloader(args, metrics)
+    memory_limit = parse_size(args.memory_limit)
+    if memory_limit or args.trace_memory:
+        downloader.memory_guard = MemoryGuard(memory_limit, metrics=metrics, trace=args.trace_memory)
+        downloader.memory_guard.start()
+    # 交易日历：缓存过期时从QMT刷新，供调度和下次 dry-run 使用
+    calendar = TradingCalendar(os.path.join(downloader.output_dir, CALENDAR_FILE), source=downloader.source)
+    calendar.load()
+    downloader.calendar = calendar
+
+    if args.plan:
+        plan = DownloadPlan.load(args.plan)
+        all_codes = [item.code for item in plan.codes]
+        print(f"\n按计划 {args.plan} 下载 {len(plan.active)} 个标的（{plan.segments} 个时间段）\n")
+        results = execute_plan(downloader, plan, args.retry_times)
+        args.period = plan.period
+        return _finish(args, downloader, metrics, all_codes, results)
+
+    all_codes = _resolve_codes(args, downloader.universe)
+    print(f"\n准备下载 {len(all_codes)} 个标的\n")
+
+    batch_runner = downloader
+    if len(endpoints) > 1:
+        print(f"使用 {len(endpoints)} 个进程分片下载: {', '.join(endpoints)}\n")
+        call_timeout, breaker_options, retry_options = _resilience_options()
+        batch_runner = ShardedDownloader(
+            endpoints, downloader.output_dir, universe=downloader.universe,
+            metrics=metrics, log_file=args.log_file, pause=args.pause,
+            call_timeout=call_timeout, breaker_options=breaker_options,
+            retry_options=retry_options, memory_limit=memory_limit
+        )
+
+    # 增量更新：只下载最后一天之后的数据，除权除息在本地换算历史
+    run_batch = batch_runner.download_batch
+    if args.incremental:
+        print("增量更新模式：只下载新数据，除权除息在本地换算历史\n")
+        run_batch = downloader.update_batch
+
+    # 按陈旧程度和优先级调度：截止时间前来不及下载的代码推迟到下次运行
+    if args.prioritize or args.deadline:
+        from config.priority_list import PRIORITY_LIST
+        deadline = parse_deadline(args.deadline) if args.deadline else None
+        print(f"按优先级调度下载{f'，截止时间 {deadline:%Y-%m-%d %H:%M}' if deadline else ''}\n")
+        scheduler = DownloadScheduler(downloader, priorities=PRIORITY_LIST, calendar=calendar)
+        run_batch = partial(scheduler.run, deadline=deadline, incremental=args.incremental)
+
+    results = run_batch(
+        code_list=all_codes,
+        start_time=args.start,
+        end_time=args.end,
+        period=args.period,
+        dividend_type=args.dividend_type,
+        years_per_segment=args.years_per_segment,
+        retry_times=args.retry_times,
+        output_formats=_split(args.formats),
+    )
+    if batch_runner is not downloader:
+        # 分片下载都是全量下载，工作进程中的改写记录不会回到主进程
+        downloader.rewritten_codes.update(code for code, ok in results.items() if ok)
+    return _finish(args, downloader, metrics, all_codes, results)
+
+
+def _finish(args: argparse.Namespace, downloader: Any, metrics: RunMetrics,
+            all_codes: list[str], results: dict[str, bool]) -> int:
+    """下载后的重采样、指标导出、数据清单和快照"""
+    from core.cleaner.validator import DataValidator
+    from core.storage.resampler import Resampler
+    from core.storage.snapshot import SnapshotStore
+
+    # 本地重采样（可选）：用刚下载的日线合成周线/月线，不再向QMT请求
+    resample_periods = _split(args.resample)
+    if resample_periods:
+        resampler = Resampler(downloader.output_dir, base_period=args.period)
+        resampler.update_all([code for code, ok in results.items() if ok], resample_periods,
+                             rebuild=downloader.rewritten_codes)
+
+    # 内存摘要写入运行指标（rss_bytes / memory_peak_*_bytes）
+    guard = getattr(downloader, 'memory_guard', None)
+    if guard is not None:
+        guard.stop()
+        print(f"\n🧠 {guard.report()}")
+
+    # 导出运行指标摘要
+    metrics.export_json(os.path.join(downloader.output_dir, 'run_metrics.json'))
+    metrics.export_csv(os.path.join(downloader.output_dir, 'run_metrics.csv'))
+    prom_file = os.getenv('METRICS_PROM_FILE')
+    if prom_file:
+        metrics.export_prometheus(prom_file)
+
+    if args.period == 'tick':
+        # 分笔数据在 output/tick 下按交易日保存，不参与数据清单和快照
+        stats = downloader.ticks.stats()
+        print(f"\n✅ 分笔数据: {stats['days']} 个交易日，{stats['files']} 个文件，"
+              f"{stats['bytes'] / 1024 / 1024:.1f} MB（{downloader.ticks.root}）")
+        return 0 if all(results.values()) else 1
+
+    print("\n" + "=" * 60)
+    print("下载完成，开始生成数据清单...")
+    print("=" * 60)
+
+    validator = DataValidator(downloader.output_dir)
+    manifest = validator.generate_manifest(all_codes, summary=downloader.summary)
+    validator.save_manifest(manifest)
+    validator.print_manifest_summary(manifest)
+
+    # 发布快照（可选）：回测用 load_data(code, snapshot='latest') 固定读取这一版数据
+    if args.snapshot_keep > 0:
+        snapshots = SnapshotStore(downloader.output_dir)
+        snapshot_id = snapshots.create(code_list=all_codes)
+        snapshots.gc(keep_last=args.snapshot_keep)
+        print(f"\n📸 已发布快照: {snapshot_id}")
+
+    print("\n✅ 全部完成！")
+    return 0 if all(results.values()) else 1
+
+
+def cmd_validate(args: argparse.Namespace) -> int:
+    """validate 子命令：检查数据文件并生成清单，有异常文件时返回1"""
+    from core.cleaner.validator import DataValidator
+
+    output_dir = _resolve_output_dir(args)
+    code_list = None if args.all_files else _resolve_codes(args, _offline_universe(output_dir), offline=True)
+
+    validator = DataValidator(output_dir)
+    manifest = validator.generate_manifest(code_list)
+    validator.save_manifest(manifest)
+    validator.print_manifest_summary(manifest)
+    failed = sum(1 for meta in manifest.values() if not meta.get('exists') or 'error' in meta)
+    return 1 if failed else 0
+
+
+def _offline_universe(output_dir: str) -> Any:
+    """只读的标的池缓存（不存在时返回None）"""
+    from core.fetcher.universe import Universe
+    cache_file = os.path.join(output_dir, 'universe.csv')
+    return Universe(cache_file) if os.path.exists(cache_file) else None
+
+
+def cmd_reconcile(args: argparse.Namespace) -> int:
+    """reconcile 子命令：与参考数据对账，有未解决的差异时返回1"""
+    from core.cleaner.reconcile import Reconciler, parse_scales, parse_tolerances
+
+    if not args.reference:
+        raise SystemExit("请用 --reference 或 RECONCILE_REFERENCE 指定参考数据")
+    output_dir = _resolve_output_dir(args)
+    code_list = _resolve_codes(args, _offline_universe(output_dir), offline=True)
+
+    reconciler = Reconciler(output_dir, args.reference, tolerances=parse_tolerances(args.tolerance),
+                            scales=parse_scales(args.ref_scale), workers=args.workers)
+    report = reconciler.run(code_list, args.start, args.end)
+    reconciler.save_report(report, args.report)
+    reconciler.print_summary(report)
+
+    segments = reconciler.affected_segments(report)
+    if args.refetch and segments:
+        metrics = RunMetrics()
+        downloader = _build_downloader(args, metrics, output_dir=output_dir)
+        results = reconciler.refetch(downloader, report, period=args.period,
+                                     dividend_type=args.dividend_type, retry_times=args.retry_times,
+                                     output_formats=_split(args.formats))
+        downloader.summary.flush()
+        failed = [code for code, ok in results.items() if not ok]
+        if failed:
+            print(f"\n❌ {len(failed)} 个代码重新下载失败: {', '.join(failed[:20])}")
+
+        # 只对重新下载过的代码再对账一次，报告中其他代码的结果不变
+        recheck = reconciler.run(list(segments), args.start, args.end)
+        report = reconciler.merge(report, recheck, list(segments))
+        reconciler.save_report(report, args.report)
+        print(f"\n重新下载后仍有差异的代码: {len(reconciler.affected_segments(recheck))} / {len(segments)}")
+        reconciler.print_summary(recheck)
+        segments = reconciler.affected_segments(report)
+
+    return 1 if segments else 0
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    """export 子命令：把已保存的parquet导出为CSV/Excel"""
+    from core.storage.reader import load_data
+    from core.storage.exporter import write_csv, write_excel
+
+    output_dir = _resolve_output_dir(args)
+    dest = args.dest or output_dir
+    os.makedirs(dest, exist_ok=True)
+    formats = _split(args.formats)
+    unknown = set(formats) - {'csv', 'excel'}
+    if unknown:
+        raise SystemExit(f"不支持的导出格式: {', '.join(sorted(unknown))}")
+
+    failed = 0
+    for code in _resolve_codes(args, _offline_universe(output_dir), offline=True):
+        try:
+            df = load_data(code, output_dir, snapshot=args.snapshot)
+        except FileNotFoundError as e:
+            print(f"❌ {code}: {e}")
+            failed += 1
+            continue
+        if 'csv' in formats:
+            write_csv(df, os.path.join(dest, f"{code}.csv"))
+        if 'excel' in formats:
+            write_excel(df, os.path.join(dest, f"{code}.xlsx"))
+        print(f"✅ {code}: {len(df)} 行 -> {', '.join(formats)}")
+    return 1 if failed else 0
+
+
+def _replay_factory(replay_dir: str, period: str, dividend_type: str, endpoint: int | str) -> Any:
+    """bench 分片时每个进程的回放数据源（模块级函数，可以被pickle）
+
+    回放目录应保存与压测参数相同周期和复权方式的数据，否则回放源不返回K线
+    """
+    from core.fetcher.source import ReplaySource
+    return ReplaySource(output_dir=replay_dir, period=period, dividend_type=dividend_type)
+
+
+def cmd_bench(args: argparse.Namespace) -> int:
+    """bench 子命令：对每个（进程数, 每段年数）组合下载到临时目录，比较吞吐"""
+    import json
+    from core.fetcher.sharding import ShardedDownloader, qmt_source_factory
+
+    source_factory = (partial(_replay_factory, args.replay_dir, args.period, args.dividend_type)
+                      if args.replay_dir else qmt_source_factory)
+    selection_dir = args.output_dir or args.replay_dir
+    code_list = _resolve_codes(args, _offline_universe(selection_dir) if selection_dir else None, offline=True)
+    if args.limit:
+        code_list = code_list[:args.limit]
+
+    kwargs = dict(start_time=args.start, end_time=args.end, period=args.period,
+                  dividend_type=args.dividend_type, retry_times=args.retry_times,
+                  output_formats=_split(args.formats))
+    print(f"压测 {len(code_list)} 个代码，数据源: {'回放 ' + args.replay_dir if args.replay_dir else 'MiniQMT'}\n")
+
+    rows = []
+    for workers in (int(w) for w in _split(args.workers)):
+        for years in (int(y) for y in _split(args.years_per_segment)):
+            for run in range(args.repeat):
+                metrics = RunMetrics()
+                bench_dir = tempfile.mkdtemp(prefix='qmtdatatool-bench-')
+                try:
+                    start = time.perf_counter()
+                    endpoints = _endpoint_list(args, workers)
+                    if len(endpoints) > 1:
+                        runner = ShardedDownloader(endpoints, bench_dir, source_factory=source_factory,
+                                                   metrics=metrics, pause=args.pause)
+                    else:
+                        # 单进程：回放数据源，或默认连接的MiniQMT
+                        source = source_factory(endpoints[0]) if endpoints else (
+                            source_factory(DEFAULT_ENDPOINT) if args.replay_dir else None)
+                        runner = _build_downloader(args, metrics, source=source, output_dir=bench_dir)
+                    results = runner.download_batch(code_list, years_per_segment=years, **kwargs)
+                    elapsed = time.perf_counter() - start
+                finally:
+                    shutil.rmtree(bench_dir, ignore_errors=True)
+
+                counters = metrics.counter_totals()
+                rows.append({
+                    'workers': workers,
+                    'years_per_segment': years,
+                    'run': run + 1,
+                    'seconds': round(elapsed, 3),
+                    'codes_ok': sum(results.values()),
+                    'codes_per_second': round(len(code_list) / elapsed, 2) if elapsed else None,
+                    'rows_per_second': round(counters.get('rows_clean', 0) / elapsed) if elapsed else None,
+                    'segments': int(counters.get('segments', 0)),
+                    'retries': int(counters.get('retries', 0)),
+                })
+
+    print(f"\n{'进程':>4} | {'每段年数':>6} | {'轮次':>4} | {'耗时(s)':>8} | {'代码/s':>7} | "
+          f"{'行/s':>9} | {'分段':>5} | {'重试':>4}")
+    for row in rows:
+        print(f"{row['workers']:>6} | {row['years_per_segment']:>10} | {row['run']:>6} | {row['seconds']:>9} | "
+              f"{row['codes_per_second']:>9} | {row['rows_per_second']:>10} | {row['segments']:>7} | {row['retries']:>6}")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 压测结果已保存到: {args.report}")
+    return 0
+
+
+def _synthetic_ticks(rng: Any, day: str, n: int) -> Any:
+    """模拟一个交易日的分笔数据：交易时段内随机时刻，价格按0.01元随机游走，累计成交量/成交额"""
+    import numpy as np
+    import pandas as pd
+
+    session_ms = 4 * 3600 * 1000
+    offsets = np.sort(rng.choice(session_ms // 1000, size=min(n, session_ms // 1000), replace=False)) * 1000
+    # 上午 09:30-11:30，下午 13:00-15:00
+    offsets = np.where(offsets < session_ms // 2, offsets, offsets + int(1.5 * 3600 * 1000))
+    times = pd.Timestamp(f"{day} 09:30") + pd.to_timedelta(offsets, unit='ms')
+    price = np.round(10 + np.cumsum(rng.choice([-0.01, 0.0, 0.01], size=len(times))), 2)
+    traded = rng.integers(0, 50, size=len(times)) * 100.0
+    return pd.DataFrame({
+        'price': price,
+        'volume': np.cumsum(traded),
+        'amount': np.round(np.cumsum(traded * price), 2),
+        'bid_price': price - 0.01,
+        'ask_price': price + 0.01,
+        'bid_volume': rng.integers(1, 1000, size=len(times)) * 100.0,
+        'ask_volume': rng.integers(1, 1000, size=len(times)) * 100.0,
+    }, index=pd.DatetimeIndex(times, name='time'))
+
+
+def cmd_tick_bench(args: argparse.Namespace) -> int:
+    """tickbench 子命令：比较分笔存储（整数+差分编码+时间索引）与float64 parquet的写入和窗口读取"""
+    import json
+    import numpy as np
+    import pandas as pd
+    from core.storage.tick_store import TickStore
+
+    rng = np.random.default_rng(0)
+    days = pd.bdate_range('2026-01-05', periods=args.days).strftime('%Y%m%d').tolist()
+    codes = [f"{600000 + i:06d}.SH" for i in range(args.codes)]
+    frames = {(code, day): _synthetic_ticks(rng, day, args.ticks_per_day) for code in codes for day in days}
+    total_rows = sum(len(df) for df in frames.values())
+    windows = [int(w) for w in _split(args.windows)]
+    print(f"模拟 {len(codes)} 个代码 × {len(days)} 个交易日，共 {total_rows} 笔\n")
+
+    # 每次读取随机选一个代码、交易日和窗口起点（所有存储方式使用同一组窗口）
+    queries = {}
+    keys = list(frames)
+    for window in windows:
+        queries[window] = []
+        for _ in range(args.repeat):
+            code, day = keys[rng.integers(len(keys))]
+            start = frames[(code, day)].index[rng.integers(len(frames[(code, day)]))]
+            queries[window].append((code, day, start, start + pd.Timedelta(minutes=window)))
+
+    bench_dir = args.output_dir or tempfile.mkdtemp(prefix='qmtdatatool-tickbench-')
+    rows = []
+    try:
+        # 对照组：每个代码每天一个float64 parquet（snappy），读取整个文件后按时间截取
+        baseline_dir = os.path.join(bench_dir, 'float64')
+        start = time.perf_counter()
+        for (code, day), df in frames.items():
+            os.makedirs(os.path.join(baseline_dir, day), exist_ok=True)
+            df.to_parquet(os.path.join(baseline_dir, day, f"{code}.parquet"))
+        write_seconds = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(baseline_dir) for name in names)
+
+        def _read_baseline(code: str, day: str, lo: Any, hi: Any) -> Any:
+            return pd.read_parquet(os.path.join(baseline_dir, day, f"{code}.parquet")).loc[lo:hi]
+
+        rows.append(_tick_bench_row('float64', write_seconds, size, total_rows, queries, _read_baseline))
+
+        for bucket in (int(b) for b in _split(args.bucket_minutes)):
+            store = TickStore(os.path.join(bench_dir, f'tick_{bucket}m'), bucket_minutes=bucket)
+            start = time.perf_counter()
+            for (code, day), df in frames.items():
+                store.write_day(code, day, df)
+            write_seconds = time.perf_counter() - start
+
+            def _read_store(code: str, day: str, lo: Any, hi: Any, store: TickStore = store) -> Any:
+                return store.read(code, lo, hi)
+
+            rows.append(_tick_bench_row(f'tick_store/{bucket}m', write_seconds, store.stats()['bytes'],
+                                        total_rows, queries, _read_store))
+    finally:
+        if not args.output_dir:
+            shutil.rmtree(bench_dir, ignore_errors=True)
+
+    header = ''.join(f" | {f'{w}分钟窗口(ms)':>12}" for w in windows)
+    print(f"{'存储方式':<18} | {'写入(笔/s)':>10} | {'大小(MB)':>8} | {'字节/笔':>7}{header}")
+    for row in rows:
+        latency = ''.join(f" | {row['read_ms_p50'][str(w)]:>16}" for w in windows)
+        print(f"{row['layout']:<22} | {row['write_rows_per_second']:>14} | {row['megabytes']:>10} | "
+              f"{row['bytes_per_row']:>11}{latency}")
+    print("\n读取延迟为中位数；窗口从随机时刻开始，同一组窗口用于所有存储方式")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 压测结果已保存到: {args.report}")
+    return 0
+
+
+def _tick_bench_row(layout: str, write_seconds: float, size: int, total_rows: int,
+                    queries: dict[int, list[tuple[Any, ...]]], read: Callable[..., Any]) -> dict[str, Any]:
+    """执行一组窗口读取并汇总一种存储方式的结果"""
+    import numpy as np
+
+    p50, p95 = {}, {}
+    for window, items in queries.items():
+        latencies = []
+        for code, day, lo, hi in items:
+            start = time.perf_counter()
+            read(code, day, lo, hi)
+            latencies.append((time.perf_counter() - start) * 1000)
+        p50[str(window)] = round(float(np.percentile(latencies, 50)), 2)
+        p95[str(window)] = round(float(np.percentile(latencies, 95)), 2)
+    return {
+        'layout': layout,
+        'write_seconds': round(write_seconds, 3),
+        'write_rows_per_second': round(total_rows / write_seconds) if write_seconds else None,
+        'megabytes': round(size / 1024 / 1024, 2),
+        'bytes_per_row': round(size / total_rows, 1),
+        'read_ms_p50': p50,
+        'read_ms_p95': p95,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    """命令行入口
+
+    Args:
+        argv: 参数列表，默认 sys.argv[1:]
+
+    Returns:
+        退出码
+    """
+    load_dotenv()
+    args = build_parser().parse_args(argv)
+    setup_logging(quiet=args.quiet, log_file=args.log_file)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+除权除息调整模块
+股票除权除息后，前复权的全部历史价格都会变化。这里根据分红送转数据在本地对已保存的历史做一次向量化换算，
+增量更新时只需要从QMT获取新K线，不必重新下载全部历史
+
+前复权（front，QMT的默认算法）对每个除权日之前的价格做仿射变换：
+    P' = (P - 每股派息 + 配股价 × 每股配股) / (1 + 每股送股 + 每股转增 + 每股配股)
+等比前复权（front_ratio）乘以除权系数的倒数：P' = P / dr
+后复权和不复权的历史不受新的除权影响
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PRICE_FIELDS = ['open', 'high', 'low', 'close']
+
+# 不受新除权事件影响的复权方式
+STABLE_DIVIDEND_TYPES = ('none', 'back', 'back_ratio')
+
+# 分红送转数据的标准列
+DIVIDEND_COLUMNS = ['interest', 'stock_bonus', 'stock_gift', 'allot_num', 'allot_price', 'dr']
+
+# xtdata.get_divid_factors 的列名 -> 标准列名
+QMT_DIVIDEND_COLUMNS = {
+    'interest': 'interest',
+    'stockBonus': 'stock_bonus',
+    'stockGift': 'stock_gift',
+    'allotNum': 'allot_num',
+    'allotPrice': 'allot_price',
+    'dr': 'dr',
+}
+
+
+def normalize_dividends(df: pd.DataFrame | None) -> pd.DataFrame:
+    """把分红送转数据整理为以除权日为索引、包含 DIVIDEND_COLUMNS 的DataFrame
+
+    Args:
+        df: 原始数据，索引为除权日（YYYYMMDD字符串、毫秒时间戳或日期）
+
+    Returns:
+        按除权日升序的DataFrame，缺失字段补0（dr补1）
+    """
+    if df is None or len(df) == 0:
+        return pd.DataFrame(columns=DIVIDEND_COLUMNS, index=pd.DatetimeIndex([], name='date'))
+
+    df = df.rename(columns=QMT_DIVIDEND_COLUMNS)
+    index = df.index
+    if 'time' in df.columns:
+        index = pd.to_datetime(df['time'], unit='ms') + pd.Timedelta(hours=8)
+    elif not isinstance(index, pd.DatetimeIndex):
+        index = pd.to_datetime(index.astype(str), format='%Y%m%d')
+
+    result = pd.DataFrame(index=pd.DatetimeIndex(index, name='date').normalize())
+    for column in DIVIDEND_COLUMNS:
+        default = 1.0 if column == 'dr' else 0.0
+        result[column] = (pd.to_numeric(df[column], errors='coerce').fillna(default).to_numpy()
+                          if column in df.columns else default)
+    return result.sort_index()
+
+
+def event_transform(event: pd.Series, dividend_type: str,
+                    prev_close: float | None = None) -> tuple[float, float]:
+    """单个除权事件对之前价格的变换 P' = a × P + b
+
+    Args:
+        event: 一行分红送转数据
+        dividend_type: 'front' 或 'front_ratio'
+        prev_close: 除权日前一天的收盘价（front_ratio 且没有dr时用来近似计算系数，
+                    结果由增量更新的重叠校验兜底）
+
+    Returns:
+        (a, b)
+    """
+    shares = 1.0 + event['stock_bonus'] + event['stock_gift'] + event['allot_num']
+    offset = -event['interest'] + event['allot_price'] * event['allot_num']
+
+    if dividend_type == 'front':
+        return 1.0 / shares, offset / shares
+
+    if dividend_type == 'front_ratio':
+        dr = event['dr']
+        if (not dr or dr == 1.0) and prev_close:
+            # 没有除权系数时，用前收盘价和除权参考价计算
+            dr = prev_close / ((prev_close + offset) / shares)
+        return 1.0 / dr, 0.0
+
+    raise ValueError(f"不支持的复权方式: {dividend_type}")
+
+
+def _last_close_before(df: pd.DataFrame | None, date: pd.Timestamp) -> float | None:
+    """date 之前最后一根K线的收盘价，没有返回None"""
+    if df is None or len(df) == 0:
+        return None
+    position = int(np.searchsorted(df.index.values, np.datetime64(date, 'ns'), side='left'))
+    return float(df['close'].iloc[position - 1]) if position > 0 else None
+
+
+def cumulative_transforms(events: pd.DataFrame, dividend_type: str, history: pd.DataFrame,
+                          reference: pd.DataFrame | None = None) -> list[tuple[float, float]]:
+    """每个除权日之前的K线需要的合成变换
+
+    第 i 个结果是第 i 个及之后所有事件的合成（较早的事件先作用）。front_ratio 缺少dr时，
+    每个事件用各自除权日前一天的收盘价计算系数：前一天在已保存的历史中时直接使用（尚未按这些事件复权）；
+    在新获取的K线中时，这根K线已按该事件及之后的事件复权，先撤销之后事件的变换得到除权参考价 x，
+    再还原收盘价 x × 股数 - 派息项。
+
+    Args:
+        events: 除权事件（normalize_dividends 的结果），都在 history 最后一天之后
+        dividend_type: 'front' 或 'front_ratio'
+        history: 已保存的K线（以date为索引）
+        reference: 新获取的、已按这些事件复权的K线（以date为索引），可以与 history 重叠
+
+    Returns:
+        [(a, b), ...]，与 events 一一对应
+    """
+    if reference is not None and len(history) > 0:
+        reference = reference[reference.index > history.index[-1]]
+
+    transforms: list[tuple[float, float]] = [(1.0, 0.0)] * len(events)
+    # 之后各事件的合成变换，从最后一个事件向前累积
+    a_later, b_later = 1.0, 0.0
+    for i in reversed(range(len(events))):
+        event = events.iloc[i]
+        date = events.index[i]
+        prev_close = _last_close_before(reference, date)
+        if prev_close is not None and a_later:
+            shares = 1.0 + event['stock_bonus'] + event['stock_gift'] + event['allot_num']
+            offset = -event['interest'] + event['allot_price'] * event['allot_num']
+            prev_close = (prev_close - b_later) / a_later * shares - offset
+        else:
+            prev_close = _last_close_before(history, date)
+
+        a, b = event_transform(event, dividend_type, prev_close)
+        a_later, b_later = a_later * a, a_later * b + b_later
+        transforms[i] = (a_later, b_later)
+    return transforms
+
+
+def rescale_history(df: pd.DataFrame, events: pd.DataFrame, dividend_type: str,
+                    reference: pd.DataFrame | None = None) -> pd.DataFrame:
+    """按新的除权事件重新换算已保存的前复权历史
+
+    只换算每个事件除权日之前的K线，每段历史的变换由之后的所有事件合成，对整段做一次向量化计算。
+
+    Args:
+        df: 已保存的前复权K线（以date为索引）
+        events: 新的除权事件
+        dividend_type: 复权方式
+        reference: 新获取的K线，front_ratio 缺少dr时用来查找每个除权日前一天的收盘价
+
+    Returns:
+        换算后的DataFrame（新对象）；后复权/不复权或没有事件时原样返回
+    """
+    if dividend_type in STABLE_DIVIDEND_TYPES or len(events) == 0 or len(df) == 0:
+        return df
+
+    df = df.copy()
+    dates = df.index.values
+    # 按除权日把历史分段：早于第 i 个事件的K线受第 i 个及之后所有事件的影响
+    boundaries = np.searchsorted(dates, events.index.values.astype(dates.dtype), side='left')
+    transforms = cumulative_transforms(events, dividend_type, df, reference)
+
+    for i in range(len(events)):
+        start = 0 if i == 0 else boundaries[i - 1]
+        end = boundaries[i]
+        if end <= start:
+            continue
+        a, b = transforms[i]
+        block = df.iloc[start:end][PRICE_FIELDS].to_numpy(dtype=np.float64)
+        df.iloc[start:end, [df.columns.get_loc(f) for f in PRICE_FIELDS]] = block * a + b
+
+    return df
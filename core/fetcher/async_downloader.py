@@ -0,0 +1,245 @@
+"""
+异步下载接口
+在asyncio事件循环中驱动 QmtDataDownloader：阻塞的xtdata调用放到有界线程池执行，
+支持并发上限（背压）、单次调用超时、取消和按完成顺序产出结果
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable
+
+from core.fetcher.downloader import QmtDataDownloader
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncQmtDataDownloader:
+    """异步QMT数据下载器
+
+    示例::
+
+        async with AsyncQmtDataDownloader(max_workers=4, timeout=120) as downloader:
+            async for code, success in downloader.iter_batch(codes, start_time='20200101'):
+                ...
+
+    注意：线程中已经开始执行的xtdata调用无法被强制中断。超时后协程立即返回并设置取消标志，
+    该线程在当前调用结束后停止，不再写入文件；期间仍然占用一个并发名额，因此并发数始终不超过 max_workers。
+    download_batch 在生成股票列表前等待这些线程结束，结果以是否实际写入为准。
+
+    同步下载器设置了内存监控（memory_guard）时，进入低内存模式后并发降为1，
+    每个代码同时也改为流式写入。
+    """
+
+    def __init__(self, downloader: QmtDataDownloader | None = None, max_workers: int = 4,
+                 timeout: float | None = None, **downloader_kwargs: Any):
+        """初始化
+
+        Args:
+            downloader: 同步下载器，默认按 downloader_kwargs 新建
+            max_workers: 最大并发数（线程池大小）；xtdata不支持并发时设为1
+            timeout: 单个代码的默认超时时间（秒），None表示不限
+            **downloader_kwargs: 新建 QmtDataDownloader 时的参数（max_calls 默认等于 max_workers）
+        """
+        if downloader is None:
+            downloader = QmtDataDownloader(**{'max_calls': max_workers, **downloader_kwargs})
+        elif downloader.max_calls < max_workers:
+            logger.warning("⚠️ 下载器的 max_calls=%d 小于并发数 %d，数据源调用会排队",
+                           downloader.max_calls, max_workers)
+        self.downloader = downloader
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='qmt-download')
+        self._semaphore: asyncio.Semaphore | None = None
+        self._in_flight = 0
+        # 没有正在执行的线程时设置；低内存模式下新的下载等它设置后再开始
+        self._idle: asyncio.Event | None = None
+        self._throttled = False
+        # 超时后已放弃等待、线程仍在运行的下载 {code: future}
+        self._abandoned: dict[str, asyncio.Future[Any]] = {}
+
+    @property
+    def output_dir(self) -> str:
+        return self.downloader.output_dir
+
+    @property
+    def metrics(self):
+        return self.downloader.metrics
+
+    async def __aenter__(self) -> 'AsyncQmtDataDownloader':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """关闭线程池，未开始的任务直接取消，不等待正在执行的调用"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _submit(self, fn: Callable[[], Any]) -> 'asyncio.Future[Any]':
+        """获取并发名额后提交到线程池
+
+        名额在线程真正结束时才释放（而不是协程超时/取消时），保证并发上限准确。
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+            self._idle = asyncio.Event()
+            self._idle.set()
+        semaphore = self._semaphore
+        idle = self._idle
+        loop = asyncio.get_running_loop()
+
+        await semaphore.acquire()
+        try:
+            await self._throttle(idle)
+            cf = self._executor.submit(fn)
+        except BaseException:
+            semaphore.release()
+            raise
+
+        # 从确认空闲到这里之间没有await，其他等待的下载恢复时会看到这个线程
+        self._in_flight += 1
+        idle.clear()
+
+        def _release(_: Future) -> None:
+            def _done() -> None:
+                self._in_flight -= 1
+                if self._in_flight == 0:
+                    idle.set()
+                semaphore.release()
+            try:
+                loop.call_soon_threadsafe(_done)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+        cf.add_done_callback(_release)
+        # 取消asyncio future时会同步取消尚未开始的线程任务
+        return asyncio.wrap_future(cf, loop=loop)
+
+    async def _throttle(self, idle: asyncio.Event) -> None:
+        """低内存模式下等到没有正在执行的线程再开始，使并发数降为1
+
+        进入低内存模式前已经开始的下载不受影响，之后的下载在它们结束后逐个执行。
+        """
+        guard = self.downloader.memory_guard
+        if self.max_workers <= 1 or guard is None or not guard.low_memory:
+            return
+        if not self._throttled:
+            self._throttled = True
+            logger.warning("🧠 内存接近上限，并发数从 %d 降为 1", self.max_workers)
+            self.metrics.incr('concurrency_reduced', self.max_workers - 1)
+        while self._in_flight:
+            await idle.wait()
+
+    async def download_stock_data(self, code: str, timeout: float | None = None,
+                                  **kwargs: Any) -> bool:
+        """异步下载单个股票/ETF的历史数据
+
+        Args:
+            code: 股票/ETF代码
+            timeout: 超时时间（秒），默认使用构造时的 timeout
+            **kwargs: 传递给 QmtDataDownloader.download_stock_data 的参数
+
+        Returns:
+            是否成功；超时返回False（线程在当前xtdata调用结束后停止，不写入文件）
+        """
+        timeout = self.timeout if timeout is None else timeout
+        cancel = threading.Event()
+        future = await self._submit(partial(self.downloader.download_stock_data, code,
+                                            cancel=cancel, **kwargs))
+        self.metrics.gauge('in_flight', self._in_flight)
+
+        try:
+            # shield：超时只放弃等待，不取消线程的结果，之后仍可以确认它是否写入了文件
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            cancel.set()
+            self._abandoned[code] = future
+            logger.warning("⏱️ %s 下载超时（%ss），已放弃等待并取消", code, timeout)
+            self.metrics.incr('timeouts', code=code)
+            return False
+        except asyncio.CancelledError:
+            # 外部取消：尚未开始的线程任务直接取消，已开始的在当前调用结束后停止
+            cancel.set()
+            future.cancel()
+            raise
+        except Exception as e:
+            logger.error("❌ %s 下载异常: %s", code, e)
+            return False
+
+    async def _download_one(self, code: str, timeout: float | None,
+                            kwargs: dict[str, Any]) -> tuple[str, bool]:
+        return code, await self.download_stock_data(code, timeout=timeout, **kwargs)
+
+    async def iter_batch(self, code_list: list[str], timeout: float | None = None,
+                         **kwargs: Any) -> AsyncIterator[tuple[str, bool]]:
+        """按完成顺序逐个产出下载结果
+
+        提前退出循环或外部取消时，未开始的任务会被取消。
+
+        Args:
+            code_list: 代码列表
+            timeout: 单个代码的超时时间（秒）
+            **kwargs: 传递给 download_stock_data 的参数
+
+        Yields:
+            (code, success)
+        """
+        tasks = [asyncio.ensure_future(self._download_one(code, timeout, kwargs))
+                 for code in code_list]
+        remaining = len(tasks)
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                remaining -= 1
+                self.metrics.gauge('queue_depth', remaining)
+                yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def download_batch(self, code_list: list[str], timeout: float | None = None,
+                             **kwargs: Any) -> dict[str, bool]:
+        """异步批量下载
+
+        Args:
+            code_list: 代码列表
+            timeout: 单个代码的超时时间（秒）
+            **kwargs: 传递给 download_stock_data 的参数
+
+        Returns:
+            下载结果字典 {code: success}，顺序与 code_list 一致
+        """
+        logger.info("🚀 开始异步批量下载 %d 个标的（并发 %d）", len(code_list), self.max_workers)
+
+        finished: dict[str, bool] = {}
+        async for code, success in self.iter_batch(code_list, timeout=timeout, **kwargs):
+            finished[code] = success
+            self.metrics.incr('codes_succeeded' if success else 'codes_failed')
+
+        results = {code: finished.get(code, False) for code in code_list}
+        await self._settle_abandoned(results)
+        success_count = sum(1 for v in results.values() if v)
+        logger.info("📈 批量下载完成: %d/%d 成功", success_count, len(code_list))
+
+        if success_count > 0:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.downloader.save_stock_list, results)
+
+        return results
+
+    async def _settle_abandoned(self, results: dict[str, bool]) -> None:
+        """等待超时后仍在运行的线程结束，取消标志生效前已经写入文件的代码改记为成功"""
+        abandoned = {code: self._abandoned.pop(code) for code in list(self._abandoned) if code in results}
+        if not abandoned:
+            return
+        logger.info("⏳ 等待 %d 个超时代码的线程结束", len(abandoned))
+        outcomes = await asyncio.gather(*abandoned.values(), return_exceptions=True)
+        for code, outcome in zip(abandoned, outcomes):
+            if outcome is True:
+                logger.warning("⚠️ %s 超时后仍完成了写入，记为成功", code)
+                results[code] = True
@@ -4,33 +4,94 @@
 """
 
 import os
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from tqdm import tqdm
 import logging
+import gc
 import time
+import threading
+from contextlib import nullcontext
+from typing import Any, Callable
 from dotenv import load_dotenv
 
-# 直接导入xtquant（已复制到项目环境）
-from xtquant import xtdata
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+from core.metrics import MetricsCollector
+from core.memory import MemoryGuard
+from core.fetcher.source import DataSource, QmtSource, parse_time
+from core.fetcher.universe import Universe
+from core.fetcher.trading_calendar import TradingCalendar
+from core.fetcher.resilience import (
+    CircuitBreaker, CircuitOpenError, RetryPolicy, SegmentOutcome, SegmentResult,
+    call_with_timeout, classify_error
+)
+# 读取函数已移到 core.storage.reader，此处保留导入以兼容旧代码
+from core.storage.reader import load_data, default_output_dir  # noqa: F401
+from core.storage.fingerprint import FingerprintStore, frame_fingerprint
+from core.storage.summary import SummaryTable
+from core.storage.tick_store import TICK_DIR, TickStore, clean_ticks
+from core.storage.exporter import (
+    ParquetStreamWriter, iter_parquet_frames, write_csv, write_csv_stream, write_excel,
+    write_excel_stream, write_parquet
 )
+from core.fetcher.adjust import PRICE_FIELDS, rescale_history
+
+# 不在导入时配置根logger，由调用方决定（见 core.logging_config.setup_logging）
 logger = logging.getLogger(__name__)
+# 单个代码的明细日志，安静模式下只把warning以上写入滚动日志文件
+detail_logger = logging.getLogger(f'{__name__}.detail')
 
 
 class QmtDataDownloader:
     """QMT数据下载器"""
     
-    def __init__(self, output_dir: str | None = None):
+    def __init__(self, output_dir: str | None = None,
+                 metrics: MetricsCollector | None = None,
+                 quiet: bool = False,
+                 source: DataSource | None = None,
+                 universe: Universe | None = None,
+                 call_timeout: float | None = None,
+                 breaker: CircuitBreaker | None = None,
+                 retry_policy: RetryPolicy | None = None,
+                 dedup: bool = True,
+                 pause: float = 0.5,
+                 memory_guard: MemoryGuard | None = None,
+                 max_calls: int = 1):
         """初始化下载器
         
         Args:
             output_dir: 输出目录，默认为QmtDataTool/output或从.env读取
+            metrics: 指标采集器，默认不记录（见 core.metrics.RunMetrics）
+            quiet: 安静模式，批量下载只显示一个总进度条，不显示每个代码的进度条
+            source: 数据源，默认为MiniQMT（QmtSource），
+                    也可以使用 ReplaySource 从本地数据回放
+            universe: 标的池，指定后按上市/退市日期裁剪每个代码的下载窗口
+            call_timeout: 单次xtdata调用的截止时间（秒），None表示不限
+            breaker: 熔断器，连续失败后暂停批量下载并重连数据源
+            retry_policy: 重试策略（指数退避、抖动、整次运行的重试预算），
+                          默认每次重试前等待1秒起翻倍
+            dedup: 按内容指纹去重，数据与已有文件相同时跳过写入
+            pause: 批量下载时每个代码之间的暂停秒数，避免请求过快
+            memory_guard: 内存监控，记录各阶段内存峰值；接近内存上限时改为逐段流式写入
+            max_calls: 同时进行的数据源调用数上限（含超时后仍在后台运行的调用），
+                       超时的调用结束前不会发起新的调用；异步下载时等于并发数
         """
+        self.source = source if source is not None else QmtSource()
+        self.universe = universe
+        self.call_timeout = call_timeout
+        self.breaker = breaker
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.max_calls = max_calls
+        self.call_slots = threading.BoundedSemaphore(max_calls)
+        if breaker is not None and breaker.on_open is None:
+            breaker.on_open = self.source.reconnect
+        self.metrics = metrics if metrics is not None else MetricsCollector()
+        self.quiet = quiet
+        self.pause = pause
+        self.memory_guard = memory_guard
+        # 交易日历（可选），分笔数据按交易日请求时使用，由调用方设置
+        self.calendar: TradingCalendar | None = None
+        
         # 加载环境变量
         load_dotenv()
         
@@ -40,17 +101,23 @@ class QmtDataDownloader:
             env_output_dir = os.getenv('OUTPUT_DIR')
             if env_output_dir:
                 self.output_dir = env_output_dir
-                logger.info(f"📁 使用环境变量配置的输出目录: {self.output_dir}")
+                logger.info("📁 使用环境变量配置的输出目录: %s", self.output_dir)
             else:
                 # 使用默认目录
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                qmt_root = os.path.dirname(os.path.dirname(current_dir))
-                self.output_dir = os.path.join(qmt_root, 'output')
+                self.output_dir = default_output_dir()
         else:
             self.output_dir = output_dir
             
         # 确保输出目录存在
         os.makedirs(self.output_dir, exist_ok=True)
+        self.fingerprints = FingerprintStore(self.output_dir) if dedup else None
+        # 每个代码的摘要统计（summary.parquet），保存数据时更新，股票列表和数据清单由它生成
+        self.summary = SummaryTable(self.output_dir)
+        # 分笔数据按交易日分文件保存在 {output_dir}/tick（见 core.storage.tick_store）
+        self.ticks = TickStore(os.path.join(self.output_dir, TICK_DIR))
+        # 本次运行中历史被整体改写的代码（全量下载、本地复权换算、按时间段修复），
+        # 这些代码的重采样结果需要全量重建，不能只更新最后一个桶
+        self.rewritten_codes: set[str] = set()
         
         logger.info("✅ 数据下载器初始化成功")
     
@@ -99,7 +166,7 @@ class QmtDataDownloader:
         return segments
     
     def _download_segment(self, code: str, start_time: str, end_time: str,
-                         period: str = '1d', dividend_type: str = 'front') -> pd.DataFrame | None:
+                         period: str = '1d', dividend_type: str = 'front') -> SegmentResult:
         """下载一个时间段的数据
         
         Args:
@@ -110,64 +177,94 @@ class QmtDataDownloader:
             dividend_type: 复权方式，默认前复权
             
         Returns:
-            DataFrame或None（如果失败）
+            SegmentResult：OK（有数据）、EMPTY（时间段内没有K线）、
+            ERROR/TIMEOUT（可重试）或 PERMANENT（不可重试）
+            
+        Raises:
+            CircuitOpenError: 熔断器多次打开仍无法恢复
         """
+        if self.breaker is not None:
+            self.breaker.before_call()
+        
         try:
             # 第一步：下载历史数据到本地缓存
-            # 这是QMT的必要步骤，必须先下载数据
-            logger.info(f"   下载 {code} ({start_time} - {end_time}) 到本地缓存...")
-            xtdata.download_history_data(
-                stock_code=code,
-                period=period,
-                start_time=start_time,
-                end_time=end_time
-            )
-            
-            # 获取数据字段
-            field_list = ['open', 'high', 'low', 'close', 'volume', 'amount']
+            segment = f"{start_time}-{end_time}"
+            detail_logger.info("   下载 %s (%s - %s) 到本地缓存...", code, start_time, end_time)
+            with self.metrics.timer('download_history_data', code, segment):
+                call_with_timeout(self.source.warm_cache, self.call_timeout,
+                                  code, period, start_time, end_time, slots=self.call_slots)
             
             # 第二步：从本地缓存获取数据
-            data_dict = xtdata.get_market_data(
-                field_list=field_list,
-                stock_list=[code],
-                period=period,
-                start_time=start_time,
-                end_time=end_time,
-                dividend_type=dividend_type,
-                fill_data=False  # 不填充数据
-            )
+            with self.metrics.timer('get_market_data', code, segment):
+                if period == 'tick':
+                    df = call_with_timeout(self.source.read_ticks, self.call_timeout,
+                                           code, start_time, end_time, slots=self.call_slots)
+                else:
+                    df = call_with_timeout(self.source.read_bars, self.call_timeout,
+                                           code, period, start_time, end_time, dividend_type,
+                                           slots=self.call_slots)
             
-            # 检查是否有数据
-            if not data_dict or 'close' not in data_dict:
-                logger.warning(f"⚠️ {code} 在 {start_time}-{end_time} 期间无数据")
-                return None
+            if self.breaker is not None:
+                self.breaker.record_success()
             
-            # 将数据字典转换为DataFrame
-            # 数据格式: {field: DataFrame(index=codes, columns=times)}
-            df_list = []
-            for field in field_list:
-                if field in data_dict:
-                    # 转置使时间成为index
-                    df_field = data_dict[field].T
-                    # 重命名列
-                    df_field.columns = [field]
-                    df_list.append(df_field)
+            # 检查是否有数据（正常返回的空结果不是错误，不需要重试）
+            if df is None or len(df) == 0:
+                detail_logger.info("   %s 在 %s-%s 期间无数据", code, start_time, end_time)
+                return SegmentResult(SegmentOutcome.EMPTY)
             
-            if not df_list:
-                return None
+            return SegmentResult(SegmentOutcome.OK, df)
             
-            # 合并所有字段
-            df = pd.concat(df_list, axis=1)
+        except ImportError:
+            # 缺少xtquant时直接报错，不进入重试
+            raise
+        except Exception as e:
+            kind = classify_error(e)
+            self.metrics.incr('segment_errors', code=code, kind=kind)
             
-            # 确保索引是datetime类型
-            df.index = pd.to_datetime(df.index)
-            df.index.name = 'date'
+            if kind == 'permanent':
+                # 数据源正常响应（只是请求本身无效），熔断器按成功处理，半开时也以此结束试探
+                if self.breaker is not None:
+                    self.breaker.record_success()
+                detail_logger.error("❌ 下载 %s 数据失败，不可重试 (%s-%s): %s", code, start_time, end_time, e)
+                return SegmentResult(SegmentOutcome.PERMANENT, error=e)
             
-            return df
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            if kind == 'timeout':
+                detail_logger.error("⏱️ 下载 %s 数据超时 (%s-%s): %s", code, start_time, end_time, e)
+                return SegmentResult(SegmentOutcome.TIMEOUT, error=e)
+            detail_logger.error("❌ 下载 %s 数据失败 (%s-%s): %s", code, start_time, end_time, e)
+            return SegmentResult(SegmentOutcome.ERROR, error=e)
+    
+    def _fetch_segment(self, code: str, start_time: str, end_time: str, period: str,
+                       dividend_type: str, retry_times: int) -> SegmentResult:
+        """下载一个时间段，只有错误和超时才按重试策略重试
+        
+        Args:
+            code: 股票/ETF代码
+            start_time: 起始时间
+            end_time: 结束时间
+            period: 周期
+            dividend_type: 复权方式
+            retry_times: 最多尝试次数
             
-        except Exception as e:
-            logger.error(f"❌ 下载 {code} 数据失败 ({start_time}-{end_time}): {e}")
-            return None
+        Returns:
+            最后一次尝试的 SegmentResult
+        """
+        attempt = 0
+        while True:
+            result = self._download_segment(code, start_time, end_time, period, dividend_type)
+            if not self.retry_policy.should_retry(result.outcome, attempt, retry_times):
+                break
+            delay = self.retry_policy.backoff(attempt)
+            attempt += 1
+            detail_logger.warning("⚠️ %s 重试 %d/%d（%.1fs 后）", code, attempt, retry_times - 1, delay)
+            self.metrics.incr('retries', code=code, outcome=result.outcome.value)
+            self.metrics.incr('retry_sleep_seconds', delay, code=code)
+            time.sleep(delay)
+        
+        self.metrics.incr('segment_outcomes', code=code, outcome=result.outcome.value)
+        return result
     
     def _clean_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """清洗数据
@@ -198,12 +295,22 @@ class QmtDataDownloader:
         
         return df
     
+    def _stage(self, name: str, code: str):
+        """内存监控的阶段上下文，没有内存监控时不做任何事"""
+        if self.memory_guard is None:
+            return nullcontext()
+        return self.memory_guard.stage(name, code)
+    
+    def _low_memory(self) -> bool:
+        return self.memory_guard is not None and self.memory_guard.check()
+    
     def download_stock_data(self, code: str, start_time: str = '20000101',
                            end_time: str = None, period: str = '1d',
                            dividend_type: str = 'front',
                            years_per_segment: int = 3,
                            retry_times: int = 3,
-                           output_formats: list[str] | None = None) -> bool:
+                           output_formats: list[str] | None = None,
+                           cancel: threading.Event | None = None) -> bool:
         """下载单个股票/ETF的历史数据
         
         Args:
@@ -213,94 +320,450 @@ class QmtDataDownloader:
             period: 周期
             dividend_type: 复权方式
             years_per_segment: 每段的年数
-            retry_times: 重试次数
+            retry_times: 每个时间段最多尝试次数（重试间隔和预算见 retry_policy）
             output_formats: 输出格式列表，可选 ['parquet', 'csv', 'excel']
                           默认只保存parquet格式
+            cancel: 取消标志（异步下载超时时设置），每个时间段之前和写入文件之前检查，
+                    设置后不再请求、不写入任何文件并返回False
             
         Returns:
             是否成功
         """
+        with self.metrics.timer('download_stock_data', code):
+            success = self._download_stock_data(
+                code, start_time, end_time, period, dividend_type,
+                years_per_segment, retry_times, output_formats, cancel
+            )
+        if success and period != 'tick':
+            self.rewritten_codes.add(code)
+        return success
+    
+    def _download_stock_data(self, code: str, start_time: str, end_time: str | None,
+                             period: str, dividend_type: str, years_per_segment: int,
+                             retry_times: int, output_formats: list[str] | None,
+                             cancel: threading.Event | None = None) -> bool:
+        """download_stock_data 的实现，参数含义相同"""
         # 默认只保存parquet格式
         if output_formats is None:
             output_formats = ['parquet']
         
-        logger.info(f"📊 开始下载 {code} 的数据")
+        detail_logger.info("📊 开始下载 %s 的数据", code)
+        
+        # 裁剪到上市期间，不请求上市前/退市后的时间段
+        if self.universe is not None:
+            window = self.universe.clip(code, start_time, end_time)
+            if window is None:
+                detail_logger.warning("⚠️ %s 在 %s-%s 期间未上市，已跳过", code, start_time, end_time)
+                self.metrics.incr('codes_not_listed', code=code)
+                return False
+            start_time, end_time = window
+        
+        if period == 'tick':
+            return self._download_ticks(code, start_time, end_time, retry_times, cancel)
         
         # 生成时间分段
         segments = self._generate_time_segments(start_time, end_time, years_per_segment)
-        logger.info(f"   分为 {len(segments)} 个时间段")
+        detail_logger.info("   分为 %d 个时间段", len(segments))
+        self.metrics.incr('segments', len(segments), code=code)
         
-        # 存储所有分段的数据
+        # 存储所有分段的数据；低内存模式下改为逐段清洗后直接写入 stream
         all_data = []
+        stream = self._open_stream(code, output_formats) if self._low_memory() else None
         
         # 逐段下载
-        for start, end in tqdm(segments, desc=f"下载{code}"):
-            # 尝试下载
-            df_segment = None
-            for attempt in range(retry_times):
-                df_segment = self._download_segment(
-                    code, start, end, period, dividend_type
-                )
-                if df_segment is not None:
-                    break
-                if attempt < retry_times - 1:
-                    logger.warning(f"⚠️ 重试 {attempt + 1}/{retry_times}")
-                    time.sleep(1)  # 等待1秒后重试
-            
-            if df_segment is not None and len(df_segment) > 0:
-                all_data.append(df_segment)
+        for start, end in tqdm(segments, desc=f"下载{code}", disable=self.quiet):
+            if self._cancelled(code, cancel):
+                if stream is not None:
+                    stream.abort()
+                return False
+            with self._stage('fetch', code):
+                result = self._fetch_segment(code, start, end, period, dividend_type, retry_times)
+            
+            if result.outcome == SegmentOutcome.PERMANENT:
+                # 不可重试的错误对整个代码有效，跳过剩余时间段
+                detail_logger.error("❌ %s 遇到不可重试的错误，放弃下载", code)
+                if stream is not None:
+                    stream.abort()
+                return False
+            
+            if result.outcome == SegmentOutcome.OK:
+                all_data.append(result.df)
+            
+            # 下载途中接近内存上限：已下载的数据段先写出，剩余的逐段写入
+            if stream is None and self._low_memory():
+                stream = self._open_stream(code, output_formats)
+            if stream is not None:
+                for df in all_data:
+                    self._stream_segment(stream, code, df)
+                all_data.clear()
+        
+        if self._cancelled(code, cancel):
+            if stream is not None:
+                stream.abort()
+            return False
+        if stream is not None:
+            return self._finish_stream(stream, code, output_formats)
         
         if not all_data:
-            logger.error(f"❌ {code} 没有下载到任何数据")
+            detail_logger.error("❌ %s 没有下载到任何数据", code)
             return False
         
-        # 合并所有分段
-        logger.info(f"   合并 {len(all_data)} 个数据段")
+        # 合并所有分段，合并后立即释放分段列表，峰值内存约为数据量的两倍而不是三倍
+        detail_logger.info("   合并 %d 个数据段", len(all_data))
         df_combined = pd.concat(all_data, axis=0)
+        del all_data
+        rows_raw = len(df_combined)
         
         # 清洗数据
-        logger.info(f"   清洗数据（原始行数: {len(df_combined)}）")
-        df_clean = self._clean_data(df_combined)
-        logger.info(f"   清洗后行数: {len(df_clean)}）")
+        detail_logger.info("   清洗数据（原始行数: %d）", rows_raw)
+        with self.metrics.timer('clean', code), self._stage('clean', code):
+            df_clean = self._clean_data(df_combined)
+            del df_combined
+        detail_logger.info("   清洗后行数: %d", len(df_clean))
+        self.metrics.incr('rows_raw', rows_raw, code=code)
+        self.metrics.incr('rows_clean', len(df_clean), code=code)
         
         if len(df_clean) == 0:
-            logger.error(f"❌ {code} 清洗后无数据")
+            detail_logger.error("❌ %s 清洗后无数据", code)
+            return False
+        
+        if self._cancelled(code, cancel):
             return False
+        with self._stage('save', code):
+            self._save_data(code, df_clean, output_formats)
         
+        return True
+    
+    def _cancelled(self, code: str, cancel: threading.Event | None) -> bool:
+        """取消标志已设置时记录并返回True"""
+        if cancel is None or not cancel.is_set():
+            return False
+        detail_logger.warning("⏹️ %s 下载已取消，未写入文件", code)
+        self.metrics.incr('codes_cancelled', code=code)
+        return True
+    
+    def _download_ticks(self, code: str, start_time: str, end_time: str | None,
+                        retry_times: int, cancel: threading.Event | None = None) -> bool:
+        """下载分笔数据：逐个交易日请求，清洗后写入分笔存储
+        
+        交易日取自交易日历（self.calendar），没有日历时按工作日请求，节假日返回空数据后跳过。
+        已保存的交易日跳过（断点续传），当天的数据总是重新下载。
+        
+        Returns:
+            是否成功：有交易日的数据已保存，且没有交易日下载失败（失败的交易日下次运行时补下）
+        """
+        today = datetime.now().strftime('%Y%m%d')
+        end_time = end_time or today
+        if self.calendar is not None:
+            days = [str(day).replace('-', '') for day in self.calendar.trading_days(start_time[:8], end_time[:8])]
+        else:
+            days = pd.bdate_range(start_time[:8], end_time[:8]).strftime('%Y%m%d').tolist()
+        self.metrics.incr('segments', len(days), code=code)
+        
+        stored = 0
+        failed_days = []
+        for day in tqdm(days, desc=f"分笔{code}", disable=self.quiet):
+            if self._cancelled(code, cancel):
+                # 已写入的交易日保留（每天一个文件，各自完整），下次运行时跳过
+                return False
+            if day != today and self.ticks.has_day(code, day):
+                self.metrics.incr('tick_days_skipped', code=code)
+                stored += 1
+                continue
+            
+            with self._stage('fetch', code):
+                result = self._fetch_segment(code, day, day, 'tick', 'none', retry_times)
+            if result.outcome == SegmentOutcome.PERMANENT:
+                detail_logger.error("❌ %s 遇到不可重试的错误，放弃下载", code)
+                return False
+            if result.outcome in (SegmentOutcome.ERROR, SegmentOutcome.TIMEOUT):
+                failed_days.append(day)
+                self.metrics.incr('tick_days_failed', code=code)
+                continue
+            if result.outcome != SegmentOutcome.OK:
+                continue
+            
+            df = clean_ticks(result.df)
+            self.metrics.incr('rows_raw', len(result.df), code=code)
+            self.metrics.incr('rows_clean', len(df), code=code)
+            if len(df) == 0:
+                continue
+            with self.metrics.timer('write_tick', code), self._stage('save', code):
+                size = self.ticks.write_day(code, day, df)
+            self.metrics.incr('bytes_written', size, code=code, fmt='tick')
+            stored += 1
+        
+        if failed_days:
+            detail_logger.error("❌ %s 有 %d 个交易日的分笔数据下载失败: %s", code, len(failed_days),
+                                ', '.join(failed_days[:10]) + (' ...' if len(failed_days) > 10 else ''))
+            return False
+        if stored == 0:
+            detail_logger.error("❌ %s 没有下载到任何分笔数据", code)
+            return False
+        detail_logger.info("✅ %s 分笔数据已保存: %d 个交易日，%s", code, stored, self.ticks.root)
+        return True
+    
+    def _open_stream(self, code: str, output_formats: list[str]) -> ParquetStreamWriter:
+        """低内存模式：打开逐段追加的Parquet写入器
+        
+        不输出parquet时也先写一个临时parquet，保存时再从它分批转换为CSV/Excel。
+        """
+        if 'parquet' in (fmt.lower() for fmt in output_formats):
+            path = os.path.join(self.output_dir, f"{code}.parquet")
+        else:
+            path = os.path.join(self.output_dir, f"{code}.stream.parquet")
+        detail_logger.info("   🧠 低内存模式，逐段写入 %s", path)
+        self.metrics.incr('codes_streamed', code=code)
+        return ParquetStreamWriter(path)
+    
+    def _stream_segment(self, stream: ParquetStreamWriter, code: str, df: pd.DataFrame) -> None:
+        """清洗一个数据段并追加写入，丢弃与已写入部分重叠的行
+        
+        数据段按时间先后下载，清洗后只保留晚于已写入的最后一根K线的行，
+        与整体合并后去重（保留最后一条）的结果在分段边界上等价。
+        """
+        with self.metrics.timer('clean', code), self._stage('clean', code):
+            df_clean = self._clean_data(df)
+            if stream.last_index is not None and len(df_clean) > 0:
+                df_clean = df_clean[df_clean.index > stream.last_index]
+        self.metrics.incr('rows_raw', len(df), code=code)
+        self.metrics.incr('rows_clean', len(df_clean), code=code)
+        with self._stage('save', code):
+            stream.write(df_clean)
+    
+    def _finish_stream(self, stream: ParquetStreamWriter, code: str, output_formats: list[str]) -> bool:
+        """低内存模式：完成parquet写入，再从parquet分批生成其他格式
+        
+        流式写入时没有完整的DataFrame，不计算内容指纹，相应的指纹记录作废。
+        """
+        with self.metrics.timer('write_parquet', code):
+            rows = stream.close()
+        if rows == 0:
+            detail_logger.error("❌ %s 清洗后无数据", code)
+            return False
+        
+        parquet_path = stream.path
+        saved_files = []
+        for fmt in output_formats:
+            fmt = fmt.lower()
+            extension = {'parquet': 'parquet', 'csv': 'csv', 'excel': 'xlsx', 'xlsx': 'xlsx'}.get(fmt)
+            if extension is None:
+                detail_logger.warning("⚠️ 不支持的格式: %s，已跳过", fmt)
+                continue
+            output_path = os.path.join(self.output_dir, f"{code}.{extension}")
+            if fmt != 'parquet':
+                with self.metrics.timer(f'write_{fmt}', code), self._stage('save', code):
+                    if fmt == 'csv':
+                        write_csv_stream(iter_parquet_frames(parquet_path), output_path)
+                    else:
+                        write_excel_stream(iter_parquet_frames(parquet_path), output_path)
+            saved_files.append(output_path)
+            self.metrics.incr('bytes_written', os.path.getsize(output_path), code=code, fmt=fmt)
+            if self.fingerprints is not None:
+                self.fingerprints.forget(output_path)
+        
+        if parquet_path not in saved_files:
+            os.remove(parquet_path)
+        
+        detail_logger.info("✅ %s 数据已保存（流式写入）", code)
+        detail_logger.info("   截至: %s", stream.last_index)
+        detail_logger.info("   总行数: %d", rows)
+        for file in saved_files:
+            detail_logger.info("   文件: %s", file)
+        return True
+    
+    def _save_data(self, code: str, df_clean: pd.DataFrame, output_formats: list[str]) -> None:
+        """按格式保存清洗后的数据，内容与已有文件相同时跳过写入
+        
+        Args:
+            code: 股票/ETF代码
+            df_clean: 清洗后的数据
+            output_formats: 输出格式列表
+        """
         # 保存为多种格式
         saved_files = []
+        unchanged_files = []
+        fingerprint = frame_fingerprint(df_clean) if self.fingerprints is not None else None
         
         for fmt in output_formats:
             fmt = fmt.lower()
+            extension = {'parquet': 'parquet', 'csv': 'csv', 'excel': 'xlsx', 'xlsx': 'xlsx'}.get(fmt)
+            if extension is None:
+                detail_logger.warning("⚠️ 不支持的格式: %s，已跳过", fmt)
+                continue
+            output_path = os.path.join(self.output_dir, f"{code}.{extension}")
             
-            if fmt == 'parquet':
-                output_path = os.path.join(self.output_dir, f"{code}.parquet")
-                df_clean.to_parquet(output_path, engine='pyarrow', compression='snappy')
-                saved_files.append(output_path)
-                
-            elif fmt == 'csv':
-                output_path = os.path.join(self.output_dir, f"{code}.csv")
-                df_clean.to_csv(output_path, encoding='utf-8-sig')  # utf-8-sig 支持中文Excel打开
-                saved_files.append(output_path)
-                
-            elif fmt == 'excel' or fmt == 'xlsx':
-                output_path = os.path.join(self.output_dir, f"{code}.xlsx")
-                df_clean.to_excel(output_path, engine='openpyxl')
-                saved_files.append(output_path)
-                
-            else:
-                logger.warning(f"⚠️ 不支持的格式: {fmt}，已跳过")
+            # 内容与已有文件相同，跳过写入
+            if fingerprint is not None and self.fingerprints.is_unchanged(output_path, fingerprint):
+                unchanged_files.append(output_path)
+                self.metrics.incr('files_unchanged', code=code, fmt=fmt)
+                continue
+            
+            with self.metrics.timer(f'write_{fmt}', code):
+                if fmt == 'parquet':
+                    write_parquet(df_clean, output_path)
+                    
+                elif fmt == 'csv':
+                    write_csv(df_clean, output_path)  # 分块写入，utf-8-sig 支持中文Excel打开
+                    
+                else:
+                    write_excel(df_clean, output_path)  # 只写模式，超过单表行数自动分表
+            
+            saved_files.append(output_path)
+            self.metrics.incr('bytes_written', os.path.getsize(output_path), code=code, fmt=fmt)
+            if fingerprint is not None:
+                self.fingerprints.record(output_path, fingerprint, rows=len(df_clean))
+        
+        if 'parquet' in (fmt.lower() for fmt in output_formats):
+            self.summary.record(code, df_clean)
         
         # 打印保存信息
-        logger.info(f"✅ {code} 数据已保存")
-        logger.info(f"   时间范围: {df_clean.index[0]} ~ {df_clean.index[-1]}")
-        logger.info(f"   总行数: {len(df_clean)}")
-        logger.info(f"   保存格式: {', '.join(output_formats)}")
+        detail_logger.info("✅ %s 数据已保存", code)
+        detail_logger.info("   时间范围: %s ~ %s", df_clean.index[0], df_clean.index[-1])
+        detail_logger.info("   总行数: %d", len(df_clean))
+        detail_logger.info("   保存格式: %s", ', '.join(output_formats))
         for file in saved_files:
-            logger.info(f"   文件: {file}")
+            detail_logger.info("   文件: %s", file)
+        for file in unchanged_files:
+            detail_logger.info("   未变化（跳过写入）: %s", file)
+    
+    def update_stock_data(self, code: str, end_time: str | None = None, period: str = '1d',
+                          dividend_type: str = 'front', retry_times: int = 3,
+                          output_formats: list[str] | None = None,
+                          start_time: str = '20000101', years_per_segment: int = 3) -> bool:
+        """增量更新单个股票/ETF的数据
+        
+        只下载已保存数据最后一天之后的K线（含最后一天，用于校验）。期间有除权除息时，
+        按数据源的分红送转数据在本地换算已保存的前复权历史，不重新下载全部历史。
+        换算后的最后一根K线与新下载的同一天K线不一致（缺少分红数据、复权算法不同等）时，
+        退回全量下载。没有已保存的数据时直接全量下载。
+        
+        Args:
+            code: 股票/ETF代码
+            end_time: 结束时间，默认今天
+            period: 周期
+            dividend_type: 复权方式
+            retry_times: 每个时间段最多尝试次数
+            output_formats: 输出格式列表
+            start_time: 没有已保存数据时全量下载的起始时间
+            years_per_segment: 全量下载时每段的年数
+            
+        Returns:
+            是否成功
+        """
+        full_kwargs = dict(end_time=end_time, period=period, dividend_type=dividend_type,
+                           years_per_segment=years_per_segment, retry_times=retry_times,
+                           output_formats=output_formats)
+        
+        parquet_file = os.path.join(self.output_dir, f"{code}.parquet")
+        try:
+            stored = pd.read_parquet(parquet_file, engine='pyarrow').sort_index() if os.path.exists(parquet_file) else None
+        except Exception as e:
+            # 文件损坏（如写入中断）时全量下载覆盖它，不影响其他代码
+            detail_logger.warning("⚠️ %s 已保存的数据无法读取（%s），改为全量下载", code, e)
+            self.metrics.incr('update_fallbacks', code=code)
+            return self.download_stock_data(code, start_time=start_time, **full_kwargs)
+        if stored is None or len(stored) == 0:
+            detail_logger.info("📊 %s 没有已保存的数据，全量下载", code)
+            return self.download_stock_data(code, start_time=start_time, **full_kwargs)
+        
+        first_date = stored.index[0].strftime('%Y%m%d')
+        last = stored.index[-1]
+        end_time = end_time or datetime.now().strftime('%Y%m%d')
+        
+        with self.metrics.timer('update_stock_data', code):
+            detail_logger.info("📊 增量更新 %s（%s 之后）", code, last)
+            result = self._fetch_segment(code, last.strftime('%Y%m%d'), end_time, period,
+                                         dividend_type, retry_times)
+            if result.outcome == SegmentOutcome.EMPTY:
+                detail_logger.info("   %s 没有新数据", code)
+                return True
+            if result.outcome != SegmentOutcome.OK:
+                detail_logger.error("❌ %s 增量更新失败: %s", code, result.error)
+                return False
+            
+            new = self._clean_data(result.df)
+            
+            # 最后一天之后的除权事件；获取失败时无法确认历史是否需要换算，全量下载
+            try:
+                events = self.source.get_dividends(code, (last + timedelta(days=1)).strftime('%Y%m%d'), end_time)
+            except Exception as e:
+                detail_logger.warning("⚠️ %s 获取分红送转数据失败（%s），改为全量下载", code, e)
+                self.metrics.incr('update_fallbacks', code=code)
+                return self.download_stock_data(code, start_time=first_date, **full_kwargs)
+            if events is not None:
+                events = events[events.index > last.normalize()]
+                if len(events) > 0:
+                    detail_logger.info("   %s 有 %d 次除权除息，本地换算历史", code, len(events))
+                    stored = rescale_history(stored, events, dividend_type, reference=new)
+                    self.metrics.incr('updates_rescaled', code=code)
+                    self.rewritten_codes.add(code)
+            
+            # 用重叠的K线校验换算结果，不一致说明本地历史已经不可信
+            overlap = stored.index.intersection(new.index)
+            if len(overlap) == 0 or not np.allclose(
+                    stored.loc[overlap, PRICE_FIELDS].to_numpy(dtype=float),
+                    new.loc[overlap, PRICE_FIELDS].to_numpy(dtype=float), rtol=1e-4, atol=1e-3):
+                detail_logger.warning("⚠️ %s 已保存的历史与新数据不一致，改为全量下载", code)
+                self.metrics.incr('update_fallbacks', code=code)
+                return self.download_stock_data(code, start_time=first_date, **full_kwargs)
+            
+            df_clean = self._clean_data(pd.concat([stored[stored.index < new.index[0]], new]))
+            self.metrics.incr('rows_appended', len(df_clean) - len(stored), code=code)
+            detail_logger.info("   新增 %d 行", len(df_clean) - len(stored))
+            self._save_data(code, df_clean, output_formats or ['parquet'])
         
         return True
-    
+
+    def repair_segments(self, code: str, segments: list[tuple[str, str]], period: str = '1d',
+                        dividend_type: str = 'front', retry_times: int = 3,
+                        output_formats: list[str] | None = None) -> bool:
+        """重新下载指定时间段，替换已保存数据中这些时间段的K线（对账发现差异后使用）
+
+        Args:
+            code: 股票/ETF代码
+            segments: [(起始日期, 结束日期), ...]，YYYYMMDD，两端都包含
+            period: 周期，需要与已保存的数据一致
+            dividend_type: 复权方式，需要与已保存的数据一致
+            retry_times: 每个时间段最多尝试次数
+            output_formats: 输出格式列表
+
+        Returns:
+            是否全部时间段都下载成功
+        """
+        parquet_file = os.path.join(self.output_dir, f"{code}.parquet")
+        if not os.path.exists(parquet_file):
+            detail_logger.error("❌ %s 没有已保存的数据，无法按时间段修复", code)
+            return False
+        stored = pd.read_parquet(parquet_file, engine='pyarrow').sort_index()
+
+        success = True
+        replaced = 0
+        with self.metrics.timer('repair_segments', code):
+            for start, end in segments:
+                result = self._fetch_segment(code, start, end, period, dividend_type, retry_times)
+                if result.outcome == SegmentOutcome.EMPTY:
+                    # 数据源在这段时间也没有数据，保留已保存的K线
+                    detail_logger.warning("⚠️ %s 在 %s-%s 期间没有数据，未修改", code, start, end)
+                    continue
+                if result.outcome != SegmentOutcome.OK:
+                    detail_logger.error("❌ %s 重新下载 %s-%s 失败: %s", code, start, end, result.error)
+                    success = False
+                    continue
+                new = self._clean_data(result.df)
+                inside = (stored.index >= parse_time(start)) & (stored.index <= parse_time(end, end=True))
+                replaced += int(inside.sum())
+                stored = pd.concat([stored[~inside], new])
+                self.metrics.incr('segments_repaired', code=code)
+
+            df_clean = self._clean_data(stored)
+            self.metrics.incr('rows_repaired', replaced, code=code)
+            detail_logger.info("🔁 %s 重新下载 %d 个时间段，替换 %d 行", code, len(segments), replaced)
+            self._save_data(code, df_clean, output_formats or ['parquet'])
+        self.rewritten_codes.add(code)
+
+        return success
+
     def download_batch(self, code_list: list[str], **kwargs) -> dict[str, bool]:
         """批量下载多个股票/ETF的数据
         
@@ -311,22 +774,93 @@ class QmtDataDownloader:
         Returns:
             下载结果字典 {code: success}
         """
+        return self.run_batch(self.download_stock_data, code_list, "批量下载", kwargs)
+    
+    def update_batch(self, code_list: list[str], **kwargs) -> dict[str, bool]:
+        """批量增量更新
+        
+        Args:
+            code_list: 代码列表
+            **kwargs: 传递给update_stock_data的其他参数
+            
+        Returns:
+            更新结果字典 {code: success}
+        """
+        return self.run_batch(self.update_stock_data, code_list, "批量更新", kwargs)
+    
+    def run_batch(self, fn: Callable[..., bool], code_list: list[str], desc: str = "批量执行",
+                  fn_kwargs: dict[str, Any] | None = None, admit: Callable[[str], bool] | None = None,
+                  save_list: bool | None = None) -> dict[str, bool]:
+        """逐个代码执行 fn，汇总结果并保存股票列表
+        
+        download_batch / update_batch 的通用实现，供需要自定义每个代码的下载方式或执行顺序的调用方使用
+        （如 core.fetcher.scheduler、core.fetcher.planner）。与它们的行为相同：总进度条、运行指标、
+        代码间暂停、低内存模式下的回收，熔断器无法恢复时剩余代码全部记为失败。
+        
+        示例::
+        
+            results = downloader.run_batch(downloader.download_stock_data, codes, "重新下载",
+                                           {'start_time': '20240101'}, admit=lambda code: code in allowed)
+        
+        Args:
+            fn: 处理单个代码的函数，调用方式为 fn(code, **fn_kwargs)，返回是否成功
+            code_list: 代码列表，按顺序执行
+            desc: 日志和进度条中的名称
+            fn_kwargs: 传递给 fn 的参数
+            admit: 每个代码执行前调用，返回False的代码不执行也不计入结果（由调用方记为推迟）
+            save_list: 是否在有成功代码时保存股票列表，None表示 fn_kwargs 中 period 不是 'tick' 时保存
+                （分笔数据不在 {code}.parquet 中，不影响股票列表）
+            
+        Returns:
+            结果字典 {code: success}，不包含 admit 拒绝的代码
+        """
+        kwargs = fn_kwargs or {}
+        if save_list is None:
+            save_list = kwargs.get('period') != 'tick'
         results = {}
         
-        logger.info(f"🚀 开始批量下载 {len(code_list)} 个标的")
+        logger.info("🚀 开始%s %d 个标的", desc, len(code_list))
         
-        for code in code_list:
-            success = self.download_stock_data(code, **kwargs)
+        # 安静模式下用一个总进度条代替每个代码的进度条
+        progress = tqdm(total=len(code_list), desc=desc, unit="code", disable=not self.quiet)
+        
+        for i, code in enumerate(code_list):
+            self.metrics.gauge('queue_depth', len(code_list) - i)
+            if admit is not None and not admit(code):
+                progress.update(1)
+                continue
+            try:
+                success = fn(code, **kwargs)
+            except CircuitOpenError as e:
+                # 数据源无法恢复，剩余代码全部记为失败，避免无限等待
+                logger.error("❌ %s，剩余 %d 个标的未处理", e, len(code_list) - i)
+                for rest in code_list[i:]:
+                    results[rest] = False
+                break
+            except Exception as e:
+                # 单个代码的意外错误只记为该代码失败，不中断批量下载和股票列表的生成
+                detail_logger.exception("❌ %s 处理失败: %s", code, e)
+                success = False
             results[code] = success
+            self.metrics.incr('codes_succeeded' if success else 'codes_failed')
+            # 低内存模式下每个代码之后立即回收，避免上一个代码的数据拖到下一个代码
+            if self.memory_guard is not None and self.memory_guard.low_memory:
+                gc.collect()
+            progress.update(1)
+            progress.set_postfix(failed=len(results) - sum(results.values()), refresh=False)
             # 每个标的之间暂停一下，避免请求过快
-            time.sleep(0.5)
+            if self.pause > 0:
+                time.sleep(self.pause)
+        
+        progress.close()
+        self.metrics.gauge('queue_depth', 0)
         
         # 统计结果
         success_count = sum(1 for v in results.values() if v)
-        logger.info(f"📈 批量下载完成: {success_count}/{len(code_list)} 成功")
+        logger.info("📈 %s完成: %d/%d 成功", desc, success_count, len(results))
         
         # 保存成功下载的股票列表
-        if success_count > 0:
+        if success_count > 0 and save_list:
             self.save_stock_list(results)
         
         return results
@@ -343,75 +877,19 @@ class QmtDataDownloader:
         if not successful_codes:
             return
         
-        # 创建DataFrame
-        stock_list_data = []
-        for code in successful_codes:
-            # 尝试读取数据获取详细信息
-            try:
-                parquet_file = os.path.join(self.output_dir, f"{code}.parquet")
-                if os.path.exists(parquet_file):
-                    df = pd.read_parquet(parquet_file)
-                    stock_list_data.append({
-                        '代码': code,
-                        '起始日期': str(df.index[0].date()),
-                        '结束日期': str(df.index[-1].date()),
-                        '数据量': len(df),
-                        '文件': f"{code}.parquet"
-                    })
-                else:
-                    stock_list_data.append({
-                        '代码': code,
-                        '起始日期': '-',
-                        '结束日期': '-',
-                        '数据量': 0,
-                        '文件': '-'
-                    })
-            except Exception as e:
-                logger.warning(f"⚠️ 读取 {code} 信息失败: {e}")
-                stock_list_data.append({
-                    '代码': code,
-                    '起始日期': '-',
-                    '结束日期': '-',
-                    '数据量': 0,
-                    '文件': '-'
-                })
-        
-        df_list = pd.DataFrame(stock_list_data)
+        # 从摘要表生成：本次写入的代码用内存中的数据更新，其余有变化的文件重新计算
+        self.summary.refresh(successful_codes)
+        df_list = self.summary.stock_list(successful_codes)
         
         # 保存为CSV（方便查看）
         csv_path = os.path.join(self.output_dir, 'stock_list.csv')
         df_list.to_csv(csv_path, index=False, encoding='utf-8-sig')
-        logger.info(f"📋 股票列表已保存到: {csv_path}")
+        logger.info("📋 股票列表已保存到: %s", csv_path)
         
         # 保存为Excel（更美观）
         try:
             excel_path = os.path.join(self.output_dir, 'stock_list.xlsx')
             df_list.to_excel(excel_path, index=False, engine='openpyxl')
-            logger.info(f"📋 股票列表已保存到: {excel_path}")
+            logger.info("📋 股票列表已保存到: %s", excel_path)
         except Exception as e:
-            logger.warning(f"⚠️ 保存Excel失败: {e}，请安装openpyxl: pip install openpyxl")
-
-
-def load_data(code: str, output_dir: str = None) -> pd.DataFrame:
-    """从output目录读取指定代码的数据
-    
-    Args:
-        code: 股票/ETF代码
-        output_dir: 输出目录，默认为项目内的output目录
-        
-    Returns:
-        DataFrame
-    """
-    if output_dir is None:
-        # 获取默认output目录
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        qmt_root = os.path.dirname(os.path.dirname(current_dir))
-        output_dir = os.path.join(qmt_root, 'output')
-    
-    file_path = os.path.join(output_dir, f"{code}.parquet")
-    
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"数据文件不存在: {file_path}")
-    
-    df = pd.read_parquet(file_path, engine='pyarrow')
-    return df
+            logger.warning("⚠️ 保存Excel失败: %s，请安装openpyxl: pip install openpyxl", e)
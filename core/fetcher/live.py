@@ -0,0 +1,497 @@
+"""
+实时K线模块
+订阅分笔行情（xtdata.subscribe_quote），在内存中合成1m/5m等K线：
+- 每笔行情O(1)更新当前K线，K线按A股交易时段切分（与 core.storage.resampler 的标签一致，标签为K线结束时间）
+- 完成的K线先进入待写队列，按批次/时间间隔以row group追加写入 {output_dir}/live/{period}/{YYYYMMDD}/{code}.parquet，
+  当日文件在换日或 stop 时完成（写入期间为临时文件）
+- 每个代码最近的K线保存在定长环形缓冲区中，策略可以低延迟读取
+
+测试和回放使用 ReplayTickFeed，不需要MiniQMT
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+from core.metrics import MetricsCollector
+from core.fetcher.source import BAR_FIELDS, DataSource, TickCallback
+from core.storage.reader import default_output_dir
+from core.storage.exporter import ParquetStreamWriter
+from core.storage.resampler import (
+    AFTERNOON_OPEN, MORNING_CLOSE, MORNING_OPEN, SESSION_MINUTES, period_minutes
+)
+
+logger = logging.getLogger(__name__)
+
+MS_PER_MINUTE = 60_000
+MS_PER_DAY = 86_400_000
+# xtdata的行情时间为UTC毫秒时间戳，K线标签使用北京时间
+TZ_OFFSET_MS = 8 * 3600 * 1000
+
+_MORNING_MINUTES = MORNING_CLOSE - MORNING_OPEN
+
+
+def bar_label(local_ms: int, minutes: int) -> int:
+    """计算一笔行情所属K线的结束时间
+
+    集合竞价并入第一根K线，午休和收盘后的行情并入前一根K线。
+
+    Args:
+        local_ms: 北京时间的毫秒时间戳
+        minutes: K线分钟数
+
+    Returns:
+        K线结束时间（北京时间毫秒时间戳）
+    """
+    day_ms = local_ms - local_ms % MS_PER_DAY
+    seconds = (local_ms - day_ms) // 1000
+    if seconds < AFTERNOON_OPEN * 60:
+        elapsed = seconds - MORNING_OPEN * 60
+        m = min(max(elapsed // 60 + 1, 1), _MORNING_MINUTES)
+    else:
+        elapsed = seconds - AFTERNOON_OPEN * 60
+        m = _MORNING_MINUTES + min(max(elapsed // 60 + 1, 1), SESSION_MINUTES - _MORNING_MINUTES)
+    end = min(((m - 1) // minutes + 1) * minutes, SESSION_MINUTES)
+    clock = MORNING_OPEN + end if end <= _MORNING_MINUTES else AFTERNOON_OPEN + (end - _MORNING_MINUTES)
+    return day_ms + clock * MS_PER_MINUTE
+
+
+class _Bar:
+    """正在合成的K线"""
+
+    __slots__ = ('label', 'open', 'high', 'low', 'close', 'volume', 'amount')
+
+    def __init__(self, label: int, price: float, volume: float, amount: float):
+        self.label = label
+        self.open = self.high = self.low = self.close = price
+        self.volume = volume
+        self.amount = amount
+
+    def update(self, price: float, volume: float, amount: float) -> None:
+        if price > self.high:
+            self.high = price
+        if price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += volume
+        self.amount += amount
+
+    def as_tuple(self) -> tuple[int, float, float, float, float, float, float]:
+        return (self.label, self.open, self.high, self.low, self.close, self.volume, self.amount)
+
+
+class BarRingBuffer:
+    """定长环形缓冲区，保存一个代码最近的K线，追加为O(1)"""
+
+    def __init__(self, capacity: int = 240):
+        self.capacity = capacity
+        self._times = np.zeros(capacity, dtype=np.int64)
+        self._values = np.zeros((capacity, len(BAR_FIELDS)), dtype=np.float64)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def append(self, bar: tuple[int, float, float, float, float, float, float]) -> None:
+        slot = self._count % self.capacity
+        self._times[slot] = bar[0]
+        self._values[slot] = bar[1:]
+        self._count += 1
+
+    def latest(self) -> dict[str, Any] | None:
+        """最近一根K线"""
+        if self._count == 0:
+            return None
+        slot = (self._count - 1) % self.capacity
+        bar = dict(zip(BAR_FIELDS, self._values[slot].tolist()))
+        bar['date'] = pd.Timestamp(int(self._times[slot]), unit='ms')
+        return bar
+
+    def to_frame(self, n: int | None = None) -> pd.DataFrame:
+        """最近 n 根K线（按时间升序）"""
+        size = len(self)
+        n = size if n is None else min(n, size)
+        slots = (np.arange(self._count - n, self._count) % self.capacity)
+        index = pd.DatetimeIndex(self._times[slots].astype('datetime64[ms]'), name='date')
+        return pd.DataFrame(self._values[slots], index=index, columns=BAR_FIELDS)
+
+
+class ReplayTickFeed:
+    """回放行情源（测试/回放用），接口与 DataSource.subscribe_ticks 相同
+
+    行情为DataFrame，列为 code, time（北京时间）, price, volume, amount，
+    volume/amount 为当日累计值（与xtdata一致）。
+    """
+
+    def __init__(self, ticks: pd.DataFrame):
+        """初始化
+
+        Args:
+            ticks: 行情数据
+        """
+        self.ticks = ticks.sort_values('time', kind='stable').reset_index(drop=True)
+        self._subscriptions: dict[int, tuple[set[str], TickCallback]] = {}
+        self._next_handle = 0
+
+    @classmethod
+    def from_file(cls, path: str) -> 'ReplayTickFeed':
+        """从录制的parquet/csv文件加载"""
+        if path.endswith('.csv'):
+            ticks = pd.read_csv(path, parse_dates=['time'])
+        else:
+            ticks = pd.read_parquet(path, engine='pyarrow')
+        return cls(ticks)
+
+    @classmethod
+    def synthetic(cls, code_list: list[str], day: str, interval_seconds: int = 3,
+                  seed: int | None = None) -> 'ReplayTickFeed':
+        """生成一天的模拟行情（随机游走），每 interval_seconds 秒一笔
+
+        Args:
+            code_list: 代码列表
+            day: 日期 YYYYMMDD
+            interval_seconds: 行情间隔
+            seed: 随机种子
+
+        Returns:
+            ReplayTickFeed
+        """
+        rng = np.random.default_rng(seed)
+        base = pd.Timestamp(day)
+        freq = f'{interval_seconds}s'
+        times = pd.DatetimeIndex(
+            [base + pd.Timedelta(hours=9, minutes=25)]
+            + list(pd.date_range(base + pd.Timedelta(hours=9, minutes=30), base + pd.Timedelta(hours=11, minutes=30), freq=freq))
+            + list(pd.date_range(base + pd.Timedelta(hours=13), base + pd.Timedelta(hours=15), freq=freq))
+        )
+        frames = []
+        for code in code_list:
+            price = 10 + np.cumsum(rng.normal(0, 0.01, len(times)))
+            volume = np.cumsum(rng.integers(0, 500, len(times))).astype(float)
+            amount = np.cumsum(np.diff(volume, prepend=0) * price)
+            frames.append(pd.DataFrame({'code': code, 'time': times, 'price': price,
+                                        'volume': volume, 'amount': amount}))
+        return cls(pd.concat(frames, ignore_index=True))
+
+    def subscribe_ticks(self, code_list: list[str], callback: TickCallback) -> int:
+        handle = self._next_handle
+        self._next_handle += 1
+        self._subscriptions[handle] = (set(code_list), callback)
+        return handle
+
+    def unsubscribe_ticks(self, handle: int) -> None:
+        self._subscriptions.pop(handle, None)
+
+    def run(self, speed: float | None = None) -> int:
+        """按时间顺序推送全部行情（在当前线程中同步调用回调）
+
+        Args:
+            speed: 回放倍速，None表示不等待、尽快推送
+
+        Returns:
+            推送的行情笔数
+        """
+        times = self.ticks['time'].to_numpy().astype('datetime64[ms]').astype(np.int64).tolist()
+        codes = self.ticks['code'].tolist()
+        prices = self.ticks['price'].astype(float).tolist()
+        volumes = self.ticks['volume'].astype(float).tolist()
+        amounts = self.ticks['amount'].astype(float).tolist()
+
+        pushed = 0
+        for i in range(len(times)):
+            if speed and i > 0:
+                time.sleep(max(times[i] - times[i - 1], 0) / 1000 / speed)
+            tick = {'time': times[i] - TZ_OFFSET_MS, 'price': prices[i], 'volume': volumes[i], 'amount': amounts[i]}
+            for code_set, callback in list(self._subscriptions.values()):
+                if codes[i] in code_set:
+                    callback(codes[i], tick)
+                    pushed += 1
+        return pushed
+
+
+class LiveBarEngine:
+    """实时K线引擎
+
+    示例::
+
+        engine = LiveBarEngine(QmtSource(), codes, periods=['1m', '5m'])
+        engine.start()
+        ...
+        bar = engine.latest_bar('600000.SH', '1m')          # 正在合成的K线
+        recent = engine.recent_bars('600000.SH', '5m', 12)   # 最近12根已完成的K线
+        ...
+        engine.stop()
+    """
+
+    def __init__(self, feed: DataSource | ReplayTickFeed, code_list: list[str],
+                 periods: list[str] | None = None, output_dir: str | None = None,
+                 flush_interval: float = 5.0, batch_size: int = 500,
+                 buffer_size: int = 240, metrics: MetricsCollector | None = None,
+                 publishers: dict[str, Any] | None = None):
+        """初始化
+
+        Args:
+            feed: 行情源，QmtSource 或 ReplayTickFeed
+            code_list: 订阅的代码
+            periods: K线周期，默认 ['1m', '5m']
+            output_dir: 数据目录，K线写入 {output_dir}/live/{period}/{YYYYMMDD}/{code}.parquet
+            flush_interval: 后台线程写盘间隔（秒）
+            batch_size: 待写K线达到该数量时立即写盘
+            buffer_size: 每个代码每个周期在内存中保留的K线数
+            metrics: 指标采集器
+            publishers: {周期: SharedWindowPublisher}，完成的K线同时追加到共享内存窗口，
+                        供其他策略进程读取（见 core.storage.shm_cache）
+        """
+        self.feed = feed
+        self.code_list = list(code_list)
+        self.periods = list(periods or ['1m', '5m'])
+        self.output_dir = output_dir or default_output_dir()
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+        self.publishers = publishers or {}
+        self.metrics = metrics if metrics is not None else MetricsCollector()
+
+        self._minutes = {}
+        for period in self.periods:
+            minutes = period_minutes(period)
+            if minutes is None:
+                raise ValueError(f"实时K线只支持分钟周期: {period}")
+            self._minutes[period] = minutes
+
+        self._bars: dict[str, dict[str, _Bar]] = {period: {} for period in self.periods}
+        # 每个代码最后一根已完成K线的标签，之后收到的同一或更早标签的行情都是迟到的
+        self._completed: dict[str, dict[str, int]] = {period: {} for period in self.periods}
+        self._buffers: dict[str, dict[str, BarRingBuffer]] = {
+            period: {code: BarRingBuffer(buffer_size) for code in self.code_list} for period in self.periods
+        }
+        # 上一笔的累计成交量/额，用于计算增量
+        self._cumulative: dict[str, tuple[float, float]] = {}
+        self._pending: list[tuple[str, str, tuple]] = []
+        # 行情时钟：已收到的最新行情时间，用于关闭没有新行情的K线
+        self._clock = 0
+
+        self._lock = threading.Lock()
+        # 写盘全程持有，避免两次写盘交错追加同一个文件
+        self._flush_lock = threading.Lock()
+        # 每个 (周期, 日期, 代码) 一个追加写入器，换日或 stop 时关闭并生成当日文件
+        self._writers: dict[tuple[str, str, str], ParquetStreamWriter] = {}
+        self._handle: Any = None
+        self._stop = threading.Event()
+        # 待写K线达到 batch_size 时唤醒写盘线程，行情回调中不写盘
+        self._wake = threading.Event()
+        self._flusher: threading.Thread | None = None
+
+    def on_tick(self, code: str, tick: dict[str, Any]) -> None:
+        """处理一笔行情（行情源回调）"""
+        local_ms = tick['time'] + TZ_OFFSET_MS
+        price = tick['price']
+        cum_volume = tick['volume']
+        cum_amount = tick['amount']
+
+        with self._lock:
+            previous = self._cumulative.get(code)
+            if previous is None:
+                # 订阅后的第一笔只作为基准；开盘前订阅时第一笔即为集合竞价
+                volume = amount = 0.0
+            elif cum_volume < previous[0]:
+                # 累计值变小说明跨日
+                volume, amount = cum_volume, cum_amount
+            else:
+                volume, amount = cum_volume - previous[0], cum_amount - previous[1]
+            self._cumulative[code] = (cum_volume, cum_amount)
+            if local_ms > self._clock:
+                self._clock = local_ms
+
+            late = 0
+            for period, minutes in self._minutes.items():
+                label = bar_label(local_ms, minutes)
+                bars = self._bars[period]
+                bar = bars.get(code)
+                if bar is not None and label == bar.label:
+                    bar.update(price, volume, amount)
+                elif (bar.label if bar is not None else self._completed[period].get(code, -1)) < label:
+                    if bar is not None:
+                        self._complete(period, code, bar)
+                    bars[code] = _Bar(label, price, volume, amount)
+                else:
+                    # 迟到的行情（属于已完成的K线，包括被 close_stale 关闭的K线）丢弃
+                    late += 1
+
+            should_flush = len(self._pending) >= self.batch_size
+
+        self.metrics.incr('live_ticks')
+        if late:
+            self.metrics.incr('live_late_ticks', late)
+        if should_flush:
+            if self._flusher is not None:
+                self._wake.set()
+            else:
+                # 没有启动写盘线程（直接调用 on_tick 回放）时在当前线程写盘
+                self.flush()
+
+    def _complete(self, period: str, code: str, bar: _Bar) -> None:
+        """K线完成：写入环形缓冲区和待写队列（调用方持有锁）"""
+        values = bar.as_tuple()
+        self._completed[period][code] = bar.label
+        buffer = self._buffers[period].get(code)
+        if buffer is None:
+            buffer = self._buffers[period][code] = BarRingBuffer(self.buffer_size)
+        buffer.append(values)
+        self._pending.append((period, code, values))
+        publisher = self.publishers.get(period)
+        if publisher is not None:
+            publisher.append(code, values[0] * 1_000_000, values[1:])
+
+    def close_stale(self) -> int:
+        """关闭行情时钟已经越过结束时间的K线（长时间没有成交的代码）
+
+        Returns:
+            关闭的K线数
+        """
+        closed = 0
+        with self._lock:
+            for period, bars in self._bars.items():
+                for code in [c for c, bar in bars.items() if bar.label < self._clock]:
+                    self._complete(period, code, bars.pop(code))
+                    closed += 1
+        return closed
+
+    def latest_bar(self, code: str, period: str = '1m') -> dict[str, Any] | None:
+        """最新的K线（正在合成的K线，没有则为最近一根完成的K线）"""
+        with self._lock:
+            bar = self._bars[period].get(code)
+            if bar is not None:
+                result = dict(zip(BAR_FIELDS, bar.as_tuple()[1:]))
+                result['date'] = pd.Timestamp(bar.label, unit='ms')
+                return result
+            buffer = self._buffers[period].get(code)
+            return buffer.latest() if buffer is not None else None
+
+    def recent_bars(self, code: str, period: str = '1m', n: int | None = None) -> pd.DataFrame:
+        """最近 n 根已完成的K线"""
+        with self._lock:
+            buffer = self._buffers[period].get(code)
+            if buffer is None:
+                return pd.DataFrame(columns=BAR_FIELDS)
+            return buffer.to_frame(n)
+
+    def flush(self) -> int:
+        """把已完成的K线追加到按日分文件的parquet
+
+        每次只写出新完成的K线（一个row group），不读取、不重写已写入的部分。
+
+        Returns:
+            写入的K线数
+        """
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+
+        with self.metrics.timer('live_flush'):
+            groups: dict[tuple[str, str, str], list[tuple]] = {}
+            for period, code, values in pending:
+                day = pd.Timestamp(values[0], unit='ms').strftime('%Y%m%d')
+                groups.setdefault((period, day, code), []).append(values)
+
+            for key, rows in groups.items():
+                writer = self._writers.get(key)
+                if writer is None:
+                    writer = self._writers[key] = self._open_writer(*key)
+                array = np.array(rows, dtype=np.float64)
+                df = pd.DataFrame(array[:, 1:], columns=BAR_FIELDS,
+                                  index=pd.DatetimeIndex(array[:, 0].astype(np.int64).astype('datetime64[ms]'), name='date'))
+                if writer.last_index is not None:
+                    # 重启后重新合成的K线可能与已有文件重叠，以已有文件为准
+                    df = df[df.index > writer.last_index]
+                writer.write(df)
+
+            # 出现新的一天后前一天的K线不会再增加，生成前一天的文件
+            latest_day = max(day for _, day, _ in groups)
+            self._close_writers(lambda day: day < latest_day)
+
+        self.metrics.incr('live_bars', len(pending))
+        logger.debug("💾 写入 %d 根实时K线", len(pending))
+        return len(pending)
+
+    def _open_writer(self, period: str, day: str, code: str) -> ParquetStreamWriter:
+        """打开当日文件的追加写入器，已有文件（当日重启）的内容先原样写入"""
+        directory = os.path.join(self.output_dir, 'live', period, day)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{code}.parquet")
+        writer = ParquetStreamWriter(path)
+        if os.path.exists(path):
+            writer.write(pd.read_parquet(path, engine='pyarrow'))
+        return writer
+
+    def _close_writers(self, should_close: Callable[[str], bool] | None = None) -> None:
+        """关闭写入器，生成当日文件
+
+        Args:
+            should_close: 按日期判断是否关闭的函数，None表示全部关闭
+        """
+        for key in [k for k in self._writers if should_close is None or should_close(k[1])]:
+            writer = self._writers.pop(key)
+            try:
+                writer.close()
+            except Exception as e:
+                writer.abort()
+                logger.error("❌ 实时K线文件 %s 生成失败: %s", writer.path, e)
+
+    def _flush_loop(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.close_stale()
+                self.flush()
+            except Exception as e:
+                logger.error("❌ 实时K线写盘失败: %s", e)
+
+    def start(self) -> None:
+        """订阅行情并启动后台写盘线程"""
+        self._stop.clear()
+        self._wake.clear()
+        self._handle = self.feed.subscribe_ticks(self.code_list, self.on_tick)
+        self._flusher = threading.Thread(target=self._flush_loop, name='live-bar-flusher', daemon=True)
+        self._flusher.start()
+        logger.info("📡 已订阅 %d 个代码的实时行情（%s）", len(self.code_list), ', '.join(self.periods))
+
+    def stop(self, close_open_bars: bool = False) -> None:
+        """取消订阅，写入剩余K线并生成当日文件
+
+        Args:
+            close_open_bars: 是否把正在合成的K线也作为完成的K线写入（收盘后停止时使用）
+        """
+        if self._handle is not None:
+            self.feed.unsubscribe_ticks(self._handle)
+            self._handle = None
+        self._stop.set()
+        self._wake.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+
+        if close_open_bars:
+            with self._lock:
+                for period, bars in self._bars.items():
+                    for code, bar in bars.items():
+                        self._complete(period, code, bar)
+                    bars.clear()
+        self.close_stale()
+        with self._flush_lock:
+            self._flush()
+            self._close_writers()
+        logger.info("📴 已停止实时行情订阅")
@@ -0,0 +1,364 @@
+"""
+下载计划模块
+大规模回补（如20年分钟线）之前，根据标的池的上市日期、交易日历和已保存的数据，
+计算每个代码要请求的时间段、预计行数和磁盘占用，不连接QMT。
+计划可以保存为JSON，确认后再按计划执行（qmtdatatool download --plan plan.json）
+
+每个代码的动作：
+- full: 本地没有数据、数据不覆盖起始日期或全量模式，按分段下载整个窗口
+- update: 只请求已保存的最后一天之后的数据（见 QmtDataDownloader.update_stock_data）
+- skip: 已是最新，或在窗口内未上市
+"""
+
+import os
+import json
+import logging
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timedelta
+from typing import Any
+
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from core.fetcher.downloader import QmtDataDownloader
+from core.fetcher.sharding import BARS_PER_DAY
+from core.fetcher.trading_calendar import CALENDAR_FILE, TradingCalendar
+from core.fetcher.scheduler import latest_trading_day
+
+logger = logging.getLogger(__name__)
+
+# 每行占用的字节数（本地没有同格式文件可参考时使用，按日线实测）
+BYTES_PER_ROW = {'parquet': 24, 'csv': 110, 'excel': 48}
+
+# 每个时间段的xtdata调用次数（download_history_data + get_market_data）
+CALLS_PER_SEGMENT = 2
+
+# 已保存数据的第一天晚于窗口第一个交易日不超过这么多天时，视为覆盖起始日期
+# （上市首日停牌、日历近似把节假日算作交易日等）
+HEAD_TOLERANCE_DAYS = 10
+
+FORMAT_EXTENSIONS = {'parquet': 'parquet', 'csv': 'csv', 'excel': 'xlsx', 'xlsx': 'xlsx'}
+
+
+def _day_after(value: str) -> str:
+    return (datetime.strptime(value, '%Y%m%d') + timedelta(days=1)).strftime('%Y%m%d')
+
+
+@dataclass
+class StoredInfo:
+    """已保存数据的范围"""
+    first: str
+    last: str
+    rows: int
+    intraday: bool   # 时间戳带时分（分钟线/分笔），用于识别与计划周期不一致的文件
+
+
+@dataclass
+class CodePlan:
+    """单个代码的计划"""
+    code: str
+    action: str                 # full / update / skip
+    reason: str
+    start: str | None = None    # 请求窗口（已裁剪到上市期间）
+    end: str | None = None
+    segments: list[tuple[str, str]] = field(default_factory=list)
+    trading_days: int = 0       # 要请求的交易日数
+    rows: int = 0               # 预计下载的行数
+    final_rows: int = 0         # 执行后文件的行数
+    stored_last: str | None = None
+
+
+@dataclass
+class DownloadPlan:
+    """下载计划"""
+    period: str
+    dividend_type: str
+    start: str
+    end: str | None
+    years_per_segment: int
+    output_formats: list[str]
+    incremental: bool
+    created: str = field(default_factory=lambda: datetime.now().isoformat(timespec='seconds'))
+    approximate_calendar: bool = False
+    bytes_per_row: dict[str, float] = field(default_factory=dict)
+    seconds_per_segment: float | None = None
+    pause: float = 0.0
+    codes: list[CodePlan] = field(default_factory=list)
+
+    @property
+    def active(self) -> list[CodePlan]:
+        """需要请求数据的代码"""
+        return [item for item in self.codes if item.action != 'skip']
+
+    @property
+    def segments(self) -> int:
+        return sum(len(item.segments) for item in self.codes)
+
+    @property
+    def requests(self) -> int:
+        """xtdata调用次数"""
+        return self.segments * CALLS_PER_SEGMENT
+
+    @property
+    def rows(self) -> int:
+        return sum(item.rows for item in self.codes)
+
+    @property
+    def bytes(self) -> int:
+        """执行后所有写入文件的大小"""
+        per_row = sum(self.bytes_per_row.get(fmt, 0) for fmt in self.output_formats)
+        return int(sum(item.final_rows for item in self.active) * per_row)
+
+    @property
+    def estimated_seconds(self) -> float | None:
+        """按上次运行的每段耗时估算，没有运行记录时为None"""
+        if self.seconds_per_segment is None:
+            return None
+        return self.segments * self.seconds_per_segment + len(self.active) * self.pause
+
+    def to_dict(self) -> dict[str, Any]:
+        data = asdict(self)
+        data['totals'] = {
+            'codes': len(self.codes),
+            'active': len(self.active),
+            'segments': self.segments,
+            'requests': self.requests,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'estimated_seconds': self.estimated_seconds,
+        }
+        return data
+
+    def save(self, path: str) -> str:
+        """保存为JSON（先写临时文件再替换）
+
+        Returns:
+            文件路径
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        logger.info("📄 下载计划已保存到: %s", path)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> 'DownloadPlan':
+        """读取 save 保存的计划"""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        data.pop('totals', None)
+        codes = [
+            CodePlan(**{**item, 'segments': [tuple(segment) for segment in item['segments']]})
+            for item in data.pop('codes')
+        ]
+        return cls(**data, codes=codes)
+
+    def print_summary(self, top: int = 10) -> None:
+        """打印计划摘要"""
+        by_action: dict[str, int] = {}
+        for item in self.codes:
+            by_action[item.action] = by_action.get(item.action, 0) + 1
+
+        print("=" * 60)
+        print("下载计划")
+        print("=" * 60)
+        print(f"模式: {'增量' if self.incremental else '全量'} | 周期: {self.period} | "
+              f"窗口: {self.start} ~ {self.end or '今天'} | 每段 {self.years_per_segment} 年")
+        print(f"代码数: {len(self.codes)}（下载 {by_action.get('full', 0)}，"
+              f"增量 {by_action.get('update', 0)}，跳过 {by_action.get('skip', 0)}）")
+        print(f"时间段: {self.segments}（xtdata调用 {self.requests} 次）")
+        print(f"预计下载行数: {self.rows:,}")
+        size = self.bytes
+        size_text = f"{size / 1024 ** 3:.2f} GB" if size >= 1024 ** 3 else f"{size / 1024 ** 2:.1f} MB"
+        print(f"预计磁盘占用: {size_text}（{', '.join(self.output_formats)}）")
+        seconds = self.estimated_seconds
+        if seconds is not None:
+            print(f"预计耗时: {timedelta(seconds=int(seconds))}（按上次运行每段 {self.seconds_per_segment:.2f} 秒）")
+        if self.approximate_calendar:
+            print("⚠️ 交易日历缺失或不完整，部分日期按工作日估算")
+
+        largest = sorted(self.active, key=lambda item: item.rows, reverse=True)[:top]
+        if largest:
+            print(f"\n预计行数最多的 {len(largest)} 个代码:")
+            for item in largest:
+                print(f"  {item.code:15} | {item.action:6} | {len(item.segments):3} 段 | "
+                      f"{item.trading_days:6} 个交易日 | {item.rows:12,} 行")
+
+
+class DownloadPlanner:
+    """下载计划生成器
+
+    示例::
+
+        planner = DownloadPlanner(downloader, calendar)
+        plan = planner.plan(codes, start='20050101', period='1m')
+        plan.print_summary()
+        plan.save('plan.json')
+        results = execute_plan(downloader, DownloadPlan.load('plan.json'))
+    """
+
+    def __init__(self, downloader: QmtDataDownloader, calendar: TradingCalendar | None = None):
+        """初始化
+
+        Args:
+            downloader: 下载器（使用其输出目录、标的池和分段逻辑，不会连接数据源）
+            calendar: 交易日历，None时读取输出目录下的缓存（不存在则按工作日估算）
+        """
+        self.downloader = downloader
+        self.calendar = calendar if calendar is not None else TradingCalendar(
+            os.path.join(downloader.output_dir, CALENDAR_FILE))
+
+    def _path(self, code: str, extension: str = 'parquet') -> str:
+        return os.path.join(self.downloader.output_dir, f"{code}.{extension}")
+
+    def stored_info(self, code: str) -> StoredInfo | None:
+        """已保存数据的范围（只读取date列）"""
+        path = self._path(code)
+        if not os.path.exists(path):
+            return None
+        column = pq.read_table(path, columns=['date']).column('date')
+        if len(column) == 0:
+            return None
+        bounds = pc.min_max(column).as_py()
+        first, last = bounds['min'], bounds['max']
+        return StoredInfo(first.strftime('%Y%m%d'), last.strftime('%Y%m%d'), len(column),
+                          intraday=(last.hour, last.minute, last.second) != (0, 0, 0))
+
+    def bytes_per_row(self, formats: list[str], stored: dict[str, StoredInfo]) -> dict[str, float]:
+        """每种格式每行的字节数：优先按本地已有文件计算，否则使用 BYTES_PER_ROW"""
+        result = {}
+        for fmt in formats:
+            extension = FORMAT_EXTENSIONS.get(fmt.lower())
+            if extension is None:
+                continue
+            size = rows = 0
+            for code, info in stored.items():
+                path = self._path(code, extension)
+                if os.path.exists(path):
+                    size += os.path.getsize(path)
+                    rows += info.rows
+            result[fmt] = size / rows if rows else BYTES_PER_ROW.get(fmt.lower(), BYTES_PER_ROW['excel'])
+        return result
+
+    def seconds_per_segment(self) -> float | None:
+        """上次运行每个时间段的平均耗时（来自 run_metrics.json）"""
+        path = os.path.join(self.downloader.output_dir, 'run_metrics.json')
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            stages = json.load(f).get('stages', {})
+        calls = stages.get('get_market_data', {}).get('count', 0)
+        if not calls:
+            return None
+        total = sum(stages.get(stage, {}).get('total', 0) for stage in ('download_history_data', 'get_market_data'))
+        return total / calls
+
+    def plan(self, code_list: list[str], start: str = '20000101', end: str | None = None,
+             period: str = '1d', dividend_type: str = 'front', years_per_segment: int = 3,
+             output_formats: list[str] | None = None, incremental: bool = True) -> DownloadPlan:
+        """生成下载计划
+
+        Args:
+            code_list: 代码列表
+            start: 起始日期 YYYYMMDD
+            end: 结束日期 YYYYMMDD，None表示到今天（执行时的今天）
+            period: 周期
+            dividend_type: 复权方式
+            years_per_segment: 每段年数
+            output_formats: 输出格式，默认 ['parquet']
+            incremental: 已有数据且覆盖起始日期的代码只请求新数据；False时全部全量下载
+
+        Returns:
+            下载计划
+        """
+        output_formats = output_formats or ['parquet']
+        universe = self.downloader.universe
+        bars_per_day = BARS_PER_DAY.get(period, 1)
+        intraday = bars_per_day > 1
+        self.calendar.approximate = False
+        latest = latest_trading_day(calendar=self.calendar)
+        approximate = False
+
+        plan = DownloadPlan(period, dividend_type, start, end, years_per_segment, list(output_formats),
+                            incremental, pause=getattr(self.downloader, 'pause', 0.0))
+        stored: dict[str, StoredInfo] = {}
+
+        for code in dict.fromkeys(code_list):
+            window = universe.clip(code, start, end) if universe is not None else (start, end)
+            if window is None:
+                plan.codes.append(CodePlan(code, 'skip', 'not_listed'))
+                continue
+            window_start, window_end = window
+            # 只统计到最近一个已收盘的交易日
+            last_day = min(window_end or latest, latest)
+
+            info = self.stored_info(code)
+            mismatch = info is not None and info.intraday != intraday
+            if mismatch:
+                info = None  # 已有文件是其他周期，不能增量
+            elif info is not None:
+                stored[code] = info
+
+            trading_days = self.calendar.trading_days(window_start, last_day)
+            approximate = approximate or self.calendar.approximate
+            first_day = trading_days[0].astype(object) if len(trading_days) else datetime.strptime(window_start, '%Y%m%d').date()
+            covered_from = (first_day + timedelta(days=HEAD_TOLERANCE_DAYS)).strftime('%Y%m%d')
+
+            if incremental and info is not None and info.first <= covered_from:
+                if info.last >= last_day:
+                    plan.codes.append(CodePlan(code, 'skip', 'up_to_date', stored_last=info.last,
+                                               final_rows=info.rows))
+                    continue
+                # 最后一天重新请求一次，用于校验除权换算
+                days = self.calendar.count(_day_after(info.last), last_day)
+                approximate = approximate or self.calendar.approximate
+                rows = int(round((days + 1) * bars_per_day))
+                plan.codes.append(CodePlan(
+                    code, 'update', 'stale', start=info.last, end=window_end,
+                    segments=[(info.last, window_end or last_day)], trading_days=days, rows=rows,
+                    final_rows=info.rows + rows - int(round(bars_per_day)), stored_last=info.last
+                ))
+                continue
+
+            if info is not None:
+                reason = 'head_gap' if incremental else 'full_mode'
+            else:
+                reason = 'period_mismatch' if mismatch else 'no_data'
+            segments = self.downloader._generate_time_segments(window_start, window_end, years_per_segment)
+            rows = int(round(len(trading_days) * bars_per_day))
+            plan.codes.append(CodePlan(
+                code, 'full', reason, start=window_start, end=window_end, segments=segments,
+                trading_days=len(trading_days), rows=rows, final_rows=rows,
+                stored_last=info.last if info is not None else None
+            ))
+
+        plan.approximate_calendar = approximate
+        plan.bytes_per_row = self.bytes_per_row(output_formats, stored)
+        plan.seconds_per_segment = self.seconds_per_segment()
+        return plan
+
+
+def execute_plan(downloader: QmtDataDownloader, plan: DownloadPlan, retry_times: int = 3) -> dict[str, bool]:
+    """按计划下载
+
+    Args:
+        downloader: 下载器
+        plan: 下载计划
+        retry_times: 每个时间段最多尝试次数
+
+    Returns:
+        结果字典 {code: success}，不包含跳过的代码
+    """
+    by_code = {item.code: item for item in plan.codes}
+    common = dict(period=plan.period, dividend_type=plan.dividend_type, retry_times=retry_times,
+                  output_formats=plan.output_formats, years_per_segment=plan.years_per_segment)
+
+    def _run(code: str) -> bool:
+        item = by_code[code]
+        if item.action == 'update':
+            return downloader.update_stock_data(code, end_time=item.end, start_time=plan.start, **common)
+        return downloader.download_stock_data(code, start_time=item.start, end_time=item.end, **common)
+
+    return downloader.run_batch(_run, [item.code for item in plan.active], "执行计划",
+                                save_list=plan.period != 'tick')
@@ -0,0 +1,313 @@
+"""
+调用容错模块
+为xtdata调用提供单次调用超时、熔断器（连续失败后暂停并重连）和错误分类，
+让单个卡死的代码不会拖住整个批量下载，最坏运行时间可预期
+"""
+
+import time
+import random
+import logging
+import threading
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class CallTimeoutError(TimeoutError):
+    """单次调用超过截止时间"""
+
+
+class PermanentError(Exception):
+    """不可重试的错误（如代码不存在），重试也不会返回数据"""
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器多次打开仍无法恢复，批量下载应当中止"""
+
+
+class SegmentOutcome(str, Enum):
+    """单个时间段的下载结果"""
+    OK = 'ok'                # 有数据
+    EMPTY = 'empty'          # 正常返回但没有K线（如上市前），不需要重试
+    ERROR = 'error'          # 可重试的错误
+    TIMEOUT = 'timeout'      # 调用超时
+    PERMANENT = 'permanent'  # 不可重试的错误
+
+
+@dataclass
+class SegmentResult:
+    """时间段下载结果"""
+    outcome: SegmentOutcome
+    df: pd.DataFrame | None = None
+    error: BaseException | None = None
+
+
+# xtdata 表示代码不存在的错误信息，出现时视为不可重试
+# 只匹配明确的"代码不存在"：掉线时xtdata也会返回"连接无效"、"invalid session"这类信息，必须按可重试处理
+PERMANENT_MESSAGES = (
+    '代码不存在', '股票代码不存在', '合约不存在', '证券不存在',
+    'stock code not exist', 'stock not exist', 'unknown stock', 'instrument not found',
+)
+
+
+def classify_error(exc: BaseException) -> str:
+    """错误分类
+
+    只有 PermanentError、数据源不支持的操作（NotImplementedError）和 PERMANENT_MESSAGES
+    中的代码不存在错误是不可重试的；其他异常（包括掉线时xtdata返回的异常数据引起的
+    TypeError/KeyError）都按可重试处理，并计入熔断器。
+
+    Args:
+        exc: 捕获到的异常
+
+    Returns:
+        'timeout' / 'permanent' / 'retryable'
+    """
+    if isinstance(exc, CallTimeoutError):
+        return 'timeout'
+    if isinstance(exc, (PermanentError, NotImplementedError)):
+        return 'permanent'
+    message = str(exc).lower()
+    if any(keyword in message for keyword in PERMANENT_MESSAGES):
+        return 'permanent'
+    return 'retryable'
+
+
+def call_with_timeout(fn: Callable[..., Any], timeout: float | None, *args: Any,
+                      slots: threading.Semaphore | None = None, **kwargs: Any) -> Any:
+    """带截止时间的调用
+
+    在守护线程中执行 fn，超时后立即抛出 CallTimeoutError。
+    Python无法强制终止线程，超时的调用会在后台继续运行，但不会阻止进程退出。
+
+    指定 slots 时每次调用先占用一个名额，名额由执行调用的线程在调用真正结束时释放：
+    超时的调用仍在后台运行时，之后的调用（如重试）在截止时间内等待名额，等不到则同样超时，
+    不会在同一个（非线程安全的）xtdata连接上叠加并发调用。
+
+    Args:
+        fn: 要调用的函数
+        timeout: 截止时间（秒，含等待名额的时间），None表示不限，直接在当前线程调用
+        *args, **kwargs: 传给 fn 的参数
+        slots: 调用名额，None表示不限制并发
+
+    Returns:
+        fn 的返回值
+    """
+    name = getattr(fn, '__name__', fn)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    if slots is not None and not slots.acquire(timeout=timeout):
+        raise CallTimeoutError(f"调用 {name} 前 {timeout}s 内之前的调用仍未返回")
+
+    if timeout is None:
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if slots is not None:
+                slots.release()
+
+    outcome: dict[str, Any] = {}
+    done = threading.Event()
+
+    def _target() -> None:
+        try:
+            outcome['result'] = fn(*args, **kwargs)
+        except BaseException as e:
+            outcome['error'] = e
+        finally:
+            if slots is not None:
+                slots.release()
+            done.set()
+
+    worker = threading.Thread(target=_target, name=f'qmt-call-{name}', daemon=True)
+    try:
+        worker.start()
+    except BaseException:
+        if slots is not None:
+            slots.release()
+        raise
+
+    if not done.wait(max(deadline - time.monotonic(), 0.0)):
+        raise CallTimeoutError(f"调用 {name} 超过 {timeout}s 未返回")
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome.get('result')
+
+
+class CircuitBreaker:
+    """熔断器
+
+    连续失败次数达到阈值后打开：第一个发现打开的调用在锁外暂停 cooldown 秒并执行重连回调，
+    然后作为唯一的试探调用放行（半开），成功则恢复，失败则再次打开（暂停时间翻倍，不超过 max_cooldown）。
+    暂停和试探期间其他线程的调用在 before_call 中等待结果，不会一起涌入。
+    打开次数超过 max_trips 后抛出 CircuitOpenError，让批量下载提前结束。
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0, max_cooldown: float = 300.0,
+                 max_trips: int | None = None, on_open: Callable[[], None] | None = None):
+        """初始化
+
+        Args:
+            threshold: 连续失败多少次后打开
+            cooldown: 首次打开后的暂停秒数
+            max_cooldown: 暂停秒数上限
+            max_trips: 最多允许打开的次数，None表示不限
+            on_open: 暂停结束后执行的重连回调
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_trips = max_trips
+        self.on_open = on_open
+
+        self.failures = 0
+        self.trips = 0
+        self.is_open = False
+        # 半开：已经放行了一次试探调用，等待它的结果
+        self.half_open = False
+        self._recovering = False
+        self._current_cooldown = cooldown
+        self._lock = threading.Lock()
+        self._state_changed = threading.Condition(self._lock)
+
+    def before_call(self) -> None:
+        """调用前检查
+
+        熔断器关闭时直接返回；打开时第一个调用负责暂停、重连并作为试探调用返回，
+        其他调用等待试探结果（恢复则放行，再次打开则由其中一个调用负责下一轮）。
+        """
+        with self._lock:
+            while True:
+                if self._recovering or self.half_open:
+                    self._state_changed.wait()
+                    continue
+                if not self.is_open:
+                    return
+                if self.max_trips is not None and self.trips > self.max_trips:
+                    raise CircuitOpenError(f"熔断器已打开 {self.trips} 次，放弃本次批量下载")
+                self._recovering = True
+                cooldown = self._current_cooldown
+                break
+
+        # 暂停和重连在锁外进行，其他线程的 record_success/record_failure 不会被阻塞
+        try:
+            logger.warning("🔌 连续失败 %d 次，暂停 %.1fs 后重连", self.failures, cooldown)
+            time.sleep(cooldown)
+            if self.on_open is not None:
+                try:
+                    self.on_open()
+                except Exception as e:
+                    logger.error("❌ 重连失败: %s", e)
+        finally:
+            with self._lock:
+                # 半开：本次调用作为试探，失败会在 record_failure 中重新打开
+                self._recovering = False
+                self.is_open = False
+                self.half_open = True
+                self.failures = self.threshold - 1
+                self._current_cooldown = min(self._current_cooldown * 2, self.max_cooldown)
+                self._state_changed.notify_all()
+
+    def record_success(self) -> None:
+        """记录一次成功调用（数据源正常响应）"""
+        with self._lock:
+            self.failures = 0
+            self.is_open = False
+            self.half_open = False
+            self._current_cooldown = self.cooldown
+            self._state_changed.notify_all()
+
+    def record_failure(self) -> None:
+        """记录一次可重试的失败（超时/连接错误）"""
+        with self._lock:
+            self.failures += 1
+            if self.half_open or (not self.is_open and self.failures >= self.threshold):
+                self.is_open = True
+                self.half_open = False
+                self.trips += 1
+                self._state_changed.notify_all()
+
+
+class RetryPolicy:
+    """重试策略
+
+    指数退避 + 随机抖动，并可设置整次运行共享的重试预算。
+    只有 ERROR / TIMEOUT 会重试，EMPTY（时间段内确实没有数据）和 PERMANENT 不重试。
+    """
+
+    RETRYABLE = (SegmentOutcome.ERROR, SegmentOutcome.TIMEOUT)
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1.0, multiplier: float = 2.0,
+                 max_delay: float = 30.0, jitter: float = 0.5, budget: int | None = None,
+                 seed: int | None = None):
+        """初始化
+
+        Args:
+            max_attempts: 每个时间段最多尝试次数（含第一次）
+            base_delay: 第一次重试前的等待秒数
+            multiplier: 每次重试等待时间的倍数
+            max_delay: 等待秒数上限
+            jitter: 抖动比例，实际等待时间在 [delay*(1-jitter), delay] 之间均匀分布，
+                    避免多个进程/线程同时重试
+            budget: 整次运行最多重试多少次，None表示不限
+            seed: 随机种子（测试用）
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.multiplier = multiplier
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.budget = budget
+        self.retries_used = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._budget_warned = False
+
+    @property
+    def budget_remaining(self) -> int | None:
+        """剩余重试次数，None表示不限"""
+        if self.budget is None:
+            return None
+        return max(self.budget - self.retries_used, 0)
+
+    def should_retry(self, outcome: SegmentOutcome, attempt: int,
+                     max_attempts: int | None = None) -> bool:
+        """判断是否重试，需要重试时占用一次预算
+
+        Args:
+            outcome: 本次结果
+            attempt: 本次是第几次尝试（从0开始）
+            max_attempts: 覆盖默认的最多尝试次数
+
+        Returns:
+            是否重试
+        """
+        if outcome not in self.RETRYABLE:
+            return False
+        if attempt + 1 >= (max_attempts if max_attempts is not None else self.max_attempts):
+            return False
+
+        with self._lock:
+            if self.budget is not None and self.retries_used >= self.budget:
+                if not self._budget_warned:
+                    logger.warning("⚠️ 本次运行的重试预算（%d 次）已用完，之后不再重试", self.budget)
+                    self._budget_warned = True
+                return False
+            self.retries_used += 1
+        return True
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次尝试失败后的等待秒数（从0开始）"""
+        delay = min(self.base_delay * (self.multiplier ** attempt), self.max_delay)
+        with self._lock:
+            factor = self._random.uniform(1 - self.jitter, 1)
+        return delay * factor
+
+    def reset(self) -> None:
+        """重置重试预算（开始新的一次运行）"""
+        with self._lock:
+            self.retries_used = 0
+            self._budget_warned = False
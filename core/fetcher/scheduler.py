@@ -0,0 +1,272 @@
+"""
+下载调度模块
+按数据陈旧程度、用户指定的优先级和预计下载量排序代码，而不是按配置顺序逐个下载；
+设置截止时间后，预计来不及完成的代码推迟到下次运行，并生成推迟报告
+
+排序规则（依次比较）：
+1. 已是最新的代码排在最后（全量模式下仍会重新下载，但价值最低）
+2. 优先级档位小的在前（0最高，未配置的代码为 DEFAULT_TIER）
+3. 落后的交易日多的在前，本地没有数据的视为最陈旧
+4. 预计K线数少的在前
+"""
+
+import os
+import json
+import time
+import logging
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from typing import Any
+
+import numpy as np
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from core.fetcher.downloader import QmtDataDownloader
+from core.fetcher.sharding import BARS_PER_DAY, estimate_bars
+from core.fetcher.trading_calendar import TradingCalendar
+
+logger = logging.getLogger(__name__)
+
+# 未配置优先级的代码所在档位
+DEFAULT_TIER = 2
+
+# 收盘后多久认为当天的数据可以下载
+MARKET_CLOSE = (15, 0)
+
+# 每个代码的固定开销折算成的K线数（预热缓存、写文件、代码间暂停等）
+OVERHEAD_BARS = 250
+
+DEFERRED_REPORT = 'deferred.json'
+
+
+def latest_trading_day(now: datetime | None = None, calendar: TradingCalendar | None = None) -> str:
+    """最近一个应当已有数据的交易日
+
+    有交易日历时按日历计算，否则只排除周末（节假日会让所有代码看起来都多落后一天，
+    不影响相互之间的排序）。
+
+    Args:
+        now: 当前时间，默认现在
+        calendar: 交易日历
+
+    Returns:
+        YYYYMMDD
+    """
+    now = now or datetime.now()
+    day = now.date()
+    if (now.hour, now.minute) < MARKET_CLOSE:
+        day -= timedelta(days=1)
+    if calendar is not None:
+        latest = calendar.latest(datetime.combine(day, datetime.min.time()))
+        if latest is not None:
+            return latest
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day.strftime('%Y%m%d')
+
+
+def stored_last_date(path: str) -> str | None:
+    """已保存文件最后一根K线的日期（只读取date列）
+
+    Returns:
+        YYYYMMDD，文件不存在或为空时返回None
+    """
+    if not os.path.exists(path):
+        return None
+    column = pq.read_table(path, columns=['date']).column('date')
+    if len(column) == 0:
+        return None
+    return pc.max(column).as_py().strftime('%Y%m%d')
+
+
+def parse_deadline(value: str, now: datetime | None = None) -> datetime:
+    """解析截止时间
+
+    Args:
+        value: 'HH:MM'（今天，已过则为明天）、分钟数（如 '90'）或ISO时间
+        now: 当前时间，默认现在
+
+    Returns:
+        截止时间
+    """
+    now = now or datetime.now()
+    value = value.strip()
+    if value.isdigit():
+        return now + timedelta(minutes=int(value))
+    if len(value) <= 5 and ':' in value:
+        hour, minute = (int(v) for v in value.split(':'))
+        deadline = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        return deadline if deadline > now else deadline + timedelta(days=1)
+    return datetime.fromisoformat(value)
+
+
+@dataclass
+class ScheduledTask:
+    """一个代码的调度信息"""
+    code: str
+    tier: int
+    last_date: str | None    # 本地最后一根K线的日期，None表示没有数据
+    stale_days: int | None   # 落后的交易日数，None表示没有数据
+    cost: int                # 预计要下载的K线数
+
+    @property
+    def fresh(self) -> bool:
+        return self.stale_days == 0
+
+    def sort_key(self) -> tuple[Any, ...]:
+        stale = float('inf') if self.stale_days is None else self.stale_days
+        return (self.fresh, self.tier, -stale, self.cost)
+
+
+class DownloadScheduler:
+    """下载调度器
+
+    示例::
+
+        scheduler = DownloadScheduler(downloader, priorities={'510300.SH': 0})
+        results = scheduler.run(codes, deadline=parse_deadline('06:30'), start_time='20200101')
+        # 没来得及下载的代码见 output/deferred.json
+    """
+
+    def __init__(self, downloader: QmtDataDownloader, priorities: dict[str, int] | None = None,
+                 default_tier: int = DEFAULT_TIER, calendar: TradingCalendar | None = None):
+        """初始化
+
+        Args:
+            downloader: 下载器
+            priorities: {代码: 优先级档位}，0最高
+            default_tier: 未配置代码的档位
+            calendar: 交易日历，None表示按工作日计算落后天数
+        """
+        self.downloader = downloader
+        self.calendar = calendar
+        self.priorities = priorities or {}
+        self.default_tier = default_tier
+        self.report_file = os.path.join(downloader.output_dir, DEFERRED_REPORT)
+
+    def plan(self, code_list: list[str], start_time: str = '20000101', end_time: str | None = None,
+             period: str = '1d', incremental: bool = False) -> list[ScheduledTask]:
+        """计算每个代码的调度信息并排序
+
+        Args:
+            code_list: 代码列表
+            start_time: 全量下载的起始时间
+            end_time: 结束时间，默认最近一个交易日
+            period: 周期
+            incremental: 是否增量更新（决定预计下载量只算落后的部分还是整个窗口）
+
+        Returns:
+            按执行顺序排列的任务
+        """
+        latest = min(end_time or '99999999', latest_trading_day(calendar=self.calendar))
+        universe = self.downloader.universe
+        bars_per_day = BARS_PER_DAY.get(period, 1)
+
+        tasks = []
+        for code in dict.fromkeys(code_list):
+            last_date = stored_last_date(os.path.join(self.downloader.output_dir, f"{code}.parquet"))
+            list_date, delist_date = universe.listing_window(code) if universe is not None else (None, None)
+            target = min(latest, delist_date) if delist_date else latest
+
+            if last_date is None:
+                stale_days = None
+            elif self.calendar is not None:
+                next_day = (datetime.strptime(last_date, '%Y%m%d') + timedelta(days=1)).strftime('%Y%m%d')
+                stale_days = self.calendar.count(next_day, target)
+            else:
+                stale_days = max(0, int(np.busday_count(
+                    np.datetime64(f"{last_date[:4]}-{last_date[4:6]}-{last_date[6:]}") + 1,
+                    np.datetime64(f"{target[:4]}-{target[4:6]}-{target[6:]}") + 1)))
+
+            if incremental and last_date is not None:
+                cost = int(stale_days * bars_per_day) + 1  # type: ignore[operator]
+            else:
+                cost = estimate_bars(start_time, end_time, period, list_date, delist_date)
+
+            tasks.append(ScheduledTask(code, self.priorities.get(code, self.default_tier),
+                                       last_date, stale_days, cost))
+
+        tasks.sort(key=ScheduledTask.sort_key)
+        return tasks
+
+    def run(self, code_list: list[str], deadline: datetime | None = None,
+            incremental: bool = False, **kwargs: Any) -> dict[str, bool]:
+        """按计划顺序下载，预计在截止时间前完成不了的代码推迟
+
+        每个代码的预计耗时 = 每K线平均耗时 ×（预计K线数 + OVERHEAD_BARS），
+        平均耗时由本次运行已完成的代码实时估算（第一个代码总会执行）。
+        放不下的代码跳过后继续尝试后面更小的代码，截止时间一到立即停止。
+
+        Args:
+            code_list: 代码列表
+            deadline: 截止时间，None表示不限
+            incremental: True时调用 update_batch，否则 download_batch
+            **kwargs: 传递给 download_stock_data / update_stock_data 的参数
+
+        Returns:
+            结果字典 {code: success}，不包含推迟的代码
+        """
+        tasks = self.plan(code_list, kwargs.get('start_time', '20000101'), kwargs.get('end_time'),
+                          kwargs.get('period', '1d'), incremental)
+        by_code = {task.code: task for task in tasks}
+        logger.info("🗓️ 调度 %d 个标的：%d 个无本地数据，%d 个已是最新",
+                    len(tasks), sum(t.last_date is None for t in tasks), sum(t.fresh for t in tasks))
+
+        deferred: list[dict[str, Any]] = []
+        # 上一个代码的开始时间和成本单位；已完成代码的累计耗时和成本单位（含代码间暂停）
+        state: dict[str, Any] = {'started': None, 'units': 0, 'seconds': 0.0, 'done_units': 0}
+
+        def admit(code: str) -> bool:
+            now = time.time()
+            if state['started'] is not None:
+                state['seconds'] += now - state['started']
+                state['done_units'] += state['units']
+                state['started'] = None
+
+            task = by_code[code]
+            units = task.cost + OVERHEAD_BARS
+            if deadline is not None:
+                remaining = deadline.timestamp() - now
+                estimate = (state['seconds'] / state['done_units'] * units) if state['done_units'] else 0.0
+                if remaining <= 0 or estimate > remaining:
+                    deferred.append({**asdict(task),
+                                     'reason': 'deadline' if remaining <= 0 else 'insufficient_time',
+                                     'estimated_seconds': round(estimate, 1)})
+                    return False
+
+            state['started'] = now
+            state['units'] = units
+            return True
+
+        fn = self.downloader.update_stock_data if incremental else self.downloader.download_stock_data
+        results = self.downloader.run_batch(fn, [task.code for task in tasks],
+                                            "调度下载", kwargs, admit=admit)
+
+        self.downloader.metrics.incr('codes_deferred', len(deferred))
+        self.write_report(deferred, deadline, len(results))
+        if deferred:
+            logger.warning("⏰ 截止时间 %s 前未完成 %d 个标的，已推迟到下次运行（见 %s）",
+                           deadline, len(deferred), self.report_file)
+        return results
+
+    def write_report(self, deferred: list[dict[str, Any]], deadline: datetime | None,
+                     completed: int) -> None:
+        """写推迟报告（先写临时文件再替换）
+
+        Args:
+            deferred: 推迟的任务
+            deadline: 截止时间
+            completed: 已执行的代码数
+        """
+        report = {
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'deadline': deadline.isoformat(timespec='seconds') if deadline else None,
+            'completed': completed,
+            'deferred_count': len(deferred),
+            'deferred': deferred,
+        }
+        tmp_path = f"{self.report_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.report_file)
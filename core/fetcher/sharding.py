@@ -0,0 +1,319 @@
+"""
+多进程分片下载
+把代码列表拆分到多个工作进程，每个进程连接各自的MiniQMT实例（不同端口），
+各进程只写自己负责的代码文件，股票列表等共享文件由主进程统一生成，避免写冲突
+"""
+
+import os
+import time
+import zlib
+import queue
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable
+
+from tqdm import tqdm
+
+from core.metrics import MetricsCollector, RunMetrics
+from core.memory import MemoryGuard
+from core.fetcher.downloader import QmtDataDownloader
+from core.fetcher.source import DataSource, QmtSource
+from core.fetcher.universe import Universe
+from core.fetcher.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+# 每个交易日的K线数量（估算下载量用）
+BARS_PER_DAY = {
+    'tick': 4800,
+    '1m': 240,
+    '5m': 48,
+    '15m': 16,
+    '30m': 8,
+    '1h': 4,
+    '60m': 4,
+    '1d': 1,
+    '1w': 1 / 5,
+    '1mon': 1 / 21,
+}
+
+# 每个自然日约有多少个交易日
+TRADING_DAYS_RATIO = 243 / 365
+
+
+def estimate_bars(start_time: str, end_time: str | None = None, period: str = '1d',
+                  list_date: str | None = None, delist_date: str | None = None) -> int:
+    """按自然日跨度粗略估算K线数量
+
+    Args:
+        start_time: 起始时间 YYYYMMDD
+        end_time: 结束时间 YYYYMMDD，默认今天
+        period: 周期
+        list_date: 上市日期，晚于 start_time 时从上市日开始算
+        delist_date: 退市日期，早于 end_time 时算到退市日
+
+    Returns:
+        估算的K线数量
+    """
+    start = max(start_time[:8], list_date or '')
+    end = (end_time or datetime.now().strftime('%Y%m%d'))[:8]
+    if delist_date and delist_date < end:
+        end = delist_date
+    if start > end:
+        return 0
+    days = (datetime.strptime(end, '%Y%m%d') - datetime.strptime(start, '%Y%m%d')).days + 1
+    return int(days * TRADING_DAYS_RATIO * BARS_PER_DAY.get(period, 1)) + 1
+
+
+def shard_codes(code_list: list[str], n_shards: int, strategy: str = 'hash',
+                costs: dict[str, float] | None = None) -> list[list[str]]:
+    """把代码列表拆分成若干分片
+
+    Args:
+        code_list: 代码列表
+        n_shards: 分片数
+        strategy: 'hash' 按代码哈希（同一代码总在同一分片，结果稳定）；
+                  'size' 按预计K线数做贪心均衡（最大的先分给当前最轻的分片）
+        costs: 每个代码的预计成本（strategy='size' 时使用，缺省视为1）
+
+    Returns:
+        分片列表，每个分片内保持原有顺序
+    """
+    if n_shards < 1:
+        raise ValueError("n_shards 必须大于0")
+
+    if strategy == 'hash':
+        shards: list[list[str]] = [[] for _ in range(n_shards)]
+        for code in code_list:
+            shards[zlib.crc32(code.encode('utf-8')) % n_shards].append(code)
+        return shards
+
+    if strategy == 'size':
+        costs = costs or {}
+        loads = [0.0] * n_shards
+        assignment: dict[str, int] = {}
+        for code in sorted(code_list, key=lambda c: costs.get(c, 1), reverse=True):
+            target = loads.index(min(loads))
+            assignment[code] = target
+            loads[target] += costs.get(code, 1)
+        shards = [[] for _ in range(n_shards)]
+        for code in code_list:
+            shards[assignment[code]].append(code)
+        return shards
+
+    raise ValueError(f"不支持的分片策略: {strategy}")
+
+
+def parse_endpoint(endpoint: int | str) -> tuple[str, int]:
+    """解析MiniQMT地址，支持 58610 / '58610' / '127.0.0.1:58610'"""
+    if isinstance(endpoint, int):
+        return '', endpoint
+    if ':' in endpoint:
+        ip, port = endpoint.rsplit(':', 1)
+        return ip, int(port)
+    return '', int(endpoint)
+
+
+def qmt_source_factory(endpoint: int | str) -> DataSource:
+    """默认的数据源工厂：每个工作进程连接到自己的MiniQMT端口"""
+    ip, port = parse_endpoint(endpoint)
+    return QmtSource(ip=ip, port=port)
+
+
+def _run_shard(shard_index: int, endpoint: int | str, codes: list[str], output_dir: str,
+               source_factory: Callable[[int | str], DataSource], universe_file: str | None,
+               log_file: str | None, pause: float, progress_queue: Any,
+               call_timeout: float | None, breaker_options: dict[str, Any] | None,
+               retry_options: dict[str, Any] | None, memory_limit: int | None,
+               kwargs: dict[str, Any]) -> tuple[dict[str, bool], RunMetrics]:
+    """工作进程入口：用自己的数据源下载分到的代码"""
+    from core.logging_config import setup_logging
+
+    if log_file:
+        base, ext = os.path.splitext(log_file)
+        setup_logging(quiet=True, log_file=f"{base}.shard{shard_index}{ext}")
+
+    metrics = RunMetrics()
+    # 标的池只读，刷新由主进程负责
+    universe = Universe(universe_file) if universe_file and os.path.exists(universe_file) else None
+    downloader = QmtDataDownloader(
+        output_dir, metrics=metrics, quiet=True,
+        source=source_factory(endpoint), universe=universe,
+        call_timeout=call_timeout,
+        breaker=CircuitBreaker(**breaker_options) if breaker_options is not None else None,
+        retry_policy=RetryPolicy(**(retry_options or {})),
+        memory_guard=MemoryGuard(memory_limit, metrics=metrics) if memory_limit else None
+    )
+
+    results = {}
+    for code in codes:
+        try:
+            success = downloader.download_stock_data(code, **kwargs)
+        except CircuitOpenError as e:
+            # 本进程的MiniQMT无法恢复，剩余代码记为失败
+            logging.getLogger(__name__).error("❌ 分片 %d: %s", shard_index, e)
+            for rest in codes[len(results):]:
+                results[rest] = False
+                progress_queue.put((shard_index, rest, False))
+            break
+        results[code] = success
+        metrics.incr('codes_succeeded' if success else 'codes_failed', shard=str(shard_index))
+        progress_queue.put((shard_index, code, success))
+        if pause > 0:
+            time.sleep(pause)
+
+    return results, metrics
+
+
+class ShardedDownloader:
+    """多进程分片下载器
+
+    示例::
+
+        sharded = ShardedDownloader(endpoints=[58610, 58611, 58612], output_dir='output')
+        results = sharded.download_batch(codes, start_time='20200101')
+    """
+
+    def __init__(self, endpoints: list[int | str], output_dir: str | None = None,
+                 source_factory: Callable[[int | str], DataSource] = qmt_source_factory,
+                 universe: Universe | None = None,
+                 metrics: MetricsCollector | None = None,
+                 log_file: str | None = None,
+                 pause: float = 0.5,
+                 call_timeout: float | None = None,
+                 breaker_options: dict[str, Any] | None = None,
+                 retry_options: dict[str, Any] | None = None,
+                 memory_limit: int | None = None):
+        """初始化
+
+        Args:
+            endpoints: 每个工作进程使用的MiniQMT地址（端口或 ip:port），进程数等于地址数
+            output_dir: 输出目录
+            source_factory: 根据地址创建数据源的函数，必须可以被pickle（模块级函数），
+                            测试时可传入返回假数据源的工厂
+            universe: 标的池，用于裁剪下载窗口和按预计K线数均衡分片
+            metrics: 指标采集器，工作进程的指标会合并进来（需为 RunMetrics）
+            log_file: 工作进程的滚动日志文件，每个分片一个文件
+            pause: 每个代码之间的暂停秒数（每个进程各自计算）
+            call_timeout: 单次xtdata调用的截止时间（秒）
+            breaker_options: 每个工作进程熔断器的参数（见 CircuitBreaker），None表示不使用
+            retry_options: 每个工作进程重试策略的参数（见 RetryPolicy），重试预算按进程计算
+            memory_limit: 所有工作进程合计的内存上限（字节），平分给每个进程，
+                          进程接近自己的份额时改为流式写入
+        """
+        if not endpoints:
+            raise ValueError("endpoints 不能为空")
+
+        self.endpoints = list(endpoints)
+        self.source_factory = source_factory
+        self.universe = universe
+        self.metrics = metrics if metrics is not None else MetricsCollector()
+        self.log_file = log_file
+        self.pause = pause
+        self.call_timeout = call_timeout
+        self.breaker_options = breaker_options
+        self.retry_options = retry_options
+        self.memory_limit = memory_limit
+        # 主进程只用它来确定输出目录、生成股票列表，不连接QMT
+        self._local = QmtDataDownloader(output_dir, metrics=self.metrics, quiet=True,
+                                        source=source_factory(self.endpoints[0]))
+
+    @property
+    def output_dir(self) -> str:
+        return self._local.output_dir
+
+    def plan_shards(self, code_list: list[str], strategy: str = 'size',
+                    start_time: str = '20000101', end_time: str | None = None,
+                    period: str = '1d') -> list[list[str]]:
+        """按策略拆分代码列表
+
+        Args:
+            code_list: 代码列表
+            strategy: 'hash' 或 'size'
+            start_time: 起始时间（估算K线数用）
+            end_time: 结束时间
+            period: 周期
+
+        Returns:
+            分片列表
+        """
+        costs = None
+        if strategy == 'size':
+            costs = {}
+            for code in code_list:
+                list_date, delist_date = (self.universe.listing_window(code)
+                                          if self.universe is not None else (None, None))
+                costs[code] = estimate_bars(start_time, end_time, period, list_date, delist_date)
+        return shard_codes(code_list, len(self.endpoints), strategy, costs)
+
+    def download_batch(self, code_list: list[str], strategy: str = 'size',
+                       **kwargs: Any) -> dict[str, bool]:
+        """分片批量下载
+
+        Args:
+            code_list: 代码列表
+            strategy: 分片策略 'hash' 或 'size'
+            **kwargs: 传递给 download_stock_data 的参数
+
+        Returns:
+            下载结果字典 {code: success}，顺序与 code_list 一致
+        """
+        shards = self.plan_shards(
+            code_list, strategy,
+            start_time=kwargs.get('start_time', '20000101'),
+            end_time=kwargs.get('end_time'),
+            period=kwargs.get('period', '1d'),
+        )
+        logger.info("🚀 开始分片下载 %d 个标的（%d 个进程: %s）",
+                    len(code_list), len(shards), ', '.join(str(len(s)) for s in shards))
+
+        universe_file = self.universe.cache_file if self.universe is not None else None
+        per_process_limit = self.memory_limit // len(shards) if self.memory_limit else None
+        ctx = multiprocessing.get_context('spawn')
+        finished: dict[str, bool] = {}
+
+        with ctx.Manager() as manager, \
+                ProcessPoolExecutor(max_workers=len(shards), mp_context=ctx) as pool:
+            progress_queue = manager.Queue()
+            futures = {
+                i: pool.submit(_run_shard, i, self.endpoints[i], shard, self.output_dir,
+                               self.source_factory, universe_file, self.log_file, self.pause,
+                               progress_queue, self.call_timeout, self.breaker_options,
+                               self.retry_options, per_process_limit, kwargs)
+                for i, shard in enumerate(shards) if shard
+            }
+
+            with tqdm(total=len(code_list), desc="分片下载", unit="code") as progress:
+                while len(finished) < len(code_list):
+                    try:
+                        _, code, success = progress_queue.get(timeout=0.5)
+                    except queue.Empty:
+                        # 有进程异常退出时不再等待
+                        if all(f.done() for f in futures.values()):
+                            break
+                        continue
+                    finished[code] = success
+                    progress.update(1)
+                    self.metrics.gauge('queue_depth', len(code_list) - len(finished))
+
+            for i, future in futures.items():
+                try:
+                    shard_results, shard_metrics = future.result()
+                except Exception as e:
+                    logger.error("❌ 分片 %d 异常退出: %s", i, e)
+                    continue
+                finished.update(shard_results)
+                if isinstance(self.metrics, RunMetrics):
+                    self.metrics.merge(shard_metrics)
+
+        results = {code: finished.get(code, False) for code in code_list}
+        success_count = sum(1 for v in results.values() if v)
+        logger.info("📈 分片下载完成: %d/%d 成功", success_count, len(code_list))
+
+        # 共享文件只由主进程写
+        if success_count > 0:
+            self._local.save_stock_list(results)
+
+        return results
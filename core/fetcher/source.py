@@ -0,0 +1,531 @@
+"""
+数据源接口
+QmtDataDownloader 通过 DataSource 获取数据，QMT只是其中一种实现：
+- QmtSource: 通过xtquant.xtdata从MiniQMT获取
+- ReplaySource: 从本地数据目录或录制的会话文件回放，不需要MiniQMT
+- RecordingSource: 包装任意数据源，把读到的K线录制成会话文件
+"""
+
+import os
+import logging
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+from core.fetcher.adjust import normalize_dividends
+from core.storage.summary import SUMMARY_FILE
+
+logger = logging.getLogger(__name__)
+
+# 标准K线字段
+BAR_FIELDS = ['open', 'high', 'low', 'close', 'volume', 'amount']
+
+# 实时行情回调: callback(code, tick)，tick为
+# {'time': 毫秒时间戳, 'price': 最新价, 'volume': 当日累计成交量, 'amount': 当日累计成交额}
+TickCallback = Callable[[str, dict[str, Any]], None]
+
+
+def import_xtdata():
+    """延迟导入xtquant.xtdata
+
+    只有真正下载时才导入（导入即连接MiniQMT），
+    读取数据、验证、回测等场景不依赖xtquant。
+
+    Returns:
+        xtquant.xtdata 模块
+    """
+    try:
+        from xtquant import xtdata
+    except ImportError as e:
+        raise ImportError(
+            "无法导入xtquant，请先运行: uv run copy_qmt_to_venv.py"
+        ) from e
+    return xtdata
+
+
+def parse_time(value: str | None, end: bool = False) -> pd.Timestamp | None:
+    """解析QMT风格的时间字符串（YYYYMMDD 或 YYYYMMDDHHMMSS）
+
+    Args:
+        value: 时间字符串，空值表示不限
+        end: 是否作为区间结束时间（只有日期时取当天最后一刻）
+
+    Returns:
+        Timestamp或None
+    """
+    if not value:
+        return None
+    if len(value) == 8:
+        ts = pd.Timestamp(datetime.strptime(value, '%Y%m%d'))
+        if end:
+            ts = ts + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+        return ts
+    return pd.Timestamp(datetime.strptime(value, '%Y%m%d%H%M%S'))
+
+
+def slice_bars(df: pd.DataFrame, start_time: str | None, end_time: str | None) -> pd.DataFrame:
+    """按QMT风格的起止时间截取已按日期排序的K线（两端都包含）"""
+    start = parse_time(start_time)
+    end = parse_time(end_time, end=True)
+    return df.loc[start:end]
+
+
+class DataSource(ABC):
+    """数据源接口
+
+    对应QMT的两步下载流程：先预热本地缓存，再读取K线。
+    """
+
+    @abstractmethod
+    def warm_cache(self, code: str, period: str, start_time: str, end_time: str) -> None:
+        """把指定时间段的数据预热到本地缓存（对应 download_history_data）
+
+        Args:
+            code: 股票/ETF代码
+            period: 周期
+            start_time: 起始时间
+            end_time: 结束时间
+        """
+
+    @abstractmethod
+    def read_bars(self, code: str, period: str, start_time: str, end_time: str,
+                  dividend_type: str = 'front') -> pd.DataFrame | None:
+        """读取K线（对应 get_market_data）
+
+        Args:
+            code: 股票/ETF代码
+            period: 周期
+            start_time: 起始时间
+            end_time: 结束时间
+            dividend_type: 复权方式
+
+        Returns:
+            以date为索引、包含BAR_FIELDS的DataFrame；
+            数据源没有该代码的数据时返回None，时间段内没有K线时返回空DataFrame
+        """
+
+    @abstractmethod
+    def list_instruments(self, sector: str) -> list[str]:
+        """列出板块内的全部代码
+
+        Args:
+            sector: 板块名，如 '沪深A股'、'沪深ETF'、'沪深指数'
+
+        Returns:
+            代码列表
+        """
+
+    def reconnect(self) -> None:
+        """重新连接数据源（熔断器打开后调用），默认无需重连"""
+        return None
+
+    def get_instrument_info(self, code: str) -> dict[str, str | None] | None:
+        """获取合约基础信息
+
+        Args:
+            code: 股票/ETF代码
+
+        Returns:
+            {'name': 名称, 'list_date': 上市日期YYYYMMDD, 'delist_date': 退市日期YYYYMMDD或None}，
+            数据源不提供时返回None
+        """
+        return None
+
+    def get_dividends(self, code: str, start_time: str, end_time: str) -> pd.DataFrame | None:
+        """获取分红送转（除权除息）数据
+
+        Args:
+            code: 股票/ETF代码
+            start_time: 起始时间
+            end_time: 结束时间
+
+        Returns:
+            以除权日为索引的DataFrame（列见 core.fetcher.adjust.DIVIDEND_COLUMNS），
+            数据源不提供时返回None
+        """
+        return None
+
+    def get_trading_dates(self, market: str, start_time: str, end_time: str) -> list[str] | None:
+        """获取交易日历
+
+        Args:
+            market: 市场，如 'SH' / 'SZ'
+            start_time: 起始日期 YYYYMMDD
+            end_time: 结束日期 YYYYMMDD
+
+        Returns:
+            升序的交易日列表（YYYYMMDD），数据源不提供时返回None
+        """
+        return None
+
+    def read_ticks(self, code: str, start_time: str, end_time: str) -> pd.DataFrame | None:
+        """读取历史分笔数据（需先 warm_cache(code, 'tick', ...)）
+
+        Args:
+            code: 股票/ETF代码
+            start_time: 起始时间
+            end_time: 结束时间
+
+        Returns:
+            以时间（北京时间）为索引的DataFrame，列见 core.storage.tick_store.TICK_FIELDS；
+            没有数据时返回None
+        """
+        raise NotImplementedError(f"{type(self).__name__} 不支持分笔数据")
+
+    def subscribe_ticks(self, code_list: list[str], callback: TickCallback) -> Any:
+        """订阅实时分笔行情
+
+        Args:
+            code_list: 代码列表
+            callback: 每收到一笔行情调用一次（可能在数据源的线程中调用）
+
+        Returns:
+            订阅句柄，传给 unsubscribe_ticks 取消订阅
+        """
+        raise NotImplementedError(f"{type(self).__name__} 不支持实时行情订阅")
+
+    def unsubscribe_ticks(self, handle: Any) -> None:
+        """取消订阅"""
+        raise NotImplementedError(f"{type(self).__name__} 不支持实时行情订阅")
+
+
+class QmtSource(DataSource):
+    """MiniQMT数据源（xtquant.xtdata）"""
+
+    def __init__(self, ip: str = '', port: int | None = None):
+        """初始化
+
+        Args:
+            ip: MiniQMT地址，默认本机
+            port: MiniQMT端口，None表示使用xtdata默认连接
+        """
+        self.ip = ip
+        self.port = port
+        self._xtdata = None
+
+    @property
+    def xtdata(self):
+        """首次使用时才导入xtdata，指定端口时连接到对应的MiniQMT"""
+        if self._xtdata is None:
+            xtdata = import_xtdata()
+            if self.port is not None:
+                xtdata.connect(ip=self.ip, port=self.port)
+            self._xtdata = xtdata
+        return self._xtdata
+
+    def reconnect(self) -> None:
+        logger.info("🔌 重新连接MiniQMT %s:%s", self.ip or '127.0.0.1', self.port or '默认端口')
+        self.xtdata.reconnect(ip=self.ip, port=self.port)
+
+    def warm_cache(self, code: str, period: str, start_time: str, end_time: str) -> None:
+        # 这是QMT的必要步骤，必须先下载数据
+        self.xtdata.download_history_data(
+            stock_code=code,
+            period=period,
+            start_time=start_time,
+            end_time=end_time
+        )
+
+    def read_bars(self, code: str, period: str, start_time: str, end_time: str,
+                  dividend_type: str = 'front') -> pd.DataFrame | None:
+        data_dict = self.xtdata.get_market_data(
+            field_list=BAR_FIELDS,
+            stock_list=[code],
+            period=period,
+            start_time=start_time,
+            end_time=end_time,
+            dividend_type=dividend_type,
+            fill_data=False  # 不填充数据
+        )
+
+        # 检查是否有数据
+        if not data_dict or 'close' not in data_dict:
+            return None
+
+        # 将数据字典转换为DataFrame
+        # 数据格式: {field: DataFrame(index=codes, columns=times)}
+        df_list = []
+        for field in BAR_FIELDS:
+            if field in data_dict:
+                # 转置使时间成为index
+                df_field = data_dict[field].T
+                # 重命名列
+                df_field.columns = [field]
+                df_list.append(df_field)
+
+        if not df_list:
+            return None
+
+        # 合并所有字段
+        df = pd.concat(df_list, axis=1)
+
+        # 确保索引是datetime类型
+        df.index = pd.to_datetime(df.index)
+        df.index.name = 'date'
+
+        return df
+
+    def list_instruments(self, sector: str) -> list[str]:
+        return list(self.xtdata.get_stock_list_in_sector(sector))
+
+    def get_instrument_info(self, code: str) -> dict[str, str | None] | None:
+        detail = self.xtdata.get_instrument_detail(code)
+        if not detail:
+            return None
+
+        def _date(value) -> str | None:
+            # QMT用 0 / 99999999 表示未设置或长期有效
+            value = str(value or '').strip()
+            if len(value) != 8 or value in ('00000000', '99999999'):
+                return None
+            return value
+
+        return {
+            'name': detail.get('InstrumentName'),
+            'list_date': _date(detail.get('OpenDate')),
+            'delist_date': _date(detail.get('ExpireDate')),
+        }
+
+    def get_dividends(self, code: str, start_time: str, end_time: str) -> pd.DataFrame | None:
+        return normalize_dividends(self.xtdata.get_divid_factors(code, start_time, end_time))
+
+    def get_trading_dates(self, market: str, start_time: str, end_time: str) -> list[str] | None:
+        # 返回毫秒时间戳（北京时间零点）
+        timestamps = self.xtdata.get_trading_dates(market, start_time, end_time)
+        if not timestamps:
+            return None
+        dates = pd.to_datetime(list(timestamps), unit='ms') + pd.Timedelta(hours=8)
+        return dates.strftime('%Y%m%d').tolist()
+
+    def read_ticks(self, code: str, start_time: str, end_time: str) -> pd.DataFrame | None:
+        # 数据格式: {code: DataFrame}，time为毫秒时间戳，盘口为五档列表
+        data = self.xtdata.get_market_data_ex([], [code], period='tick',
+                                              start_time=start_time, end_time=end_time)
+        raw = data.get(code) if data else None
+        if raw is None or len(raw) == 0:
+            return None
+
+        def _level1(column: str) -> np.ndarray:
+            if column not in raw.columns:
+                return np.zeros(len(raw))
+            return np.array([v[0] if len(v) else 0.0 for v in raw[column]], dtype='float64')
+
+        df = pd.DataFrame({
+            'price': raw['lastPrice'].to_numpy(dtype='float64'),
+            'volume': raw['volume'].to_numpy(dtype='float64'),
+            'amount': raw['amount'].to_numpy(dtype='float64'),
+            'bid_price': _level1('bidPrice'),
+            'ask_price': _level1('askPrice'),
+            'bid_volume': _level1('bidVol'),
+            'ask_volume': _level1('askVol'),
+        }, index=pd.to_datetime(raw['time'].to_numpy(), unit='ms') + pd.Timedelta(hours=8))
+        df.index.name = 'time'
+        return df
+
+    def subscribe_ticks(self, code_list: list[str], callback: TickCallback) -> list[int]:
+        def _on_quote(datas: dict[str, Any]) -> None:
+            # 数据格式: {code: [tick, ...]} 或 {code: tick}
+            for code, ticks in datas.items():
+                for tick in (ticks if isinstance(ticks, list) else [ticks]):
+                    try:
+                        callback(code, {
+                            'time': int(tick['time']),
+                            'price': float(tick['lastPrice']),
+                            'volume': float(tick.get('volume', 0)),
+                            'amount': float(tick.get('amount', 0)),
+                        })
+                    except Exception as e:
+                        logger.error("❌ 处理 %s 实时行情失败: %s", code, e)
+
+        return [
+            self.xtdata.subscribe_quote(code, period='tick', count=0, callback=_on_quote)
+            for code in code_list
+        ]
+
+    def unsubscribe_ticks(self, handle: list[int]) -> None:
+        for seq in handle:
+            self.xtdata.unsubscribe_quote(seq)
+
+
+class ReplaySource(DataSource):
+    """本地回放数据源
+
+    从已有的数据目录（{code}.parquet）或录制的会话文件读取K线，
+    用于在没有MiniQMT的机器上重建衍生数据、测试流程和压测清洗/存储性能。
+
+    数据目录中的文件不记录周期和复权方式，由 period / dividend_type 声明；
+    请求其他周期或复权方式时返回None（会话文件按录制时的周期和复权方式分组，不受影响）。
+    """
+
+    def __init__(self, output_dir: str | None = None, session_file: str | None = None,
+                 dividends: dict[str, pd.DataFrame] | None = None,
+                 period: str = '1d', dividend_type: str = 'front'):
+        """初始化
+
+        Args:
+            output_dir: 已有的数据目录
+            session_file: RecordingSource 录制的会话文件（parquet）
+            dividends: {code: 分红送转数据}，用于测试增量更新的除权换算
+            period: 数据目录中K线的周期
+            dividend_type: 数据目录中K线的复权方式
+        """
+        if output_dir is None and session_file is None:
+            raise ValueError("必须指定 output_dir 或 session_file")
+
+        self.output_dir = output_dir
+        self.session_file = session_file
+        self.dividends = dividends or {}
+        self.period = period
+        self.dividend_type = dividend_type
+        self._session: dict[tuple[str, str, str], pd.DataFrame] | None = None
+        # 分段读取同一代码时复用上一次读到的文件，按文件的修改时间和大小失效（异步下载时多个线程共用）
+        self._last_file: tuple[str, int, int, pd.DataFrame] | None = None
+        self._lock = threading.Lock()
+
+    def _load_session(self) -> dict[tuple[str, str, str], pd.DataFrame]:
+        """加载会话文件，按 (code, period, dividend_type) 分组"""
+        if self._session is None:
+            self._session = {}
+            if self.session_file is not None:
+                df = pd.read_parquet(self.session_file, engine='pyarrow')
+                for key, group in df.groupby(['code', 'period', 'dividend_type'], sort=False):
+                    bars = group.set_index('date')[BAR_FIELDS].sort_index()
+                    self._session[key] = bars  # type: ignore[index]
+        return self._session
+
+    def warm_cache(self, code: str, period: str, start_time: str, end_time: str) -> None:
+        # 本地数据无需预热
+        return None
+
+    def read_bars(self, code: str, period: str, start_time: str, end_time: str,
+                  dividend_type: str = 'front') -> pd.DataFrame | None:
+        with self._lock:
+            bars = self._load_session().get((code, period, dividend_type))
+        if bars is None and self.output_dir is not None:
+            if (period, dividend_type) != (self.period, self.dividend_type):
+                logger.debug("%s 回放目录为 %s/%s，没有 %s/%s 的数据",
+                             code, self.period, self.dividend_type, period, dividend_type)
+                return None
+            bars = self._read_file(code)
+
+        if bars is None:
+            return None
+
+        return slice_bars(bars, start_time, end_time)
+
+    def _read_file(self, code: str) -> pd.DataFrame | None:
+        """读取 {output_dir}/{code}.parquet，文件没有变化时复用上一次的结果"""
+        file_path = os.path.join(self.output_dir, f"{code}.parquet")
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            cached = self._last_file
+        if cached is not None and cached[:3] == (code, stat.st_mtime_ns, stat.st_size):
+            return cached[3]
+        bars = pd.read_parquet(file_path, engine='pyarrow').sort_index()
+        with self._lock:
+            self._last_file = (code, stat.st_mtime_ns, stat.st_size, bars)
+        return bars
+
+    def get_instrument_info(self, code: str) -> dict[str, str | None] | None:
+        # 本地数据没有上市日期，用第一根K线的日期近似
+        bars = self.read_bars(code, self.period, '', '', self.dividend_type)
+        if bars is None or len(bars) == 0:
+            return None
+        return {'name': None, 'list_date': bars.index[0].strftime('%Y%m%d'), 'delist_date': None}
+
+    def get_dividends(self, code: str, start_time: str, end_time: str) -> pd.DataFrame | None:
+        if code not in self.dividends:
+            return None
+        return slice_bars(normalize_dividends(self.dividends[code]), start_time, end_time)
+
+    def read_ticks(self, code: str, start_time: str, end_time: str) -> pd.DataFrame | None:
+        # 从数据目录下的分笔存储（{output_dir}/tick）回放
+        from core.storage.tick_store import TICK_DIR, TickStore
+
+        if self.output_dir is None:
+            return None
+        ticks = TickStore(os.path.join(self.output_dir, TICK_DIR)).read(code, start_time, end_time)
+        return ticks if len(ticks) else None
+
+    def list_instruments(self, sector: str) -> list[str]:
+        codes = {code for code, _, _ in self._load_session()}
+        if self.output_dir is not None and os.path.isdir(self.output_dir):
+            for file in os.listdir(self.output_dir):
+                if file.endswith('.parquet') and file != SUMMARY_FILE:
+                    codes.add(file[:-len('.parquet')])
+        return sorted(codes)
+
+
+class RecordingSource(DataSource):
+    """录制数据源：转发到内部数据源，并记录读到的K线，供 ReplaySource 回放"""
+
+    def __init__(self, inner: DataSource, session_file: str):
+        """初始化
+
+        Args:
+            inner: 实际的数据源，通常是 QmtSource
+            session_file: 会话文件保存路径（parquet）
+        """
+        self.inner = inner
+        self.session_file = session_file
+        self._records: list[pd.DataFrame] = []
+
+    def warm_cache(self, code: str, period: str, start_time: str, end_time: str) -> None:
+        self.inner.warm_cache(code, period, start_time, end_time)
+
+    def read_bars(self, code: str, period: str, start_time: str, end_time: str,
+                  dividend_type: str = 'front') -> pd.DataFrame | None:
+        df = self.inner.read_bars(code, period, start_time, end_time, dividend_type)
+        if df is not None and len(df) > 0:
+            record = df.reset_index()
+            record['code'] = code
+            record['period'] = period
+            record['dividend_type'] = dividend_type
+            self._records.append(record)
+        return df
+
+    def list_instruments(self, sector: str) -> list[str]:
+        return self.inner.list_instruments(sector)
+
+    def reconnect(self) -> None:
+        self.inner.reconnect()
+
+    def get_instrument_info(self, code: str) -> dict[str, str | None] | None:
+        return self.inner.get_instrument_info(code)
+
+    def get_dividends(self, code: str, start_time: str, end_time: str) -> pd.DataFrame | None:
+        return self.inner.get_dividends(code, start_time, end_time)
+
+    def get_trading_dates(self, market: str, start_time: str, end_time: str) -> list[str] | None:
+        return self.inner.get_trading_dates(market, start_time, end_time)
+
+    def read_ticks(self, code: str, start_time: str, end_time: str) -> pd.DataFrame | None:
+        return self.inner.read_ticks(code, start_time, end_time)
+
+    def subscribe_ticks(self, code_list: list[str], callback: TickCallback) -> Any:
+        return self.inner.subscribe_ticks(code_list, callback)
+
+    def unsubscribe_ticks(self, handle: Any) -> None:
+        self.inner.unsubscribe_ticks(handle)
+
+    def save(self) -> str:
+        """把录制的K线写入会话文件（同一根K线重复读取时保留最后一次）
+
+        Returns:
+            会话文件路径
+        """
+        if self._records:
+            session = pd.concat(self._records, ignore_index=True)
+            session = session.drop_duplicates(['code', 'period', 'dividend_type', 'date'], keep='last')
+        else:
+            session = pd.DataFrame(columns=['date'] + BAR_FIELDS + ['code', 'period', 'dividend_type'])
+        session.to_parquet(self.session_file, engine='pyarrow', compression='snappy', index=False)
+        logger.info("📼 会话已录制到: %s（%d 行）", self.session_file, len(session))
+        return self.session_file
@@ -0,0 +1,161 @@
+"""
+交易日历模块
+从数据源获取沪市交易日历并缓存到本地CSV，离线估算（dry-run、调度）时不需要连接QMT。
+缓存没有覆盖的日期按工作日近似（不排除节假日），并通过 approximate 标记告知调用方
+"""
+
+import os
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from core.fetcher.source import DataSource
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_FILE = 'trading_calendar.csv'
+CALENDAR_START = '19900101'
+CALENDAR_MARKET = 'SH'
+
+
+def _to_day(value: str) -> np.datetime64:
+    """YYYYMMDD -> datetime64[D]"""
+    value = value[:8]
+    return np.datetime64(f"{value[:4]}-{value[4:6]}-{value[6:8]}", 'D')
+
+
+class TradingCalendar:
+    """交易日历
+
+    示例::
+
+        calendar = TradingCalendar('output/trading_calendar.csv', source=downloader.source)
+        calendar.load()                                  # 缓存过期时从数据源刷新
+        calendar.count('20240101', '20241231')           # 交易日数
+    """
+
+    def __init__(self, cache_file: str, source: DataSource | None = None,
+                 max_age_days: float = 1):
+        """初始化
+
+        Args:
+            cache_file: 缓存文件路径，如 output/trading_calendar.csv
+            source: 数据源，None表示只使用缓存
+            max_age_days: 缓存有效天数，超过后 load 会从数据源刷新
+        """
+        self.cache_file = cache_file
+        self.source = source
+        self.max_age_days = max_age_days
+        self._days: np.ndarray | None = None
+        # 最近一次查询是否用了工作日近似
+        self.approximate = False
+
+    @property
+    def days(self) -> np.ndarray:
+        """缓存的交易日（datetime64[D]，升序），首次访问时读取缓存"""
+        if self._days is None:
+            self._days = self._read_cache()
+        return self._days
+
+    def _read_cache(self) -> np.ndarray:
+        if not os.path.exists(self.cache_file):
+            return np.empty(0, dtype='datetime64[D]')
+        dates = pd.read_csv(self.cache_file, dtype=str)['date']
+        return np.array([_to_day(d) for d in dates], dtype='datetime64[D]')
+
+    def is_stale(self) -> bool:
+        """缓存不存在或超过有效期"""
+        if not os.path.exists(self.cache_file):
+            return True
+        age = datetime.now() - datetime.fromtimestamp(os.path.getmtime(self.cache_file))
+        return age > timedelta(days=self.max_age_days)
+
+    def refresh(self) -> np.ndarray:
+        """从数据源刷新并写入缓存（先写临时文件再替换）
+
+        Returns:
+            交易日数组；数据源不提供日历时保持原缓存
+        """
+        if self.source is None:
+            return self.days
+        end = (datetime.now() + timedelta(days=365)).strftime('%Y%m%d')
+        dates = self.source.get_trading_dates(CALENDAR_MARKET, CALENDAR_START, end)
+        if not dates:
+            logger.warning("⚠️ 数据源没有返回交易日历，使用工作日近似")
+            return self.days
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+        tmp_path = f"{self.cache_file}.tmp"
+        pd.DataFrame({'date': dates}).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.cache_file)
+        self._days = np.array([_to_day(d) for d in dates], dtype='datetime64[D]')
+        logger.info("📅 交易日历已更新: %d 个交易日（%s ~ %s）", len(dates), dates[0], dates[-1])
+        return self._days
+
+    def load(self) -> np.ndarray:
+        """读取缓存，过期且有数据源时刷新"""
+        if self.source is not None and self.is_stale():
+            try:
+                return self.refresh()
+            except Exception as e:
+                logger.warning("⚠️ 刷新交易日历失败，使用缓存: %s", e)
+        return self.days
+
+    def trading_days(self, start: str, end: str) -> np.ndarray:
+        """[start, end] 内的交易日（含两端）
+
+        缓存覆盖范围之外的部分按工作日近似，并设置 approximate。
+
+        Args:
+            start: 起始日期 YYYYMMDD
+            end: 结束日期 YYYYMMDD
+
+        Returns:
+            datetime64[D] 数组
+        """
+        lo, hi = _to_day(start), _to_day(end)
+        self.approximate = False
+        if hi < lo:
+            return np.empty(0, dtype='datetime64[D]')
+
+        days = self.days
+        if len(days) == 0:
+            self.approximate = True
+            return self._weekdays(lo, hi)
+
+        first, last = days[0], days[-1]
+        parts = []
+        if lo < first:
+            self.approximate = True
+            parts.append(self._weekdays(lo, min(hi, first - 1)))
+        left = np.searchsorted(days, max(lo, first), side='left')
+        right = np.searchsorted(days, hi, side='right')
+        parts.append(days[left:right])
+        if hi > last:
+            self.approximate = True
+            parts.append(self._weekdays(max(lo, last + 1), hi))
+        return np.concatenate(parts)
+
+    def count(self, start: str, end: str) -> int:
+        """[start, end] 内的交易日数"""
+        return len(self.trading_days(start, end))
+
+    def latest(self, now: datetime | None = None) -> str | None:
+        """不晚于 now 的最后一个交易日，缓存为空时返回None"""
+        days = self.days
+        if len(days) == 0:
+            return None
+        today = np.datetime64((now or datetime.now()).date(), 'D')
+        position = int(np.searchsorted(days, today, side='right'))
+        if position == 0:
+            return None
+        return str(days[position - 1]).replace('-', '')
+
+    @staticmethod
+    def _weekdays(lo: np.datetime64, hi: np.datetime64) -> np.ndarray:
+        if hi < lo:
+            return np.empty(0, dtype='datetime64[D]')
+        days = np.arange(lo, hi + 1, dtype='datetime64[D]')
+        return days[np.is_busday(days)]
@@ -0,0 +1,210 @@
+"""
+标的池发现模块
+从数据源的板块列表获取全市场A股/ETF/指数，缓存上市和退市日期，
+并把每个代码的下载时间窗口裁剪到其上市期间，避免请求上市前的空时间段
+"""
+
+import os
+import logging
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from core.fetcher.source import DataSource
+
+logger = logging.getLogger(__name__)
+
+# 标的类型 -> QMT板块名
+SECTORS = {
+    'stock': '沪深A股',
+    'etf': '沪深ETF',
+    'index': '沪深指数',
+}
+
+UNIVERSE_COLUMNS = ['code', 'kind', 'name', 'list_date', 'delist_date', 'updated']
+
+
+class Universe:
+    """标的池
+
+    缓存文件为CSV，每行一个代码：code, kind, name, list_date, delist_date, updated
+    """
+
+    def __init__(self, cache_file: str, source: DataSource | None = None,
+                 max_age_days: float = 1):
+        """初始化
+
+        Args:
+            cache_file: 缓存文件路径，如 output/universe.csv
+            source: 数据源，刷新板块列表和上市日期时使用
+            max_age_days: 缓存有效天数，超过后 load 会自动刷新
+        """
+        self.cache_file = cache_file
+        self.source = source
+        self.max_age_days = max_age_days
+        self._df: pd.DataFrame | None = None
+        self._windows: dict[str, tuple[str | None, str | None]] = {}
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """标的池数据（首次访问时从缓存读取）"""
+        if self._df is None:
+            self._set_df(self._read_cache())
+        return self._df  # type: ignore[return-value]
+
+    def _set_df(self, df: pd.DataFrame) -> None:
+        self._df = df
+        self._windows = {
+            row.code: (row.list_date or None, row.delist_date or None)
+            for row in df.itertuples(index=False)
+        }
+
+    def _read_cache(self) -> pd.DataFrame:
+        if not os.path.exists(self.cache_file):
+            return pd.DataFrame(columns=UNIVERSE_COLUMNS)
+        return pd.read_csv(self.cache_file, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+
+    def _write_cache(self) -> None:
+        cache_dir = os.path.dirname(self.cache_file)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.df.to_csv(self.cache_file, index=False, encoding='utf-8-sig')
+        logger.info("🗂️ 标的池已缓存到: %s（%d 个代码）", self.cache_file, len(self.df))
+
+    def is_stale(self) -> bool:
+        """缓存是否不存在或已过期"""
+        if not os.path.exists(self.cache_file):
+            return True
+        age = datetime.now() - datetime.fromtimestamp(os.path.getmtime(self.cache_file))
+        return age > timedelta(days=self.max_age_days)
+
+    def _require_source(self) -> DataSource:
+        if self.source is None:
+            raise ValueError("刷新标的池需要指定数据源")
+        return self.source
+
+    def _fetch_rows(self, codes: list[str], kind: str) -> list[dict[str, str]]:
+        source = self._require_source()
+        today = datetime.now().strftime('%Y%m%d')
+        rows = []
+        for code in codes:
+            try:
+                info = source.get_instrument_info(code) or {}
+            except Exception as e:
+                logger.warning("⚠️ 获取 %s 合约信息失败: %s", code, e)
+                info = {}
+            rows.append({
+                'code': code,
+                'kind': kind,
+                'name': info.get('name') or '',
+                'list_date': info.get('list_date') or '',
+                'delist_date': info.get('delist_date') or '',
+                'updated': today,
+            })
+        return rows
+
+    def _merge(self, rows: list[dict[str, str]]) -> None:
+        """合并新行，已不在板块列表中的旧代码（如已退市）保留"""
+        if not rows:
+            return
+        new = pd.DataFrame(rows, columns=UNIVERSE_COLUMNS)
+        old = self.df[~self.df['code'].isin(new['code'])]
+        merged = pd.concat([old, new], ignore_index=True) if len(old) else new
+        self._set_df(merged.sort_values('code', ignore_index=True))
+
+    def refresh(self, kinds: list[str] | None = None) -> pd.DataFrame:
+        """从数据源刷新板块列表和上市日期，并写入缓存
+
+        Args:
+            kinds: 标的类型，可选 'stock'/'etf'/'index'，默认全部
+
+        Returns:
+            标的池DataFrame
+        """
+        source = self._require_source()
+        rows = []
+        for kind in kinds or list(SECTORS):
+            sector = SECTORS[kind]
+            codes = source.list_instruments(sector)
+            logger.info("🔍 板块 %s: %d 个代码", sector, len(codes))
+            rows.extend(self._fetch_rows(codes, kind))
+
+        self._merge(rows)
+        self._write_cache()
+        return self.df
+
+    def load(self, kinds: list[str] | None = None) -> pd.DataFrame:
+        """读取标的池，缓存不存在或过期时自动刷新
+
+        Args:
+            kinds: 标的类型，默认全部
+
+        Returns:
+            标的池DataFrame
+        """
+        if self.is_stale() and self.source is not None:
+            return self.refresh(kinds)
+        return self.df
+
+    def ensure(self, codes: list[str], kind: str = '') -> None:
+        """确保指定代码有上市日期记录（用于配置文件中的手工列表）
+
+        Args:
+            codes: 代码列表
+            kind: 标的类型
+        """
+        known = set(self.df['code'])
+        missing = [code for code in codes if code not in known]
+        if missing and self.source is not None:
+            self._merge(self._fetch_rows(missing, kind))
+            self._write_cache()
+
+    def codes(self, kinds: list[str] | None = None, active_on: str | None = None) -> list[str]:
+        """列出代码
+
+        Args:
+            kinds: 标的类型过滤，默认全部
+            active_on: 只保留该日期（YYYYMMDD）之后仍在上市的代码
+
+        Returns:
+            代码列表
+        """
+        df = self.df
+        if kinds:
+            df = df[df['kind'].isin(kinds)]
+        if active_on:
+            df = df[(df['delist_date'] == '') | (df['delist_date'] >= active_on)]
+        return df['code'].tolist()
+
+    def listing_window(self, code: str) -> tuple[str | None, str | None]:
+        """上市/退市日期
+
+        Returns:
+            (list_date, delist_date)，未知时为None
+        """
+        _ = self.df
+        return self._windows.get(code, (None, None))
+
+    def clip(self, code: str, start_time: str,
+             end_time: str | None = None) -> tuple[str, str | None] | None:
+        """把下载时间窗口裁剪到上市期间
+
+        Args:
+            code: 代码
+            start_time: 起始时间 YYYYMMDD
+            end_time: 结束时间 YYYYMMDD，None表示到今天
+
+        Returns:
+            裁剪后的 (start_time, end_time)；与上市期间无交集时返回None
+        """
+        list_date, delist_date = self.listing_window(code)
+
+        if list_date and list_date > start_time:
+            start_time = list_date
+        if delist_date and (end_time is None or delist_date < end_time):
+            end_time = delist_date
+
+        today = datetime.now().strftime('%Y%m%d')
+        if start_time > (end_time or today):
+            return None
+        return start_time, end_time
@@ -0,0 +1,78 @@
+"""
+日志配置模块
+core 下的模块在导入时不配置根logger，由脚本入口调用 setup_logging 决定输出方式
+"""
+
+import logging
+from logging.handlers import RotatingFileHandler
+
+from tqdm import tqdm
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# 单个代码明细日志所在的logger（见 core.fetcher.downloader.detail_logger）
+DETAIL_LOGGER = 'core.fetcher.downloader.detail'
+
+
+class TqdmLoggingHandler(logging.StreamHandler):
+    """通过 tqdm.write 输出日志，避免打断正在显示的进度条"""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            tqdm.write(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def setup_logging(quiet: bool = False, log_file: str | None = None,
+                  level: int = logging.INFO, max_bytes: int = 10 * 1024 * 1024,
+                  backup_count: int = 5) -> None:
+    """配置 core 模块的日志输出
+
+    普通模式：所有日志输出到控制台（与原先的 basicConfig 行为一致）。
+    安静模式：控制台只保留批量级别的日志，单个代码的明细日志不再输出到控制台，
+    其中warning以上写入滚动日志文件，适合全市场运行。
+
+    Args:
+        quiet: 是否启用安静模式
+        log_file: 滚动日志文件路径，安静模式下默认为 qmtdatatool.log
+        level: 控制台日志级别
+        max_bytes: 单个日志文件大小上限
+        backup_count: 保留的历史日志文件数
+    """
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    console = TqdmLoggingHandler()
+    console.setFormatter(formatter)
+    console.setLevel(level)
+
+    core_logger = logging.getLogger('core')
+    core_logger.setLevel(min(level, logging.INFO))
+    core_logger.handlers = [console]
+    core_logger.propagate = False
+
+    detail = logging.getLogger(DETAIL_LOGGER)
+    detail.handlers = []
+
+    if quiet and log_file is None:
+        log_file = 'qmtdatatool.log'
+
+    if log_file:
+        file_handler = RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+        )
+        file_handler.setFormatter(formatter)
+        file_handler.setLevel(logging.WARNING)
+
+        if quiet:
+            # 明细日志只进文件，不再冒泡到控制台
+            detail.handlers = [file_handler]
+            detail.setLevel(logging.WARNING)
+            detail.propagate = False
+        else:
+            core_logger.addHandler(file_handler)
+            detail.setLevel(logging.NOTSET)
+            detail.propagate = True
+    else:
+        detail.setLevel(logging.NOTSET)
+        detail.propagate = True
@@ -0,0 +1,245 @@
+"""
+内存监控模块
+按阶段记录Python分配峰值（tracemalloc）并采样进程常驻内存（RSS），
+接近设定的内存上限时进入低内存模式：下载器改为逐段流式写入，异步下载降低并发，
+而不是等到内存耗尽被系统杀掉
+"""
+
+import sys
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from core.metrics import MetricsCollector
+
+logger = logging.getLogger(__name__)
+
+# 达到上限的这个比例即进入低内存模式，给流式写入本身留出余量
+SOFT_RATIO = 0.8
+
+# 进入低内存模式时日志中列出的分配最多的代码行数
+TOP_ALLOCATIONS = 5
+
+_SIZE_UNITS = {'': 1, 'B': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(value: str | int | None) -> int | None:
+    """解析内存大小
+
+    Args:
+        value: 字节数或带单位的字符串，如 '12G'、'800M'、'1.5GB'；空值返回None
+
+    Returns:
+        字节数
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, int):
+        return value
+    text = value.strip().upper().removesuffix('IB').removesuffix('B')
+    number = text.rstrip('KMGT')
+    unit = text[len(number):]
+    if unit not in _SIZE_UNITS or not number:
+        raise ValueError(f"无法解析内存大小: {value}")
+    return int(float(number) * _SIZE_UNITS[unit])
+
+
+def format_size(n_bytes: float) -> str:
+    """字节数 -> 便于阅读的字符串，如 1.2 GB"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(n_bytes) < 1024 or unit == 'GB':
+            return f"{n_bytes:.1f} {unit}" if unit != 'B' else f"{int(n_bytes)} B"
+        n_bytes /= 1024
+    return f"{n_bytes:.1f} GB"
+
+
+def rss_bytes() -> int | None:
+    """当前进程的常驻内存（字节）
+
+    依次尝试 psutil（可选依赖）、Windows GetProcessMemoryInfo、Linux /proc/self/status，
+    都不可用时返回None。
+    """
+    try:
+        import psutil
+        return int(psutil.Process().memory_info().rss)
+    except ImportError:
+        pass
+
+    if sys.platform == 'win32':
+        return _windows_rss()
+
+    try:
+        with open('/proc/self/status', 'r', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _windows_rss() -> int | None:
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD),
+                    ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t),
+                    ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t),
+                    ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    try:
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return None
+    except (AttributeError, OSError):
+        return None
+    return int(counters.WorkingSetSize)
+
+
+class MemoryGuard:
+    """内存监控与上限保护
+
+    示例::
+
+        guard = MemoryGuard(limit_bytes=parse_size('12G'), metrics=metrics, trace=True)
+        guard.start()
+        with guard.stage('clean', code):
+            df = clean(df)
+        if guard.check():          # 接近上限，改为流式写入
+            ...
+        guard.stop()
+        logger.info(guard.report())
+    """
+
+    def __init__(self, limit_bytes: int | None = None, soft_ratio: float = SOFT_RATIO,
+                 metrics: MetricsCollector | None = None, trace: bool = False):
+        """初始化
+
+        Args:
+            limit_bytes: 内存上限（字节），None表示不限，只做统计
+            soft_ratio: RSS达到上限的这个比例时进入低内存模式
+            metrics: 指标采集器，记录 rss_bytes / memory_peak_*_bytes 等指标
+            trace: 是否用 tracemalloc 记录每个阶段的Python分配峰值（会让下载慢一些）
+        """
+        self.limit_bytes = limit_bytes
+        self.soft_ratio = soft_ratio
+        self.metrics = metrics if metrics is not None else MetricsCollector()
+        self.trace = trace
+        # 进入后不再退出：释放的内存不一定归还给操作系统，RSS回落不可靠
+        self.low_memory = False
+        self.peak_rss = 0
+        self.stage_peaks: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._owns_tracemalloc = False
+
+    def start(self) -> None:
+        """开始监控（trace=True 时启动 tracemalloc）"""
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        self.sample()
+
+    def stop(self) -> None:
+        """停止监控并写入最终指标"""
+        self.sample()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+
+    def __enter__(self) -> 'MemoryGuard':
+        self.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    @property
+    def soft_limit(self) -> int | None:
+        if self.limit_bytes is None:
+            return None
+        return int(self.limit_bytes * self.soft_ratio)
+
+    def sample(self) -> int | None:
+        """采样一次RSS并更新峰值"""
+        rss = rss_bytes()
+        if rss is None:
+            return None
+        with self._lock:
+            self.peak_rss = max(self.peak_rss, rss)
+        self.metrics.gauge('rss_bytes', rss)
+        return rss
+
+    def check(self) -> bool:
+        """采样RSS，达到软上限时进入低内存模式
+
+        Returns:
+            是否处于低内存模式
+        """
+        if self.low_memory or self.limit_bytes is None:
+            return self.low_memory
+        rss = self.sample()
+        if rss is not None and rss >= self.soft_limit:  # type: ignore[operator]
+            self._enter_low_memory(rss)
+        return self.low_memory
+
+    def _enter_low_memory(self, rss: int) -> None:
+        with self._lock:
+            if self.low_memory:
+                return
+            self.low_memory = True
+        self.metrics.incr('memory_pressure_events')
+        logger.warning("🧠 内存 %s 已接近上限 %s，切换为流式写入并降低并发",
+                       format_size(rss), format_size(self.limit_bytes))  # type: ignore[arg-type]
+        if tracemalloc.is_tracing():
+            for stat in tracemalloc.take_snapshot().statistics('lineno')[:TOP_ALLOCATIONS]:
+                logger.warning("   %s", stat)
+
+    @contextmanager
+    def stage(self, name: str, code: str | None = None) -> Iterator[None]:
+        """记录一个阶段的内存峰值
+
+        开启 trace 时记录阶段内Python分配的峰值（相对阶段开始时），
+        结束时采样RSS并检查是否需要进入低内存模式。
+
+        Args:
+            name: 阶段名，如 fetch / clean / save
+            code: 股票/ETF代码（只用于日志）
+        """
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1] - base
+                with self._lock:
+                    if peak > self.stage_peaks.get(name, 0):
+                        self.stage_peaks[name] = peak
+                        self.metrics.gauge(f'memory_peak_{name}_bytes', peak)
+                logger.debug("🧠 %s %s 阶段分配峰值 %s", code or '', name, format_size(peak))
+            self.check()
+
+    def report(self) -> str:
+        """一行内存摘要，如 '峰值RSS 1.2 GB / 上限 12.0 GB；阶段峰值 fetch 300.0 MB, clean 500.0 MB'"""
+        parts = [f"峰值RSS {format_size(self.peak_rss) if self.peak_rss else '未知'}"]
+        if self.limit_bytes is not None:
+            parts[0] += f" / 上限 {format_size(self.limit_bytes)}"
+        if self.low_memory:
+            parts[0] += "（已进入低内存模式）"
+        if self.stage_peaks:
+            parts.append("阶段峰值 " + ', '.join(f"{name} {format_size(size)}"
+                                               for name, size in self.stage_peaks.items()))
+        return '；'.join(parts)
@@ -0,0 +1,289 @@
+"""
+运行指标采集模块
+记录分阶段耗时、重试次数、清洗前后行数、各格式写入字节数和队列深度，
+并导出为JSON/CSV运行摘要或Prometheus文本文件（node_exporter textfile采集）
+"""
+
+import os
+import csv
+import json
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+import numpy as np
+
+
+class MetricsCollector:
+    """指标采集器基类
+
+    默认实现不做任何记录，作为下载器的缺省采集器，开销可以忽略。
+    自定义采集器继承本类并重写 record_timing / incr / gauge 即可。
+    """
+
+    def record_timing(self, stage: str, seconds: float, code: str | None = None,
+                      segment: str | None = None) -> None:
+        """记录一次阶段耗时
+
+        Args:
+            stage: 阶段名，如 download_history_data / get_market_data / clean
+            seconds: 耗时（秒）
+            code: 股票/ETF代码
+            segment: 时间段标识，如 20200101-20221231
+        """
+
+    def incr(self, name: str, value: float = 1, code: str | None = None, **labels: str) -> None:
+        """累加计数器
+
+        Args:
+            name: 计数器名，如 retries / rows_raw / bytes_written
+            value: 增量
+            code: 股票/ETF代码
+            **labels: 额外标签，如 fmt='parquet'
+        """
+
+    def gauge(self, name: str, value: float) -> None:
+        """设置瞬时值（如队列深度）
+
+        Args:
+            name: 指标名
+            value: 当前值
+        """
+
+    @contextmanager
+    def timer(self, stage: str, code: str | None = None,
+              segment: str | None = None) -> Iterator[None]:
+        """计时上下文，退出时调用 record_timing（异常时同样记录）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_timing(stage, time.perf_counter() - start, code, segment)
+
+
+class RunMetrics(MetricsCollector):
+    """内存指标采集器
+
+    线程安全，记录一次运行内的所有指标，结束后导出摘要。
+    """
+
+    def __init__(self, prefix: str = 'qmtdatatool'):
+        self.prefix = prefix
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._timings: list[tuple[str, str | None, str | None, float]] = []
+        self._counters: dict[tuple[str, str | None, tuple[tuple[str, str], ...]], float] = defaultdict(float)
+        self._gauges: dict[str, float] = {}
+        self._gauge_max: dict[str, float] = {}
+
+    def record_timing(self, stage: str, seconds: float, code: str | None = None,
+                      segment: str | None = None) -> None:
+        with self._lock:
+            self._timings.append((stage, code, segment, seconds))
+
+    def incr(self, name: str, value: float = 1, code: str | None = None, **labels: str) -> None:
+        key = (name, code, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+            self._gauge_max[name] = max(value, self._gauge_max.get(name, value))
+
+    def merge(self, other: 'RunMetrics') -> None:
+        """合并另一个采集器的记录（用于汇总多个工作进程的指标）"""
+        with other._lock:
+            timings = list(other._timings)
+            counters = dict(other._counters)
+            gauges = dict(other._gauges)
+            gauge_max = dict(other._gauge_max)
+        with self._lock:
+            self._timings.extend(timings)
+            for key, value in counters.items():
+                self._counters[key] += value
+            for name, value in gauges.items():
+                self._gauges[name] = value
+            for name, value in gauge_max.items():
+                self._gauge_max[name] = max(value, self._gauge_max.get(name, value))
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_counters'] = dict(self._counters)
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        counters = state.pop('_counters')
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float, counters)
+
+    def stage_summary(self) -> dict[str, dict[str, float]]:
+        """按阶段汇总耗时
+
+        Returns:
+            {stage: {count, total, mean, p50, p95, max}}，单位秒
+        """
+        with self._lock:
+            timings = list(self._timings)
+
+        by_stage: dict[str, list[float]] = defaultdict(list)
+        for stage, _, _, seconds in timings:
+            by_stage[stage].append(seconds)
+
+        summary = {}
+        for stage, values in by_stage.items():
+            arr = np.asarray(values)
+            summary[stage] = {
+                'count': int(arr.size),
+                'total': round(float(arr.sum()), 6),
+                'mean': round(float(arr.mean()), 6),
+                'p50': round(float(np.percentile(arr, 50)), 6),
+                'p95': round(float(np.percentile(arr, 95)), 6),
+                'max': round(float(arr.max()), 6),
+            }
+        return summary
+
+    def counter_totals(self) -> dict[str, float]:
+        """按计数器名（含标签，不区分代码）汇总"""
+        with self._lock:
+            counters = dict(self._counters)
+
+        totals: dict[str, float] = defaultdict(float)
+        for (name, _, labels), value in counters.items():
+            totals[self._label_key(name, labels)] += value
+        return dict(totals)
+
+    def per_code(self) -> dict[str, dict[str, float]]:
+        """按代码汇总：各阶段耗时之和与各计数器
+
+        Returns:
+            {code: {'<stage>_seconds': x, '<counter>': y, ...}}
+        """
+        with self._lock:
+            timings = list(self._timings)
+            counters = dict(self._counters)
+
+        rows: dict[str, dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        for stage, code, _, seconds in timings:
+            if code is not None:
+                rows[code][f'{stage}_seconds'] += seconds
+        for (name, code, labels), value in counters.items():
+            if code is not None:
+                rows[code][self._label_key(name, labels)] += value
+        return {code: dict(values) for code, values in rows.items()}
+
+    def summary(self) -> dict[str, Any]:
+        """生成完整运行摘要"""
+        with self._lock:
+            gauges = {name: {'last': value, 'max': self._gauge_max[name]}
+                      for name, value in self._gauges.items()}
+        return {
+            'started_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at)),
+            'elapsed_seconds': round(time.time() - self.started_at, 3),
+            'stages': self.stage_summary(),
+            'counters': self.counter_totals(),
+            'gauges': gauges,
+            'per_code': self.per_code(),
+        }
+
+    def export_json(self, path: str) -> str:
+        """导出JSON运行摘要
+
+        Args:
+            path: 输出文件路径
+
+        Returns:
+            文件路径
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def export_csv(self, path: str) -> str:
+        """导出按代码展开的CSV运行摘要（每行一个代码）
+
+        Args:
+            path: 输出文件路径
+
+        Returns:
+            文件路径
+        """
+        per_code = self.per_code()
+        columns = sorted({key for values in per_code.values() for key in values})
+
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            writer.writerow(['code'] + columns)
+            for code in sorted(per_code):
+                values = per_code[code]
+                writer.writerow([code] + [round(values.get(col, 0), 6) for col in columns])
+        return path
+
+    def export_prometheus(self, path: str) -> str:
+        """导出Prometheus文本格式，供node_exporter的textfile采集器读取
+
+        先写临时文件再原子替换，避免node_exporter读到半个文件。
+
+        Args:
+            path: 输出文件路径（通常以 .prom 结尾）
+
+        Returns:
+            文件路径
+        """
+        p = self.prefix
+        lines = []
+
+        stages = self.stage_summary()
+        if stages:
+            lines.append(f'# TYPE {p}_stage_seconds summary')
+            for stage, stats in sorted(stages.items()):
+                lines.append(f'{p}_stage_seconds{{stage="{stage}",quantile="0.5"}} {stats["p50"]}')
+                lines.append(f'{p}_stage_seconds{{stage="{stage}",quantile="0.95"}} {stats["p95"]}')
+                lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {stats["total"]}')
+                lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            gauge_max = dict(self._gauge_max)
+
+        # 计数器按名称+标签聚合，不带代码标签，避免全市场运行时序列数爆炸
+        grouped: dict[str, dict[tuple[tuple[str, str], ...], float]] = defaultdict(lambda: defaultdict(float))
+        for (name, _, labels), value in counters.items():
+            grouped[name][labels] += value
+        for name in sorted(grouped):
+            lines.append(f'# TYPE {p}_{name}_total counter')
+            for labels, value in sorted(grouped[name].items()):
+                lines.append(f'{p}_{name}_total{self._format_labels(labels)} {value}')
+
+        for name in sorted(gauges):
+            lines.append(f'# TYPE {p}_{name} gauge')
+            lines.append(f'{p}_{name} {gauges[name]}')
+            lines.append(f'# TYPE {p}_{name}_max gauge')
+            lines.append(f'{p}_{name}_max {gauge_max[name]}')
+
+        lines.append(f'# TYPE {p}_last_run_timestamp_seconds gauge')
+        lines.append(f'{p}_last_run_timestamp_seconds {round(time.time(), 3)}')
+
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
+        return path
+
+    @staticmethod
+    def _label_key(name: str, labels: tuple[tuple[str, str], ...]) -> str:
+        """把计数器名和标签拼成摘要中的键，如 bytes_written[fmt=parquet]"""
+        if not labels:
+            return name
+        return name + '[' + ','.join(f'{k}={v}' for k, v in labels) + ']'
+
+    @staticmethod
+    def _format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+        if not labels:
+            return ''
+        return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
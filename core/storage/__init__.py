@@ -0,0 +1 @@
+# 数据存储读取模块（不依赖xtquant）
@@ -0,0 +1,281 @@
+"""
+跨代码对齐索引
+维护一个全局交易日期轴，以及每个代码的行在轴上的位置（offset数组），
+拼面板时直接把各代码的列散射到预先分配的二维数组，不需要逐个outer join或reindex
+
+索引保存在 {output_dir}/.alignment/index.npz：
+- axis: 全局日期轴（int64纳秒，升序去重）
+- codes: 代码
+- offsets / pointers: CSR结构，第i个代码的行位置为 offsets[pointers[i]:pointers[i+1]]
+- mtimes / sizes: 建索引时数据文件的修改时间和大小，用于增量刷新
+"""
+
+import os
+import logging
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from core.storage.reader import default_output_dir
+from core.storage.query import CODE_FILE_PATTERN
+
+logger = logging.getLogger(__name__)
+
+ALIGNMENT_DIR = '.alignment'
+INDEX_FILE = 'index.npz'
+# 拼面板期间文件持续变化时最多重拼的次数
+MAX_PANEL_ATTEMPTS = 3
+
+
+def _read_dates(path: str) -> np.ndarray:
+    """只读取date列，返回int64纳秒"""
+    column = pq.read_table(path, columns=['date']).column('date').to_numpy()
+    return column.astype('datetime64[ns]').astype(np.int64)
+
+
+class AlignmentIndex:
+    """跨代码对齐索引
+
+    示例::
+
+        index = AlignmentIndex()
+        close = index.panel('close', codes, start='2024-01-01')   # 行为日期，列为代码
+        panels = index.panels(['close', 'volume'], codes)
+    """
+
+    def __init__(self, output_dir: str | None = None):
+        """初始化
+
+        Args:
+            output_dir: 数据目录
+        """
+        self.output_dir = output_dir or default_output_dir()
+        self.index_file = os.path.join(self.output_dir, ALIGNMENT_DIR, INDEX_FILE)
+
+        self.axis = np.empty(0, dtype=np.int64)
+        self.codes: list[str] = []
+        self._offsets: dict[str, np.ndarray] = {}
+        self._stats: dict[str, tuple[float, int]] = {}
+        self._loaded = False
+
+    def _path(self, code: str) -> str:
+        return os.path.join(self.output_dir, f"{code}.parquet")
+
+    def load(self) -> None:
+        """读取已保存的索引"""
+        self._loaded = True
+        if not os.path.exists(self.index_file):
+            return
+        with np.load(self.index_file, allow_pickle=False) as data:
+            self.axis = data['axis']
+            self.codes = data['codes'].tolist()
+            pointers = data['pointers']
+            offsets = data['offsets']
+            mtimes = data['mtimes']
+            sizes = data['sizes']
+        self._offsets = {
+            code: offsets[pointers[i]:pointers[i + 1]] for i, code in enumerate(self.codes)
+        }
+        self._stats = {code: (float(mtimes[i]), int(sizes[i])) for i, code in enumerate(self.codes)}
+
+    def save(self) -> None:
+        """保存索引（先写临时文件再替换）"""
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        lengths = [len(self._offsets[code]) for code in self.codes]
+        pointers = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+        offsets = (np.concatenate([self._offsets[code] for code in self.codes])
+                   if self.codes else np.empty(0, dtype=np.int32))
+
+        tmp_path = f"{self.index_file}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                axis=self.axis,
+                codes=np.array(self.codes, dtype=str),
+                pointers=pointers,
+                offsets=offsets.astype(np.int32),
+                mtimes=np.array([self._stats[c][0] for c in self.codes], dtype=np.float64),
+                sizes=np.array([self._stats[c][1] for c in self.codes], dtype=np.int64),
+            )
+        os.replace(tmp_path, self.index_file)
+
+    def refresh(self, code_list: list[str] | None = None) -> int:
+        """增量刷新：只重新读取新增或修改过的文件的日期列
+
+        新日期使全局轴变长时，已有代码的offset通过一次searchsorted整体重映射，不需要重新读取文件。
+
+        Args:
+            code_list: 只检查这些代码，None表示输出目录下的全部数据文件
+
+        Returns:
+            重新读取的文件数
+        """
+        if not self._loaded:
+            self.load()
+
+        if code_list is None:
+            code_list = [m.group(1) for m in map(CODE_FILE_PATTERN.match, sorted(os.listdir(self.output_dir))) if m]
+            # 索引中有、目录中已没有的代码也要检查，以便移除
+            listed = set(code_list)
+            code_list += [code for code in self.codes if code not in listed]
+
+        changed: dict[str, np.ndarray] = {}
+        removed: list[str] = []
+        for code in code_list:
+            path = self._path(code)
+            if not os.path.exists(path):
+                if code in self._offsets:
+                    removed.append(code)
+                continue
+            stat = os.stat(path)
+            if self._stats.get(code) == (stat.st_mtime, stat.st_size):
+                continue
+            changed[code] = _read_dates(path)
+            self._stats[code] = (stat.st_mtime, stat.st_size)
+
+        self._update(changed, removed)
+        return len(changed)
+
+    def _update(self, changed: dict[str, np.ndarray], removed: list[str]) -> None:
+        """把新读取的日期并入索引，删除文件已不存在的代码，然后保存
+
+        Args:
+            changed: {代码: 日期(int64纳秒)}，调用方已更新 _stats
+            removed: 文件已被删除的代码
+        """
+        if not changed and not removed:
+            return
+
+        for code in removed:
+            # 轴上只属于被删除代码的日期保留，面板中对应的行为NaN
+            self._offsets.pop(code, None)
+            self._stats.pop(code, None)
+        self.codes = [code for code in self.codes if code in self._offsets]
+
+        if not changed:
+            self.save()
+            logger.info("🧭 对齐索引已移除 %d 个不存在的文件", len(removed))
+            return
+
+        new_axis = np.union1d(self.axis, np.concatenate(list(changed.values())))
+        if len(new_axis) != len(self.axis):
+            # 旧位置 -> 新位置
+            remap = np.searchsorted(new_axis, self.axis).astype(np.int32)
+            self._offsets = {code: remap[offsets] for code, offsets in self._offsets.items()}
+            self.axis = new_axis
+
+        for code, dates in changed.items():
+            self._offsets[code] = np.searchsorted(self.axis, dates).astype(np.int32)
+            if code not in self.codes:
+                self.codes.append(code)
+
+        self.save()
+        logger.info("🧭 对齐索引已更新: %d 个文件，日期轴 %d 个", len(changed), len(self.axis))
+
+    def _window(self, start: str | None, end: str | None) -> tuple[int, int]:
+        lo = 0 if start is None else int(np.searchsorted(self.axis, pd.Timestamp(start).value, side='left'))
+        hi = len(self.axis) if end is None else int(np.searchsorted(self.axis, pd.Timestamp(end).value, side='right'))
+        return lo, hi
+
+    def panels(self, fields: list[str], code_list: list[str] | None = None,
+               start: str | None = None, end: str | None = None) -> dict[str, pd.DataFrame]:
+        """拼多个字段的面板，每个文件只读取一次
+
+        Args:
+            fields: 字段列表，如 ['close', 'volume']
+            code_list: 代码列表，None表示索引中的全部代码
+            start: 起始日期（含）
+            end: 结束日期（含）
+
+        Returns:
+            {字段: DataFrame}，行为日期，列为代码，缺失为NaN
+        """
+        self.refresh(code_list)
+        code_list = list(code_list) if code_list is not None else list(self.codes)
+
+        # 文件可能在 refresh 之后被下载任务替换或删除：按实际读到的日期重建这些代码的条目，
+        # 新日期使日期轴变长时整体重拼（每次重拼前文件都已重新核对，通常只会发生一次）
+        for _ in range(MAX_PANEL_ATTEMPTS):
+            arrays = self._scatter(fields, code_list, start, end)
+            if arrays is not None:
+                break
+        else:
+            raise RuntimeError(f"数据文件在拼面板期间持续变化，已重试 {MAX_PANEL_ATTEMPTS} 次")
+
+        lo, hi = self._window(start, end)
+        index = pd.DatetimeIndex(self.axis[lo:hi].astype('datetime64[ns]'), name='date')
+        return {field: pd.DataFrame(arrays[field], index=index, columns=code_list) for field in fields}
+
+    def _scatter(self, fields: list[str], code_list: list[str], start: str | None,
+                 end: str | None) -> dict[str, np.ndarray] | None:
+        """把各代码的列散射到二维数组
+
+        Returns:
+            {字段: 二维数组}；有文件在读取前被修改、导致日期轴变化时返回None，需要重拼
+        """
+        lo, hi = self._window(start, end)
+        arrays = {field: np.full((hi - lo, len(code_list)), np.nan) for field in fields}
+        changed: dict[str, np.ndarray] = {}
+        removed: list[str] = []
+        stale: dict[int, tuple[str, pa.Table]] = {}
+
+        for j, code in enumerate(code_list):
+            offsets = self._offsets.get(code)
+            if offsets is None:
+                continue
+            path = self._path(code)
+            try:
+                # 先取文件状态再读：读取后文件又被替换时，下次 refresh 能发现
+                stat = os.stat(path)
+                if self._stats.get(code) == (stat.st_mtime, stat.st_size):
+                    # offset 升序，二分找到窗口内的行，只散射这一段
+                    first, last = np.searchsorted(offsets, [lo, hi])
+                    if first == last:
+                        continue
+                    table = pq.read_table(path, columns=fields)
+                    if table.num_rows == len(offsets):
+                        for field in fields:
+                            values = table.column(field).to_numpy()
+                            arrays[field][offsets[first:last] - lo, j] = values[first:last]
+                        continue
+                table = pq.read_table(path, columns=list(dict.fromkeys(['date', *fields])))
+            except FileNotFoundError:
+                removed.append(code)
+                continue
+            changed[code] = table.column('date').to_numpy().astype('datetime64[ns]').astype(np.int64)
+            self._stats[code] = (stat.st_mtime, stat.st_size)
+            stale[j] = (code, table)
+
+        if not changed and not removed:
+            return arrays
+
+        logger.info("🧭 %d 个文件在读取前被修改或删除，重建对应的索引条目", len(changed) + len(removed))
+        axis_length = len(self.axis)
+        self._update(changed, removed)
+        if len(self.axis) != axis_length:
+            return None
+
+        for j, (code, table) in stale.items():
+            offsets = self._offsets[code]
+            first, last = np.searchsorted(offsets, [lo, hi])
+            for field in fields:
+                values = table.column(field).to_numpy()
+                arrays[field][offsets[first:last] - lo, j] = values[first:last]
+        return arrays
+
+    def panel(self, field: str, code_list: list[str] | None = None,
+              start: str | None = None, end: str | None = None) -> pd.DataFrame:
+        """拼单个字段的面板
+
+        Args:
+            field: 字段，如 'close'
+            code_list: 代码列表，None表示索引中的全部代码
+            start: 起始日期（含）
+            end: 结束日期（含）
+
+        Returns:
+            DataFrame，行为日期，列为代码，缺失为NaN
+        """
+        return self.panels([field], code_list, start, end)[field]
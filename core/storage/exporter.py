@@ -0,0 +1,264 @@
+"""
+导出模块
+CSV按块写入同一个文件句柄，Excel使用openpyxl的只写模式逐行写入，
+内存占用与块大小相关而不是与数据量相关；Excel超过单表行数上限时自动分表
+
+所有格式都先写临时文件再替换目标文件（新的inode），快照中硬链接的旧版本不会被改写
+"""
+
+import os
+import logging
+from typing import Iterable, Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+# Excel单个工作表的最大行数（含表头）
+EXCEL_MAX_ROWS = 1_048_576
+
+CSV_CHUNK_ROWS = 100_000
+EXCEL_CHUNK_ROWS = 50_000
+
+
+def _atomic_target(path: str) -> str:
+    """临时文件路径，写完后再替换目标文件，避免读到写了一半的文件"""
+    return f"{path}.tmp"
+
+
+def write_parquet(df: pd.DataFrame, path: str, compression: str = 'snappy') -> None:
+    """写入Parquet（先写临时文件再替换）
+
+    Args:
+        df: 数据
+        path: 输出路径
+        compression: 压缩算法
+    """
+    tmp_path = _atomic_target(path)
+    try:
+        df.to_parquet(tmp_path, engine='pyarrow', compression=compression)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ParquetStreamWriter:
+    """逐块追加写入Parquet（先写临时文件，close 时替换目标文件）
+
+    每次 write 写出一个row group，内存中只保留当前块。后续块的列类型按第一块的schema转换。
+    last_index 为最后写入的一行的索引，供调用方丢弃与已写入部分重叠的数据。
+
+    示例::
+
+        writer = ParquetStreamWriter(path)
+        for df in frames:
+            writer.write(df)
+        rows = writer.close()
+    """
+
+    def __init__(self, path: str, compression: str = 'snappy'):
+        self.path = path
+        self.compression = compression
+        self.rows = 0
+        self.last_index = None
+        self._tmp_path = _atomic_target(path)
+        self._writer: pq.ParquetWriter | None = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        """追加一块数据（保留索引）"""
+        if len(df) == 0:
+            return
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self._tmp_path, table.schema, compression=self.compression)
+        else:
+            table = table.cast(self._writer.schema)
+        self._writer.write_table(table)
+        self.rows += len(df)
+        self.last_index = df.index[-1]
+
+    def close(self) -> int:
+        """完成写入并替换目标文件；没有写入任何数据时不创建文件
+
+        Returns:
+            写入的行数
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            os.replace(self._tmp_path, self.path)
+        return self.rows
+
+    def abort(self) -> None:
+        """放弃写入，删除临时文件"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def iter_parquet_frames(path: str, batch_rows: int = CSV_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """按批读取Parquet文件，每批恢复为带索引的DataFrame"""
+    parquet_file = pq.ParquetFile(path)
+    schema = parquet_file.schema_arrow
+    for batch in parquet_file.iter_batches(batch_size=batch_rows):
+        yield pa.Table.from_batches([batch], schema=schema).to_pandas()
+
+
+def _chunks(df: pd.DataFrame, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    if len(df) == 0:
+        yield df
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def write_csv(df: pd.DataFrame, path: str, chunk_rows: int = CSV_CHUNK_ROWS,
+              encoding: str = 'utf-8-sig') -> None:
+    """分块写入CSV
+
+    输出与 df.to_csv(path, encoding='utf-8-sig') 相同：BOM只写一次（Excel打开中文不乱码），表头只写一次。
+
+    Args:
+        df: 数据
+        path: 输出路径
+        chunk_rows: 每块行数
+        encoding: 编码，默认带BOM的utf-8
+    """
+    write_csv_stream(_chunks(df, chunk_rows), path, encoding)
+
+
+def write_csv_stream(frames: Iterable[pd.DataFrame], path: str, encoding: str = 'utf-8-sig') -> int:
+    """把多块数据依次写入同一个CSV，表头只写一次
+
+    Args:
+        frames: 数据块（列相同）
+        path: 输出路径
+        encoding: 编码
+
+    Returns:
+        写入的行数
+    """
+    tmp_path = _atomic_target(path)
+    rows = 0
+    try:
+        with open(tmp_path, 'w', encoding=encoding, newline='') as f:
+            first = True
+            for chunk in frames:
+                if len(chunk) == 0 and not first:
+                    continue
+                chunk.to_csv(f, header=first)
+                first = False
+                rows += len(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return rows
+
+
+def _sheet_names(base: str, count: int) -> Iterator[str]:
+    yield base
+    for i in range(2, count + 1):
+        yield f"{base}_{i}"
+
+
+def write_excel(df: pd.DataFrame, path: str, sheet_name: str = 'data',
+                max_rows: int = EXCEL_MAX_ROWS) -> int:
+    """以只写模式流式写入Excel
+
+    openpyxl的只写模式不在内存中保留单元格，逐行写出；
+    数据行数超过单表上限时依次写入 data、data_2、data_3 ... 工作表，每个工作表都有表头。
+
+    Args:
+        df: 数据
+        path: 输出路径
+        sheet_name: 工作表名
+        max_rows: 单个工作表最大行数（含表头）
+
+    Returns:
+        工作表数量
+    """
+    return write_excel_stream(_chunks(df, EXCEL_CHUNK_ROWS), path, sheet_name, max_rows)
+
+
+def _discard_workbook(wb) -> None:
+    """放弃写了一半的只写工作簿，删除openpyxl为每个工作表创建的临时文件"""
+    for ws in wb.worksheets:
+        try:
+            ws.close()
+        except Exception:
+            pass
+        writer = getattr(ws, '_writer', None)
+        if writer is not None and os.path.exists(writer.out):
+            writer.cleanup()
+
+
+def write_excel_stream(frames: Iterable[pd.DataFrame], path: str, sheet_name: str = 'data',
+                       max_rows: int = EXCEL_MAX_ROWS) -> int:
+    """把多块数据依次写入Excel，当前工作表写满后换到下一个工作表
+
+    Args:
+        frames: 数据块（列相同）
+        path: 输出路径
+        sheet_name: 工作表名
+        max_rows: 单个工作表最大行数（含表头）
+
+    Returns:
+        工作表数量
+    """
+    from openpyxl import Workbook
+
+    rows_per_sheet = max_rows - 1
+    wb = Workbook(write_only=True)
+    names = _sheet_names(sheet_name, 2 ** 31)
+    ws = None
+    header: list[str] | None = None
+    n_sheets = 0
+    sheet_rows = 0
+
+    try:
+        for chunk in frames:
+            if header is None:
+                header = [chunk.index.name or 'index'] + [str(c) for c in chunk.columns]
+            index_values = (chunk.index.to_pydatetime() if isinstance(chunk.index, pd.DatetimeIndex)
+                            else chunk.index.tolist())
+            # 按块把列转换为Python对象后逐行写出，避免逐行构造Series
+            columns = [chunk[c].tolist() for c in chunk.columns]
+            rows = zip(index_values, *columns)
+            remaining = len(chunk)
+            while ws is None or remaining > 0:
+                if ws is None or sheet_rows == rows_per_sheet:
+                    ws = wb.create_sheet(title=next(names))
+                    ws.append(header)
+                    n_sheets += 1
+                    sheet_rows = 0
+                take = min(remaining, rows_per_sheet - sheet_rows)
+                for _ in range(take):
+                    ws.append(next(rows))
+                sheet_rows += take
+                remaining -= take
+    except BaseException:
+        _discard_workbook(wb)
+        raise
+
+    if ws is None:
+        wb.create_sheet(title=sheet_name).append(header or ['index'])
+        n_sheets = 1
+    if n_sheets > 1:
+        logger.info("📑 %s 超过Excel单表上限，分为 %d 个工作表", path, n_sheets)
+
+    tmp_path = _atomic_target(path)
+    try:
+        wb.save(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return n_sheets
@@ -0,0 +1,121 @@
+"""
+内容指纹模块
+对清洗后的DataFrame计算内容指纹，记录在 {output_dir}/.fingerprints/{文件名}.json，
+数据与磁盘上的文件相同时跳过写入，下游可以监视指纹而不是文件修改时间
+"""
+
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_DIR = '.fingerprints'
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """计算DataFrame的内容指纹
+
+    对索引和每一行取64位哈希（pd.util.hash_pandas_object），再连同列名、dtype一起做blake2b，
+    与文件格式、压缩参数无关，只要数据相同指纹就相同。
+
+    Args:
+        df: DataFrame
+
+    Returns:
+        32位十六进制字符串
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode('utf-8'))
+    digest.update(str(df.index.name).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class FingerprintStore:
+    """输出文件的指纹记录
+
+    示例::
+
+        store = FingerprintStore(output_dir)
+        fp = frame_fingerprint(df)
+        if not store.is_unchanged(path, fp):
+            df.to_parquet(path)
+            store.record(path, fp)
+    """
+
+    def __init__(self, output_dir: str):
+        """初始化
+
+        Args:
+            output_dir: 数据目录，指纹保存在其下的 .fingerprints 目录
+        """
+        self.output_dir = output_dir
+        self.fingerprint_dir = os.path.join(output_dir, FINGERPRINT_DIR)
+
+    def sidecar_path(self, path: str) -> str:
+        """数据文件对应的指纹文件路径"""
+        return os.path.join(self.fingerprint_dir, f"{os.path.basename(path)}.json")
+
+    def load(self, path: str) -> dict[str, Any] | None:
+        """读取数据文件的指纹记录，没有记录返回None"""
+        sidecar = self.sidecar_path(path)
+        if not os.path.exists(sidecar):
+            return None
+        try:
+            with open(sidecar, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️ 指纹文件损坏，将重新写入: %s (%s)", sidecar, e)
+            return None
+
+    def is_unchanged(self, path: str, fingerprint: str) -> bool:
+        """数据文件存在、未被外部修改，且记录的指纹与给定指纹相同
+
+        Args:
+            path: 数据文件路径
+            fingerprint: 新数据的指纹
+
+        Returns:
+            是否可以跳过写入
+        """
+        if not os.path.exists(path):
+            return False
+        record = self.load(path)
+        if record is None or record.get('fingerprint') != fingerprint:
+            return False
+        # 文件大小变化说明被外部改写过，不能相信记录
+        return record.get('size') == os.path.getsize(path)
+
+    def record(self, path: str, fingerprint: str, rows: int | None = None) -> None:
+        """写入数据文件后记录指纹
+
+        Args:
+            path: 数据文件路径
+            fingerprint: 数据指纹
+            rows: 行数（可选，供下游参考）
+        """
+        os.makedirs(self.fingerprint_dir, exist_ok=True)
+        record = {
+            'file': os.path.basename(path),
+            'fingerprint': fingerprint,
+            'size': os.path.getsize(path),
+            'rows': rows,
+            'updated': datetime.now().isoformat(timespec='seconds'),
+        }
+        sidecar = self.sidecar_path(path)
+        tmp_path = f"{sidecar}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, sidecar)
+
+    def forget(self, path: str) -> None:
+        """删除数据文件的指纹记录（文件以无法计算指纹的方式写入时调用，下次写入不会被跳过）"""
+        sidecar = self.sidecar_path(path)
+        if os.path.exists(sidecar):
+            os.remove(sidecar)
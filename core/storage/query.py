@@ -0,0 +1,292 @@
+"""
+SQL查询层
+把输出目录（每个代码一个parquet，或按 code=xxx 分区的数据集）注册到内嵌的DuckDB，
+用SQL做截面、排名和关联查询，结果直接返回pandas/Arrow，不需要把整个文件读进Python
+
+依赖duckdb（可选）: pip install duckdb
+"""
+
+import os
+import re
+import logging
+from typing import Any
+
+import pandas as pd
+
+from core.storage.reader import default_output_dir
+
+logger = logging.getLogger(__name__)
+
+# 数据文件名：{code}.parquet，如 600000.SH.parquet
+CODE_FILE_PATTERN = re.compile(r'^([0-9A-Za-z]+\.[A-Za-z]+)\.parquet$')
+# 分区目录：code=600000.SH
+PARTITION_PATTERN = re.compile(r'^code=(.+)$')
+
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'amount']
+
+
+def _import_duckdb():
+    try:
+        import duckdb
+    except ImportError as e:
+        raise ImportError("SQL查询层需要duckdb，请安装: pip install duckdb") from e
+    return duckdb
+
+
+def _quote(value: str) -> str:
+    """SQL字符串字面量"""
+    return "'" + value.replace("'", "''") + "'"
+
+
+class DataQuery:
+    """输出目录的SQL查询接口
+
+    - bars: 持久化表，按 (code, date) 建索引，refresh() 只重新导入有变化的文件
+    - bars_live: 直接读取parquet文件的视图，无需刷新，但没有索引
+
+    示例::
+
+        query = DataQuery()
+        query.refresh()
+        top = query.sql('''
+            SELECT code, close, amount FROM bars
+            WHERE date = ? ORDER BY amount DESC LIMIT 20
+        ''', ['2026-01-13'])
+    """
+
+    def __init__(self, output_dir: str | None = None, database: str | None = None,
+                 read_only: bool = False):
+        """初始化
+
+        Args:
+            output_dir: 数据目录，默认为项目的output目录
+            database: DuckDB数据库文件，默认为 {output_dir}/.query/qmt.duckdb；
+                      ':memory:' 表示不持久化
+            read_only: 只读打开（多个进程同时查询时使用）
+        """
+        self.output_dir = output_dir or default_output_dir()
+        if database is None:
+            database = os.path.join(self.output_dir, '.query', 'qmt.duckdb')
+            os.makedirs(os.path.dirname(database), exist_ok=True)
+        self.database = database
+        self.read_only = read_only
+        self._con = None
+
+    @property
+    def con(self):
+        """DuckDB连接（首次使用时建立）"""
+        if self._con is None:
+            duckdb = _import_duckdb()
+            self._con = duckdb.connect(self.database, read_only=self.read_only)
+            if not self.read_only:
+                self._init_schema()
+        return self._con
+
+    def close(self) -> None:
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+
+    def __enter__(self) -> 'DataQuery':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _init_schema(self) -> None:
+        columns = ', '.join(f'{c} DOUBLE' for c in BAR_COLUMNS)
+        self._con.execute(f"CREATE TABLE IF NOT EXISTS bars (code VARCHAR, date TIMESTAMP, {columns})")
+        self._con.execute("CREATE INDEX IF NOT EXISTS idx_bars_code_date ON bars (code, date)")
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS _files (path VARCHAR PRIMARY KEY, code VARCHAR, "
+            "mtime DOUBLE, size BIGINT)"
+        )
+
+    def discover_files(self) -> dict[str, str]:
+        """扫描数据文件
+
+        Returns:
+            {文件路径: 代码}
+        """
+        files: dict[str, str] = {}
+        for root, dirs, names in os.walk(self.output_dir):
+            # 跳过隐藏目录（.query、.fingerprints 等）
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            partition = PARTITION_PATTERN.match(os.path.basename(root))
+            for name in names:
+                if not name.endswith('.parquet'):
+                    continue
+                path = os.path.join(root, name)
+                if partition:
+                    files[path] = partition.group(1)
+                elif root == self.output_dir:
+                    match = CODE_FILE_PATTERN.match(name)
+                    if match:
+                        files[path] = match.group(1)
+        return files
+
+    def register(self) -> None:
+        """（重新）创建 bars_live 视图，直接读取当前所有数据文件"""
+        files = self.discover_files()
+        if not files:
+            logger.warning("⚠️ %s 下没有数据文件", self.output_dir)
+            return
+        selects = [
+            f"SELECT {_quote(code)} AS code, date, {', '.join(BAR_COLUMNS)} FROM read_parquet({_quote(path)})"
+            for path, code in sorted(files.items())
+        ]
+        self.con.execute("CREATE OR REPLACE TEMP VIEW bars_live AS " + " UNION ALL ".join(selects))
+
+    def refresh(self) -> dict[str, int]:
+        """增量同步 bars 表：只导入新增或修改过的文件，删除已不存在的文件
+
+        Returns:
+            {'added': n, 'updated': n, 'removed': n, 'unchanged': n}
+        """
+        con = self.con
+        files = self.discover_files()
+        known = {
+            path: (code, mtime, size)
+            for path, code, mtime, size in con.execute("SELECT path, code, mtime, size FROM _files").fetchall()
+        }
+
+        stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+        changed_codes: set[str] = set()
+        file_stats: dict[str, os.stat_result] = {}
+
+        for path in set(known) - set(files):
+            changed_codes.add(known[path][0])
+            stats['removed'] += 1
+
+        for path, code in files.items():
+            stat = file_stats[path] = os.stat(path)
+            previous = known.get(path)
+            if previous is not None and previous[1] == stat.st_mtime and previous[2] == stat.st_size:
+                stats['unchanged'] += 1
+                continue
+            changed_codes.add(code)
+            stats['updated' if previous is not None else 'added'] += 1
+
+        # 分区数据集中一个代码可能有多个文件，按代码整体重新导入
+        paths_by_code: dict[str, list[str]] = {}
+        for path, code in files.items():
+            paths_by_code.setdefault(code, []).append(path)
+
+        con.execute("BEGIN TRANSACTION")
+        try:
+            for code in sorted(changed_codes):
+                con.execute("DELETE FROM bars WHERE code = ?", [code])
+                con.execute("DELETE FROM _files WHERE code = ?", [code])
+                paths = sorted(paths_by_code.get(code, []))
+                if not paths:
+                    continue
+                con.execute(
+                    f"INSERT INTO bars SELECT ? AS code, date, {', '.join(BAR_COLUMNS)} "
+                    f"FROM read_parquet(?) ORDER BY date",
+                    [code, paths]
+                )
+                for path in paths:
+                    con.execute("INSERT INTO _files VALUES (?, ?, ?, ?)",
+                                [path, code, file_stats[path].st_mtime, file_stats[path].st_size])
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+        logger.info("🔄 查询库已同步: 新增 %d, 更新 %d, 删除 %d, 未变 %d",
+                    stats['added'], stats['updated'], stats['removed'], stats['unchanged'])
+        return stats
+
+    def sql(self, query: str, params: list[Any] | None = None) -> pd.DataFrame:
+        """执行SQL，返回pandas DataFrame"""
+        return self.con.execute(query, params or []).df()
+
+    def arrow(self, query: str, params: list[Any] | None = None):
+        """执行SQL，返回pyarrow.Table"""
+        result = self.con.execute(query, params or [])
+        # 兼容不同版本的duckdb
+        fetch = (getattr(result, 'to_arrow_table', None) or getattr(result, 'fetch_arrow_table', None)
+                 or result.arrow)
+        return fetch()
+
+    def cross_section(self, date: str, fields: list[str] | None = None) -> pd.DataFrame:
+        """某一天的截面数据
+
+        Args:
+            date: 日期，如 '2026-01-13'
+            fields: 字段列表，默认全部
+
+        Returns:
+            以code为索引的DataFrame
+        """
+        columns = ', '.join(fields or BAR_COLUMNS)
+        return self.sql(
+            f"SELECT code, {columns} FROM bars WHERE date = CAST(? AS TIMESTAMP) ORDER BY code", [date]
+        ).set_index('code')
+
+    def rank(self, date: str, by: str = 'amount', top: int = 20, ascending: bool = False) -> pd.DataFrame:
+        """某一天按字段排名
+
+        Args:
+            date: 日期
+            by: 排名字段
+            top: 返回前多少名
+            ascending: 是否升序
+
+        Returns:
+            DataFrame，包含 code、字段值和 rank
+        """
+        if by not in BAR_COLUMNS:
+            raise ValueError(f"不支持的排名字段: {by}")
+        order = 'ASC' if ascending else 'DESC'
+        return self.sql(
+            f"SELECT code, {by}, RANK() OVER (ORDER BY {by} {order}) AS rank FROM bars "
+            f"WHERE date = CAST(? AS TIMESTAMP) ORDER BY rank LIMIT ?",
+            [date, top]
+        )
+
+    def file_summary(self, code_list: list[str] | None = None) -> pd.DataFrame:
+        """每个代码的起止日期和行数（生成清单和股票列表用）
+
+        Args:
+            code_list: 代码列表，None表示全部
+
+        Returns:
+            DataFrame: code, start_date, end_date, count
+        """
+        query = ("SELECT code, CAST(MIN(date) AS DATE) AS start_date, CAST(MAX(date) AS DATE) AS end_date, "
+                 "COUNT(*) AS count FROM bars")
+        params: list[Any] = []
+        if code_list is not None:
+            query += " WHERE code IN (SELECT UNNEST(?))"
+            params.append(code_list)
+        return self.sql(query + " GROUP BY code ORDER BY code", params)
+
+    def manifest(self, code_list: list[str] | None = None) -> dict[str, dict[str, Any]]:
+        """生成与 DataValidator.generate_manifest 相同结构的清单，不读取文件内容
+
+        Args:
+            code_list: 代码列表，None表示全部
+
+        Returns:
+            清单字典
+        """
+        summary = self.file_summary(code_list).set_index('code')
+        files = {code: path for path, code in self.discover_files().items()}
+
+        manifest = {}
+        for code in (code_list if code_list is not None else list(summary.index)):
+            if code not in summary.index or code not in files:
+                manifest[code] = {'code': code, 'exists': False, 'error': 'File not found'}
+                continue
+            row = summary.loc[code]
+            manifest[code] = {
+                'code': code,
+                'exists': True,
+                'start_date': str(row['start_date'])[:10],
+                'end_date': str(row['end_date'])[:10],
+                'count': int(row['count']),
+                'fields': BAR_COLUMNS,
+                'file_size_mb': round(os.path.getsize(files[code]) / (1024 * 1024), 2),
+            }
+        return manifest
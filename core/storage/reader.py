@@ -0,0 +1,52 @@
+"""
+数据读取模块
+只依赖pandas/pyarrow，不导入xtquant，可在没有安装QMT的机器上使用
+"""
+
+import os
+import pandas as pd
+
+
+def default_output_dir() -> str:
+    """默认输出目录
+
+    优先使用环境变量 OUTPUT_DIR，否则为项目根目录下的 output
+
+    Returns:
+        输出目录路径
+    """
+    env_output_dir = os.getenv('OUTPUT_DIR')
+    if env_output_dir:
+        return env_output_dir
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    qmt_root = os.path.dirname(os.path.dirname(current_dir))
+    return os.path.join(qmt_root, 'output')
+
+
+def load_data(code: str, output_dir: str | None = None, snapshot: str | None = None) -> pd.DataFrame:
+    """从output目录读取指定代码的数据
+    
+    Args:
+        code: 股票/ETF代码
+        output_dir: 输出目录，默认为项目内的output目录
+        snapshot: 快照ID或 'latest'，指定后从该快照读取（见 core.storage.snapshot），
+                  None表示读取最新的数据文件
+        
+    Returns:
+        DataFrame
+    """
+    if output_dir is None:
+        output_dir = default_output_dir()
+    
+    if snapshot is not None:
+        from core.storage.snapshot import SnapshotStore
+        file_path = SnapshotStore(output_dir).file_path(code, snapshot)
+    else:
+        file_path = os.path.join(output_dir, f"{code}.parquet")
+    
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"数据文件不存在: {file_path}")
+    
+    df = pd.read_parquet(file_path, engine='pyarrow')
+    return df
@@ -0,0 +1,245 @@
+"""
+本地重采样模块
+用已下载的日线/分钟线在本地合成周线、月线和15/30/60分钟线，不需要再向QMT请求其他周期
+
+- 日线 -> 1w / 1mon：按自然周（周一开始）/自然月分组，标签为组内最后一个交易日
+- 分钟线 -> 5m / 15m / 30m / 60m / 1d：按A股交易时段分组（9:30-11:30, 13:00-15:00），
+  午休不跨桶，标签为桶的结束时间（与QMT的分钟线标签一致），如60分钟线为 10:30/11:30/14:00/15:00
+
+结果保存在 {output_dir}/{period}/{code}.parquet，增量更新时只重新计算最后一个桶
+"""
+
+import os
+import re
+import logging
+
+import numpy as np
+import pandas as pd
+
+from core.storage.reader import default_output_dir
+from core.storage.exporter import write_parquet
+
+logger = logging.getLogger(__name__)
+
+# 交易时段（距0点的分钟数）
+MORNING_OPEN = 9 * 60 + 30
+MORNING_CLOSE = 11 * 60 + 30
+AFTERNOON_OPEN = 13 * 60
+AFTERNOON_CLOSE = 15 * 60
+SESSION_MINUTES = (MORNING_CLOSE - MORNING_OPEN) + (AFTERNOON_CLOSE - AFTERNOON_OPEN)  # 240
+
+NS_PER_DAY = 86_400_000_000_000
+NS_PER_MINUTE = 60_000_000_000
+
+_MINUTE_PERIOD = re.compile(r'^(\d+)m$')
+
+
+def period_minutes(period: str) -> int | None:
+    """分钟周期的分钟数，'1h' 视为60分钟；非分钟周期返回None"""
+    if period == '1h':
+        return 60
+    match = _MINUTE_PERIOD.match(period)
+    return int(match.group(1)) if match else None
+
+
+def _session_minute(minutes_of_day: np.ndarray) -> np.ndarray:
+    """把时刻映射为交易时段内的第几分钟（1..240）
+
+    集合竞价（9:30及之前）并入第一分钟，午休时间并入上午最后一分钟，收盘后并入最后一分钟。
+    """
+    morning = minutes_of_day - MORNING_OPEN
+    afternoon = (MORNING_CLOSE - MORNING_OPEN) + (minutes_of_day - AFTERNOON_OPEN)
+    m = np.where(minutes_of_day <= MORNING_CLOSE, morning,
+                 np.where(minutes_of_day <= AFTERNOON_OPEN, MORNING_CLOSE - MORNING_OPEN, afternoon))
+    return np.clip(m, 1, SESSION_MINUTES)
+
+
+def _session_clock(session_minute: np.ndarray) -> np.ndarray:
+    """交易时段内的第几分钟 -> 距0点的分钟数"""
+    morning_len = MORNING_CLOSE - MORNING_OPEN
+    return np.where(session_minute <= morning_len,
+                    MORNING_OPEN + session_minute,
+                    AFTERNOON_OPEN + (session_minute - morning_len))
+
+
+def bucket_keys(index: pd.DatetimeIndex, target: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """计算每根K线所属的桶
+
+    Args:
+        index: 已排序的时间索引
+        target: 目标周期
+
+    Returns:
+        (keys, labels)：keys为单调不减的桶编号；
+        labels为每根K线所在桶的结束时间（纳秒），日线以上周期返回None（用组内最后一根的时间）
+    """
+    # parquet读回的时间可能是 us/ms 精度，统一换算到纳秒
+    ns = index.values.astype('datetime64[ns]').astype(np.int64)
+    days = ns // NS_PER_DAY
+
+    if target == '1w':
+        # 1970-01-01 是周四，(days + 3) % 7 为周一=0
+        return days - (days + 3) % 7, None
+
+    if target == '1mon':
+        return index.year.to_numpy() * 12 + index.month.to_numpy() - 1, None
+
+    if target == '1d':
+        return days, None
+
+    minutes = period_minutes(target)
+    if minutes is None:
+        raise ValueError(f"不支持的目标周期: {target}")
+    if SESSION_MINUTES % minutes != 0:
+        logger.warning("⚠️ %s 不能整除交易时段，最后一个桶会较短", target)
+
+    minutes_of_day = (ns - days * NS_PER_DAY) // NS_PER_MINUTE
+    bucket = (_session_minute(minutes_of_day) - 1) // minutes
+    end_minute = np.minimum((bucket + 1) * minutes, SESSION_MINUTES)
+    labels = days * NS_PER_DAY + _session_clock(end_minute) * NS_PER_MINUTE
+    return days * 1000 + bucket, labels
+
+
+def resample_bars(df: pd.DataFrame, target: str) -> pd.DataFrame:
+    """把基础K线重采样为更高周期
+
+    Args:
+        df: 以date为索引、已排序的OHLCV数据
+        target: 目标周期，'1w'/'1mon'/'1d'/'5m'/'15m'/'30m'/'60m'/'1h'
+
+    Returns:
+        重采样后的DataFrame，列与输入相同
+    """
+    if len(df) == 0:
+        return df.copy()
+
+    index = pd.DatetimeIndex(df.index)
+    keys, labels = bucket_keys(index, target)
+
+    # 排序数组上的分组：桶边界处切分，reduceat 一次完成聚合
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    ends = np.concatenate((starts[1:], [len(keys)])) - 1
+
+    result = {}
+    for column in df.columns:
+        values = df[column].to_numpy()
+        if column == 'open':
+            result[column] = values[starts]
+        elif column == 'high':
+            result[column] = np.maximum.reduceat(values, starts)
+        elif column == 'low':
+            result[column] = np.minimum.reduceat(values, starts)
+        elif column == 'close':
+            result[column] = values[ends]
+        else:
+            # volume / amount 等累加字段
+            result[column] = np.add.reduceat(values, starts)
+
+    if labels is None:
+        new_index = index[ends]
+    else:
+        new_index = pd.DatetimeIndex(labels[starts].astype('datetime64[ns]'))
+    out = pd.DataFrame(result, index=new_index, columns=df.columns)
+    out.index.name = df.index.name or 'date'
+    return out
+
+
+class Resampler:
+    """增量重采样并保存
+
+    示例::
+
+        resampler = Resampler()
+        resampler.update('600000.SH', '1w')      # 从 output/600000.SH.parquet 生成 output/1w/600000.SH.parquet
+        resampler.update_all(codes, ['1w', '1mon'])
+    """
+
+    def __init__(self, output_dir: str | None = None, base_period: str = '1d'):
+        """初始化
+
+        Args:
+            output_dir: 数据目录，基础K线为 {output_dir}/{code}.parquet
+            base_period: 基础K线的周期，用于检查目标周期是否可以由其合成
+        """
+        self.output_dir = output_dir or default_output_dir()
+        self.base_period = base_period
+
+    def target_path(self, code: str, target: str) -> str:
+        return os.path.join(self.output_dir, target, f"{code}.parquet")
+
+    def _check_target(self, target: str) -> None:
+        base_minutes = period_minutes(self.base_period)
+        target_minutes = period_minutes(target)
+        if base_minutes is None:
+            if target_minutes is not None or target == '1d':
+                raise ValueError(f"无法从 {self.base_period} 合成 {target}")
+        elif target_minutes is not None and target_minutes % base_minutes != 0:
+            raise ValueError(f"{target} 不是 {self.base_period} 的整数倍")
+
+    def _read_base(self, code: str, after: pd.Timestamp | None = None) -> pd.DataFrame:
+        path = os.path.join(self.output_dir, f"{code}.parquet")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"数据文件不存在: {path}")
+        filters = [('date', '>', after)] if after is not None else None
+        return pd.read_parquet(path, engine='pyarrow', filters=filters).sort_index()
+
+    def update(self, code: str, target: str, full: bool = False) -> pd.DataFrame:
+        """增量更新一个代码的重采样结果
+
+        已有结果时只读取倒数第二个桶之后的基础K线，重新计算最后一个（可能未完成的）桶和新桶。
+        基础K线被整体改写（如复权因子变化）后需要 full=True 全量重建。
+
+        Args:
+            code: 代码
+            target: 目标周期
+            full: 是否全量重建
+
+        Returns:
+            完整的重采样结果
+        """
+        self._check_target(target)
+        path = self.target_path(code, target)
+
+        existing = None
+        if not full and os.path.exists(path):
+            existing = pd.read_parquet(path, engine='pyarrow')
+
+        if existing is not None and len(existing) >= 2:
+            # 倒数第二个桶的标签是它的最后时刻，之后的K线都属于最后一个桶或更新的桶
+            cutoff = existing.index[-2]
+            fresh = resample_bars(self._read_base(code, after=cutoff), target)
+            result = pd.concat([existing.iloc[:-1], fresh])
+        else:
+            result = resample_bars(self._read_base(code), target)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_parquet(result, path)
+        return result
+
+    def update_all(self, code_list: list[str], targets: list[str], full: bool = False,
+                   rebuild: set[str] | None = None) -> dict[str, bool]:
+        """批量更新
+
+        Args:
+            code_list: 代码列表
+            targets: 目标周期列表
+            full: 是否全量重建
+            rebuild: 需要全量重建的代码（基础K线被整体改写，如重新下载或复权换算），
+                     见 QmtDataDownloader.rewritten_codes
+
+        Returns:
+            {code: 是否全部成功}
+        """
+        results = {}
+        for code in code_list:
+            ok = True
+            for target in targets:
+                try:
+                    self.update(code, target, full=full or code in (rebuild or ()))
+                except Exception as e:
+                    logger.warning("⚠️ %s 重采样为 %s 失败: %s", code, target, e)
+                    ok = False
+            results[code] = ok
+        logger.info("🧮 重采样完成: %d/%d 成功（%s）",
+                    sum(results.values()), len(code_list), ', '.join(targets))
+        return results
@@ -0,0 +1,323 @@
+"""
+共享内存行情窗口
+发布进程把每个代码最近N根K线放在一块固定布局的共享内存中（multiprocessing.shared_memory），
+多个策略进程直接映射读取，不再各自读取parquet、重复计算同一个窗口
+
+内存布局（全部按8字节对齐）：
+- 头部64字节: magic, n_slots, window, n_fields
+- 字段名表: n_fields × 16字节
+- 代码表: n_slots × 16字节（code -> slot）
+- seq: int64[n_slots]，每个槽位的顺序锁计数，奇数表示正在写
+- count: int64[n_slots]，该槽位累计写入的K线数，环形位置为 count % window
+- times: int64[n_slots, window]，纳秒时间戳
+- values: float64[n_fields, n_slots, window]，按字段分列存放
+
+只有一个写进程；读进程先读seq（奇数则重试），复制数据后再读seq，前后不一致则重试
+"""
+
+import os
+import time
+import logging
+from multiprocessing import shared_memory
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from core.fetcher.source import BAR_FIELDS
+from core.storage.reader import default_output_dir
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'QMTWIN01'
+HEADER_BYTES = 64
+NAME_BYTES = 16
+DEFAULT_NAME = 'qmtdatatool_window'
+
+# 本进程创建的共享内存（同一进程中既发布又读取时，不能取消发布端的登记）
+_OWNED: set[str] = set()
+
+
+def _layout(n_slots: int, window: int, n_fields: int) -> dict[str, tuple[int, tuple[int, ...], str]]:
+    """各数组的 (偏移, 形状, dtype)"""
+    layout = {}
+    offset = HEADER_BYTES
+    for key, shape, dtype, itemsize in (
+        ('fields', (n_fields,), f'S{NAME_BYTES}', NAME_BYTES),
+        ('codes', (n_slots,), f'S{NAME_BYTES}', NAME_BYTES),
+        ('seq', (n_slots,), 'int64', 8),
+        ('count', (n_slots,), 'int64', 8),
+        ('times', (n_slots, window), 'int64', 8),
+        ('values', (n_fields, n_slots, window), 'float64', 8),
+    ):
+        layout[key] = (offset, shape, dtype)
+        offset += int(np.prod(shape)) * itemsize
+        offset = (offset + 7) // 8 * 8
+    layout['_total'] = (offset, (), '')
+    return layout
+
+
+def _views(buf: memoryview, n_slots: int, window: int, n_fields: int) -> dict[str, np.ndarray]:
+    layout = _layout(n_slots, window, n_fields)
+    return {
+        key: np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+        for key, (offset, shape, dtype) in layout.items() if key != '_total'
+    }
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """附加到已有的共享内存，读进程退出时不删除它"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == 'posix' and name not in _OWNED:
+            # 旧版本的resource_tracker会在读进程退出时删除共享内存
+            from multiprocessing import resource_tracker
+            try:
+                resource_tracker.unregister(shm._name, 'shared_memory')  # type: ignore[attr-defined]
+            except Exception:
+                pass
+        return shm
+
+
+class SharedWindowPublisher:
+    """共享内存窗口的写端（每块共享内存只能有一个写进程）
+
+    示例::
+
+        publisher = SharedWindowPublisher(codes, window=240)
+        publisher.publish_from_store()           # 从输出目录加载每个代码最近240根K线
+        publisher.append('600000.SH', ts, bar)   # 实时追加（见 LiveBarEngine 的 publishers 参数）
+        ...
+        publisher.unlink()
+    """
+
+    def __init__(self, code_list: list[str], window: int = 240, fields: list[str] | None = None,
+                 name: str = DEFAULT_NAME):
+        """创建共享内存
+
+        Args:
+            code_list: 代码列表，决定槽位
+            window: 每个代码保留的K线数
+            fields: 字段，默认 BAR_FIELDS
+            name: 共享内存名称，读进程用它附加
+        """
+        self.fields = list(fields or BAR_FIELDS)
+        self.code_list = list(code_list)
+        self.window = window
+        self.name = name
+        self.slots = {code: i for i, code in enumerate(self.code_list)}
+
+        size = _layout(len(self.code_list), window, len(self.fields))['_total'][0]
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # 上次的发布进程没有正常退出，重新创建
+            stale = _attach(name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _OWNED.add(name)
+
+        header = np.ndarray((1,), dtype='S8', buffer=self.shm.buf, offset=0)
+        header[0] = MAGIC
+        dims = np.ndarray((3,), dtype='int64', buffer=self.shm.buf, offset=8)
+        dims[:] = (len(self.code_list), window, len(self.fields))
+
+        self._arrays = _views(self.shm.buf, len(self.code_list), window, len(self.fields))
+        self._arrays['fields'][:] = [f.encode('ascii') for f in self.fields]
+        self._arrays['codes'][:] = [c.encode('ascii') for c in self.code_list]
+        self._arrays['seq'][:] = 0
+        self._arrays['count'][:] = 0
+        logger.info("🧠 共享内存窗口 %s: %d 个代码 × %d 根K线（%.1f MB）",
+                    name, len(self.code_list), window, size / (1024 * 1024))
+
+    def __enter__(self) -> 'SharedWindowPublisher':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.unlink()
+
+    def publish(self, code: str, df: pd.DataFrame) -> None:
+        """用DataFrame的最后 window 行整体替换一个代码的窗口
+
+        Args:
+            code: 代码
+            df: 以date为索引的K线
+        """
+        slot = self.slots[code]
+        tail = df.iloc[-self.window:]
+        n = len(tail)
+        arrays = self._arrays
+
+        arrays['seq'][slot] += 1  # 奇数：开始写
+        arrays['times'][slot, :n] = tail.index.values.astype('datetime64[ns]').astype(np.int64)
+        for i, field in enumerate(self.fields):
+            arrays['values'][i, slot, :n] = tail[field].to_numpy(dtype=np.float64)
+        arrays['count'][slot] = n
+        arrays['seq'][slot] += 1  # 偶数：写完
+
+    def append(self, code: str, timestamp_ns: int, values: tuple[float, ...] | list[float]) -> None:
+        """追加一根K线，覆盖窗口中最旧的一根
+
+        Args:
+            code: 代码
+            timestamp_ns: K线时间（纳秒）
+            values: 与 fields 顺序一致的字段值
+        """
+        slot = self.slots.get(code)
+        if slot is None:
+            return
+        arrays = self._arrays
+        position = arrays['count'][slot] % self.window
+
+        arrays['seq'][slot] += 1
+        arrays['times'][slot, position] = timestamp_ns
+        arrays['values'][:, slot, position] = values
+        arrays['count'][slot] += 1
+        arrays['seq'][slot] += 1
+
+    def publish_from_store(self, output_dir: str | None = None) -> int:
+        """从输出目录读取每个代码的数据并发布窗口
+
+        Args:
+            output_dir: 数据目录
+
+        Returns:
+            成功发布的代码数
+        """
+        output_dir = output_dir or default_output_dir()
+        published = 0
+        for code in self.code_list:
+            path = os.path.join(output_dir, f"{code}.parquet")
+            if not os.path.exists(path):
+                continue
+            self.publish(code, pd.read_parquet(path, engine='pyarrow', columns=self.fields))
+            published += 1
+        logger.info("🧠 已发布 %d/%d 个代码的窗口", published, len(self.code_list))
+        return published
+
+    def close(self) -> None:
+        self._arrays = {}
+        self.shm.close()
+
+    def unlink(self) -> None:
+        """关闭并删除共享内存（读进程之后无法再附加）"""
+        self.close()
+        self.shm.unlink()
+        _OWNED.discard(self.name)
+
+
+class SharedWindowReader:
+    """共享内存窗口的读端
+
+    示例::
+
+        reader = SharedWindowReader()
+        df = reader.read('600000.SH')          # 一致的副本
+        close = reader.read_field('close', codes, n=20)
+    """
+
+    def __init__(self, name: str = DEFAULT_NAME, max_retries: int = 1000):
+        """附加到共享内存
+
+        Args:
+            name: 共享内存名称
+            max_retries: 读到正在写的数据时最多重试次数
+        """
+        self.name = name
+        self.max_retries = max_retries
+        self.shm = _attach(name)
+
+        header = np.ndarray((1,), dtype='S8', buffer=self.shm.buf, offset=0)
+        if header[0] != MAGIC:
+            self.shm.close()
+            raise ValueError(f"共享内存 {name} 不是行情窗口")
+        n_slots, window, n_fields = np.ndarray((3,), dtype='int64', buffer=self.shm.buf, offset=8).tolist()
+        self.window = window
+        self._arrays = _views(self.shm.buf, n_slots, window, n_fields)
+        self.fields = [f.decode('ascii') for f in self._arrays['fields'].tolist()]
+        self.codes = [c.decode('ascii') for c in self._arrays['codes'].tolist()]
+        self.slots = {code: i for i, code in enumerate(self.codes)}
+
+    def __enter__(self) -> 'SharedWindowReader':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._arrays = {}
+        self.shm.close()
+
+    def _snapshot(self, slot: int, n: int | None) -> tuple[np.ndarray, np.ndarray]:
+        """顺序锁读取一个槽位，返回按时间升序的 (times, values[n_fields, k])"""
+        seq = self._arrays['seq']
+        for _ in range(self.max_retries):
+            before = int(seq[slot])
+            if before % 2 == 1:
+                time.sleep(0)
+                continue
+            count = int(self._arrays['count'][slot])
+            size = min(count, self.window)
+            k = size if n is None else min(n, size)
+            # 环形缓冲区中最近 k 根的位置
+            positions = np.arange(count - k, count) % self.window
+            times = self._arrays['times'][slot, positions]
+            values = self._arrays['values'][:, slot, positions]
+            if int(seq[slot]) == before:
+                return times, values
+        raise TimeoutError(f"读取 {self.codes[slot]} 时写进程持续在写，已重试 {self.max_retries} 次")
+
+    def read(self, code: str, n: int | None = None) -> pd.DataFrame:
+        """读取一个代码最近 n 根K线的一致副本
+
+        Args:
+            code: 代码
+            n: K线数，默认整个窗口
+
+        Returns:
+            以date为索引的DataFrame
+        """
+        times, values = self._snapshot(self.slots[code], n)
+        index = pd.DatetimeIndex(times.astype('datetime64[ns]'), name='date')
+        return pd.DataFrame(values.T, index=index, columns=self.fields)
+
+    def latest(self, code: str) -> dict[str, Any] | None:
+        """最新一根K线"""
+        times, values = self._snapshot(self.slots[code], 1)
+        if len(times) == 0:
+            return None
+        bar = dict(zip(self.fields, values[:, 0].tolist()))
+        bar['date'] = pd.Timestamp(int(times[0]))
+        return bar
+
+    def read_field(self, field: str, code_list: list[str] | None = None, n: int | None = None) -> pd.DataFrame:
+        """多个代码同一字段最近 n 根K线（按位置对齐，行为从旧到新的序号）
+
+        Args:
+            field: 字段
+            code_list: 代码列表，默认全部
+            n: K线数，默认整个窗口
+
+        Returns:
+            DataFrame，列为代码；K线不足的代码前面补NaN
+        """
+        code_list = code_list or self.codes
+        n = n or self.window
+        field_index = self.fields.index(field)
+        out = np.full((n, len(code_list)), np.nan)
+        for j, code in enumerate(code_list):
+            _, values = self._snapshot(self.slots[code], n)
+            column = values[field_index]
+            out[n - len(column):, j] = column
+        return pd.DataFrame(out, columns=code_list)
+
+    def view(self, code: str) -> tuple[np.ndarray, np.ndarray]:
+        """零拷贝视图（times, values[n_fields, window]），环形顺序，不做一致性检查
+
+        适合只需要近似最新值、能容忍读到写了一半的场景。
+        """
+        slot = self.slots[code]
+        return self._arrays['times'][slot], self._arrays['values'][:, slot]
@@ -0,0 +1,225 @@
+"""
+数据快照模块
+每次下载完成后把当前数据文件发布为一个只读快照 output/snapshots/{id}/，回测固定读取某个快照，
+结果可复现，不会读到一半旧一半新的数据
+
+- 快照中的文件是数据文件的硬链接：数据文件总是先写临时文件再替换（见 core.storage.exporter），
+  替换后快照仍指向旧版本；没有变化的文件在各快照之间共享同一份磁盘空间
+- 快照目录先在临时目录中建好再重命名发布，最后更新 LATEST 指针
+- 旧快照按保留策略清理
+"""
+
+import os
+import json
+import shutil
+import logging
+from datetime import datetime, timedelta
+from typing import Any
+
+from core.storage.reader import default_output_dir
+from core.storage.fingerprint import FingerprintStore
+from core.storage.query import CODE_FILE_PATTERN
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = 'snapshots'
+LATEST_FILE = 'LATEST'
+MANIFEST_FILE = 'manifest.json'
+
+
+class SnapshotStore:
+    """快照管理
+
+    示例::
+
+        store = SnapshotStore()
+        snapshot_id = store.create()             # 下载完成后发布
+        df = load_data('600000.SH', snapshot=snapshot_id)
+        store.gc(keep_last=7)
+    """
+
+    def __init__(self, output_dir: str | None = None):
+        """初始化
+
+        Args:
+            output_dir: 数据目录，快照保存在 {output_dir}/snapshots
+        """
+        self.output_dir = output_dir or default_output_dir()
+        self.root = os.path.join(self.output_dir, SNAPSHOT_DIR)
+
+    def _data_files(self, code_list: list[str] | None = None) -> dict[str, str]:
+        """当前的数据文件 {code: 文件名}"""
+        files = {}
+        for name in sorted(os.listdir(self.output_dir)):
+            match = CODE_FILE_PATTERN.match(name)
+            if match and (code_list is None or match.group(1) in code_list):
+                files[match.group(1)] = name
+        return files
+
+    def _new_id(self) -> str:
+        snapshot_id = datetime.now().strftime('%Y%m%d-%H%M%S')
+        candidate, n = snapshot_id, 1
+        while os.path.exists(os.path.join(self.root, candidate)):
+            n += 1
+            candidate = f"{snapshot_id}-{n}"
+        return candidate
+
+    def create(self, snapshot_id: str | None = None, code_list: list[str] | None = None,
+               note: str | None = None) -> str:
+        """发布快照
+
+        Args:
+            snapshot_id: 快照ID，默认为当前时间 YYYYMMDD-HHMMSS
+            code_list: 只包含这些代码，None表示全部数据文件
+            note: 备注（写入快照清单）
+
+        Returns:
+            快照ID
+        """
+        snapshot_id = snapshot_id or self._new_id()
+        target = os.path.join(self.root, snapshot_id)
+        if os.path.exists(target):
+            raise FileExistsError(f"快照已存在: {snapshot_id}")
+
+        staging = os.path.join(self.root, f".{snapshot_id}.tmp")
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+        os.makedirs(staging)
+
+        fingerprints = FingerprintStore(self.output_dir)
+        entries: dict[str, dict[str, Any]] = {}
+        linked = copied = 0
+        try:
+            for code, name in self._data_files(code_list).items():
+                source = os.path.join(self.output_dir, name)
+                destination = os.path.join(staging, name)
+                try:
+                    os.link(source, destination)
+                    linked += 1
+                except OSError:
+                    # 文件系统不支持硬链接（如FAT32、跨盘符）时退化为复制
+                    shutil.copy2(source, destination)
+                    copied += 1
+                record = fingerprints.load(source) or {}
+                entries[code] = {
+                    'file': name,
+                    'size': os.path.getsize(destination),
+                    'fingerprint': record.get('fingerprint'),
+                }
+
+            manifest = {
+                'id': snapshot_id,
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'note': note,
+                'files': entries,
+            }
+            with open(os.path.join(staging, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+            os.rename(staging, target)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        self._write_latest(snapshot_id)
+        logger.info("📸 已发布快照 %s: %d 个文件（硬链接 %d，复制 %d）",
+                    snapshot_id, len(entries), linked, copied)
+        return snapshot_id
+
+    def _write_latest(self, snapshot_id: str) -> None:
+        path = os.path.join(self.root, LATEST_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(snapshot_id)
+        os.replace(tmp_path, path)
+
+    def list_snapshots(self) -> list[str]:
+        """已发布的快照ID，按创建时间从旧到新
+
+        快照ID可以由调用方指定（如 'pre-release'），不能按名称排序；
+        按清单中的创建时间排序，同一秒内创建的按清单文件的修改时间排序。
+        """
+        if not os.path.isdir(self.root):
+            return []
+        names = [name for name in os.listdir(self.root)
+                 if not name.startswith('.') and os.path.exists(os.path.join(self.root, name, MANIFEST_FILE))]
+        return sorted(names, key=self._created_key)
+
+    def _created_key(self, snapshot_id: str) -> tuple[str, int, str]:
+        path = os.path.join(self.root, snapshot_id, MANIFEST_FILE)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                created = json.load(f).get('created') or ''
+        except (OSError, ValueError):
+            created = ''
+        mtime_ns = os.stat(path).st_mtime_ns
+        # 清单中没有创建时间时用清单文件的修改时间
+        return (created or datetime.fromtimestamp(mtime_ns / 1e9).isoformat(timespec='seconds'),
+                mtime_ns, snapshot_id)
+
+    def latest(self) -> str | None:
+        """最新发布的快照ID，没有快照返回None"""
+        path = os.path.join(self.root, LATEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+
+    def resolve(self, snapshot: str) -> str:
+        """快照ID或 'latest' -> 快照ID"""
+        snapshot_id = self.latest() if snapshot == 'latest' else snapshot
+        if snapshot_id is None or not os.path.exists(os.path.join(self.root, snapshot_id, MANIFEST_FILE)):
+            raise FileNotFoundError(f"快照不存在: {snapshot}")
+        return snapshot_id
+
+    def manifest(self, snapshot: str = 'latest') -> dict[str, Any]:
+        """读取快照清单"""
+        snapshot_id = self.resolve(snapshot)
+        with open(os.path.join(self.root, snapshot_id, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def file_path(self, code: str, snapshot: str = 'latest') -> str:
+        """某个快照中代码对应的数据文件路径"""
+        snapshot_id = self.resolve(snapshot)
+        path = os.path.join(self.root, snapshot_id, f"{code}.parquet")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"快照 {snapshot_id} 中没有 {code}")
+        return path
+
+    def gc(self, keep_last: int = 7, keep_days: int | None = None,
+           pinned: list[str] | None = None) -> list[str]:
+        """按保留策略删除旧快照
+
+        保留最近 keep_last 个快照、keep_days 天内创建的快照、pinned 中的快照和 LATEST。
+        硬链接的文件只有在最后一个引用被删除时才真正释放空间。
+
+        Args:
+            keep_last: 至少保留最近多少个
+            keep_days: 保留多少天内的快照，None表示不按时间保留
+            pinned: 始终保留的快照ID（如正在运行的回测）
+
+        Returns:
+            被删除的快照ID
+        """
+        snapshots = self.list_snapshots()
+        keep = set(snapshots[-keep_last:]) if keep_last > 0 else set()
+        keep.update(pinned or [])
+        latest = self.latest()
+        if latest:
+            keep.add(latest)
+
+        cutoff = datetime.now() - timedelta(days=keep_days) if keep_days is not None else None
+        removed = []
+        for snapshot_id in snapshots:
+            if snapshot_id in keep:
+                continue
+            if cutoff is not None:
+                created = self.manifest(snapshot_id).get('created')
+                if created and datetime.fromisoformat(created) >= cutoff:
+                    continue
+            shutil.rmtree(os.path.join(self.root, snapshot_id))
+            removed.append(snapshot_id)
+
+        if removed:
+            logger.info("🗑️ 已清理 %d 个旧快照: %s", len(removed), ', '.join(removed))
+        return removed
@@ -0,0 +1,281 @@
+"""
+摘要统计表模块
+为每个代码维护一行摘要（最新收盘价、N日均量/均额、52周高低点、区间收益、行数、起止日期），
+保存在 {output_dir}/summary.parquet，选股筛选只需读取这一个小文件，不必逐个加载数据文件
+
+每次保存数据时由下载器用内存中的DataFrame更新对应的行；其他途径写入的文件
+（分片下载的工作进程、流式写入、手工替换）按文件大小和修改时间识别，刷新时重新计算。
+stock_list.csv 和 manifest.json 都由摘要表生成。
+"""
+
+import os
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from core.storage.query import CODE_FILE_PATTERN
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_FILE = 'summary.parquet'
+
+# 均量/均额的窗口（交易日）
+AVG_WINDOWS = (5, 20, 60)
+# 区间收益的窗口（交易日），另有年初至今 ret_ytd
+RETURN_WINDOWS = (5, 20, 60, 250)
+# 52周高低点的回看天数（自然日）
+HIGH_LOW_DAYS = 365
+
+# 计算摘要只需要这些列
+SUMMARY_SOURCE_COLUMNS = ['high', 'low', 'close', 'volume', 'amount']
+
+
+def _daily(df: pd.DataFrame) -> pd.DataFrame:
+    """分钟线等日内数据合并为日线（收盘价取每日最后一根，高低点取极值，量额求和），日线原样返回"""
+    days = df.index.normalize()
+    if days.is_unique:
+        return df
+    grouped = df.groupby(days)
+    agg = {col: how for col, how in (('high', 'max'), ('low', 'min'), ('close', 'last'),
+                                     ('volume', 'sum'), ('amount', 'sum')) if col in df.columns}
+    return grouped.agg(agg)
+
+
+def summarize_frame(code: str, df: pd.DataFrame, path: str | None = None) -> dict[str, Any]:
+    """计算一个代码的摘要
+
+    Args:
+        code: 股票/ETF代码
+        df: 清洗后的数据（按日期升序的DatetimeIndex）
+        path: 数据文件路径，记录文件名、大小和修改时间，用于识别文件是否被其他途径改写
+
+    Returns:
+        摘要行
+    """
+    row: dict[str, Any] = {
+        'code': code,
+        'rows': len(df),
+        'first_date': df.index[0] if len(df) else pd.NaT,
+        'last_date': df.index[-1] if len(df) else pd.NaT,
+        'fields': ','.join(str(c) for c in df.columns),
+    }
+
+    daily = _daily(df) if len(df) else df
+    close = daily['close'].to_numpy(dtype='float64') if 'close' in daily.columns else np.empty(0)
+    row['last_close'] = close[-1] if len(close) else np.nan
+
+    for window in AVG_WINDOWS:
+        for col, name in (('volume', 'avg_volume'), ('amount', 'avg_amount')):
+            values = daily[col].to_numpy(dtype='float64')[-window:] if col in daily.columns else ()
+            row[f'{name}_{window}'] = float(np.mean(values)) if len(values) else np.nan
+
+    if len(daily):
+        recent = daily[daily.index > daily.index[-1] - timedelta(days=HIGH_LOW_DAYS)]
+        row['high_52w'] = float(recent['high' if 'high' in recent.columns else 'close'].max())
+        row['low_52w'] = float(recent['low' if 'low' in recent.columns else 'close'].min())
+    else:
+        row['high_52w'] = row['low_52w'] = np.nan
+
+    for window in RETURN_WINDOWS:
+        row[f'ret_{window}d'] = close[-1] / close[-1 - window] - 1 if len(close) > window else np.nan
+    if len(close):
+        # 年初至今：相对上一年最后一个交易日的收盘价
+        before = daily.index < pd.Timestamp(daily.index[-1].year, 1, 1)
+        row['ret_ytd'] = close[-1] / close[before][-1] - 1 if before.any() else np.nan
+    else:
+        row['ret_ytd'] = np.nan
+
+    row['file'] = os.path.basename(path) if path else None
+    stat = os.stat(path) if path and os.path.exists(path) else None
+    row['file_size'] = stat.st_size if stat else 0
+    row['file_mtime_ns'] = stat.st_mtime_ns if stat else 0
+    row['updated'] = pd.Timestamp(datetime.now().replace(microsecond=0))
+    return row
+
+
+class SummaryTable:
+    """摘要统计表
+
+    示例::
+
+        summary = SummaryTable(output_dir)
+        summary.refresh()                                        # 重新计算有变化的文件
+        liquid = summary.screen('avg_amount_20 > 1e8 and last_close >= high_52w * 0.95')
+    """
+
+    def __init__(self, output_dir: str):
+        """初始化
+
+        Args:
+            output_dir: 数据目录，摘要表保存为其下的 summary.parquet
+        """
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, SUMMARY_FILE)
+        # 保存数据时计算、尚未写入摘要表的行 {code: row}
+        self._pending: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def data_path(self, code: str) -> str:
+        return os.path.join(self.output_dir, f"{code}.parquet")
+
+    def load(self) -> pd.DataFrame:
+        """读取摘要表（以代码为索引），不存在时返回空表"""
+        if not os.path.exists(self.path):
+            return pd.DataFrame(index=pd.Index([], name='code'))
+        return pd.read_parquet(self.path).set_index('code')
+
+    def record(self, code: str, df: pd.DataFrame) -> None:
+        """数据文件写入后用内存中的数据更新摘要（在 flush/refresh 时写入摘要表）
+
+        Args:
+            code: 股票/ETF代码
+            df: 刚写入 {code}.parquet 的数据
+        """
+        row = summarize_frame(code, df, self.data_path(code))
+        with self._lock:
+            self._pending[code] = row
+
+    def _summarize_file(self, code: str) -> dict[str, Any] | None:
+        """从数据文件重新计算摘要，文件不存在或无法读取时返回None"""
+        path = self.data_path(code)
+        if not os.path.exists(path):
+            return None
+        try:
+            schema = pq.read_schema(path)
+            index_columns = (schema.pandas_metadata or {}).get('index_columns', [])
+            fields = [n for n in schema.names if n not in index_columns]
+            df = pd.read_parquet(path, columns=[c for c in SUMMARY_SOURCE_COLUMNS if c in fields])
+            row = summarize_frame(code, df, path)
+            # 只读取了计算需要的列，字段列表以文件为准
+            row['fields'] = ','.join(fields)
+            return row
+        except Exception as e:
+            logger.warning("⚠️ 计算 %s 的摘要失败: %s", code, e)
+            return None
+
+    def _is_current(self, code: str, row: pd.Series | dict[str, Any]) -> bool:
+        """摘要行与数据文件一致（文件大小和修改时间都没变）"""
+        path = self.data_path(code)
+        if not os.path.exists(path):
+            return False
+        stat = os.stat(path)
+        return int(row['file_size']) == stat.st_size and int(row['file_mtime_ns']) == stat.st_mtime_ns
+
+    def refresh(self, code_list: list[str] | None = None) -> pd.DataFrame:
+        """写入待更新的行，重新计算文件有变化的代码，并保存摘要表
+
+        Args:
+            code_list: 需要保证最新的代码，None表示数据目录下的全部数据文件
+
+        Returns:
+            刷新后的摘要表
+        """
+        table = self.load()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if code_list is None:
+            matches = map(CODE_FILE_PATTERN.match, os.listdir(self.output_dir))
+            code_list = sorted(match.group(1) for match in matches if match)
+
+        rows = {}
+        removed = []
+        for code in code_list:
+            if code in pending and self._is_current(code, pending[code]):
+                rows[code] = pending.pop(code)
+                continue
+            if code in table.index and self._is_current(code, table.loc[code]):
+                continue
+            row = self._summarize_file(code)
+            if row is None:
+                removed.append(code)
+            else:
+                rows[code] = row
+        # 不在 code_list 中但已经计算好的行也一并写入
+        rows.update({code: row for code, row in pending.items() if self._is_current(code, row)})
+
+        if rows or removed:
+            table = table.drop(index=[c for c in removed if c in table.index])
+            updates = pd.DataFrame(list(rows.values())).set_index('code') if rows else None
+            if updates is not None:
+                kept = table.drop(index=[c for c in updates.index if c in table.index])
+                table = updates if kept.empty else pd.concat([kept, updates])
+            table = table.sort_index()
+            self._save(table)
+            logger.info("📊 摘要表已更新 %d 个代码（共 %d 个）: %s", len(rows), len(table), self.path)
+        return table
+
+    def flush(self) -> None:
+        """只写入待更新的行，不检查其他文件"""
+        with self._lock:
+            codes = list(self._pending)
+        if codes:
+            self.refresh(codes)
+
+    def _save(self, table: pd.DataFrame) -> None:
+        tmp_path = f"{self.path}.tmp"
+        table.reset_index().to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+
+    def screen(self, expr: str) -> pd.DataFrame:
+        """按条件筛选代码（DataFrame.query 语法）
+
+        Args:
+            expr: 如 'avg_amount_20 > 1e8 and ret_20d > 0'
+
+        Returns:
+            满足条件的摘要行
+        """
+        return self.load().query(expr)
+
+    def stock_list(self, code_list: list[str]) -> pd.DataFrame:
+        """生成股票列表（stock_list.csv 的格式），没有数据文件的代码各项为 '-'"""
+        table = self.load()
+        records = []
+        for code in code_list:
+            if code in table.index:
+                row = table.loc[code]
+                records.append({
+                    '代码': code,
+                    '起始日期': str(row['first_date'].date()),
+                    '结束日期': str(row['last_date'].date()),
+                    '数据量': int(row['rows']),
+                    '文件': row['file'],
+                })
+            else:
+                records.append({'代码': code, '起始日期': '-', '结束日期': '-', '数据量': 0, '文件': '-'})
+        return pd.DataFrame(records)
+
+    def manifest(self, code_list: list[str] | None = None) -> dict[str, dict[str, Any]]:
+        """生成与 DataValidator.generate_manifest 相同结构的清单，不读取数据文件
+
+        Args:
+            code_list: 代码列表，None表示摘要表中的全部代码
+
+        Returns:
+            清单字典
+        """
+        table = self.refresh(code_list)
+        manifest = {}
+        for code in (code_list if code_list is not None else list(table.index)):
+            if code not in table.index:
+                exists = os.path.exists(self.data_path(code))
+                manifest[code] = {'code': code, 'exists': exists,
+                                  'error': 'Unreadable file' if exists else 'File not found'}
+                continue
+            row = table.loc[code]
+            manifest[code] = {
+                'code': code,
+                'exists': True,
+                'start_date': str(row['first_date'].date()) if int(row['rows']) else None,
+                'end_date': str(row['last_date'].date()) if int(row['rows']) else None,
+                'count': int(row['rows']),
+                'fields': row['fields'].split(',') if row['fields'] else [],
+                'file_size_mb': round(int(row['file_size']) / (1024 * 1024), 2),
+            }
+        return manifest
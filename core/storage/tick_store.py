@@ -0,0 +1,265 @@
+"""
+分笔数据存储模块
+period='tick' 的数据量是1分钟线的约20倍，每个代码一个float64的parquet文件既大又慢。
+分笔数据按交易日、代码分文件保存在 {output_dir}/tick/{YYYYMMDD}/{code}.parquet：
+
+- 价格按 PRICE_SCALE 换算为整数（0.001元），成交额按 AMOUNT_SCALE 换算为整数（0.01元），
+  时间为毫秒整数；整数列使用Parquet的 DELTA_BINARY_PACKED 编码（存相邻差值并按位打包），
+  时间、价格、累计成交量这类缓慢变化的序列压缩后约为float64的40%
+- 每 BUCKET_MINUTES 分钟一个row group，文件元数据中保存每个row group的起止时间（时间索引），
+  读取日内某个时间窗口时只解压覆盖该窗口的row group
+"""
+
+import os
+import json
+import logging
+from datetime import datetime
+from typing import Any, Iterable
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from core.fetcher.source import parse_time
+from core.storage.reader import default_output_dir
+
+logger = logging.getLogger(__name__)
+
+TICK_DIR = 'tick'
+
+# 分笔字段（盘口只保存买一/卖一），累计成交量/成交额与xtdata一致
+TICK_FIELDS = ['price', 'volume', 'amount', 'bid_price', 'ask_price', 'bid_volume', 'ask_volume']
+
+# 整数换算比例：价格精确到0.001元（ETF最小变动价位），成交额精确到0.01元
+PRICE_SCALE = 1000
+AMOUNT_SCALE = 100
+FIELD_SCALES = {'price': PRICE_SCALE, 'bid_price': PRICE_SCALE, 'ask_price': PRICE_SCALE,
+                'amount': AMOUNT_SCALE, 'volume': 1, 'bid_volume': 1, 'ask_volume': 1}
+
+# 每个row group覆盖的分钟数，越小读取窗口越精确，但压缩率越低
+BUCKET_MINUTES = 30
+
+# 文件元数据中时间索引的键
+INDEX_KEY = b'qmt.tick_index'
+
+_MS_PER_MINUTE = 60_000
+
+
+def _to_timestamp(value: str | pd.Timestamp | datetime, end: bool = False) -> pd.Timestamp:
+    """YYYYMMDD / YYYYMMDDHHMMSS / Timestamp -> Timestamp，只有日期的结束时间取当天最后一刻"""
+    if isinstance(value, str):
+        return parse_time(value, end=end)
+    return pd.Timestamp(value)
+
+
+def _to_ms(ts: pd.Timestamp) -> int:
+    return int(ts.value // 1_000_000)
+
+
+def encode_ticks(df: pd.DataFrame) -> pa.Table:
+    """分笔DataFrame -> 整数列的Arrow表
+
+    Args:
+        df: 以时间为索引（北京时间，不带时区）的分笔数据，列为 TICK_FIELDS 的子集
+
+    Returns:
+        Arrow表，time 为毫秒整数，其余字段按 FIELD_SCALES 换算为int64（缺失值记为0）
+    """
+    columns = {'time': pa.array(pd.DatetimeIndex(df.index).as_unit('ms').asi8, type=pa.int64())}
+    for field in TICK_FIELDS:
+        if field in df.columns:
+            values = df[field].to_numpy(dtype='float64', na_value=0.0) * FIELD_SCALES[field]
+            columns[field] = pa.array(np.rint(values).astype('int64'))
+    return pa.table(columns)
+
+
+def decode_ticks(table: pa.Table) -> pd.DataFrame:
+    """encode_ticks 的逆变换：整数列还原为float64，time 还原为时间索引"""
+    data = {}
+    for field in table.column_names:
+        if field == 'time':
+            continue
+        data[field] = table.column(field).to_numpy() / FIELD_SCALES.get(field, 1)
+    index = pd.DatetimeIndex(table.column('time').to_numpy().astype('datetime64[ms]'), name='time')
+    return pd.DataFrame(data, index=index)
+
+
+def clean_ticks(df: pd.DataFrame) -> pd.DataFrame:
+    """清洗分笔数据：去除没有成交价的快照（集合竞价前等），按时间排序，同一时间保留最后一条"""
+    if df is None or len(df) == 0:
+        return df
+    if 'price' in df.columns:
+        df = df[df['price'] > 0]
+    df = df.sort_index(kind='stable')
+    return df[~df.index.duplicated(keep='last')]
+
+
+class TickStore:
+    """分笔数据存储
+
+    示例::
+
+        store = TickStore()                                            # output/tick
+        store.write('600000.SH', ticks)                                # 按交易日拆分写入
+        window = store.read('600000.SH', '20260113100000', '20260113103000')
+    """
+
+    def __init__(self, root: str | None = None, bucket_minutes: int = BUCKET_MINUTES,
+                 compression: str = 'zstd'):
+        """初始化
+
+        Args:
+            root: 存储目录，默认为 {output_dir}/tick
+            bucket_minutes: 每个row group覆盖的分钟数
+            compression: Parquet压缩算法
+        """
+        self.root = root or os.path.join(default_output_dir(), TICK_DIR)
+        self.bucket_minutes = bucket_minutes
+        self.compression = compression
+
+    def path(self, code: str, day: str) -> str:
+        """某个代码某个交易日的文件路径"""
+        return os.path.join(self.root, day, f"{code}.parquet")
+
+    def has_day(self, code: str, day: str) -> bool:
+        return os.path.exists(self.path(code, day))
+
+    def days(self, code: str | None = None) -> list[str]:
+        """已保存的交易日（YYYYMMDD，升序），指定代码时只返回有该代码的交易日"""
+        if not os.path.isdir(self.root):
+            return []
+        days = sorted(d for d in os.listdir(self.root) if len(d) == 8 and d.isdigit())
+        if code is None:
+            return days
+        return [d for d in days if self.has_day(code, d)]
+
+    def write_day(self, code: str, day: str, df: pd.DataFrame) -> int:
+        """写入一个代码一个交易日的分笔数据（先写临时文件再替换）
+
+        Args:
+            code: 股票/ETF代码
+            day: 交易日 YYYYMMDD
+            df: 当天的分笔数据，以时间为索引
+
+        Returns:
+            文件字节数
+        """
+        table = encode_ticks(df.sort_index(kind='stable'))
+        times = table.column('time').to_numpy()
+        bucket_ms = self.bucket_minutes * _MS_PER_MINUTE
+        # 按时间桶切分row group，边界落在桶的整数倍上（北京时间），不随数据起点漂移
+        buckets = times // bucket_ms
+        cuts = np.flatnonzero(np.diff(buckets)) + 1
+        bounds = list(zip(np.r_[0, cuts], np.r_[cuts, len(times)]))
+
+        index = [[int(times[lo]), int(times[hi - 1]), int(hi - lo)] for lo, hi in bounds]
+        metadata = {INDEX_KEY: json.dumps({'bucket_minutes': self.bucket_minutes,
+                                           'row_groups': index}).encode('utf-8')}
+        schema = table.schema.with_metadata(metadata)
+        encodings = {c: 'DELTA_BINARY_PACKED' for c in table.column_names}
+
+        path = self.path(code, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        try:
+            with pq.ParquetWriter(tmp_path, schema, compression=self.compression,
+                                  use_dictionary=False, column_encoding=encodings) as writer:
+                for lo, hi in bounds:
+                    writer.write_table(table.slice(lo, hi - lo))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return os.path.getsize(path)
+
+    def write(self, code: str, df: pd.DataFrame) -> dict[str, int]:
+        """按交易日拆分写入（整天覆盖）
+
+        Args:
+            code: 股票/ETF代码
+            df: 分笔数据，可以跨多个交易日
+
+        Returns:
+            {交易日: 行数}
+        """
+        written = {}
+        if df is None or len(df) == 0:
+            return written
+        for day, group in df.groupby(df.index.strftime('%Y%m%d')):
+            self.write_day(code, day, group)
+            written[day] = len(group)
+        return written
+
+    def read_index(self, code: str, day: str) -> list[tuple[int, int, int]]:
+        """读取文件的时间索引（只读文件尾部的元数据）
+
+        Returns:
+            每个row group的 (起始毫秒, 结束毫秒, 行数)
+        """
+        metadata = pq.read_schema(self.path(code, day)).metadata or {}
+        if INDEX_KEY not in metadata:
+            return []
+        return [tuple(item) for item in json.loads(metadata[INDEX_KEY])['row_groups']]
+
+    def read(self, code: str, start: str | pd.Timestamp, end: str | pd.Timestamp | None = None,
+             fields: Iterable[str] | None = None) -> pd.DataFrame:
+        """读取时间窗口内的分笔数据
+
+        每个交易日只解压与窗口重叠的row group。
+
+        Args:
+            code: 股票/ETF代码
+            start: 起始时间 YYYYMMDD / YYYYMMDDHHMMSS / Timestamp（含）
+            end: 结束时间（含），只有日期时取当天收盘后；None表示与 start 同一天
+            fields: 只读取这些字段，默认全部
+
+        Returns:
+            以时间为索引的DataFrame，没有数据时为空表
+        """
+        start_ts = _to_timestamp(start)
+        end_ts = _to_timestamp(end if end is not None else start_ts.strftime('%Y%m%d'), end=True)
+        start_ms, end_ms = _to_ms(start_ts), _to_ms(end_ts)
+        columns = ['time', *fields] if fields is not None else None
+
+        tables = []
+        for day in self.days(code):
+            if not start_ts.strftime('%Y%m%d') <= day <= end_ts.strftime('%Y%m%d'):
+                continue
+            tables.extend(self._read_day(code, day, start_ms, end_ms, columns))
+
+        if not tables:
+            return decode_ticks(pa.table({'time': pa.array([], type=pa.int64())}))
+        return decode_ticks(pa.concat_tables(tables))
+
+    def _read_day(self, code: str, day: str, start_ms: int, end_ms: int,
+                  columns: list[str] | None) -> list[pa.Table]:
+        parquet_file = pq.ParquetFile(self.path(code, day))
+        metadata = parquet_file.schema_arrow.metadata or {}
+        index = json.loads(metadata[INDEX_KEY])['row_groups'] if INDEX_KEY in metadata else None
+        if index is None:
+            groups = list(range(parquet_file.num_row_groups))
+        else:
+            groups = [i for i, (lo, hi, _) in enumerate(index) if hi >= start_ms and lo <= end_ms]
+        if not groups:
+            return []
+
+        table = parquet_file.read_row_groups(groups, columns=columns)
+        times = table.column('time').to_numpy()
+        # 首尾两个row group可能只有一部分在窗口内
+        lo, hi = np.searchsorted(times, start_ms, 'left'), np.searchsorted(times, end_ms, 'right')
+        return [table.slice(lo, hi - lo)]
+
+    def stats(self, code: str | None = None) -> dict[str, Any]:
+        """存储统计：交易日数、文件数和总字节数"""
+        files = size = 0
+        days = self.days(code)
+        for day in days:
+            names = [f"{code}.parquet"] if code else os.listdir(os.path.join(self.root, day))
+            for name in names:
+                path = os.path.join(self.root, day, name)
+                if name.endswith('.parquet') and os.path.exists(path):
+                    files += 1
+                    size += os.path.getsize(path)
+        return {'days': len(days), 'files': files, 'bytes': size}
@@ -0,0 +1,50 @@
+"""
+测试用的数据源和样例数据
+不依赖MiniQMT：K线由 ReplaySource 从临时目录回放
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from core.fetcher.source import BAR_FIELDS, DataSource, ReplaySource
+
+
+class ReplaySourceFactory:
+    """分片下载用的数据源工厂：每个工作进程从同一个目录回放K线
+
+    ShardedDownloader 用spawn方式启动工作进程，工厂必须可以被pickle，
+    因此用模块级的类保存目录，而不是闭包或lambda。
+    """
+
+    def __init__(self, source_dir: str):
+        self.source_dir = source_dir
+
+    def __call__(self, endpoint: int | str) -> DataSource:
+        return ReplaySource(self.source_dir)
+
+
+def make_daily_bars(start: str = '2024-01-01', periods: int = 30, base: float = 10.0,
+                    seed: int = 0) -> pd.DataFrame:
+    """工作日日线，价格在 base 附近随机游走，以date为索引"""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(start, periods=periods, name='date')
+    close = base + np.cumsum(rng.normal(0, 0.1, periods))
+    open_ = close + rng.normal(0, 0.05, periods)
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) + 0.1,
+        'low': np.minimum(open_, close) - 0.1,
+        'close': close,
+        'volume': rng.integers(1_000, 10_000, periods).astype('float64'),
+        'amount': rng.integers(10_000, 100_000, periods).astype('float64'),
+    }, index=index)[BAR_FIELDS]
+
+
+def write_bars(directory: str, code: str, df: pd.DataFrame) -> str:
+    """把K线写成 {directory}/{code}.parquet（ReplaySource 的目录格式）"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{code}.parquet")
+    df.to_parquet(path, engine='pyarrow')
+    return path
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+from core.fetcher.adjust import PRICE_FIELDS, normalize_dividends, rescale_history
+
+
+def _bars(close: pd.Series) -> pd.DataFrame:
+    return pd.DataFrame({field: close for field in PRICE_FIELDS + ['volume']})
+
+
+def _events(rows: dict[pd.Timestamp, dict[str, float]]) -> pd.DataFrame:
+    raw = pd.DataFrame.from_dict(rows, orient='index')
+    raw.index = raw.index.strftime('%Y%m%d')
+    return normalize_dividends(raw)
+
+
+def _front_ratio(raw: pd.Series, events: pd.DataFrame) -> pd.Series:
+    """模拟QMT的等比前复权：除权日之前的价格除以按前收盘价计算的除权系数"""
+    adjusted = raw.copy()
+    for date, event in events.iterrows():
+        prev_close = raw[raw.index < date].iloc[-1]
+        shares = 1 + event['stock_bonus'] + event['stock_gift'] + event['allot_num']
+        reference = (prev_close - event['interest'] + event['allot_price'] * event['allot_num']) / shares
+        adjusted[adjusted.index < date] /= prev_close / reference
+    return adjusted
+
+
+DATES = pd.bdate_range('2024-01-01', periods=20, name='date')
+RAW = pd.Series(np.linspace(10, 20, 20), index=DATES)
+
+
+def test_front_is_affine_per_event():
+    events = _events({DATES[12]: {'interest': 0.5}, DATES[16]: {'stockBonus': 0.2}})
+    stored = _bars(RAW[:10])
+
+    out = rescale_history(stored, events, 'front')
+
+    expected = (RAW[:10] - 0.5) / 1.2
+    np.testing.assert_allclose(out['close'], expected)
+    # 非价格字段不变，原DataFrame不被修改
+    pd.testing.assert_series_equal(out['volume'], stored['volume'])
+    np.testing.assert_array_equal(stored['close'], RAW[:10])
+
+
+def test_only_bars_before_each_event_are_rescaled():
+    events = _events({DATES[5]: {'interest': 1.0}})
+    out = rescale_history(_bars(RAW[:10]), events, 'front')
+
+    np.testing.assert_allclose(out['close'][:5], RAW[:5] - 1.0)
+    np.testing.assert_allclose(out['close'][5:], RAW[5:10])
+
+
+def test_front_ratio_uses_dr_when_available():
+    events = _events({DATES[12]: {'interest': 0.5, 'dr': 1.05}})
+    out = rescale_history(_bars(RAW[:10]), events, 'front_ratio')
+    np.testing.assert_allclose(out['close'], RAW[:10] / 1.05)
+
+
+def test_front_ratio_without_dr_uses_each_events_prev_close():
+    events = _events({DATES[12]: {'interest': 0.5}, DATES[16]: {'interest': 0.8, 'stockBonus': 0.2}})
+    adjusted = _front_ratio(RAW, events)
+    stored = _bars(RAW[:10])
+    # 新获取的K线与已保存的最后一天重叠，已按两个事件复权
+    new = _bars(adjusted[9:])
+
+    out = rescale_history(stored, events, 'front_ratio', reference=new)
+
+    np.testing.assert_allclose(out['close'], adjusted[:10], rtol=1e-12)
+
+
+def test_stable_dividend_types_are_untouched():
+    events = _events({DATES[12]: {'interest': 0.5}})
+    stored = _bars(RAW[:10])
+    for dividend_type in ('none', 'back', 'back_ratio'):
+        assert rescale_history(stored, events, dividend_type) is stored
+    assert rescale_history(stored, events.iloc[:0], 'front') is stored
@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.storage.alignment import AlignmentIndex
+from tests.fakes import make_daily_bars, write_bars
+
+BARS = {
+    '600000.SH': make_daily_bars('2024-01-01', periods=20, seed=1),
+    # 晚上市、中间停牌几天
+    '000001.SZ': make_daily_bars('2024-01-10', periods=15, seed=2).drop(pd.bdate_range('2024-01-15', periods=3)),
+    '510300.SH': make_daily_bars('2023-12-25', periods=10, seed=3),
+}
+
+
+def _write(directory: str, code: str, df: pd.DataFrame, mtime: int | None = None) -> None:
+    path = write_bars(directory, code, df)
+    if mtime is not None:
+        # 保证修改时间变化（同一时间片内写入的文件修改时间可能相同）
+        os.utime(path, (mtime, mtime))
+
+
+def _expected(bars: dict[str, pd.DataFrame], field: str) -> pd.DataFrame:
+    return pd.concat({code: df[field] for code, df in bars.items()}, axis=1, sort=True)
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    for code, df in BARS.items():
+        _write(str(tmp_path), code, df)
+    return str(tmp_path)
+
+
+def _assert_panel(panel: pd.DataFrame, expected: pd.DataFrame) -> None:
+    np.testing.assert_array_equal(panel.index.values, expected.index.values)
+    np.testing.assert_allclose(panel.to_numpy(), expected[list(panel.columns)].to_numpy())
+
+
+def test_panels_match_outer_join(output_dir):
+    index = AlignmentIndex(output_dir)
+    panels = index.panels(['close', 'volume'], list(BARS))
+    for field in ('close', 'volume'):
+        _assert_panel(panels[field], _expected(BARS, field))
+
+    window = index.panel('close', ['000001.SZ', '600000.SH'], start='2024-01-12', end='2024-01-18')
+    _assert_panel(window, _expected(BARS, 'close').loc['2024-01-12':'2024-01-18'])
+    assert window['000001.SZ'].isna().sum() == 3
+
+
+def test_index_is_reused_and_refreshed_incrementally(output_dir):
+    AlignmentIndex(output_dir).refresh()
+
+    index = AlignmentIndex(output_dir)
+    assert index.refresh() == 0
+    assert sorted(index.codes) == sorted(BARS)
+
+    # 新数据使日期轴变长：已有代码的位置整体重映射
+    extended = dict(BARS, **{'600000.SH': make_daily_bars('2024-01-01', periods=40, seed=1)})
+    _write(output_dir, '600000.SH', extended['600000.SH'], mtime=1)
+    assert index.refresh() == 1
+    _assert_panel(index.panel('close'), _expected(extended, 'close'))
+
+    os.remove(os.path.join(output_dir, '510300.SH.parquet'))
+    assert AlignmentIndex(output_dir).refresh() == 0
+    reloaded = AlignmentIndex(output_dir)
+    reloaded.load()
+    assert '510300.SH' not in reloaded.codes
+    panel = reloaded.panel('close', ['510300.SH', '600000.SH'])
+    assert panel['510300.SH'].isna().all()
+
+
+@pytest.mark.parametrize('replacement', [
+    make_daily_bars('2024-01-01', periods=30, seed=4),    # 日期轴变长，整体重拼
+    make_daily_bars('2024-01-01', periods=12, seed=5),    # 行数变化但日期都在轴上
+])
+def test_files_replaced_after_refresh_are_rescattered(output_dir, replacement):
+    index = AlignmentIndex(output_dir)
+    index.refresh()
+    # 模拟下载任务在 refresh 之后、读取之前替换了文件
+    index.refresh = lambda code_list=None: 0
+    _write(output_dir, '600000.SH', replacement, mtime=1)
+
+    expected = dict(BARS, **{'600000.SH': replacement})
+    # 轴上只属于旧文件的日期保留，对应的行为NaN
+    _assert_panel(index.panel('close', list(BARS)).dropna(how='all'), _expected(expected, 'close'))
+
+
+def test_panel_gives_up_when_files_keep_changing(output_dir, monkeypatch):
+    index = AlignmentIndex(output_dir)
+    index.refresh()
+    index.refresh = lambda code_list=None: 0
+    periods = iter(range(30, 60, 5))
+    original_scatter = index._scatter
+
+    def scatter_while_rewriting(*args):
+        # 每次读取前文件都被换成日期更长的版本
+        n = next(periods)
+        _write(output_dir, '600000.SH', make_daily_bars('2024-01-01', periods=n, seed=1), mtime=n)
+        return original_scatter(*args)
+
+    monkeypatch.setattr(index, '_scatter', scatter_while_rewriting)
+    with pytest.raises(RuntimeError):
+        index.panel('close')
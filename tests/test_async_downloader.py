@@ -0,0 +1,142 @@
+import asyncio
+import os
+import threading
+import time
+
+from core.fetcher.async_downloader import AsyncQmtDataDownloader
+from core.fetcher.downloader import QmtDataDownloader
+from core.fetcher.source import ReplaySource
+from core.metrics import RunMetrics
+from tests.fakes import make_daily_bars, write_bars
+
+CODES = ['600000.SH', '000001.SZ', '510300.SH']
+WINDOW = {'start_time': '20240101', 'end_time': '20240331'}
+
+
+class GatedSource(ReplaySource):
+    """指定代码的读取阻塞到 release 被设置；记录读取过的代码和最大并发数"""
+
+    def __init__(self, output_dir: str, blocked: set[str] | None = None, delay: float = 0.0):
+        super().__init__(output_dir)
+        self.blocked = blocked or set()
+        self.delay = delay
+        self.release = threading.Event()
+        self.started: list[str] = []
+        self.active = 0
+        self.peak = 0
+        self._count_lock = threading.Lock()
+
+    def read_bars(self, code, *args, **kwargs):
+        with self._count_lock:
+            self.started.append(code)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            if code in self.blocked:
+                self.release.wait(5)
+            time.sleep(self.delay)
+            return super().read_bars(code, *args, **kwargs)
+        finally:
+            with self._count_lock:
+                self.active -= 1
+
+
+def _downloader(tmp_path, source_cls=GatedSource, **source_kwargs):
+    source_dir = str(tmp_path / 'source')
+    for seed, code in enumerate(CODES):
+        write_bars(source_dir, code, make_daily_bars(seed=seed))
+    source = source_cls(source_dir, **source_kwargs)
+    return QmtDataDownloader(str(tmp_path / 'output'), source=source, metrics=RunMetrics(),
+                             pause=0, max_calls=4), source
+
+
+def _saved(tmp_path, code: str) -> bool:
+    return os.path.exists(os.path.join(str(tmp_path / 'output'), f'{code}.parquet'))
+
+
+def test_download_batch_keeps_order_and_bounds_concurrency(tmp_path):
+    downloader, source = _downloader(tmp_path, delay=0.05)
+
+    async def main():
+        async with AsyncQmtDataDownloader(downloader, max_workers=2) as client:
+            return await client.download_batch(CODES, **WINDOW)
+
+    results = asyncio.run(main())
+    assert list(results) == CODES and all(results.values())
+    assert source.peak <= 2
+    assert all(_saved(tmp_path, code) for code in CODES)
+
+
+def test_timeout_returns_false_and_writes_nothing(tmp_path):
+    downloader, source = _downloader(tmp_path, blocked={'600000.SH'})
+
+    async def main():
+        async with AsyncQmtDataDownloader(downloader, max_workers=2) as client:
+            # 超时后放开阻塞的读取，线程看到取消标志后不写入文件
+            threading.Timer(0.3, source.release.set).start()
+            return await client.download_batch(CODES, timeout=0.1, **WINDOW)
+
+    results = asyncio.run(main())
+    assert results == {'600000.SH': False, '000001.SZ': True, '510300.SH': True}
+    assert not _saved(tmp_path, '600000.SH')
+    assert downloader.metrics.counter_totals()['timeouts'] == 1
+
+
+class LateWriteDownloader(QmtDataDownloader):
+    """忽略取消标志：模拟超时前已经通过最后一次取消检查、随后完成写入的线程"""
+
+    def download_stock_data(self, code, *args, cancel=None, **kwargs):
+        time.sleep(0.2)
+        return super().download_stock_data(code, *args, **kwargs)
+
+
+def test_settle_marks_late_writes_as_succeeded(tmp_path):
+    source_dir = str(tmp_path / 'source')
+    write_bars(source_dir, '600000.SH', make_daily_bars())
+    downloader = LateWriteDownloader(str(tmp_path / 'output'), source=ReplaySource(source_dir),
+                                     metrics=RunMetrics(), pause=0, max_calls=2)
+
+    async def main():
+        async with AsyncQmtDataDownloader(downloader, max_workers=2) as client:
+            return await client.download_batch(['600000.SH'], timeout=0.05, **WINDOW)
+
+    assert asyncio.run(main()) == {'600000.SH': True}
+    assert _saved(tmp_path, '600000.SH')
+
+
+def test_cancel_stops_queued_downloads(tmp_path):
+    downloader, source = _downloader(tmp_path, blocked=set(CODES))
+
+    async def main():
+        async with AsyncQmtDataDownloader(downloader, max_workers=1) as client:
+            task = asyncio.ensure_future(client.download_batch(CODES, **WINDOW))
+            while not source.started:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            source.release.set()
+
+    asyncio.run(main())
+    # 已经开始的代码在当前调用结束后停止，排队中的代码不会开始
+    time.sleep(0.2)
+    assert source.started == ['600000.SH']
+    assert not any(_saved(tmp_path, code) for code in CODES)
+
+
+def test_breaking_out_of_iter_batch_cancels_the_rest(tmp_path):
+    downloader, source = _downloader(tmp_path, blocked={'000001.SZ', '510300.SH'})
+
+    async def main():
+        async with AsyncQmtDataDownloader(downloader, max_workers=1) as client:
+            async for code, success in client.iter_batch(CODES, **WINDOW):
+                assert (code, success) == ('600000.SH', True)
+                source.release.set()
+                break
+
+    asyncio.run(main())
+    time.sleep(0.2)
+    assert _saved(tmp_path, '600000.SH')
+    assert not _saved(tmp_path, '510300.SH')
@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+from core.cli import main
+from tests.fakes import make_daily_bars, write_bars
+
+
+def test_dry_run_uses_the_configured_output_dir(tmp_path, monkeypatch):
+    output_dir = tmp_path / 'data'
+    write_bars(str(output_dir), '600000.SH', make_daily_bars(periods=20))
+    # 当前目录不是数据目录：回放源和规划器都应使用 OUTPUT_DIR
+    monkeypatch.setenv('OUTPUT_DIR', str(output_dir))
+    monkeypatch.chdir(tmp_path)
+    plan_file = tmp_path / 'plan.json'
+
+    code = main(['download', '--codes', '600000.SH,000001.SZ', '--start', '20240101', '--end', '20240331',
+                 '--incremental', '--dry-run', '--save-plan', str(plan_file)])
+
+    assert code == 0
+    actions = {item['code']: item['action'] for item in json.loads(plan_file.read_text())['codes']}
+    assert actions == {'600000.SH': 'update', '000001.SZ': 'full'}
+
+
+def test_sharding_rejects_incremental_and_scheduling(tmp_path):
+    with pytest.raises(SystemExit) as exc_info:
+        main(['download', '--codes', '600000.SH', '--output-dir', str(tmp_path),
+              '--endpoints', '58610,58611', '--incremental'])
+    assert 'incremental' in str(exc_info.value)
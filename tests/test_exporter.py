@@ -0,0 +1,120 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+from openpyxl.worksheet._writer import ALL_TEMP_FILES
+
+from core.storage.exporter import (
+    EXCEL_MAX_ROWS, ParquetStreamWriter, iter_parquet_frames, write_csv, write_csv_stream,
+    write_excel, write_excel_stream,
+)
+from tests.fakes import make_daily_bars
+
+
+def _sheets(path: str) -> dict[str, list[tuple]]:
+    wb = load_workbook(path, read_only=True)
+    try:
+        return {ws.title: list(ws.values) for ws in wb.worksheets}
+    finally:
+        wb.close()
+
+
+def test_excel_limit_matches_excel():
+    assert EXCEL_MAX_ROWS == 1_048_576
+    assert write_excel.__defaults__[-1] == EXCEL_MAX_ROWS
+
+
+@pytest.mark.parametrize('rows, expected', [
+    (0, [0]),
+    (4, [4]),
+    (5, [5]),        # 正好写满一个工作表（5行数据+表头=上限6行）
+    (6, [5, 1]),     # 超出一行换到下一个工作表
+    (11, [5, 5, 1]),
+])
+def test_excel_sheet_rollover(tmp_path, rows, expected):
+    df = pd.DataFrame({'v': np.arange(rows, dtype='int64')}, index=pd.RangeIndex(rows, name='i'))
+    path = str(tmp_path / 'out.xlsx')
+    assert write_excel(df, path, max_rows=6) == len(expected)
+
+    sheets = _sheets(path)
+    assert list(sheets) == ['data', 'data_2', 'data_3'][:len(expected)]
+    assert all(values[0] == ('i', 'v') for values in sheets.values())
+    assert [len(values) - 1 for values in sheets.values()] == expected
+    written = [row[1] for values in sheets.values() for row in values[1:]]
+    assert written == list(range(rows))
+
+
+def test_excel_stream_rolls_over_inside_a_chunk(tmp_path):
+    bars = make_daily_bars(periods=10)
+    path = str(tmp_path / 'bars.xlsx')
+    chunks = [bars.iloc[:3], bars.iloc[3:4], bars.iloc[4:]]
+    assert write_excel_stream(iter(chunks), path, sheet_name='bars', max_rows=5) == 3
+
+    sheets = _sheets(path)
+    assert list(sheets) == ['bars', 'bars_2', 'bars_3']
+    dates = [row[0] for values in sheets.values() for row in values[1:]]
+    assert dates == list(bars.index.to_pydatetime())
+    assert not os.path.exists(f'{path}.tmp')
+
+
+def test_csv_stream_matches_to_csv(tmp_path):
+    bars = make_daily_bars(periods=25)
+    expected = str(tmp_path / 'expected.csv')
+    bars.to_csv(expected, encoding='utf-8-sig')
+
+    path = str(tmp_path / 'chunked.csv')
+    write_csv(bars, path, chunk_rows=7)
+    with open(path, 'rb') as actual, open(expected, 'rb') as reference:
+        assert actual.read() == reference.read()
+
+    empty = str(tmp_path / 'empty.csv')
+    assert write_csv_stream(iter([bars.iloc[:0], bars.iloc[:0]]), empty) == 0
+    with open(empty, encoding='utf-8-sig') as f:
+        assert f.read().splitlines() == [','.join(['date'] + list(bars.columns))]
+
+
+def test_failed_stream_leaves_target_untouched(tmp_path):
+    path = str(tmp_path / 'out.csv')
+    with open(path, 'w') as f:
+        f.write('old')
+
+    def frames():
+        yield make_daily_bars(periods=3)
+        raise RuntimeError('source failed')
+
+    with pytest.raises(RuntimeError):
+        write_csv_stream(frames(), path)
+    temp_files = len(ALL_TEMP_FILES)
+    with pytest.raises(RuntimeError):
+        write_excel_stream(frames(), str(tmp_path / 'out.xlsx'))
+    # openpyxl为工作表创建的临时文件已删除
+    assert len(ALL_TEMP_FILES) == temp_files
+    with open(path) as f:
+        assert f.read() == 'old'
+    assert sorted(os.listdir(tmp_path)) == ['out.csv']
+
+
+def test_parquet_stream_writer(tmp_path):
+    bars = make_daily_bars(periods=20)
+    path = str(tmp_path / 'bars.parquet')
+    writer = ParquetStreamWriter(path)
+    writer.write(bars.iloc[:10])
+    writer.write(bars.iloc[:0])
+    # 后续块按第一块的schema转换
+    writer.write(bars.iloc[10:].astype({'volume': 'float32'}))
+    assert writer.last_index == bars.index[-1]
+    assert not os.path.exists(path)
+    assert writer.close() == 20
+
+    pd.testing.assert_frame_equal(pd.read_parquet(path), bars, check_freq=False)
+    frames = list(iter_parquet_frames(path, batch_rows=8))
+    assert [len(f) for f in frames] == [8, 8, 4]
+    pd.testing.assert_frame_equal(pd.concat(frames), bars, check_freq=False)
+
+    aborted = ParquetStreamWriter(str(tmp_path / 'aborted.parquet'))
+    aborted.write(bars)
+    aborted.abort()
+    assert ParquetStreamWriter(str(tmp_path / 'empty.parquet')).close() == 0
+    assert sorted(os.listdir(tmp_path)) == ['bars.parquet']
@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+from core.fetcher.downloader import QmtDataDownloader
+from core.fetcher.source import ReplaySource
+from core.metrics import RunMetrics
+from core.storage.fingerprint import FingerprintStore, frame_fingerprint
+from tests.fakes import make_daily_bars, write_bars
+
+WINDOW = {'start_time': '20240101', 'end_time': '20240331'}
+
+
+def test_fingerprint_depends_only_on_content():
+    bars = make_daily_bars()
+    assert frame_fingerprint(bars) == frame_fingerprint(bars.copy())
+
+    changed = bars.copy()
+    changed.iloc[5, 3] += 0.01
+    assert frame_fingerprint(changed) != frame_fingerprint(bars)
+    assert frame_fingerprint(bars.astype({'volume': 'int64'})) != frame_fingerprint(bars)
+    assert frame_fingerprint(bars.rename_axis('time')) != frame_fingerprint(bars)
+    assert frame_fingerprint(bars.iloc[:-1]) != frame_fingerprint(bars)
+
+
+def test_store_detects_external_changes_and_corrupt_records(tmp_path):
+    store = FingerprintStore(str(tmp_path))
+    bars = make_daily_bars()
+    path = write_bars(str(tmp_path), '600000.SH', bars)
+    fingerprint = frame_fingerprint(bars)
+
+    assert not store.is_unchanged(path, fingerprint)
+    store.record(path, fingerprint, rows=len(bars))
+    assert store.is_unchanged(path, fingerprint)
+    assert store.load(path)['rows'] == len(bars)
+
+    # 文件被外部改写（大小变化）
+    write_bars(str(tmp_path), '600000.SH', bars.iloc[:10])
+    assert not store.is_unchanged(path, fingerprint)
+
+    store.record(path, fingerprint)
+    with open(store.sidecar_path(path), 'w', encoding='utf-8') as f:
+        f.write('{not json')
+    assert store.load(path) is None
+    assert not store.is_unchanged(path, fingerprint)
+
+    store.forget(path)
+    assert not os.path.exists(store.sidecar_path(path))
+    os.remove(path)
+    assert not store.is_unchanged(path, fingerprint)
+
+
+def _downloader(tmp_path, dedup: bool = True) -> QmtDataDownloader:
+    source_dir = str(tmp_path / 'source')
+    write_bars(source_dir, '600000.SH', make_daily_bars(periods=40))
+    return QmtDataDownloader(str(tmp_path / 'output'), source=ReplaySource(source_dir),
+                             metrics=RunMetrics(), pause=0, dedup=dedup)
+
+
+def _mtimes(tmp_path) -> dict[str, int]:
+    output_dir = str(tmp_path / 'output')
+    return {name: os.stat(os.path.join(output_dir, name)).st_mtime_ns
+            for name in ('600000.SH.parquet', '600000.SH.csv')}
+
+
+def test_unchanged_download_skips_rewriting(tmp_path):
+    downloader = _downloader(tmp_path)
+    formats = ['parquet', 'csv']
+    assert downloader.download_stock_data('600000.SH', output_formats=formats, **WINDOW)
+    before = _mtimes(tmp_path)
+
+    assert downloader.download_stock_data('600000.SH', output_formats=formats, **WINDOW)
+    assert _mtimes(tmp_path) == before
+    totals = downloader.metrics.counter_totals()
+    assert totals['files_unchanged[fmt=parquet]'] == 1
+    assert totals['files_unchanged[fmt=csv]'] == 1
+
+
+@pytest.mark.parametrize('dedup', [True, False])
+def test_modified_or_undeduplicated_files_are_rewritten(tmp_path, dedup):
+    downloader = _downloader(tmp_path, dedup=dedup)
+    output_dir = str(tmp_path / 'output')
+    assert downloader.download_stock_data('600000.SH', **WINDOW)
+    if dedup:
+        # 外部改写了输出文件，记录的指纹不再可信
+        write_bars(output_dir, '600000.SH', make_daily_bars(periods=5))
+
+    assert downloader.download_stock_data('600000.SH', **WINDOW)
+    assert downloader.metrics.counter_totals().get('files_unchanged[fmt=parquet]', 0) == 0
+    assert os.path.exists(os.path.join(output_dir, '.fingerprints')) is dedup
@@ -0,0 +1,148 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.fetcher.live import LiveBarEngine, ReplayTickFeed, TZ_OFFSET_MS, bar_label
+from core.metrics import RunMetrics
+
+
+def _ms(text: str) -> int:
+    return int(pd.Timestamp(text).value // 1_000_000)
+
+
+def _ticks(rows: list[tuple[str, str, float, float, float]]) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=['code', 'time', 'price', 'volume', 'amount']).assign(
+        time=lambda df: pd.to_datetime(df['time']))
+
+
+def _day_file(output_dir, period: str, day: str, code: str) -> str:
+    return os.path.join(str(output_dir), 'live', period, day, f'{code}.parquet')
+
+
+@pytest.mark.parametrize('clock, minutes, expected', [
+    ('09:25:00', 1, '09:31'),   # 集合竞价并入第一根K线
+    ('09:30:00', 1, '09:31'),
+    ('09:30:59', 1, '09:31'),
+    ('09:31:00', 1, '09:32'),
+    ('11:29:59', 1, '11:30'),
+    ('11:30:30', 1, '11:30'),   # 午休并入上午最后一根
+    ('13:00:00', 1, '13:01'),
+    ('15:00:05', 1, '15:00'),   # 收盘后并入最后一根
+    ('09:31:00', 5, '09:35'),
+    ('11:29:00', 5, '11:30'),
+    ('13:04:59', 5, '13:05'),
+])
+def test_bar_label(clock, minutes, expected):
+    assert bar_label(_ms(f'2026-01-19 {clock}'), minutes) == _ms(f'2026-01-19 {expected}')
+
+
+def test_ticks_aggregate_into_ohlcv_bars(tmp_path):
+    feed = ReplayTickFeed(_ticks([
+        ('600000.SH', '2026-01-19 09:25:00', 10.0, 1000, 10000),   # 基准
+        ('600000.SH', '2026-01-19 09:30:10', 10.2, 1100, 11020),
+        ('600000.SH', '2026-01-19 09:30:40', 9.9, 1300, 13000),
+        ('600000.SH', '2026-01-19 09:31:05', 10.1, 1350, 13505),
+        ('600000.SH', '2026-01-19 09:33:00', 10.3, 1450, 14535),
+    ]))
+    engine = LiveBarEngine(feed, ['600000.SH'], periods=['1m', '5m'], output_dir=str(tmp_path))
+    engine.start()
+    feed.run()
+    assert engine.latest_bar('600000.SH', '1m')['close'] == 10.3
+    engine.stop(close_open_bars=True)
+
+    bars = pd.read_parquet(_day_file(tmp_path, '1m', '20260119', '600000.SH'))
+    assert list(bars.index) == [pd.Timestamp('2026-01-19 09:31'), pd.Timestamp('2026-01-19 09:32'),
+                                pd.Timestamp('2026-01-19 09:34')]
+    first = bars.iloc[0]
+    assert (first['open'], first['high'], first['low'], first['close']) == (10.0, 10.2, 9.9, 9.9)
+    assert first['volume'] == 300 and first['amount'] == 3000
+    assert bars['volume'].tolist() == [300, 50, 100]
+
+    five = pd.read_parquet(_day_file(tmp_path, '5m', '20260119', '600000.SH'))
+    assert len(five) == 1
+    assert five.iloc[0]['high'] == 10.3 and five.iloc[0]['volume'] == 450
+
+
+def test_late_tick_after_close_stale_is_dropped(tmp_path):
+    engine = LiveBarEngine(ReplayTickFeed(_ticks([])), ['A', 'B'], periods=['1m'],
+                           output_dir=str(tmp_path), metrics=RunMetrics())
+
+    def tick(code, clock, price, volume):
+        engine.on_tick(code, {'time': _ms(f'2026-01-19 {clock}') - TZ_OFFSET_MS,
+                              'price': price, 'volume': volume, 'amount': volume * price})
+
+    tick('A', '09:30:05', 10.0, 100)
+    tick('B', '09:30:10', 20.0, 100)
+    tick('B', '09:32:10', 20.5, 200)
+    # A 在 09:31 之后没有成交，行情时钟越过后由 close_stale 关闭
+    assert engine.close_stale() == 1
+    tick('A', '09:30:50', 99.0, 150)
+
+    assert engine.metrics.counter_totals().get('live_late_ticks') == 1
+    assert engine.recent_bars('A', '1m')['close'].tolist() == [10.0]
+
+
+def test_micro_batches_append_without_rewriting(tmp_path):
+    codes = ['600000.SH', '510300.SH']
+    batched = LiveBarEngine(ReplayTickFeed.synthetic(codes, '20260119', seed=3), codes,
+                            periods=['1m'], output_dir=str(tmp_path / 'batched'), batch_size=1)
+    batched.feed.subscribe_ticks(codes, batched.on_tick)
+    batched.feed.run()
+    batched.stop(close_open_bars=True)
+
+    whole = LiveBarEngine(ReplayTickFeed.synthetic(codes, '20260119', seed=3), codes,
+                          periods=['1m'], output_dir=str(tmp_path / 'whole'), batch_size=10 ** 9)
+    whole.feed.subscribe_ticks(codes, whole.on_tick)
+    whole.feed.run()
+    whole.stop(close_open_bars=True)
+
+    for code in codes:
+        expected = pd.read_parquet(_day_file(tmp_path / 'whole', '1m', '20260119', code))
+        actual = pd.read_parquet(_day_file(tmp_path / 'batched', '1m', '20260119', code))
+        assert len(actual) == 240
+        assert actual.index.is_unique and actual.index.is_monotonic_increasing
+        pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_restart_keeps_existing_day_file(tmp_path):
+    day = [('A', f'2026-01-19 09:{m:02d}:30', 10.0 + m / 100, 100.0 * m, 1000.0 * m) for m in range(30, 40)]
+    first = LiveBarEngine(ReplayTickFeed(_ticks(day[:6])), ['A'], periods=['1m'], output_dir=str(tmp_path))
+    first.start()
+    first.feed.run()
+    first.stop(close_open_bars=True)
+    before = pd.read_parquet(_day_file(tmp_path, '1m', '20260119', 'A'))
+
+    # 重启后从 09:34 开始重新订阅，重叠的K线以已有文件为准
+    second = LiveBarEngine(ReplayTickFeed(_ticks(day[4:])), ['A'], periods=['1m'], output_dir=str(tmp_path))
+    second.start()
+    second.feed.run()
+    second.stop(close_open_bars=True)
+    after = pd.read_parquet(_day_file(tmp_path, '1m', '20260119', 'A'))
+
+    assert after.index.is_unique and after.index.is_monotonic_increasing
+    pd.testing.assert_frame_equal(after.loc[before.index], before)
+    assert after.index[-1] == pd.Timestamp('2026-01-19 09:40')
+
+
+def test_day_change_finishes_previous_day_file(tmp_path):
+    feed = ReplayTickFeed(_ticks([
+        ('A', '2026-01-19 09:30:05', 10.0, 100, 1000),
+        ('A', '2026-01-19 14:59:00', 10.5, 300, 3100),
+        ('A', '2026-01-20 09:30:05', 11.0, 50, 550),
+        ('A', '2026-01-20 09:31:05', 11.1, 80, 883),
+    ]))
+    engine = LiveBarEngine(feed, ['A'], periods=['1m'], output_dir=str(tmp_path), batch_size=1)
+    feed.subscribe_ticks(['A'], engine.on_tick)
+    feed.run()
+
+    # 新的一天写盘后前一天的文件已经生成，当天的文件在 stop 时生成
+    previous = pd.read_parquet(_day_file(tmp_path, '1m', '20260119', 'A'))
+    assert list(previous.index) == [pd.Timestamp('2026-01-19 09:31'), pd.Timestamp('2026-01-19 15:00')]
+    assert not os.path.exists(_day_file(tmp_path, '1m', '20260120', 'A'))
+
+    engine.stop(close_open_bars=True)
+    current = pd.read_parquet(_day_file(tmp_path, '1m', '20260120', 'A'))
+    assert current['volume'].tolist() == [50, 30]
+    np.testing.assert_allclose(current['close'], [11.0, 11.1])
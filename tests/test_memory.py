@@ -0,0 +1,208 @@
+import asyncio
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.fetcher.async_downloader import AsyncQmtDataDownloader
+from core.fetcher.downloader import QmtDataDownloader
+from core.fetcher.source import ReplaySource
+from core.memory import MemoryGuard, format_size, parse_size, rss_bytes
+from core.metrics import RunMetrics
+from tests.fakes import make_daily_bars, write_bars
+
+WINDOW = {'start_time': '20220101', 'end_time': '20241231', 'years_per_segment': 1}
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('12G', 12 * 1024 ** 3),
+    ('800M', 800 * 1024 ** 2),
+    ('1.5GB', int(1.5 * 1024 ** 3)),
+    ('2gib', 2 * 1024 ** 3),
+    ('4096', 4096),
+    (1024, 1024),
+    ('', None),
+    (None, None),
+])
+def test_parse_size(value, expected):
+    assert parse_size(value) == expected
+
+
+@pytest.mark.parametrize('value', ['12X', 'G', 'lots'])
+def test_parse_size_rejects_garbage(value):
+    with pytest.raises(ValueError):
+        parse_size(value)
+
+
+def test_format_size():
+    assert format_size(512) == '512 B'
+    assert format_size(1536) == '1.5 KB'
+    assert format_size(3 * 1024 ** 4) == '3072.0 GB'
+
+
+class FakeGuard(MemoryGuard):
+    """RSS由测试控制的内存监控"""
+
+    def __init__(self, limit_bytes: int | None = 1000, **kwargs):
+        super().__init__(limit_bytes, metrics=kwargs.pop('metrics', RunMetrics()), **kwargs)
+        self.rss = 0
+
+    def sample(self) -> int:
+        self.peak_rss = max(self.peak_rss, self.rss)
+        self.metrics.gauge('rss_bytes', self.rss)
+        return self.rss
+
+
+def test_guard_enters_low_memory_at_soft_limit_and_stays():
+    guard = FakeGuard(limit_bytes=1000, soft_ratio=0.8)
+    guard.rss = 799
+    assert not guard.check()
+    guard.rss = 800
+    assert guard.check()
+    guard.rss = 10
+    # RSS回落后不退出低内存模式
+    assert guard.check()
+    assert guard.metrics.counter_totals()['memory_pressure_events'] == 1
+    assert '已进入低内存模式' in guard.report()
+
+    unlimited = FakeGuard(limit_bytes=None)
+    unlimited.rss = 10 ** 12
+    assert not unlimited.check()
+
+
+def test_stage_records_allocation_peaks():
+    with FakeGuard(trace=True) as guard:
+        with guard.stage('clean', '600000.SH'):
+            block = np.ones(2_000_000)
+            del block
+        with guard.stage('save'):
+            pass
+    assert guard.stage_peaks['clean'] >= 16_000_000
+    assert guard.stage_peaks.get('save', 0) < guard.stage_peaks['clean']
+    assert 'clean' in guard.report()
+
+
+def test_rss_is_available():
+    rss = rss_bytes()
+    assert rss is None or rss > 0
+
+
+class PressureSource(ReplaySource):
+    """第 n 次读取时把内存监控的RSS推到上限"""
+
+    def __init__(self, output_dir: str, guard: FakeGuard | None = None, at_read: int = 0):
+        super().__init__(output_dir)
+        self.guard = guard
+        self.at_read = at_read
+        self.reads = 0
+
+    def read_bars(self, *args, **kwargs):
+        self.reads += 1
+        if self.guard is not None and self.reads >= self.at_read:
+            self.guard.rss = self.guard.limit_bytes
+        return super().read_bars(*args, **kwargs)
+
+
+def _download(tmp_path, name: str, output_formats: list[str], guard: FakeGuard | None = None,
+              at_read: int = 0) -> tuple[QmtDataDownloader, str]:
+    source_dir = str(tmp_path / 'source')
+    if not os.path.exists(source_dir):
+        bars = make_daily_bars('2022-01-03', periods=780)
+        # 重复的K线和停牌行，检验逐段清洗与整体清洗一致
+        bars = pd.concat([bars, bars.iloc[[100, 400]]]).sort_index()
+        bars.iloc[200, bars.columns.get_loc('volume')] = 0
+        write_bars(source_dir, '600000.SH', bars)
+    output_dir = str(tmp_path / name)
+    downloader = QmtDataDownloader(output_dir, source=PressureSource(source_dir, guard, at_read),
+                                   metrics=RunMetrics(), pause=0, memory_guard=guard)
+    assert downloader.download_stock_data('600000.SH', output_formats=output_formats, **WINDOW)
+    return downloader, output_dir
+
+
+@pytest.mark.parametrize('at_read', [0, 2])
+def test_low_memory_switches_to_streaming_with_the_same_result(tmp_path, at_read):
+    _, reference_dir = _download(tmp_path, 'reference', ['parquet'])
+    guard = FakeGuard()
+    downloader, output_dir = _download(tmp_path, 'streamed', ['parquet'], guard, at_read)
+
+    assert guard.low_memory
+    assert downloader.metrics.counter_totals()['codes_streamed'] == 1
+    expected = pd.read_parquet(os.path.join(reference_dir, '600000.SH.parquet'))
+    actual = pd.read_parquet(os.path.join(output_dir, '600000.SH.parquet'))
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_streaming_csv_only_removes_temporary_parquet(tmp_path):
+    _, reference_dir = _download(tmp_path, 'reference', ['csv'])
+    _, output_dir = _download(tmp_path, 'streamed', ['csv'], FakeGuard())
+
+    assert sorted(name for name in os.listdir(output_dir) if not name.startswith('.')) == ['600000.SH.csv']
+    with open(os.path.join(reference_dir, '600000.SH.csv'), 'rb') as expected, \
+            open(os.path.join(output_dir, '600000.SH.csv'), 'rb') as actual:
+        assert actual.read() == expected.read()
+
+
+class CountingSource(ReplaySource):
+    def __init__(self, output_dir: str):
+        super().__init__(output_dir)
+        self.active = 0
+        self.peak = 0
+        self._count_lock = threading.Lock()
+
+    def read_bars(self, *args, **kwargs):
+        with self._count_lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(0.05)
+            return super().read_bars(*args, **kwargs)
+        finally:
+            with self._count_lock:
+                self.active -= 1
+
+
+def test_async_concurrency_drops_to_one_in_low_memory(tmp_path):
+    source_dir = str(tmp_path / 'source')
+    codes = [f'60000{i}.SH' for i in range(6)]
+    for i, code in enumerate(codes):
+        write_bars(source_dir, code, make_daily_bars(seed=i))
+    guard = FakeGuard()
+    guard.rss = guard.limit_bytes
+    guard.check()
+    source = CountingSource(source_dir)
+    downloader = QmtDataDownloader(str(tmp_path / 'output'), source=source, metrics=RunMetrics(),
+                                   pause=0, memory_guard=guard, max_calls=3)
+
+    async def main():
+        async with AsyncQmtDataDownloader(downloader, max_workers=3) as client:
+            return await client.download_batch(codes, start_time='20240101', end_time='20240331')
+
+    assert all(asyncio.run(main()).values())
+    assert source.peak == 1
+    assert downloader.metrics.counter_totals()['concurrency_reduced'] == 2
+
+
+def test_async_concurrency_drops_after_entering_low_memory(tmp_path):
+    source_dir = str(tmp_path / 'source')
+    codes = [f'60000{i}.SH' for i in range(6)]
+    for i, code in enumerate(codes):
+        write_bars(source_dir, code, make_daily_bars(seed=i))
+    guard = FakeGuard()
+    source = CountingSource(source_dir)
+    downloader = QmtDataDownloader(str(tmp_path / 'output'), source=source, metrics=RunMetrics(),
+                                   pause=0, memory_guard=guard, max_calls=3)
+
+    async def main():
+        async with AsyncQmtDataDownloader(downloader, max_workers=3) as client:
+            await client.download_batch(codes[:3], start_time='20240101', end_time='20240331')
+            peak, source.peak = source.peak, 0
+            guard.rss = guard.limit_bytes
+            guard.check()
+            await client.download_batch(codes[3:], start_time='20240101', end_time='20240331')
+            return peak
+
+    assert asyncio.run(main()) == 3
+    assert source.peak == 1
@@ -0,0 +1,121 @@
+import csv
+import json
+import os
+import pickle
+
+import pytest
+
+from core.metrics import MetricsCollector, RunMetrics
+
+
+@pytest.fixture
+def metrics():
+    metrics = RunMetrics(prefix='qdt')
+    metrics.record_timing('get_market_data', 0.2, code='600000.SH', segment='20240101-20241231')
+    metrics.record_timing('get_market_data', 0.4, code='000001.SZ')
+    metrics.record_timing('clean', 0.1, code='600000.SH')
+    metrics.incr('retries', code='600000.SH')
+    metrics.incr('retries', 2, code='000001.SZ')
+    metrics.incr('bytes_written', 100, code='600000.SH', fmt='parquet')
+    metrics.incr('bytes_written', 50, code='600000.SH', fmt='csv')
+    metrics.gauge('queue_depth', 5)
+    metrics.gauge('queue_depth', 2)
+    return metrics
+
+
+def test_base_collector_is_noop():
+    collector = MetricsCollector()
+    collector.incr('retries')
+    collector.gauge('queue_depth', 1)
+    with collector.timer('clean'):
+        pass
+
+
+def test_timer_records_on_exception():
+    metrics = RunMetrics()
+    with pytest.raises(ValueError):
+        with metrics.timer('clean', code='600000.SH'):
+            raise ValueError('boom')
+    assert metrics.stage_summary()['clean']['count'] == 1
+
+
+def test_counters_and_stages(metrics):
+    totals = metrics.counter_totals()
+    assert totals['retries'] == 3
+    assert totals['bytes_written[fmt=parquet]'] == 100
+    assert totals['bytes_written[fmt=csv]'] == 50
+
+    stage = metrics.stage_summary()['get_market_data']
+    assert stage['count'] == 2
+    assert stage['total'] == pytest.approx(0.6)
+    assert stage['max'] == pytest.approx(0.4)
+
+    per_code = metrics.per_code()
+    assert per_code['600000.SH']['get_market_data_seconds'] == pytest.approx(0.2)
+    assert per_code['600000.SH']['bytes_written[fmt=csv]'] == 50
+    assert per_code['000001.SZ'] == {'get_market_data_seconds': pytest.approx(0.4), 'retries': 2}
+
+    assert metrics.summary()['gauges'] == {'queue_depth': {'last': 2, 'max': 5}}
+
+
+def test_merge_and_pickle(metrics):
+    # 工作进程的采集器经pickle传回主进程后合并
+    restored = pickle.loads(pickle.dumps(metrics))
+    restored.incr('retries')
+    restored.gauge('queue_depth', 9)
+
+    total = RunMetrics()
+    total.merge(metrics)
+    total.merge(restored)
+    assert total.counter_totals()['retries'] == 7
+    assert total.stage_summary()['get_market_data']['count'] == 4
+    assert total.summary()['gauges']['queue_depth'] == {'last': 9, 'max': 9}
+
+
+def test_export_json(metrics, tmp_path):
+    path = metrics.export_json(str(tmp_path / 'run.json'))
+    with open(path, encoding='utf-8') as f:
+        summary = json.load(f)
+    assert summary['counters']['retries'] == 3
+    assert summary['stages']['clean']['count'] == 1
+    assert set(summary['per_code']) == {'600000.SH', '000001.SZ'}
+
+
+def test_export_csv(metrics, tmp_path):
+    path = metrics.export_csv(str(tmp_path / 'run.csv'))
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['code'] for row in rows] == ['000001.SZ', '600000.SH']
+    # 没有记录的列填0
+    assert float(rows[0]['clean_seconds']) == 0
+    assert float(rows[1]['bytes_written[fmt=parquet]']) == 100
+
+
+def test_export_csv_without_codes(tmp_path):
+    path = RunMetrics().export_csv(str(tmp_path / 'empty.csv'))
+    with open(path, encoding='utf-8-sig') as f:
+        assert f.read().strip() == 'code'
+
+
+def test_export_prometheus(metrics, tmp_path):
+    path = metrics.export_prometheus(str(tmp_path / 'run.prom'))
+    with open(path, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+
+    assert '# TYPE qdt_retries_total counter' in lines
+    # 计数器不带代码标签
+    assert 'qdt_retries_total 3.0' in lines
+    assert 'qdt_bytes_written_total{fmt="csv"} 50.0' in lines
+    assert 'qdt_bytes_written_total{fmt="parquet"} 100.0' in lines
+    assert 'qdt_stage_seconds_count{stage="get_market_data"} 2' in lines
+    assert 'qdt_queue_depth 2' in lines and 'qdt_queue_depth_max 5' in lines
+    assert not any('600000.SH' in line for line in lines)
+    assert not os.path.exists(f'{path}.tmp')
+
+
+def test_export_prometheus_empty_run(tmp_path):
+    path = RunMetrics(prefix='qdt').export_prometheus(str(tmp_path / 'run.prom'))
+    with open(path, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert lines[0] == '# TYPE qdt_last_run_timestamp_seconds gauge'
+    assert len(lines) == 2
@@ -0,0 +1,110 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from core.fetcher.downloader import QmtDataDownloader
+from core.fetcher.planner import BYTES_PER_ROW, DownloadPlan, DownloadPlanner, execute_plan
+from core.fetcher.source import ReplaySource
+from core.fetcher.universe import UNIVERSE_COLUMNS, Universe
+from tests.fakes import make_daily_bars, write_bars
+
+START, END = '20240101', '20240301'
+
+
+@pytest.fixture
+def downloader(tmp_path):
+    output_dir = str(tmp_path / 'output')
+    os.makedirs(output_dir)
+    universe_file = os.path.join(output_dir, 'universe.csv')
+    pd.DataFrame([['DELISTED.SH', 'stock', '', '20050101', '20100101', '']],
+                 columns=UNIVERSE_COLUMNS).to_csv(universe_file, index=False)
+
+    # 2024-01-01 起的工作日线，截到不同日期
+    bars = make_daily_bars(START, periods=45)  # 到 2024-03-01
+    write_bars(output_dir, 'FRESH.SH', bars)
+    write_bars(output_dir, 'STALE.SH', bars.loc[:'2024-02-23'])
+    write_bars(output_dir, 'GAP.SH', bars.loc['2024-02-01':])
+    minute = bars.copy()
+    minute.index = minute.index + pd.Timedelta('09:31:00')
+    write_bars(output_dir, 'MINUTE.SH', minute)
+    return QmtDataDownloader(output_dir, source=ReplaySource(str(tmp_path)), pause=0,
+                             universe=Universe(universe_file))
+
+
+CODES = ['NEW.SH', 'FRESH.SH', 'STALE.SH', 'GAP.SH', 'MINUTE.SH', 'DELISTED.SH', 'FRESH.SH']
+
+
+def test_plan_actions(downloader):
+    plan = DownloadPlanner(downloader).plan(CODES, start=START, end=END)
+    actions = {item.code: (item.action, item.reason) for item in plan.codes}
+    assert actions == {
+        'NEW.SH': ('full', 'no_data'),
+        'FRESH.SH': ('skip', 'up_to_date'),
+        'STALE.SH': ('update', 'stale'),
+        'GAP.SH': ('full', 'head_gap'),
+        'MINUTE.SH': ('full', 'period_mismatch'),
+        'DELISTED.SH': ('skip', 'not_listed'),
+    }
+    # 没有交易日历时按工作日估算
+    assert plan.approximate_calendar
+
+    stale = next(item for item in plan.codes if item.code == 'STALE.SH')
+    # 2024-02-26 ~ 2024-03-01 共5个交易日，最后一天重新请求一次
+    assert stale.segments == [('20240223', END)]
+    assert stale.trading_days == 5 and stale.rows == 6
+    assert stale.final_rows == 45
+
+    new = next(item for item in plan.codes if item.code == 'NEW.SH')
+    assert new.segments == [(START, END)]
+    assert new.trading_days == 45 and new.rows == 45
+    assert plan.segments == 4 and plan.requests == 8
+
+
+def test_full_mode_downloads_everything(downloader):
+    plan = DownloadPlanner(downloader).plan(['FRESH.SH', 'STALE.SH'], start=START, end=END, incremental=False)
+    assert [(item.action, item.reason) for item in plan.codes] == [('full', 'full_mode')] * 2
+
+
+def test_estimates_use_local_files_and_last_run(downloader):
+    with open(os.path.join(downloader.output_dir, 'run_metrics.json'), 'w', encoding='utf-8') as f:
+        json.dump({'stages': {'get_market_data': {'count': 4, 'total': 2.0},
+                              'download_history_data': {'count': 4, 'total': 6.0}}}, f)
+    plan = DownloadPlanner(downloader).plan(CODES, start=START, end=END, output_formats=['parquet', 'csv'])
+
+    assert plan.seconds_per_segment == 2.0
+    assert plan.estimated_seconds == 2.0 * plan.segments
+    # 本地有parquet文件时按实际大小计算，没有csv文件时使用默认值
+    assert plan.bytes_per_row['parquet'] != BYTES_PER_ROW['parquet']
+    assert plan.bytes_per_row['csv'] == BYTES_PER_ROW['csv']
+    assert plan.bytes == int(sum(item.final_rows for item in plan.active)
+                             * (plan.bytes_per_row['parquet'] + plan.bytes_per_row['csv']))
+
+
+def test_save_and_load_round_trip(downloader, tmp_path, capsys):
+    plan = DownloadPlanner(downloader).plan(CODES, start=START, end=END)
+    path = plan.save(str(tmp_path / 'plan.json'))
+    loaded = DownloadPlan.load(path)
+    assert loaded == plan
+    assert loaded.to_dict()['totals']['active'] == 4
+
+    loaded.print_summary(top=2)
+    out = capsys.readouterr().out
+    assert '下载 3，增量 1，跳过 2' in out
+    assert '交易日历缺失' in out
+
+
+def test_execute_plan_runs_each_action(downloader, monkeypatch):
+    calls = []
+    monkeypatch.setattr(downloader, 'download_stock_data',
+                        lambda code, **kwargs: calls.append(('full', code, kwargs['start_time'])) or True)
+    monkeypatch.setattr(downloader, 'update_stock_data',
+                        lambda code, **kwargs: calls.append(('update', code, kwargs['start_time'])) or code != 'STALE.SH')
+    plan = DownloadPlanner(downloader).plan(CODES, start=START, end=END)
+
+    results = execute_plan(downloader, plan)
+    assert results == {'NEW.SH': True, 'STALE.SH': False, 'GAP.SH': True, 'MINUTE.SH': True}
+    assert ('update', 'STALE.SH', START) in calls
+    assert ('full', 'GAP.SH', START) in calls
+    assert not any(code in ('FRESH.SH', 'DELISTED.SH') for _, code, _ in calls)
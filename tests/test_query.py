@@ -0,0 +1,88 @@
+import os
+
+import pandas as pd
+import pytest
+
+from tests.fakes import make_daily_bars, write_bars
+
+pytest.importorskip('duckdb')
+
+from core.storage.query import DataQuery  # noqa: E402
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    directory = str(tmp_path)
+    write_bars(directory, '600000.SH', make_daily_bars(periods=10, base=10.0, seed=1))
+    write_bars(directory, '000001.SZ', make_daily_bars(periods=10, base=20.0, seed=2))
+    return directory
+
+
+@pytest.fixture
+def query(output_dir):
+    with DataQuery(output_dir, database=':memory:') as query:
+        yield query
+
+
+def test_discover_files_skips_hidden_and_unrelated_files(output_dir, query):
+    write_bars(os.path.join(output_dir, '.snapshots'), '510300.SH', make_daily_bars(periods=3))
+    write_bars(os.path.join(output_dir, 'live', '1m', '20240102'), '510300.SH', make_daily_bars(periods=3))
+    write_bars(output_dir, 'stock_list', make_daily_bars(periods=3))
+    write_bars(os.path.join(output_dir, 'dataset', 'code=510300.SH'), 'part-0', make_daily_bars(periods=3))
+
+    codes = query.discover_files()
+    assert sorted(codes.values()) == ['000001.SZ', '510300.SH', '600000.SH']
+    assert any('code=510300.SH' in path for path in codes)
+
+
+def test_refresh_only_reimports_changed_files(output_dir, query):
+    assert query.refresh() == {'added': 2, 'updated': 0, 'removed': 0, 'unchanged': 0}
+    assert query.sql("SELECT COUNT(*) AS n FROM bars")['n'][0] == 20
+    assert query.refresh() == {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 2}
+
+    path = write_bars(output_dir, '600000.SH', make_daily_bars(periods=12, seed=3))
+    os.utime(path, (1, 1))
+    os.remove(os.path.join(output_dir, '000001.SZ.parquet'))
+    assert query.refresh() == {'added': 0, 'updated': 1, 'removed': 1, 'unchanged': 0}
+
+    counts = query.sql("SELECT code, COUNT(*) AS n FROM bars GROUP BY code")
+    assert counts.set_index('code')['n'].to_dict() == {'600000.SH': 12}
+
+
+def test_cross_section_and_rank(query):
+    query.refresh()
+    day = '2024-01-03'
+    section = query.cross_section(day, ['close', 'amount'])
+    assert list(section.index) == ['000001.SZ', '600000.SH']
+    expected = make_daily_bars(periods=10, base=20.0, seed=2).loc[day, 'close']
+    assert section.loc['000001.SZ', 'close'] == pytest.approx(expected)
+
+    ranked = query.rank(day, by='close', top=1)
+    assert ranked['code'].tolist() == ['000001.SZ'] and ranked['rank'].tolist() == [1]
+    with pytest.raises(ValueError):
+        query.rank(day, by='close; DROP TABLE bars')
+
+
+def test_live_view_reads_files_without_refresh(output_dir, query):
+    query.register()
+    assert query.sql("SELECT COUNT(DISTINCT code) AS n FROM bars_live")['n'][0] == 2
+    assert query.sql("SELECT COUNT(*) AS n FROM bars")['n'][0] == 0
+
+
+def test_register_empty_directory(tmp_path):
+    with DataQuery(str(tmp_path), database=':memory:') as query:
+        query.register()
+        with pytest.raises(Exception):
+            query.sql("SELECT * FROM bars_live")
+
+
+def test_manifest_marks_missing_codes(query):
+    query.refresh()
+    manifest = query.manifest(['600000.SH', '510300.SH'])
+    assert manifest['510300.SH'] == {'code': '510300.SH', 'exists': False, 'error': 'File not found'}
+    entry = manifest['600000.SH']
+    bars = make_daily_bars(periods=10, base=10.0, seed=1)
+    assert entry['count'] == 10
+    assert entry['start_date'] == str(bars.index[0].date())
+    assert entry['end_date'] == str(bars.index[-1].date())
+    assert isinstance(query.arrow("SELECT * FROM bars LIMIT 1").to_pandas(), pd.DataFrame)
@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+from core.cleaner.reconcile import (
+    MISMATCH, MISSING_LOCAL, MISSING_REFERENCE, Tolerance, compare_frames, normalize_code,
+    parse_tolerances, standardize_reference,
+)
+from tests.fakes import make_daily_bars
+
+
+def test_identical_frames_have_no_differences():
+    local = make_daily_bars()
+    assert len(compare_frames('600000.SH', local, local.copy())) == 0
+
+
+def test_mismatch_outside_tolerance():
+    local = make_daily_bars()
+    reference = local.copy()
+    reference.iloc[3, reference.columns.get_loc('close')] += 0.5
+    reference.iloc[4, reference.columns.get_loc('close')] += 0.001  # 在默认容差内
+
+    report = compare_frames('600000.SH', local, reference)
+
+    assert list(report['kind']) == [MISMATCH]
+    row = report.iloc[0]
+    assert row['code'] == '600000.SH'
+    assert row['field'] == 'close'
+    assert row['date'] == local.index[3]
+    assert row['reference'] - row['local'] == pytest.approx(0.5)
+
+
+def test_missing_days_and_suspensions():
+    local = make_daily_bars(periods=10)
+    reference = local.copy()
+    reference.loc[local.index[8], 'volume'] = 0.0
+    local = local.drop(index=[local.index[2], local.index[8]])
+    reference = reference.drop(index=local.index[5])
+
+    report = compare_frames('600000.SH', local, reference)
+
+    kinds = dict(zip(report['date'], report['kind']))
+    assert kinds == {reference.index[2]: MISSING_LOCAL, local.index[5]: MISSING_REFERENCE}
+
+
+def test_only_overlapping_range_is_compared():
+    local = make_daily_bars(periods=20)
+    reference = local.iloc[5:15].copy()
+    assert len(compare_frames('600000.SH', local, reference)) == 0
+
+
+def test_custom_tolerances():
+    local = make_daily_bars()
+    reference = local.copy()
+    reference['volume'] *= 1.02
+
+    assert len(compare_frames('600000.SH', local, reference)) == len(local)
+    tolerances = parse_tolerances('volume=5%')
+    assert tolerances['volume'] == Tolerance(rtol=0.05)
+    assert len(compare_frames('600000.SH', local, reference, tolerances)) == 0
+
+
+def test_standardize_reference_and_codes():
+    raw = pd.DataFrame({'ts_code': ['SH600000', '600000.XSHG'], 'trade_date': [20240102, 20240103],
+                        'close': [10.0, 10.1], 'vol': [12.0, 13.0]})
+    reference = standardize_reference(raw, {'volume': 100})
+
+    assert list(reference.index) == [pd.Timestamp('2024-01-02'), pd.Timestamp('2024-01-03')]
+    assert set(reference['code']) == {'600000.SH'}
+    assert list(reference['volume']) == [1200.0, 1300.0]
+    assert normalize_code('sz.000001') == '000001.SZ'
+    assert normalize_code('AAPL') == 'AAPL'
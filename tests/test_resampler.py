@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.storage.resampler import Resampler, resample_bars
+from tests.fakes import make_daily_bars, write_bars
+
+
+def test_weekly_bars_aggregate_ohlcv():
+    daily = make_daily_bars('2024-01-01', periods=10)  # 两个完整的自然周
+    weekly = resample_bars(daily, '1w')
+
+    assert list(weekly.index) == [pd.Timestamp('2024-01-05'), pd.Timestamp('2024-01-12')]
+    first = daily.iloc[:5]
+    row = weekly.iloc[0]
+    assert row['open'] == first['open'].iloc[0]
+    assert row['close'] == first['close'].iloc[-1]
+    assert row['high'] == first['high'].max()
+    assert row['low'] == first['low'].min()
+    assert row['volume'] == first['volume'].sum()
+
+
+def test_monthly_label_is_last_trading_day():
+    daily = make_daily_bars('2024-01-01', periods=30)
+    monthly = resample_bars(daily, '1mon')
+    assert list(monthly.index) == [pd.Timestamp('2024-01-31'), pd.Timestamp('2024-02-09')]
+
+
+def test_minute_buckets_follow_trading_sessions():
+    day = pd.Timestamp('2024-01-02')
+    minutes = ([day + pd.Timedelta(hours=9, minutes=31 + i) for i in range(120)]
+               + [day + pd.Timedelta(hours=13, minutes=1 + i) for i in range(120)])
+    bars = pd.DataFrame({'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': 1.0, 'volume': 1.0},
+                        index=pd.DatetimeIndex(minutes, name='date'))
+
+    hourly = resample_bars(bars, '60m')
+
+    # 午休不跨桶，标签为桶的结束时间
+    assert [t.strftime('%H:%M') for t in hourly.index] == ['10:30', '11:30', '14:00', '15:00']
+    assert (hourly['volume'] == 60).all()
+
+
+def test_empty_and_unsupported_targets():
+    assert len(resample_bars(make_daily_bars().iloc[:0], '1w')) == 0
+    with pytest.raises(ValueError):
+        resample_bars(make_daily_bars(), '2d')
+
+
+def test_incremental_update_matches_full_rebuild(tmp_path):
+    output_dir = str(tmp_path)
+    daily = make_daily_bars('2024-01-01', periods=60)
+    write_bars(output_dir, '600000.SH', daily.iloc[:33])
+    resampler = Resampler(output_dir)
+    resampler.update('600000.SH', '1w')
+
+    write_bars(output_dir, '600000.SH', daily)
+    incremental = resampler.update('600000.SH', '1w')
+
+    pd.testing.assert_frame_equal(incremental, resample_bars(daily, '1w'), check_freq=False)
+
+
+def test_rebuild_replaces_rewritten_history(tmp_path):
+    output_dir = str(tmp_path)
+    daily = make_daily_bars('2024-01-01', periods=30)
+    write_bars(output_dir, '600000.SH', daily)
+    resampler = Resampler(output_dir)
+    resampler.update_all(['600000.SH'], ['1w'])
+
+    # 除权换算改写了全部历史
+    rescaled = daily.copy()
+    rescaled[['open', 'high', 'low', 'close']] *= 0.5
+    write_bars(output_dir, '600000.SH', rescaled)
+    resampler.update_all(['600000.SH'], ['1w'], rebuild={'600000.SH'})
+
+    weekly = pd.read_parquet(resampler.target_path('600000.SH', '1w'))
+    np.testing.assert_allclose(weekly['close'], resample_bars(rescaled, '1w')['close'])
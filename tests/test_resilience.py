@@ -0,0 +1,179 @@
+import threading
+import time
+
+import pytest
+
+from core.fetcher.downloader import QmtDataDownloader
+from core.fetcher.resilience import (
+    CallTimeoutError, CircuitBreaker, CircuitOpenError, PermanentError, RetryPolicy, SegmentOutcome,
+    call_with_timeout, classify_error,
+)
+from core.fetcher.source import ReplaySource
+from core.metrics import RunMetrics
+from tests.fakes import make_daily_bars, write_bars
+
+
+@pytest.mark.parametrize('exc, kind', [
+    (CallTimeoutError('slow'), 'timeout'),
+    (PermanentError('bad code'), 'permanent'),
+    (NotImplementedError('no ticks'), 'permanent'),
+    (RuntimeError('股票代码不存在: 600000.XX'), 'permanent'),
+    (RuntimeError('连接无效'), 'retryable'),
+    (RuntimeError('invalid session'), 'retryable'),
+    (KeyError('600000.SH'), 'retryable'),
+    (TypeError("'NoneType' object is not subscriptable"), 'retryable'),
+    (ConnectionError('reset'), 'retryable'),
+])
+def test_classify_error(exc, kind):
+    assert classify_error(exc) == kind
+
+
+def test_timed_out_call_blocks_the_next_call_until_it_returns():
+    slots = threading.BoundedSemaphore(1)
+    release = threading.Event()
+    running = []
+
+    def hung() -> None:
+        running.append(1)
+        release.wait(5)
+        running.pop()
+
+    with pytest.raises(CallTimeoutError):
+        call_with_timeout(hung, 0.05, slots=slots)
+    # 之前的调用仍在后台运行：重试等不到名额，不会在同一个连接上并发调用
+    with pytest.raises(CallTimeoutError):
+        call_with_timeout(lambda: running.append(2), 0.05, slots=slots)
+    assert running == [1]
+
+    release.set()
+    assert call_with_timeout(lambda: len(running), 1.0, slots=slots) == 0
+
+
+def test_call_errors_release_the_slot():
+    slots = threading.BoundedSemaphore(1)
+    with pytest.raises(ValueError):
+        call_with_timeout(lambda: (_ for _ in ()).throw(ValueError('boom')), 1.0, slots=slots)
+    with pytest.raises(ValueError):
+        call_with_timeout(lambda: (_ for _ in ()).throw(ValueError('boom')), None, slots=slots)
+    assert call_with_timeout(lambda: 'ok', None, slots=slots) == 'ok'
+
+
+def test_breaker_lets_a_single_probe_through():
+    reconnects = []
+    breaker = CircuitBreaker(threshold=2, cooldown=0.05, on_open=lambda: reconnects.append(1))
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.is_open
+
+    admitted = []
+
+    def caller(i: int) -> None:
+        breaker.before_call()
+        admitted.append(i)
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    # 只有试探调用被放行，其他调用等待试探结果
+    assert len(admitted) == 1
+    assert breaker.half_open
+    assert reconnects == [1]
+
+    breaker.record_success()
+    for thread in threads:
+        thread.join(1)
+    assert len(admitted) == 3
+    assert not breaker.is_open and not breaker.half_open
+
+
+def test_failed_probe_reopens_and_trips_are_limited():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.01, max_trips=1)
+    breaker.record_failure()
+    breaker.before_call()
+    assert breaker.half_open
+    breaker.record_failure()
+    assert breaker.is_open and breaker.trips == 2
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+class FlakySource(ReplaySource):
+    """前几次读取抛出掉线时的异常数据错误"""
+
+    def __init__(self, output_dir: str, errors: list[BaseException]):
+        super().__init__(output_dir)
+        self.errors = list(errors)
+
+    def read_bars(self, *args, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        return super().read_bars(*args, **kwargs)
+
+
+def test_malformed_replies_are_retried_and_count_against_the_breaker(tmp_path):
+    write_bars(str(tmp_path), '600000.SH', make_daily_bars())
+    breaker = CircuitBreaker(threshold=5, cooldown=0)
+    source = FlakySource(str(tmp_path), [KeyError('600000.SH')])
+    downloader = QmtDataDownloader(str(tmp_path / 'out'), source=source, breaker=breaker)
+
+    failed = downloader._download_segment('600000.SH', '20240101', '20240131', '1d', 'front')
+    assert failed.outcome == SegmentOutcome.ERROR
+    assert breaker.failures == 1
+
+    assert downloader._download_segment('600000.SH', '20240101', '20240131', '1d', 'front').outcome \
+        == SegmentOutcome.OK
+    assert breaker.failures == 0
+
+
+def test_backoff_grows_with_jitter_and_is_capped():
+    policy = RetryPolicy(base_delay=1.0, multiplier=2.0, max_delay=5.0, jitter=0.5, seed=7)
+    for attempt, delay in enumerate([1.0, 2.0, 4.0, 5.0, 5.0]):
+        assert delay * 0.5 <= policy.backoff(attempt) <= delay
+    assert RetryPolicy(base_delay=1.0, jitter=0.0).backoff(3) == 8.0
+    # 相同种子得到相同的抖动
+    assert [RetryPolicy(seed=1).backoff(i) for i in range(3)] == [RetryPolicy(seed=1).backoff(i) for i in range(3)]
+
+
+@pytest.mark.parametrize('outcome, retried', [
+    (SegmentOutcome.ERROR, True),
+    (SegmentOutcome.TIMEOUT, True),
+    (SegmentOutcome.EMPTY, False),
+    (SegmentOutcome.PERMANENT, False),
+    (SegmentOutcome.OK, False),
+])
+def test_only_errors_and_timeouts_are_retried(outcome, retried):
+    policy = RetryPolicy(max_attempts=3, budget=10)
+    assert policy.should_retry(outcome, 0) is retried
+    assert policy.retries_used == int(retried)
+
+
+def test_retry_budget_is_shared_and_resettable():
+    policy = RetryPolicy(max_attempts=3, budget=2)
+    assert policy.should_retry(SegmentOutcome.ERROR, 0)
+    # 最后一次尝试不再重试，也不占用预算
+    assert not policy.should_retry(SegmentOutcome.ERROR, 2)
+    assert policy.should_retry(SegmentOutcome.TIMEOUT, 0)
+    assert policy.budget_remaining == 0
+    assert not policy.should_retry(SegmentOutcome.ERROR, 0)
+    assert policy.retries_used == 2
+
+    policy.reset()
+    assert policy.budget_remaining == 2
+    assert RetryPolicy().budget_remaining is None
+
+
+def test_fetch_segment_stops_retrying_when_budget_runs_out(tmp_path):
+    write_bars(str(tmp_path), '600000.SH', make_daily_bars())
+    errors = [ConnectionError('reset')] * 5
+    metrics = RunMetrics()
+    downloader = QmtDataDownloader(str(tmp_path / 'out'), source=FlakySource(str(tmp_path), errors),
+                                   metrics=metrics, retry_policy=RetryPolicy(base_delay=0, budget=3))
+
+    first = downloader._fetch_segment('600000.SH', '20240101', '20240131', '1d', 'front', retry_times=3)
+    assert first.outcome == SegmentOutcome.ERROR
+    second = downloader._fetch_segment('600000.SH', '20240101', '20240131', '1d', 'front', retry_times=3)
+    # 预算只剩1次：第二个时间段重试一次后放弃
+    assert second.outcome == SegmentOutcome.ERROR
+    assert metrics.counter_totals()['retries[outcome=error]'] == 3
+    assert downloader.source.errors == []
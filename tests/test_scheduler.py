@@ -0,0 +1,124 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from core.fetcher import scheduler as scheduler_module
+from core.fetcher.downloader import QmtDataDownloader
+from core.fetcher.scheduler import DownloadScheduler, latest_trading_day, parse_deadline
+from core.fetcher.source import ReplaySource
+from core.metrics import RunMetrics
+from tests.fakes import make_daily_bars, write_bars
+
+END = '20240301'
+
+
+def _write_stale(output_dir: str, code: str, stale_days: int) -> None:
+    """写一个最后一根K线落后 END stale_days 个交易日的文件"""
+    last = pd.Timestamp(END) - pd.offsets.BDay(stale_days)
+    write_bars(output_dir, code, make_daily_bars(start=str((last - pd.offsets.BDay(4)).date()), periods=5))
+
+
+@pytest.fixture
+def downloader(tmp_path):
+    return QmtDataDownloader(str(tmp_path / 'output'), source=ReplaySource(str(tmp_path)),
+                             metrics=RunMetrics(), pause=0)
+
+
+@pytest.mark.parametrize('now, expected', [
+    (datetime(2024, 3, 1, 16, 0), '20240301'),    # 周五收盘后
+    (datetime(2024, 3, 1, 10, 0), '20240229'),    # 盘中：前一天
+    (datetime(2024, 3, 4, 9, 0), '20240301'),     # 周一开盘前：上周五
+    (datetime(2024, 3, 3, 20, 0), '20240301'),    # 周日
+])
+def test_latest_trading_day(now, expected):
+    assert latest_trading_day(now) == expected
+
+
+def test_parse_deadline():
+    now = datetime(2024, 3, 1, 22, 0)
+    assert parse_deadline('90', now) == now + timedelta(minutes=90)
+    assert parse_deadline('23:30', now) == datetime(2024, 3, 1, 23, 30)
+    assert parse_deadline('06:30', now) == datetime(2024, 3, 2, 6, 30)
+    assert parse_deadline('2024-03-02T05:00', now) == datetime(2024, 3, 2, 5, 0)
+
+
+def test_plan_orders_by_freshness_tier_staleness_and_cost(downloader):
+    output_dir = downloader.output_dir
+    _write_stale(output_dir, 'FRESH.SH', 0)
+    _write_stale(output_dir, 'STALE3.SH', 3)
+    _write_stale(output_dir, 'STALE10.SH', 10)
+    _write_stale(output_dir, 'VIP.SH', 1)
+    scheduler = DownloadScheduler(downloader, priorities={'VIP.SH': 0, 'FRESH.SH': 0})
+
+    tasks = scheduler.plan(['FRESH.SH', 'STALE3.SH', 'NEW.SH', 'VIP.SH', 'STALE10.SH', 'STALE3.SH'],
+                           start_time='20230101', end_time=END, incremental=True)
+    # 已是最新的排最后（即使优先级最高）；同档位中没有数据的视为最陈旧
+    assert [t.code for t in tasks] == ['VIP.SH', 'NEW.SH', 'STALE10.SH', 'STALE3.SH', 'FRESH.SH']
+    by_code = {t.code: t for t in tasks}
+    assert by_code['STALE10.SH'].stale_days == 10 and by_code['STALE10.SH'].cost == 11
+    assert by_code['FRESH.SH'].fresh and by_code['FRESH.SH'].last_date == END
+    assert by_code['NEW.SH'].last_date is None and by_code['NEW.SH'].cost > 200
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = datetime(2024, 3, 4, 1, 0).timestamp()
+
+    def time(self) -> float:
+        return self.now
+
+
+def _run(downloader, monkeypatch, codes, deadline_seconds, priorities=None, seconds_per_unit=0.01):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler_module, 'time', clock)
+    scheduler = DownloadScheduler(downloader, priorities=priorities)
+    costs = {t.code: t.cost for t in scheduler.plan(codes, end_time=END, incremental=True)}
+
+    def update(code, **kwargs):
+        clock.now += (costs[code] + scheduler_module.OVERHEAD_BARS) * seconds_per_unit
+        return True
+
+    monkeypatch.setattr(downloader, 'update_stock_data', update)
+    deadline = datetime.fromtimestamp(clock.now + deadline_seconds)
+    results = scheduler.run(codes, deadline=deadline, incremental=True, end_time=END)
+    with open(scheduler.report_file, encoding='utf-8') as f:
+        return results, json.load(f)
+
+
+def test_codes_that_do_not_fit_are_deferred_and_smaller_ones_still_run(downloader, monkeypatch):
+    for code, stale in [('BIG.SH', 200), ('MID.SH', 30), ('SMALL.SH', 1)]:
+        _write_stale(downloader.output_dir, code, stale)
+
+    # BIG 先执行 4.51s，剩余 2.69s：MID 预计 2.81s 放不下，SMALL 预计 2.52s 可以
+    results, report = _run(downloader, monkeypatch, ['SMALL.SH', 'MID.SH', 'BIG.SH'], 7.2,
+                           priorities={'BIG.SH': 0})
+    assert results == {'BIG.SH': True, 'SMALL.SH': True}
+    assert report['completed'] == 2 and report['deferred_count'] == 1
+    deferred = report['deferred'][0]
+    assert deferred['code'] == 'MID.SH' and deferred['reason'] == 'insufficient_time'
+    assert deferred['estimated_seconds'] == pytest.approx(2.8, abs=0.1)
+    assert downloader.metrics.counter_totals()['codes_deferred'] == 1
+
+
+def test_passed_deadline_defers_everything(downloader, monkeypatch):
+    _write_stale(downloader.output_dir, 'A.SH', 3)
+    results, report = _run(downloader, monkeypatch, ['A.SH', 'NEW.SH'], -1)
+    assert results == {}
+    assert [d['reason'] for d in report['deferred']] == ['deadline', 'deadline']
+    # 没有成功的代码时不生成股票列表
+    assert not any(name.startswith('stock_list') for name in os.listdir(downloader.output_dir))
+
+
+def test_without_deadline_everything_runs(downloader, monkeypatch):
+    _write_stale(downloader.output_dir, 'A.SH', 3)
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler_module, 'time', clock)
+    monkeypatch.setattr(downloader, 'update_stock_data', lambda code, **kwargs: code == 'A.SH')
+    scheduler = DownloadScheduler(downloader)
+    assert scheduler.run(['A.SH', 'B.SH'], incremental=True, end_time=END) == {'B.SH': False, 'A.SH': True}
+    with open(scheduler.report_file, encoding='utf-8') as f:
+        report = json.load(f)
+    assert report['deadline'] is None and report['deferred'] == []
@@ -0,0 +1,82 @@
+import os
+
+import pandas as pd
+import pytest
+
+from core.metrics import RunMetrics
+from core.fetcher.sharding import ShardedDownloader, estimate_bars, shard_codes
+from tests.fakes import ReplaySourceFactory, make_daily_bars, write_bars
+
+CODES = ['600000.SH', '600036.SH', '000001.SZ', '000002.SZ', '510300.SH']
+
+
+def test_hash_sharding_is_stable_and_complete():
+    shards = shard_codes(CODES, 3, 'hash')
+    assert sorted(code for shard in shards for code in shard) == sorted(CODES)
+    assert shards == shard_codes(CODES, 3, 'hash')
+    # 分片内保持原有顺序
+    for shard in shards:
+        assert shard == [code for code in CODES if code in shard]
+
+
+def test_size_sharding_balances_costs():
+    costs = {'a': 100, 'b': 60, 'c': 50, 'd': 10}
+    shards = shard_codes(list(costs), 2, 'size', costs)
+    loads = sorted(sum(costs[code] for code in shard) for shard in shards)
+    assert loads == [110, 110]
+
+
+def test_invalid_shard_arguments():
+    with pytest.raises(ValueError):
+        shard_codes(CODES, 0)
+    with pytest.raises(ValueError):
+        shard_codes(CODES, 2, 'random')
+
+
+def test_estimate_bars_respects_listing_window():
+    full = estimate_bars('20200101', '20201231')
+    assert estimate_bars('20200101', '20201231', list_date='20200701') < full
+    assert estimate_bars('20200101', '20201231', delist_date='20191231') == 0
+    assert estimate_bars('20200101', '20201231', '1m') > full * 200
+
+
+def test_sharded_download_writes_every_code(tmp_path):
+    source_dir = str(tmp_path / 'source')
+    output_dir = str(tmp_path / 'output')
+    expected = {}
+    for seed, code in enumerate(CODES):
+        expected[code] = make_daily_bars(periods=40, seed=seed)
+        write_bars(source_dir, code, expected[code])
+
+    metrics = RunMetrics()
+    sharded = ShardedDownloader([58610, 58611], output_dir,
+                                source_factory=ReplaySourceFactory(source_dir),
+                                metrics=metrics, pause=0)
+    results = sharded.download_batch(CODES, start_time='20240101', end_time='20240331',
+                                     output_formats=['parquet'])
+
+    assert results == {code: True for code in CODES}
+    assert list(results) == CODES
+    for code in CODES:
+        saved = pd.read_parquet(os.path.join(output_dir, f"{code}.parquet"))
+        pd.testing.assert_frame_equal(saved[['open', 'close']], expected[code][['open', 'close']],
+                                      check_freq=False, check_index_type=False)
+    # 共享文件只由主进程写，工作进程的指标合并到主进程
+    stock_list = pd.read_csv(os.path.join(output_dir, 'stock_list.csv'))
+    assert len(stock_list) == len(CODES)
+    succeeded = sum(value for key, value in metrics.counter_totals().items()
+                    if key.startswith('codes_succeeded'))
+    assert succeeded == len(CODES)
+
+
+def test_sharded_download_reports_missing_codes(tmp_path):
+    source_dir = str(tmp_path / 'source')
+    write_bars(source_dir, '600000.SH', make_daily_bars())
+
+    sharded = ShardedDownloader([58610, 58611], str(tmp_path / 'output'),
+                                source_factory=ReplaySourceFactory(source_dir), pause=0)
+    results = sharded.download_batch(['600000.SH', '000001.SZ'], start_time='20240101',
+                                     end_time='20240331', output_formats=['parquet'],
+                                     retry_times=1)
+
+    assert results == {'600000.SH': True, '000001.SZ': False}
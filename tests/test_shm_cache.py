@@ -0,0 +1,136 @@
+import multiprocessing
+import threading
+import uuid
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.storage.shm_cache import SharedWindowPublisher, SharedWindowReader
+from tests.fakes import make_daily_bars, write_bars
+
+
+@pytest.fixture
+def name():
+    return f'qdt_test_{uuid.uuid4().hex[:12]}'
+
+
+def _bar(i: int) -> tuple[float, ...]:
+    return (float(i),) * 6
+
+
+def _assert_bars(actual: pd.DataFrame, expected: pd.DataFrame) -> None:
+    assert list(actual.columns) == list(expected.columns)
+    assert list(actual.index) == list(expected.index)
+    np.testing.assert_array_equal(actual.to_numpy(), expected.to_numpy())
+
+
+def test_publish_and_read(name, tmp_path):
+    bars = make_daily_bars(periods=30)
+    write_bars(str(tmp_path), '600000.SH', bars)
+    with SharedWindowPublisher(['600000.SH', '000001.SZ'], window=10, name=name) as publisher:
+        assert publisher.publish_from_store(str(tmp_path)) == 1
+        with SharedWindowReader(name) as reader:
+            _assert_bars(reader.read('600000.SH'), bars.iloc[-10:])
+            _assert_bars(reader.read('600000.SH', n=3), bars.iloc[-3:])
+            assert reader.latest('600000.SH')['close'] == bars['close'].iloc[-1]
+            assert reader.latest('000001.SZ') is None
+            assert len(reader.read('000001.SZ')) == 0
+
+
+def test_append_wraps_around_the_ring(name):
+    with SharedWindowPublisher(['A', 'B'], window=3, name=name) as publisher:
+        for i in range(5):
+            publisher.append('A', i * 1_000_000_000, _bar(i))
+        publisher.append('B', 0, _bar(7))
+        publisher.append('UNKNOWN', 0, _bar(9))
+
+        with SharedWindowReader(name) as reader:
+            df = reader.read('A')
+            assert df['close'].tolist() == [2.0, 3.0, 4.0]
+            assert list(df.index) == [pd.Timestamp(i * 1_000_000_000) for i in (2, 3, 4)]
+            assert reader.latest('A')['date'] == pd.Timestamp(4_000_000_000)
+
+            close = reader.read_field('close', ['A', 'B'])
+            assert close['A'].tolist() == [2.0, 3.0, 4.0]
+            # K线不足的代码前面补NaN
+            assert np.isnan(close['B'].iloc[:2]).all() and close['B'].iloc[2] == 7.0
+
+
+def test_reader_retries_while_writer_is_writing(name):
+    with SharedWindowPublisher(['A'], window=3, name=name) as publisher:
+        publisher.append('A', 0, _bar(1))
+        with SharedWindowReader(name, max_retries=5) as reader:
+            # 写进程在写（seq为奇数）时读不到一致的数据
+            publisher._arrays['seq'][0] += 1
+            with pytest.raises(TimeoutError):
+                reader.read('A')
+            publisher._arrays['seq'][0] += 1
+            assert reader.latest('A')['close'] == 1.0
+
+
+def test_concurrent_reads_are_never_torn(name):
+    window = 16
+    with SharedWindowPublisher(['A'], window=window, name=name) as publisher:
+        stop = threading.Event()
+
+        def write() -> None:
+            i = 0
+            while not stop.is_set():
+                publisher.append('A', i, _bar(i))
+                i += 1
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            with SharedWindowReader(name, max_retries=100_000) as reader:
+                for _ in range(2000):
+                    df = reader.read('A')
+                    values = df.to_numpy()
+                    # 同一根K线的所有字段和时间来自同一次写入，窗口内连续
+                    assert (values == values[:, :1]).all()
+                    np.testing.assert_array_equal(values[:, 0], df.index.asi8)
+                    assert (np.diff(df.index.asi8) == 1).all()
+        finally:
+            stop.set()
+            writer.join()
+
+
+def _read_in_child(name: str, queue) -> None:
+    with SharedWindowReader(name) as reader:
+        queue.put(reader.read('A')['close'].tolist())
+
+
+def test_reader_in_another_process(name):
+    with SharedWindowPublisher(['A'], window=4, name=name) as publisher:
+        for i in range(6):
+            publisher.append('A', i, _bar(i))
+        context = multiprocessing.get_context('spawn')
+        queue = context.Queue()
+        process = context.Process(target=_read_in_child, args=(name, queue))
+        process.start()
+        assert queue.get(timeout=30) == [2.0, 3.0, 4.0, 5.0]
+        process.join(30)
+        # 读进程退出后共享内存仍然可以附加
+        with SharedWindowReader(name) as reader:
+            assert reader.latest('A')['close'] == 5.0
+
+
+def test_stale_segment_is_recreated_and_foreign_segment_rejected(name):
+    stale = SharedWindowPublisher(['A'], window=2, name=name)
+    stale.append('A', 0, _bar(1))
+    stale.close()
+    # 上次的发布进程没有 unlink
+    with SharedWindowPublisher(['A', 'B'], window=4, name=name):
+        with SharedWindowReader(name) as reader:
+            assert reader.codes == ['A', 'B'] and reader.window == 4
+            assert reader.latest('A') is None
+
+    foreign = shared_memory.SharedMemory(name=name, create=True, size=128)
+    try:
+        with pytest.raises(ValueError):
+            SharedWindowReader(name)
+    finally:
+        foreign.close()
+        foreign.unlink()
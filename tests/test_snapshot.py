@@ -0,0 +1,88 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from core.storage.exporter import write_parquet
+from core.storage.reader import load_data
+from core.storage.snapshot import MANIFEST_FILE, SnapshotStore
+from tests.fakes import make_daily_bars, write_bars
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    directory = str(tmp_path)
+    write_bars(directory, '600000.SH', make_daily_bars(seed=1))
+    write_bars(directory, '000001.SZ', make_daily_bars(seed=2))
+    return directory
+
+
+def _set_created(store: SnapshotStore, snapshot_id: str, created: datetime) -> None:
+    path = os.path.join(store.root, snapshot_id, MANIFEST_FILE)
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest['created'] = created.isoformat(timespec='seconds')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+
+def test_snapshot_is_unaffected_by_later_writes(output_dir):
+    store = SnapshotStore(output_dir)
+    snapshot_id = store.create(note='before rewrite')
+    assert store.latest() == snapshot_id
+    assert os.path.samefile(store.file_path('600000.SH'), os.path.join(output_dir, '600000.SH.parquet'))
+
+    original = load_data('600000.SH', output_dir)
+    write_parquet(make_daily_bars(seed=9), os.path.join(output_dir, '600000.SH.parquet'))
+    pd.testing.assert_frame_equal(load_data('600000.SH', output_dir, snapshot='latest'), original)
+    assert not original.equals(load_data('600000.SH', output_dir))
+
+    manifest = store.manifest()
+    assert manifest['note'] == 'before rewrite'
+    assert set(manifest['files']) == {'600000.SH', '000001.SZ'}
+
+
+def test_create_filters_codes_and_rejects_existing_ids(output_dir):
+    store = SnapshotStore(output_dir)
+    store.create('only-one', code_list=['000001.SZ'])
+    assert set(store.manifest('only-one')['files']) == {'000001.SZ'}
+    with pytest.raises(FileNotFoundError):
+        store.file_path('600000.SH', 'only-one')
+    with pytest.raises(FileExistsError):
+        store.create('only-one')
+    with pytest.raises(FileNotFoundError):
+        store.resolve('missing')
+    assert not any(name.startswith('.') for name in os.listdir(store.root))
+
+
+def test_snapshots_are_ordered_by_creation_not_name(output_dir):
+    store = SnapshotStore(output_dir)
+    now = datetime.now()
+    for snapshot_id, age in [('b', 3), ('a', 2), ('pre-release', 1)]:
+        store.create(snapshot_id)
+        _set_created(store, snapshot_id, now - timedelta(days=age))
+    assert store.list_snapshots() == ['b', 'a', 'pre-release']
+    assert SnapshotStore(os.path.join(output_dir, 'empty')).list_snapshots() == []
+
+
+def test_gc_keeps_recent_pinned_and_latest(output_dir):
+    store = SnapshotStore(output_dir)
+    now = datetime.now()
+    ids = [f's{i}' for i in range(5)]
+    for age, snapshot_id in zip(range(50, 0, -10), ids):
+        store.create(snapshot_id)
+        _set_created(store, snapshot_id, now - timedelta(days=age))
+    # LATEST 指向较旧的快照（如回滚后）
+    store._write_latest('s1')
+
+    assert store.gc(keep_last=2, pinned=['s0']) == ['s2']
+    assert store.list_snapshots() == ['s0', 's1', 's3', 's4']
+    # 按天数保留：s3（20天前）、s4（10天前）在30天内，s1 是 LATEST
+    assert store.gc(keep_last=0, keep_days=30) == ['s0']
+    assert store.list_snapshots() == ['s1', 's3', 's4']
+    assert store.gc(keep_last=0, keep_days=15) == ['s3']
+    # 删除快照不影响其他快照和数据文件（硬链接）
+    assert os.path.exists(store.file_path('600000.SH', 's4'))
+    assert os.path.exists(os.path.join(output_dir, '600000.SH.parquet'))
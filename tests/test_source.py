@@ -0,0 +1,40 @@
+import os
+
+from core.fetcher.source import RecordingSource, ReplaySource
+from tests.fakes import make_daily_bars, write_bars
+
+
+def test_replay_only_serves_the_declared_period_and_adjustment(tmp_path):
+    write_bars(str(tmp_path), '600000.SH', make_daily_bars())
+    source = ReplaySource(str(tmp_path))
+
+    assert len(source.read_bars('600000.SH', '1d', '20240101', '20240131')) == 23
+    assert source.read_bars('600000.SH', '1m', '20240101', '20240131') is None
+    assert source.read_bars('600000.SH', '1d', '20240101', '20240131', 'none') is None
+    assert source.read_bars('000001.SZ', '1d', '20240101', '20240131') is None
+
+    minute = ReplaySource(str(tmp_path), period='1m', dividend_type='none')
+    assert minute.read_bars('600000.SH', '1d', '20240101', '20240131') is None
+    assert len(minute.read_bars('600000.SH', '1m', '20240101', '20240131', 'none')) == 23
+
+
+def test_replay_rereads_rewritten_files(tmp_path):
+    path = write_bars(str(tmp_path), '600000.SH', make_daily_bars(periods=10))
+    source = ReplaySource(str(tmp_path))
+    assert len(source.read_bars('600000.SH', '1d', '', '')) == 10
+
+    write_bars(str(tmp_path), '600000.SH', make_daily_bars(periods=20))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert len(source.read_bars('600000.SH', '1d', '', '')) == 20
+
+
+def test_recorded_session_replays_by_period_and_adjustment(tmp_path):
+    write_bars(str(tmp_path / 'store'), '600000.SH', make_daily_bars())
+    recorder = RecordingSource(ReplaySource(str(tmp_path / 'store')), str(tmp_path / 'session.parquet'))
+    recorder.read_bars('600000.SH', '1d', '20240101', '20240110')
+    recorder.save()
+
+    replay = ReplaySource(session_file=str(tmp_path / 'session.parquet'))
+    assert len(replay.read_bars('600000.SH', '1d', '', '')) == 8
+    assert replay.read_bars('600000.SH', '1d', '', '', 'back') is None
@@ -0,0 +1,163 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.cleaner.validator import DataValidator
+from core.fetcher.downloader import QmtDataDownloader
+from core.fetcher.source import ReplaySource
+from core.storage.summary import SUMMARY_FILE, SummaryTable, summarize_frame
+from tests.fakes import make_daily_bars, write_bars
+
+
+def _write(directory: str, code: str, df: pd.DataFrame, mtime: int | None = None) -> str:
+    path = write_bars(directory, code, df)
+    if mtime is not None:
+        # 保证修改时间变化（同一时间片内写入的文件修改时间可能相同）
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_summarize_frame_matches_direct_computation():
+    bars = make_daily_bars('2023-01-02', periods=300)
+    row = summarize_frame('600000.SH', bars)
+    close = bars['close']
+
+    assert row['rows'] == 300
+    assert row['first_date'] == bars.index[0] and row['last_date'] == bars.index[-1]
+    assert row['fields'] == ','.join(bars.columns)
+    assert row['last_close'] == close.iloc[-1]
+    assert row['avg_volume_5'] == pytest.approx(bars['volume'].iloc[-5:].mean())
+    assert row['avg_amount_60'] == pytest.approx(bars['amount'].iloc[-60:].mean())
+    assert row['ret_5d'] == pytest.approx(close.iloc[-1] / close.iloc[-6] - 1)
+    assert row['ret_250d'] == pytest.approx(close.iloc[-1] / close.iloc[-251] - 1)
+    recent = bars[bars.index > bars.index[-1] - pd.Timedelta(days=365)]
+    assert row['high_52w'] == recent['high'].max() and row['low_52w'] == recent['low'].min()
+    # 年初至今相对上一年最后一个交易日
+    assert row['ret_ytd'] == pytest.approx(close.iloc[-1] / close.loc[:'2023-12-31'].iloc[-1] - 1)
+    assert row['file'] is None and row['file_size'] == 0
+
+
+def test_short_and_empty_frames():
+    bars = make_daily_bars('2024-01-01', periods=10)
+    short = summarize_frame('A', bars)
+    assert short['ret_5d'] == pytest.approx(bars['close'].iloc[-1] / bars['close'].iloc[-6] - 1)
+    # 不足窗口长度的收益为NaN，均量按已有的K线计算
+    assert np.isnan(short['ret_20d']) and np.isnan(short['ret_ytd'])
+    assert short['avg_volume_60'] == pytest.approx(bars['volume'].mean())
+
+    empty = summarize_frame('B', make_daily_bars(periods=0))
+    assert empty['rows'] == 0 and pd.isna(empty['first_date'])
+    assert np.isnan(empty['last_close']) and np.isnan(empty['high_52w']) and np.isnan(empty['ret_ytd'])
+
+
+def test_intraday_bars_are_rolled_up_to_days():
+    daily = make_daily_bars('2024-01-01', periods=10)
+    morning, afternoon = daily.copy(), daily.copy()
+    morning.index = morning.index + pd.Timedelta('09:31:00')
+    afternoon.index = afternoon.index + pd.Timedelta('15:00:00')
+    afternoon['close'] += 1.0
+    minute = pd.concat([morning, afternoon]).sort_index()
+
+    row = summarize_frame('A', minute)
+    assert row['rows'] == 20
+    assert row['last_close'] == afternoon['close'].iloc[-1]
+    assert row['avg_volume_5'] == pytest.approx(2 * daily['volume'].iloc[-5:].mean())
+    assert row['ret_5d'] == pytest.approx(afternoon['close'].iloc[-1] / afternoon['close'].iloc[-6] - 1)
+
+
+def test_refresh_tracks_records_rewrites_and_removals(tmp_path, caplog):
+    output_dir = str(tmp_path)
+    summary = SummaryTable(output_dir)
+    assert summary.load().empty
+
+    a = make_daily_bars(periods=30, seed=1)
+    _write(output_dir, 'A.SH', a)
+    summary.record('A.SH', a)
+    # 没有记录过的文件由刷新时扫描发现
+    _write(output_dir, 'B.SH', make_daily_bars(periods=20, seed=2))
+    table = summary.refresh()
+    assert list(table.index) == ['A.SH', 'B.SH']
+    assert table.loc['B.SH', 'rows'] == 20
+    assert os.path.exists(os.path.join(output_dir, SUMMARY_FILE))
+    # 摘要表本身不被当成数据文件
+    assert SUMMARY_FILE not in table['file'].tolist()
+
+    # 其他途径改写的文件按大小和修改时间识别
+    _write(output_dir, 'B.SH', make_daily_bars(periods=25, seed=2), mtime=1)
+    # 记录之后文件又被替换：记录的行作废，从文件重新计算
+    summary.record('A.SH', a)
+    _write(output_dir, 'A.SH', a.iloc[:10], mtime=1)
+    os.remove(os.path.join(output_dir, 'B.SH.parquet'))
+    with open(os.path.join(output_dir, 'C.SH.parquet'), 'wb') as f:
+        f.write(b'not a parquet file')
+
+    with caplog.at_level(logging.WARNING):
+        table = SummaryTable(output_dir).refresh(['A.SH', 'B.SH', 'C.SH'])
+    assert 'C.SH' in caplog.text
+    assert list(table.index) == ['A.SH']
+    assert summary.refresh(['A.SH']).loc['A.SH', 'rows'] == 10
+
+    pd.testing.assert_frame_equal(SummaryTable(output_dir).load(), summary.load())
+
+
+def test_flush_writes_only_pending_rows(tmp_path):
+    output_dir = str(tmp_path)
+    summary = SummaryTable(output_dir)
+    summary.flush()
+    assert not os.path.exists(summary.path)
+
+    a = make_daily_bars(periods=30)
+    _write(output_dir, 'A.SH', a)
+    _write(output_dir, 'B.SH', a)
+    summary.record('A.SH', a)
+    summary.flush()
+    assert list(summary.load().index) == ['A.SH']
+
+
+def test_screen_stock_list_and_manifest(tmp_path):
+    output_dir = str(tmp_path)
+    rising = make_daily_bars(periods=30, seed=1)
+    rising['close'] = np.linspace(10, 20, 30)
+    falling = make_daily_bars(periods=30, seed=2)
+    falling['close'] = np.linspace(20, 10, 30)
+    _write(output_dir, 'UP.SH', rising)
+    _write(output_dir, 'DOWN.SH', falling)
+    summary = SummaryTable(output_dir)
+    summary.refresh()
+
+    assert list(summary.screen('ret_20d > 0').index) == ['UP.SH']
+
+    stock_list = summary.stock_list(['UP.SH', 'MISSING.SH'])
+    assert stock_list.to_dict('records') == [
+        {'代码': 'UP.SH', '起始日期': '2024-01-01', '结束日期': '2024-02-09', '数据量': 30, '文件': 'UP.SH.parquet'},
+        {'代码': 'MISSING.SH', '起始日期': '-', '结束日期': '-', '数据量': 0, '文件': '-'},
+    ]
+
+    # 与逐个读取文件生成的清单一致
+    codes = ['UP.SH', 'DOWN.SH', 'MISSING.SH']
+    validator = DataValidator(output_dir)
+    assert summary.manifest(codes) == validator.generate_manifest(codes)
+    with open(os.path.join(output_dir, 'BAD.SH.parquet'), 'wb') as f:
+        f.write(b'broken')
+    assert summary.manifest(['BAD.SH'])['BAD.SH'] == {'code': 'BAD.SH', 'exists': True, 'error': 'Unreadable file'}
+
+
+def test_batch_download_writes_summary_and_stock_list(tmp_path):
+    source_dir = str(tmp_path / 'source')
+    bars = make_daily_bars('2024-01-01', periods=30)
+    write_bars(source_dir, '600000.SH', bars)
+    output_dir = str(tmp_path / 'output')
+    downloader = QmtDataDownloader(output_dir, source=ReplaySource(source_dir), pause=0)
+
+    results = downloader.download_batch(['600000.SH', 'NODATA.SH'], start_time='20240101', end_time='20240229')
+    assert results == {'600000.SH': True, 'NODATA.SH': False}
+
+    table = SummaryTable(output_dir).load()
+    assert list(table.index) == ['600000.SH']
+    assert table.loc['600000.SH', 'rows'] == 30
+    stock_list = pd.read_csv(os.path.join(output_dir, 'stock_list.csv'), encoding='utf-8-sig')
+    assert stock_list['代码'].tolist() == ['600000.SH']
+    assert stock_list['数据量'].tolist() == [30]
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.storage.tick_store import TickStore, decode_ticks, encode_ticks
+
+
+def _ticks(day: str, seconds: int = 3) -> pd.DataFrame:
+    """一个交易日的分笔数据：上午、下午各两小时，每 seconds 秒一笔"""
+    base = pd.Timestamp(day)
+    morning = pd.date_range(base + pd.Timedelta('09:30:00'), base + pd.Timedelta('11:30:00'),
+                            freq=f'{seconds}s', inclusive='left')
+    afternoon = pd.date_range(base + pd.Timedelta('13:00:00'), base + pd.Timedelta('15:00:00'),
+                              freq=f'{seconds}s', inclusive='left')
+    index = morning.append(afternoon).rename('time')
+    n = len(index)
+    price = np.round(10 + np.arange(n) % 50 * 0.001, 3)
+    return pd.DataFrame({
+        'price': price,
+        'volume': np.arange(1, n + 1) * 100.0,
+        'amount': np.round(np.arange(1, n + 1) * 1000.25, 2),
+        'bid_price': price - 0.001,
+        'ask_price': price + 0.001,
+    }, index=index)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TickStore(str(tmp_path), bucket_minutes=30)
+    store.write('600000.SH', pd.concat([_ticks('2024-01-02'), _ticks('2024-01-03')]))
+    return store
+
+
+def test_encode_decode_round_trip():
+    ticks = _ticks('2024-01-02')
+    decoded = decode_ticks(encode_ticks(ticks))
+    np.testing.assert_allclose(decoded.to_numpy(), ticks.to_numpy())
+    assert (decoded.index == ticks.index).all()
+
+
+def test_write_splits_by_day_and_builds_index(store):
+    assert store.days('600000.SH') == ['20240102', '20240103']
+    index = store.read_index('600000.SH', '20240102')
+    # 4小时交易时段，每30分钟一个row group
+    assert len(index) == 8
+    assert sum(rows for _, _, rows in index) == len(_ticks('2024-01-02'))
+
+
+def test_read_intraday_window(store):
+    window = store.read('600000.SH', '20240102100000', '20240102103000')
+    expected = _ticks('2024-01-02').loc['2024-01-02 10:00:00':'2024-01-02 10:30:00']
+
+    assert len(window) == len(expected)
+    assert window.index[0] == expected.index[0]
+    assert window.index[-1] == expected.index[-1]
+    np.testing.assert_allclose(window['price'], expected['price'])
+
+
+def test_read_window_spanning_days(store):
+    window = store.read('600000.SH', '20240102143000', '20240103093500')
+    assert window.index[0] == pd.Timestamp('2024-01-02 14:30:00')
+    assert window.index[-1] <= pd.Timestamp('2024-01-03 09:35:00')
+    assert window.index.normalize().nunique() == 2
+
+
+def test_read_whole_day_and_fields(store):
+    day = store.read('600000.SH', '20240103')
+    assert len(day) == len(_ticks('2024-01-03'))
+
+    prices = store.read('600000.SH', '20240103', fields=['price'])
+    assert list(prices.columns) == ['price']
+
+
+def test_read_empty_window(store):
+    assert len(store.read('600000.SH', '20240102120000', '20240102123000')) == 0
+    assert len(store.read('600000.SH', '20240105')) == 0
+    assert len(store.read('000001.SZ', '20240102')) == 0
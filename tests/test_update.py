@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from core.metrics import RunMetrics
+from core.fetcher.downloader import QmtDataDownloader
+from core.fetcher.source import ReplaySource
+from tests.fakes import make_daily_bars, write_bars
+
+
+class DividendSource(ReplaySource):
+    """get_dividends 按需抛出异常的回放数据源"""
+
+    def __init__(self, output_dir: str, dividends: dict | None = None, fail: bool = False):
+        super().__init__(output_dir, dividends=dividends)
+        self.fail = fail
+
+    def get_dividends(self, code, start_time, end_time):
+        if self.fail:
+            raise ConnectionError('get_divid_factors failed')
+        return super().get_dividends(code, start_time, end_time)
+
+
+def _setup(tmp_path, **source_kwargs):
+    source_dir, output_dir = str(tmp_path / 'source'), str(tmp_path / 'output')
+    bars = make_daily_bars(periods=40)
+    write_bars(source_dir, '600000.SH', bars)
+    write_bars(output_dir, '600000.SH', bars.iloc[:30])
+    metrics = RunMetrics()
+    downloader = QmtDataDownloader(output_dir, metrics=metrics, pause=0,
+                                   source=DividendSource(source_dir, **source_kwargs))
+    return downloader, metrics, bars, output_dir
+
+
+def _fallbacks(metrics: RunMetrics) -> float:
+    return metrics.counter_totals().get('update_fallbacks', 0)
+
+
+def test_update_appends_new_bars(tmp_path):
+    downloader, metrics, bars, output_dir = _setup(tmp_path)
+    assert downloader.update_stock_data('600000.SH', end_time='20240331')
+
+    saved = pd.read_parquet(os.path.join(output_dir, '600000.SH.parquet'))
+    np.testing.assert_allclose(saved['close'], bars['close'])
+    assert _fallbacks(metrics) == 0
+
+
+def test_corrupt_file_falls_back_to_full_download(tmp_path):
+    downloader, metrics, bars, output_dir = _setup(tmp_path)
+    with open(os.path.join(output_dir, '600000.SH.parquet'), 'wb') as f:
+        f.write(b'not a parquet file')
+
+    assert downloader.update_stock_data('600000.SH', end_time='20240331', start_time='20240101')
+    assert len(pd.read_parquet(os.path.join(output_dir, '600000.SH.parquet'))) == len(bars)
+    assert _fallbacks(metrics) == 1
+
+
+def test_dividend_failure_falls_back_to_full_download(tmp_path):
+    downloader, metrics, bars, output_dir = _setup(tmp_path, fail=True)
+
+    assert downloader.update_stock_data('600000.SH', end_time='20240331')
+    assert len(pd.read_parquet(os.path.join(output_dir, '600000.SH.parquet'))) == len(bars)
+    assert _fallbacks(metrics) == 1
+
+
+def test_unexpected_error_fails_only_that_code(tmp_path):
+    downloader, _, _, output_dir = _setup(tmp_path)
+
+    def update(code: str, **kwargs) -> bool:
+        if code == 'BROKEN':
+            raise RuntimeError('boom')
+        return downloader.update_stock_data(code, **kwargs)
+
+    results = downloader.run_batch(update, ['BROKEN', '600000.SH'], "批量更新", {'end_time': '20240331'})
+
+    assert results == {'BROKEN': False, '600000.SH': True}
+    assert os.path.exists(os.path.join(output_dir, 'stock_list.csv'))